@@ -49,6 +49,8 @@ class Settings(BaseSettings):
     GROQ_API_KEY_4: str = ""                    # Groq LLM Key #4 (Pool)
     GROQ_API_KEY_5: str = ""                    # Groq LLM Key #5 (Pool)
     GROQ_API_KEYS: str = ""                     # Comma-separated keys (alternative format)
+    GROQ_TOKENS_PER_MINUTE: int = 6000          # Per-key token budget (prompt + output) for admission
+    ENABLE_LOAD_AWARE_ROUTING: bool = False     # Platform turns pick the model by complexity + live model health
     
     # --------------------------------------------------
     # Database Services
@@ -78,6 +80,26 @@ class Settings(BaseSettings):
     SENDGRID_API_KEY: str = ""                  # SendGrid API Key
     SENDER_EMAIL: str = "dev@example.com"       # Verified sender email
     ENABLE_EMAIL_WORKER: bool = False           # Old Redis-based worker (disabled - using Celery now)
+    SMTP_HOST: str = ""                         # Optional SMTP relay (used instead of SendGrid when set)
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_USE_TLS: bool = True
+    MAIL_POOL_SIZE: int = 4                     # Concurrent sends / pooled connections per process
+    MAIL_MAX_PENDING: int = 200                 # Queued sends before the transport rejects (backpressure)
+    REMINDER_BATCH_MODE: bool = True            # Periodic batched reminder delivery (Celery beat)
+    REMINDER_BATCH_SIZE: int = 200
+
+    # --------------------------------------------------
+    # Request Tracing (disabled unless an export target is set)
+    # --------------------------------------------------
+    TRACE_SAMPLE_RATE: float = 0.01             # Fraction of requests traced (head sampling)
+    TRACE_EXPORT_FILE: str = ""                 # JSON-lines span file, e.g. "traces.jsonl"
+    TRACE_EXPORT_URL: str = ""                  # OTLP/HTTP JSON endpoint, e.g. http://localhost:4318/v1/traces
+    LOOP_MONITOR_ENABLED: bool = True           # Event-loop lag monitor + stall watchdog (admin profiling)
+    LOOP_STALL_WARN_MS: float = 250.0           # Log the loop thread's stack when it is blocked this long
+    # Reverse proxies (IPs/CIDRs) allowed to set X-Forwarded-For and force trace sampling
+    TRUSTED_PROXIES: str = "127.0.0.0/8,::1,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16"
 
     # --------------------------------------------------
     # Email Limits & Retries
@@ -100,6 +122,11 @@ class Settings(BaseSettings):
         """Convert CORS_ORIGINS string to list"""
         return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
     
+    @property
+    def trusted_proxies_list(self) -> List[str]:
+        """Convert TRUSTED_PROXIES string to list"""
+        return [entry.strip() for entry in self.TRUSTED_PROXIES.split(",") if entry.strip()]
+
     @property
     def is_production(self) -> bool:
         """Check if running in production"""
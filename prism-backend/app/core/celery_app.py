@@ -123,6 +123,7 @@ if CELERY_AVAILABLE:
         task_routes={
             "prism_tasks.send_reminder_email": {"queue": "email"},
             "prism_tasks.send_otp_email": {"queue": "email"},
+            "prism_tasks.send_due_reminders_batch": {"queue": "email"},
         },
         task_default_queue="default",
         task_default_exchange="tasks",
@@ -146,6 +147,12 @@ if CELERY_AVAILABLE:
                 "schedule": 300.0,  # Every 5 minutes
                 "options": {"queue": "default"}
             },
+            # 📦 Batched delivery of due reminders every minute
+            "send-due-reminders-batch-every-min": {
+                "task": "prism_tasks.send_due_reminders_batch",
+                "schedule": 60.0,
+                "options": {"queue": "email"}
+            },
             # Health check every 2 minutes
             "health-check-every-2-min": {
                 "task": "prism_tasks.health_check",
@@ -6,7 +6,8 @@ Provides a reusable HTTP client for external API calls.
 ✅ MANDATORY PATTERNS:
 - Single httpx.AsyncClient instance (singleton)
 - Connection pooling (max 100 connections)
-- Automatic retries on transient failures
+- Automatic retries on transient failures (GET only), per-host circuit
+  breakers and retry budgets via app.utils.resilience
 - Keep-alive for connection reuse
 
 ❌ NEVER create httpx.Client per request - causes:
@@ -19,10 +20,33 @@ import httpx
 import logging
 from typing import Optional, Dict, Any
 from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from app.utils.resilience import CircuitOpenError, get_backend
 
 logger = logging.getLogger(__name__)
 
 
+class _ServerError(httpx.HTTPStatusError):
+    """5xx response: counts against the host's circuit breaker (4xx does not)"""
+
+
+# Transport failures, timeouts and 5xx are the host's fault; retry/trip on those
+_RETRYABLE = (httpx.TransportError, _ServerError)
+
+
+def _raise_for_status(response: "httpx.Response") -> "httpx.Response":
+    if response.status_code >= 500:
+        raise _ServerError(f"Server error {response.status_code}", request=response.request, response=response)
+    response.raise_for_status()
+    return response
+
+
+def _backend_for(url: str):
+    """One resilience backend (breaker + retry budget) per external host"""
+    return get_backend(f"http:{urlsplit(url).hostname or 'unknown'}")
+
+
 class HTTPClient:
     """
     🔌 SINGLETON HTTP client with connection pooling.
@@ -122,15 +146,22 @@ class HTTPClient:
             logger.error("HTTP client not initialized")
             return None
         
-        try:
+        async def send():
             response = await self._client.get(
                 url,
                 params=params,
                 headers=headers,
                 timeout=timeout
             )
-            response.raise_for_status()
-            return response
+            return _raise_for_status(response)
+        
+        try:
+            # GET is idempotent: one jittered retry within the host's budget
+            return await _backend_for(url).call(send, retries=1, retry_on=_RETRYABLE)
+        
+        except CircuitOpenError as e:
+            logger.debug(f"HTTP GET skipped for {url}: {e}")
+            return None
         
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error for {url}: {e.response.status_code} - {e.response.text}")
@@ -169,7 +200,7 @@ class HTTPClient:
             logger.error("HTTP client not initialized")
             return None
         
-        try:
+        async def send():
             response = await self._client.post(
                 url,
                 data=data,
@@ -177,8 +208,15 @@ class HTTPClient:
                 headers=headers,
                 timeout=timeout
             )
-            response.raise_for_status()
-            return response
+            return _raise_for_status(response)
+        
+        try:
+            # Not idempotent: breaker only, never retried here
+            return await _backend_for(url).call(send, retry_on=_RETRYABLE)
+        
+        except CircuitOpenError as e:
+            logger.debug(f"HTTP POST skipped for {url}: {e}")
+            return None
         
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error for {url}: {e.response.status_code} - {e.response.text}")
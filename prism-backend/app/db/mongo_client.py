@@ -246,7 +246,6 @@ def get_database():
 # ============================================================================
 # MONGODB RETRY HELPER - Handles connection issues gracefully
 # ============================================================================
-import asyncio
 import logging
 from functools import wraps
 from pymongo.errors import AutoReconnect, ServerSelectionTimeoutError, NetworkTimeout
@@ -265,8 +264,8 @@ async def mongo_retry(
     
     Args:
         operation: Async callable (lambda or function)
-        max_retries: Number of retry attempts
-        base_delay: Initial delay between retries (doubles each retry)
+        max_retries: Number of attempts (first try included)
+        base_delay: Backoff ceiling for the first retry (doubles each retry, full jitter)
         fallback: Value to return if all retries fail (None raises exception)
         log_errors: Whether to log errors
     
@@ -279,40 +278,30 @@ async def mongo_retry(
             fallback={}
         )
     """
-    last_error = None
+    from app.utils.resilience import CircuitOpenError, get_backend
     
-    for attempt in range(max_retries):
-        try:
-            return await operation()
-        except (AutoReconnect, ServerSelectionTimeoutError, NetworkTimeout) as e:
-            last_error = e
-            if attempt < max_retries - 1:
-                delay = base_delay * (2 ** attempt)  # Exponential backoff
-                if log_errors:
-                    # Only warn on subsequent retries, debug on first
-                    level = logging.WARNING if attempt > 0 else logging.DEBUG
-                    _retry_logger.log(
-                        level,
-                        f"⚠️ MongoDB retry {attempt + 1}/{max_retries} "
-                        f"after {type(e).__name__}, waiting {delay:.1f}s..."
-                    )
-                await asyncio.sleep(delay)
-            continue
-        except Exception as e:
-            # Non-retryable error
-            if log_errors:
-                _retry_logger.error(f"❌ MongoDB error (non-retryable): {e}")
-            if fallback is not None:
-                return fallback
-            raise
-    
-    # All retries exhausted
-    if log_errors:
-        _retry_logger.error(f"❌ MongoDB operation failed after {max_retries} retries: {last_error}")
-    
-    if fallback is not None:
-        return fallback
-    raise last_error
+    try:
+        # Jittered backoff + shared retry budget + "mongo" circuit breaker;
+        # only connection errors are retried or count against the breaker
+        return await get_backend("mongo").call(
+            operation,
+            retries=max_retries - 1,
+            retry_on=(AutoReconnect, ServerSelectionTimeoutError, NetworkTimeout),
+            base_delay=base_delay,
+        )
+    except (AutoReconnect, ServerSelectionTimeoutError, NetworkTimeout, CircuitOpenError) as e:
+        if log_errors:
+            _retry_logger.error(f"❌ MongoDB operation failed (up to {max_retries} attempts): {e}")
+        if fallback is not None:
+            return fallback
+        raise
+    except Exception as e:
+        # Non-retryable error
+        if log_errors:
+            _retry_logger.error(f"❌ MongoDB error (non-retryable): {e}")
+        if fallback is not None:
+            return fallback
+        raise
 
 
 def with_mongo_retry(max_retries: int = 3, fallback=None):
@@ -693,6 +682,31 @@ async def initialize_indexes():
         await users_global_collection.create_index("userId")
         print("  ✅ userId - Fast global user lookup")
         
+        # ============================================================
+        # ANALYTICS_ROLLUPS COLLECTION INDEXES
+        # ============================================================
+        print("\n📊 Analytics Rollups Collection:")
+        
+        # Newest rollups per period (admin dashboard series)
+        await db.analytics_rollups.create_index([
+            ("period", 1),
+            ("start", -1)
+        ])
+        print("  ✅ (period, start) - Rollup series query")
+        
+        # ============================================================
+        # FINALIZED_GENERATIONS COLLECTION INDEXES
+        # ============================================================
+        print("\n📊 Finalized Generations Collection:")
+        
+        # One record per generation - the finalize idempotency guard
+        await db.finalized_generations.create_index("generation_id", unique=True)
+        print("  ✅ generation_id (unique) - Finalize idempotency lookup")
+        
+        # Records only matter while a client may still retry
+        await db.finalized_generations.create_index("created_at", expireAfterSeconds=30 * 86400)
+        print("  ✅ created_at (TTL 30d) - Auto-expire old records")
+        
         # ============================================================
         # PENDING_MEMORY COLLECTION INDEXES (if exists)
         # ============================================================
@@ -17,11 +17,13 @@ Why this helps?
 """
 
 from neo4j import AsyncGraphDatabase
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Set, Tuple
+from dataclasses import dataclass, field
 from datetime import datetime
 import logging
 import asyncio
 from app.config import settings
+from app.utils.resilience import get_backend
 
 logger = logging.getLogger(__name__)
 
@@ -118,24 +120,69 @@ class Neo4jClient:
         if not self._driver:
             return []
         
-        last_error = None
+        async def run():
+            async with self._driver.session() as session:
+                result = await session.run(query, parameters)
+                return [record.data() async for record in result]
         
-        for attempt in range(max_retries):
-            try:
-                async with self._driver.session() as session:
-                    result = await session.run(query, parameters)
-                    return [record.data() async for record in result]
-            except Exception as e:
-                last_error = e
-                if attempt < max_retries - 1:
-                    # Quick retry with minimal backoff
-                    await asyncio.sleep(0.2 * (attempt + 1))
-                    continue
+        try:
+            # Jittered retries within the shared "neo4j" breaker + retry budget
+            return await get_backend("neo4j").call(run, retries=max_retries - 1, base_delay=0.2)
+        except Exception as e:
+            # Only log once if all retries fail (reduces noise)
+            logger.debug(f"Neo4j query unavailable after {max_retries} attempts: {e}")
+            return []
+    
+    async def _execute(self, statements: List[Tuple[str, dict]], write: bool) -> Optional[List[List[dict]]]:
+        """
+        Run statements inside ONE managed transaction on ONE session.
         
-        # Only log once if all retries fail (reduces noise)
-        if last_error:
-            logger.debug(f"Neo4j query unavailable after {max_retries} attempts: {last_error}")
-        return []
+        Managed transactions (execute_read/execute_write) retry transient
+        errors themselves and let the driver route reads to followers.
+        Returns one record list per statement, or None on failure.
+        """
+        if not self._driver:
+            return None
+        
+        async def work(tx):
+            results = []
+            for statement, parameters in statements:
+                result = await tx.run(statement, parameters or {})
+                results.append([record.data() async for record in result])
+            return results
+        
+        async def run():
+            async with self._driver.session() as session:
+                if write:
+                    return await session.execute_write(work)
+                return await session.execute_read(work)
+        
+        try:
+            # Managed transactions already retry transient errors, so no
+            # extra retries here - just the breaker, plus hedging for reads
+            return await get_backend("neo4j").call(run, hedge=not write)
+        except Exception as e:
+            logger.debug(f"Neo4j {'write' if write else 'read'} transaction failed: {e}")
+            return None
+    
+    async def read(self, query: str, parameters: dict = None, strict: bool = False) -> Optional[List[dict]]:
+        """
+        Execute a Cypher query in an explicit READ transaction.
+        Returns [] on failure, or None when strict (to tell "empty" from "failed").
+        """
+        results = await self._execute([(query, parameters)], write=False)
+        if results is None:
+            return None if strict else []
+        return results[0]
+    
+    async def write(self, query: str, parameters: dict = None) -> Optional[List[dict]]:
+        """Execute a Cypher query in a managed WRITE transaction (None on failure)"""
+        results = await self._execute([(query, parameters)], write=True)
+        return results[0] if results is not None else None
+    
+    async def write_batch(self, statements: List[Tuple[str, dict]]) -> bool:
+        """Execute several write statements atomically in one transaction/session"""
+        return await self._execute(statements, write=True) is not None
 
 # Global Neo4j client instance
 neo4j_client = Neo4jClient()
@@ -156,6 +203,292 @@ async def query_graph(query: str, parameters: dict = None):
     """
     return await neo4j_client.query(query, parameters)
 
+async def read_graph(query: str, parameters: dict = None) -> List[dict]:
+    """
+    Runs a read-only Cypher query in an explicit read transaction.
+    """
+    return await neo4j_client.read(query, parameters)
+
+
+# =============================================================================
+# 📦 GRAPH WRITE BATCHER (UNWIND upserts, one round-trip per user per window)
+# =============================================================================
+
+# Target node label for each relationship type written by the memory pipeline
+RELATION_TARGET_LABELS = {
+    "LIKES": "Interest", "INTERESTED_IN": "Interest", "FAVORITE_LANGUAGE": "Interest",
+    "LIVES_IN": "Location", "WORKS_AT": "Location",
+    "HAS_SKILL": "Skill", "LEARNING": "Skill",
+}
+
+
+def label_for_relation(relation_type: str) -> str:
+    return RELATION_TARGET_LABELS.get(relation_type, "Entity")
+
+
+def _safe_identifier(value: str, default: str, upper: bool = False) -> str:
+    """Labels/relationship types can't be parameters - restrict to [A-Za-z0-9_]"""
+    value = (value or "").upper() if upper else (value or "")
+    cleaned = "".join(c for c in value if c.isalnum() or c == "_")
+    return cleaned or default
+
+
+def _property_value(value: Any) -> Any:
+    """
+    Neo4j properties must be primitives or homogeneous lists of primitives.
+    Anything else (dicts, mixed lists from LLM output) is stored as text so
+    one malformed value can't fail the whole batched statement.
+    """
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, (list, tuple)):
+        kinds = {type(item) for item in value}
+        if len(kinds) <= 1 and kinds <= {str, bool, int, float}:
+            return list(value)
+    return str(value)
+
+
+@dataclass
+class GraphUpsert:
+    """
+    Buffered graph writes for ONE user.
+    
+    - properties: SET directly on the User node
+    - interests: (name, category) -> hits  (LIKES, strength += hits)
+    - relationships: (label, REL_TYPE) -> target -> {target, source, strength_inc}
+      (strength_inc None leaves r.strength untouched)
+    """
+    properties: Dict[str, Any] = field(default_factory=dict)
+    interests: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    relationships: Dict[Tuple[str, str], Dict[str, dict]] = field(default_factory=dict)
+    
+    def set_property(self, key: str, value: Any) -> "GraphUpsert":
+        safe_key = "".join(ch for ch in key if ch.isalnum() or ch == "_")
+        if safe_key:
+            self.properties[safe_key] = _property_value(value)
+        return self
+    
+    def add_interest(self, name: str, category: str = "interest", hits: int = 1) -> "GraphUpsert":
+        name = str(name).strip().lower() if name is not None else ""
+        if name:
+            slot = (name, category)
+            self.interests[slot] = self.interests.get(slot, 0) + hits
+        return self
+    
+    def add_relationship(
+        self,
+        target: str,
+        relationship_type: str,
+        target_label: str = "Entity",
+        source: Optional[str] = None,
+        strength_inc: Optional[float] = None,
+    ) -> "GraphUpsert":
+        target = str(target).strip() if target is not None else ""
+        if not target:
+            return self
+        group = (_safe_identifier(target_label, "Entity"), _safe_identifier(relationship_type, "RELATED_TO", upper=True))
+        items = self.relationships.setdefault(group, {})
+        existing = items.get(target)
+        if existing:
+            if strength_inc is not None:
+                existing["strength_inc"] = (existing["strength_inc"] or 0) + strength_inc
+            existing["source"] = source or existing["source"]
+        else:
+            items[target] = {"target": target, "source": source, "strength_inc": strength_inc}
+        return self
+    
+    def merge(self, other: "GraphUpsert") -> "GraphUpsert":
+        self.properties.update(other.properties)
+        for slot, hits in other.interests.items():
+            self.interests[slot] = self.interests.get(slot, 0) + hits
+        for (label, rel_type), items in other.relationships.items():
+            for item in items.values():
+                self.add_relationship(item["target"], rel_type, label, item["source"], item["strength_inc"])
+        return self
+    
+    def split(self) -> List["GraphUpsert"]:
+        """One single-item upsert per property/interest/relationship (failure isolation)"""
+        parts = [GraphUpsert().set_property(key, value) for key, value in self.properties.items()]
+        parts.extend(
+            GraphUpsert().add_interest(name, category, hits)
+            for (name, category), hits in self.interests.items()
+        )
+        for (label, rel_type), items in self.relationships.items():
+            parts.extend(
+                GraphUpsert().add_relationship(item["target"], rel_type, label, item["source"], item["strength_inc"])
+                for item in items.values()
+            )
+        return parts
+    
+    def is_empty(self) -> bool:
+        return not (self.properties or self.interests or self.relationships)
+    
+    def edges(self) -> List[Tuple[str, str, str]]:
+        """(rel_type, target, label) for every direct edge this upsert writes"""
+        edges = [("LIKES", name, "Interest") for name, _ in self.interests]
+        for (label, rel_type), items in self.relationships.items():
+            edges.extend((rel_type, target, label) for target in items)
+        return edges
+    
+    def size(self) -> int:
+        return len(self.properties) + len(self.interests) + sum(len(v) for v in self.relationships.values())
+    
+    def to_cypher(self, user_id: str) -> Tuple[str, dict]:
+        """
+        Compile the whole buffer into ONE parameterized statement.
+        Each UNWIND lives in a CALL subquery ending in count(*) so an empty
+        list never eliminates the outer row.
+        """
+        timestamp = datetime.utcnow().isoformat()
+        params: Dict[str, Any] = {"user_id": user_id, "props": self.properties, "timestamp": timestamp}
+        parts = [
+            "MERGE (u:User {id: $user_id})",
+            "SET u += $props",
+        ]
+        if self.properties:
+            parts.append("SET u.updatedAt = $timestamp")
+        
+        if self.interests:
+            params["interests"] = [
+                {"name": name, "category": category, "hits": hits}
+                for (name, category), hits in self.interests.items()
+            ]
+            parts.append("""WITH u
+CALL {
+    WITH u
+    UNWIND $interests AS item
+    MERGE (i:Interest {name: item.name, category: item.category})
+    MERGE (u)-[r:LIKES]->(i)
+    SET r.createdAt = COALESCE(r.createdAt, $timestamp),
+        r.strength = COALESCE(r.strength, 0) + item.hits
+    RETURN count(*) AS interests_written
+}""")
+        
+        for index, ((label, rel_type), items) in enumerate(self.relationships.items()):
+            param = f"rels_{index}"
+            params[param] = list(items.values())
+            parts.append(f"""WITH u
+CALL {{
+    WITH u
+    UNWIND ${param} AS item
+    MERGE (t:{label} {{name: item.target}})
+    MERGE (u)-[r:{rel_type}]->(t)
+    SET r.createdAt = COALESCE(r.createdAt, $timestamp),
+        r.updatedAt = $timestamp,
+        r.strength = CASE WHEN item.strength_inc IS NULL THEN r.strength
+                          ELSE COALESCE(r.strength, 1) + item.strength_inc END,
+        r.source = COALESCE(item.source, r.source)
+    RETURN count(*) AS {param}_written
+}}""")
+        
+        parts.append("RETURN u.id AS user_id")
+        return "\n".join(parts), params
+
+
+class GraphWriteBatcher:
+    """
+    🚀 Coalesces graph upserts per user for a short window, then writes them
+    as ONE UNWIND statement in ONE managed write transaction.
+    
+    Every submitter awaits the flush that includes it and receives its own
+    success flag. If the combined statement fails, each submission is
+    retried on its own, so one bad submission can't sink the others.
+    """
+    
+    def __init__(self, client: "Neo4jClient", window_seconds: float = 0.05):
+        self.client = client
+        self.window_seconds = window_seconds
+        self._pending: Dict[str, GraphUpsert] = {}
+        self._submitters: Dict[str, List[Tuple[GraphUpsert, asyncio.Future]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.flushes = 0
+        self.items_written = 0
+    
+    async def submit(self, user_id: str, upsert: GraphUpsert) -> bool:
+        """Buffer upsert for user_id and wait for the flush that includes it"""
+        if not self.client.is_available:
+            return False
+        if upsert.is_empty():
+            return True
+        
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        buffered = self._pending.get(user_id)
+        if buffered is None:
+            self._pending[user_id] = GraphUpsert().merge(upsert)
+            self._submitters[user_id] = [(upsert, waiter)]
+            loop.call_later(self.window_seconds, self._schedule_flush, user_id)
+        else:
+            buffered.merge(upsert)
+            self._submitters[user_id].append((upsert, waiter))
+        
+        return await asyncio.shield(waiter)
+    
+    def _schedule_flush(self, user_id: str):
+        # Hold a reference so the task can't be garbage-collected mid-flight
+        task = asyncio.ensure_future(self._flush(user_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._flush_done)
+    
+    def _flush_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Graph batch flush crashed: {task.exception()}")
+    
+    async def _write(self, user_id: str, upsert: GraphUpsert) -> bool:
+        try:
+            query, params = upsert.to_cypher(user_id)
+            return await self.client.write(query, params) is not None
+        except Exception as e:
+            logger.debug(f"Graph batch write failed for {user_id}: {e}")
+            return False
+    
+    async def _flush(self, user_id: str):
+        upsert = self._pending.pop(user_id, None)
+        submitters = self._submitters.pop(user_id, [])
+        if upsert is None:
+            return
+        
+        results: List[bool] = []
+        try:
+            if await self._write(user_id, upsert):
+                results = [True] * len(submitters)
+                written = [upsert]
+            elif len(submitters) > 1:
+                written = []
+                for own, _ in submitters:
+                    ok = await self._write(user_id, own)
+                    results.append(ok)
+                    if ok:
+                        written.append(own)
+            else:
+                written = []
+            
+            for done in written:
+                self.flushes += 1
+                self.items_written += done.size()
+                try:
+                    from app.services.graph_snapshot import graph_snapshots
+                    await graph_snapshots.record_edges(user_id, done.edges())
+                except Exception as e:
+                    logger.debug(f"Graph snapshot update skipped for {user_id}: {e}")
+        finally:
+            # Always resolve every waiter - a submitter must never hang
+            for index, (_, waiter) in enumerate(submitters):
+                if not waiter.done():
+                    waiter.set_result(results[index] if index < len(results) else False)
+    
+    async def flush_all(self):
+        """Flush every buffered user immediately and wait for in-flight flushes (shutdown)"""
+        await asyncio.gather(
+            *[self._flush(user_id) for user_id in list(self._pending)],
+            *list(self._tasks),
+            return_exceptions=True,
+        )
+
+
+graph_write_batcher = GraphWriteBatcher(neo4j_client)
+
 class GraphMemoryService:
     """
     Perfect Graph Memory Service for PRISM AI.
@@ -200,36 +533,14 @@ class GraphMemoryService:
         if not neo4j_client.is_available:
             return False
 
-        # Sanitize relationship type (uppercase, alphanumeric + underscore)
-        safe_rel_type = "".join(c for c in relationship_type.upper() if c.isalnum() or c == '_')
-        if not safe_rel_type:
-            safe_rel_type = "RELATED_TO"
-            
-        safe_label = "".join(c for c in target_label if c.isalnum())
-        if not safe_label:
-            safe_label = "Entity"
-
-        query = f"""
-        MERGE (u:User {{id: $user_id}})
-        MERGE (t:{safe_label} {{name: $target}})
-        MERGE (u)-[r:{safe_rel_type}]->(t)
-        SET r.createdAt = $timestamp,
-            r.updatedAt = $timestamp,
-            r.source = 'holographic_extractor'
-        RETURN u, r, t
-        """
-        
-        try:
-            await query_graph(query, {
-                "user_id": user_id,
-                "target": target,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            print(f"✅ Dynamic relationship added: {user_id} -[{safe_rel_type}]-> {target}")
+        upsert = GraphUpsert().add_relationship(
+            target, relationship_type, target_label, source="holographic_extractor"
+        )
+        if await graph_write_batcher.submit(user_id, upsert):
+            print(f"✅ Dynamic relationship added: {user_id} -[{relationship_type}]-> {target}")
             return True
-        except Exception as e:
-            print(f"❌ Error adding dynamic relationship: {e}")
-            return False
+        print(f"❌ Error adding dynamic relationship: {user_id} -[{relationship_type}]-> {target}")
+        return False
 
     async def add_user_interest(self, user_id: str, interest: str, category: str = "interest") -> bool:
         """
@@ -239,27 +550,12 @@ class GraphMemoryService:
         if not neo4j_client.is_available:
             return False
 
-        query = """
-        MERGE (u:User {id: $user_id})
-        MERGE (i:Interest {name: $interest, category: $category})
-        MERGE (u)-[r:LIKES]->(i)
-        SET r.createdAt = $timestamp,
-            r.strength = COALESCE(r.strength, 0) + 1
-        RETURN u, i, r
-        """
-        
-        try:
-            await query_graph(query, {
-                "user_id": user_id,
-                "interest": interest.lower(),
-                "category": category,
-                "timestamp": datetime.utcnow().isoformat()
-            })
+        # Coalesced with any other graph writes for this user (one UNWIND round-trip)
+        if await graph_write_batcher.submit(user_id, GraphUpsert().add_interest(interest, category)):
             print(f"✅ Interest added: {user_id} likes {interest}")
             return True
-        except Exception as e:
-            print(f"❌ Error adding interest: {e}")
-            return False
+        print(f"❌ Error adding interest: {user_id} likes {interest}")
+        return False
 
     async def add_interest_relationship(self, user_id: str, interest: str, category: str = "interest") -> bool:
         """
@@ -341,7 +637,7 @@ class GraphMemoryService:
         """
         
         try:
-            result = await query_graph(query, {"user_id": user_id})
+            result = await read_graph(query, {"user_id": user_id})
             interests = [record["interest"] for record in result]
             print(f"✅ Found {len(interests)} interests for user {user_id}")
             return interests
@@ -364,7 +660,7 @@ class GraphMemoryService:
             params = {"user_id": user_id}
         
         try:
-            result = await query_graph(query, params)
+            result = await read_graph(query, params)
             tasks = []
             for record in result:
                 task_data = record["t"]
@@ -405,7 +701,7 @@ class GraphMemoryService:
         """
         
         try:
-            result = await query_graph(query, {"user_id": user_id})
+            result = await read_graph(query, {"user_id": user_id})
             
             if result:
                 data = result[0]
@@ -440,23 +736,11 @@ class GraphMemoryService:
         if not neo4j_client.is_available:
             return False
 
-        query = """
-        MERGE (u:User {id: $user_id})
-        SET u.name = $name,
-            u.updatedAt = $timestamp
-        RETURN u
-        """
-        try:
-            await query_graph(query, {
-                "user_id": user_id,
-                "name": name,
-                "timestamp": datetime.utcnow().isoformat()
-            })
+        if await graph_write_batcher.submit(user_id, GraphUpsert().set_property("name", name)):
             print(f"✅ User name set for {user_id} -> {name}")
             return True
-        except Exception as e:
-            print(f"❌ Error updating user name: {e}")
-            return False
+        print(f"❌ Error updating user name for {user_id}")
+        return False
 
     async def add_user_property(self, user_id: str, key: str, value: Any) -> bool:
         """
@@ -466,27 +750,14 @@ class GraphMemoryService:
         if not neo4j_client.is_available:
             return False
 
-        # Safely interpolate property key by restricting to alphanumeric and underscore
-        safe_key = "".join(ch for ch in key if ch.isalnum() or ch == "_")
-        if not safe_key:
+        upsert = GraphUpsert().set_property(key, value)
+        if upsert.is_empty():
             return False
-        query = f"""
-        MERGE (u:User {{id: $user_id}})
-        SET u.{safe_key} = $value,
-            u.updatedAt = $timestamp
-        RETURN u
-        """
-        try:
-            await query_graph(query, {
-                "user_id": user_id,
-                "value": value,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            print(f"✅ User property set: {user_id}.{safe_key} -> {value}")
+        if await graph_write_batcher.submit(user_id, upsert):
+            print(f"✅ User property set: {user_id}.{key} -> {value}")
             return True
-        except Exception as e:
-            print(f"❌ Error setting user property {safe_key}: {e}")
-            return False
+        print(f"❌ Error setting user property {key}")
+        return False
     
     async def find_related_interests(self, user_id: str, limit: int = 5) -> List[str]:
         """
@@ -509,7 +780,7 @@ class GraphMemoryService:
         """
         
         try:
-            result = await query_graph(query, {"user_id": user_id, "limit": limit})
+            result = await read_graph(query, {"user_id": user_id, "limit": limit})
             suggestions = [record["suggestion"] for record in result]
             print(f"✅ Found {len(suggestions)} interest suggestions for {user_id}")
             return suggestions
@@ -530,6 +801,8 @@ class GraphMemoryService:
         
         try:
             await query_graph(query, {"user_id": user_id})
+            from app.services.graph_snapshot import graph_snapshots
+            await graph_snapshots.invalidate(user_id)
             print(f"✅ Deleted graph data for user: {user_id}")
             return True
         except Exception as e:
@@ -614,7 +887,7 @@ class AdvancedNeo4jClient:
             ORDER BY r.createdAt DESC
             """
             
-            result = await query_graph(query, {"user_id": user_id})
+            result = await read_graph(query, {"user_id": user_id})
             return result if result else []
         except Exception as e:
             print(f"Error getting user relationships: {e}")
@@ -629,7 +902,7 @@ class AdvancedNeo4jClient:
             ORDER BY i.strength DESC
             """
             
-            result = await query_graph(query, {"user_id": user_id})
+            result = await read_graph(query, {"user_id": user_id})
             return result if result else []
         except Exception as e:
             print(f"Error getting user interests: {e}")
@@ -637,41 +910,10 @@ class AdvancedNeo4jClient:
     
     async def merge_user_relationship(self, user_id: str, relation_type: str, target_value: str) -> bool:
         """Create or update a relationship using MERGE (prevents duplicates)"""
-        try:
-            # Determine target node type based on relation type
-            if relation_type in ["LIKES", "INTERESTED_IN", "FAVORITE_LANGUAGE"]:
-                target_label = "Interest"
-                target_property = "name"
-            elif relation_type in ["LIVES_IN", "WORKS_AT"]:
-                target_label = "Location"
-                target_property = "name"
-            elif relation_type in ["HAS_SKILL", "LEARNING"]:
-                target_label = "Skill"
-                target_property = "name"
-            else:
-                target_label = "Entity"
-                target_property = "name"
-            
-            query = f"""
-            MERGE (u:User {{id: $user_id}})
-            MERGE (t:{target_label} {{{target_property}: $target_value}})
-            MERGE (u)-[r:{relation_type}]->(t)
-            SET r.createdAt = CASE WHEN r.createdAt IS NULL THEN $timestamp ELSE r.createdAt END,
-                r.updatedAt = $timestamp,
-                r.strength = COALESCE(r.strength, 1) + 0.1
-            RETURN u, r, t
-            """
-            
-            result = await query_graph(query, {
-                "user_id": user_id,
-                "target_value": target_value,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            return len(result) > 0
-        except Exception as e:
-            print(f"Error merging user relationship: {e}")
-            return False
+        upsert = GraphUpsert().add_relationship(
+            target_value, relation_type, label_for_relation(relation_type), strength_inc=0.1
+        )
+        return await graph_write_batcher.submit(user_id, upsert)
     
     # ADVANCED QUERY OPERATIONS
     async def get_related_interests(self, user_id: str, interest: str) -> list:
@@ -685,7 +927,7 @@ class AdvancedNeo4jClient:
             LIMIT 5
             """
             
-            result = await query_graph(query, {
+            result = await read_graph(query, {
                 "user_id": user_id,
                 "interest": interest
             })
@@ -703,7 +945,7 @@ class AdvancedNeo4jClient:
                    [r in relationships(path) | type(r)] as relationships
             """
             
-            result = await query_graph(query, {
+            result = await read_graph(query, {
                 "user_id": user_id,
                 "goal": goal
             })
@@ -748,11 +990,13 @@ class AdvancedNeo4jClient:
             RETURN count(r) as removed_count
             """
             
-            result = await query_graph(query, {
+            await query_graph(query, {
                 "user_id": user_id,
                 "threshold": threshold
             })
             
+            from app.services.graph_snapshot import graph_snapshots
+            await graph_snapshots.invalidate(user_id)
             return True
         except Exception as e:
             print(f"Error removing weak relationships: {e}")
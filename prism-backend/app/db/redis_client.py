@@ -15,11 +15,13 @@ Use Redis for things that expire:
 """
 
 import redis.asyncio as redis
+from redis.exceptions import ResponseError
 import json
 import logging
 import asyncio
 import time
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
 from app.config import settings
 
@@ -42,7 +44,13 @@ class InMemoryStore:
         self._expiry: Dict[str, float] = {}  # key -> expiry timestamp
         self._lists: Dict[str, list] = {}
         self._sorted_sets: Dict[str, Dict[str, float]] = {}
+        self._subscribers: Dict[str, list] = {}  # channel -> [asyncio.Queue]
+        self._streams: Dict[str, "OrderedDict[str, dict]"] = {}
+        self._groups: Dict[Tuple[str, str], dict] = {}  # (stream, group) -> {"last": id, "pending": {id: [consumer, ts]}}
+        self._last_stream_id = (0, 0)
         self._lock = asyncio.Lock()
+        # Blocking reads (BRPOP/BZPOPMIN/XREADGROUP) wait on this; writers notify
+        self._changed = asyncio.Condition(self._lock)
         logger.info("🧠 InMemoryStore initialized (Redis fallback mode)")
     
     def _is_expired(self, key: str) -> bool:
@@ -138,6 +146,7 @@ class InMemoryStore:
                 self._lists[key] = []
             for v in reversed(values):
                 self._lists[key].insert(0, v)
+            self._changed.notify_all()
             return True
     
     async def rpush(self, key: str, *values) -> bool:
@@ -146,6 +155,7 @@ class InMemoryStore:
             if key not in self._lists:
                 self._lists[key] = []
             self._lists[key].extend(values)
+            self._changed.notify_all()
             return True
     
     async def lpop(self, key: str) -> Optional[str]:
@@ -180,6 +190,7 @@ class InMemoryStore:
             if key not in self._sorted_sets:
                 self._sorted_sets[key] = {}
             self._sorted_sets[key].update(mapping)
+            self._changed.notify_all()
             return True
     
     async def zrangebyscore(self, key: str, min_score: str, max_score: str, start: int = 0, num: int = -1) -> list:
@@ -207,6 +218,17 @@ class InMemoryStore:
         """Get sorted set size"""
         async with self._lock:
             return len(self._sorted_sets.get(key, {}))
+
+    async def zremrangebyscore(self, key: str, min_score: str, max_score: str) -> int:
+        """Remove sorted set members by score; returns number removed"""
+        async with self._lock:
+            ss = self._sorted_sets.get(key, {})
+            min_s = float('-inf') if min_score == '-inf' else float(min_score)
+            max_s = float('inf') if max_score == '+inf' else float(max_score)
+            doomed = [k for k, v in ss.items() if min_s <= v <= max_s]
+            for k in doomed:
+                del ss[k]
+            return len(doomed)
     
     async def keys(self, pattern: str) -> list:
         """Get keys matching pattern (simple wildcard support)"""
@@ -317,6 +339,16 @@ class InMemoryStore:
                 return 1
             return 0
     
+    async def hsetnx(self, name: str, key: str, value: str) -> bool:
+        """Set hash field only if it does not exist"""
+        async with self._lock:
+            if self._is_expired(name) or not isinstance(self._store.get(name), dict):
+                self._store[name] = {}
+            if key in self._store[name]:
+                return False
+            self._store[name][key] = value
+            return True
+    
     async def hget(self, name: str, key: str) -> Optional[str]:
         """Get hash field"""
         async with self._lock:
@@ -326,6 +358,190 @@ class InMemoryStore:
         """Get all hash fields"""
         async with self._lock:
             return dict(self._store.get(name, {}))
+    
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        """Increment hash field"""
+        async with self._lock:
+            if self._is_expired(name) or not isinstance(self._store.get(name), dict):
+                self._store[name] = {}
+            current = int(self._store[name].get(key, 0)) + amount
+            self._store[name][key] = str(current)
+            return current
+    
+    async def hdel(self, name: str, *keys: str) -> int:
+        """Delete hash fields"""
+        async with self._lock:
+            fields = self._store.get(name)
+            if not isinstance(fields, dict):
+                return 0
+            return sum(1 for key in keys if fields.pop(key, None) is not None)
+    
+    async def rename(self, src: str, dst: str) -> bool:
+        """Atomically rename key (False if src does not exist)"""
+        async with self._lock:
+            if self._is_expired(src):
+                return False
+            for container in (self._store, self._lists, self._sorted_sets):
+                if src in container:
+                    container[dst] = container.pop(src)
+                    if src in self._expiry:
+                        self._expiry[dst] = self._expiry.pop(src)
+                    else:
+                        self._expiry.pop(dst, None)
+                    return True
+            return False
+    
+    # ---------- blocking primitives (local stand-ins for BRPOP/BZPOPMIN/streams) ----------
+    
+    async def _wait_changed(self, deadline: Optional[float]) -> bool:
+        """Wait (lock held) until a writer notifies; False once deadline passes"""
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            return False
+        try:
+            await asyncio.wait_for(self._changed.wait(), remaining)
+            return True
+        except asyncio.TimeoutError:
+            return False
+    
+    @staticmethod
+    def _deadline(timeout: float) -> Optional[float]:
+        return time.monotonic() + timeout if timeout else None
+    
+    async def brpop(self, keys, timeout: float = 0) -> Optional[Tuple[str, str]]:
+        """Blocking right pop across keys; None on timeout (0 = wait forever)"""
+        keys = [keys] if isinstance(keys, str) else list(keys)
+        deadline = self._deadline(timeout)
+        async with self._changed:
+            while True:
+                for key in keys:
+                    lst = self._lists.get(key)
+                    if lst:
+                        return key, lst.pop()
+                if not await self._wait_changed(deadline):
+                    return None
+    
+    @staticmethod
+    def _parse_stream_id(stream_id: str) -> Tuple[int, int]:
+        ms, _, seq = str(stream_id).partition("-")
+        return int(ms), int(seq or 0)
+    
+    def _xadd(self, name: str, fields: dict, maxlen: Optional[int] = None) -> str:
+        """XADD body (lock held by caller)"""
+        ms = int(time.time() * 1000)
+        last_ms, last_seq = self._last_stream_id
+        self._last_stream_id = (ms, 0) if ms > last_ms else (last_ms, last_seq + 1)
+        entry_id = f"{self._last_stream_id[0]}-{self._last_stream_id[1]}"
+        stream = self._streams.setdefault(name, OrderedDict())
+        stream[entry_id] = dict(fields)
+        if maxlen:
+            while len(stream) > maxlen:
+                stream.popitem(last=False)
+        self._changed.notify_all()
+        return entry_id
+    
+    async def xadd(self, name: str, fields: dict, maxlen: Optional[int] = None) -> str:
+        """Append an entry to a stream; returns its id"""
+        async with self._lock:
+            return self._xadd(name, fields, maxlen)
+    
+    async def zmove_due_to_stream(
+        self, key: str, stream: str, max_score: float, count: int, maxlen: Optional[int] = None
+    ) -> Tuple[List[str], Optional[float]]:
+        """Atomic stand-in for PROMOTE_DUE_LUA: move due members into stream"""
+        async with self._lock:
+            ss = self._sorted_sets.get(key, {})
+            ordered = sorted(ss.items(), key=lambda x: x[1])
+            moved = []
+            for member, score in ordered[:count]:
+                if score > max_score:
+                    break
+                self._xadd(stream, {"task_id": member, "due_ts": str(score)}, maxlen)
+                del ss[member]
+                moved.append(member)
+            rest = ordered[len(moved):]
+            return moved, (rest[0][1] if rest else None)
+    
+    async def xgroup_create(self, name: str, group: str, id: str = "0", mkstream: bool = True) -> bool:
+        """Create a consumer group (False if it already exists)"""
+        async with self._lock:
+            if (name, group) in self._groups:
+                return False
+            if mkstream:
+                self._streams.setdefault(name, OrderedDict())
+            last = self._last_stream_id if id == "$" else self._parse_stream_id(id)
+            self._groups[(name, group)] = {"last": last, "pending": {}}
+            return True
+    
+    async def xreadgroup(self, name: str, group: str, consumer: str, count: int = 10, block_ms: Optional[int] = None) -> list:
+        """Deliver new entries to consumer as [(id, fields)]; blocks up to block_ms"""
+        deadline = self._deadline(block_ms / 1000) if block_ms else None
+        async with self._changed:
+            while True:
+                state = self._groups.get((name, group))
+                if state is None:
+                    raise ResponseError("NOGROUP No such key or consumer group")
+                delivered = []
+                for entry_id, fields in self._streams.get(name, {}).items():
+                    if self._parse_stream_id(entry_id) <= state["last"]:
+                        continue
+                    delivered.append((entry_id, dict(fields)))
+                    state["pending"][entry_id] = [consumer, time.monotonic()]
+                    state["last"] = self._parse_stream_id(entry_id)
+                    if len(delivered) >= count:
+                        break
+                if delivered or block_ms is None:
+                    return delivered
+                if not await self._wait_changed(deadline):
+                    return []
+    
+    async def xack(self, name: str, group: str, *ids: str) -> int:
+        """Acknowledge entries (removes them from the group's pending list)"""
+        async with self._lock:
+            state = self._groups.get((name, group))
+            if not state:
+                return 0
+            return sum(1 for entry_id in ids if state["pending"].pop(entry_id, None) is not None)
+    
+    async def xautoclaim(self, name: str, group: str, consumer: str, min_idle_ms: int, count: int = 100) -> list:
+        """Take over entries pending longer than min_idle_ms; returns [(id, fields)]"""
+        async with self._lock:
+            state = self._groups.get((name, group))
+            if not state:
+                return []
+            stream = self._streams.get(name, {})
+            now = time.monotonic()
+            claimed = []
+            for entry_id, owner in list(state["pending"].items()):
+                if len(claimed) >= count:
+                    break
+                if (now - owner[1]) * 1000 < min_idle_ms:
+                    continue
+                if entry_id not in stream:
+                    state["pending"].pop(entry_id, None)
+                    continue
+                state["pending"][entry_id] = [consumer, now]
+                claimed.append((entry_id, dict(stream[entry_id])))
+            return claimed
+    
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish to in-process subscribers of channel"""
+        queues = self._subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait(message)
+        return len(queues)
+    
+    async def subscribe(self, channel: str):
+        """Async iterator over messages published on channel (in-process only)"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(channel, []).append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            subscribers = self._subscribers.get(channel, [])
+            if queue in subscribers:
+                subscribers.remove(queue)
 
 # --------------------------------------------------
 # Email Queue Key Definitions (Dual-Lane Architecture)
@@ -333,9 +549,33 @@ class InMemoryStore:
 EMAIL_HIGH_PRIORITY_QUEUE = "queue:email:high_priority"  # OTP/Auth lane (List)
 EMAIL_SCHEDULED_QUEUE = "queue:email:scheduled"  # Task reminders lane (Sorted Set)
 EMAIL_DAILY_LIMIT_KEY_TEMPLATE = "limit:email:{user_id}:{date}"  # Per-user/day counter
-EMAIL_LOCK_KEY_TEMPLATE = "lock:email:{task_id}"  # Idempotency lock per task
+EMAIL_SCHEDULED_STREAM = "stream:email:scheduled"  # Due reminders handed to the consumer group
+EMAIL_CONSUMER_GROUP = "email-workers"  # Stream ownership replaces per-task locks
+EMAIL_SCHEDULED_WAKE = "queue:email:scheduled:wake"  # Nudges the promoter when an earlier reminder arrives
 EMAIL_DLQ = "queue:email:dlq"  # Dead-letter queue for failed sends
 
+# Move due members of a delay ZSET into a stream in ONE atomic step.
+# KEYS[1]=zset, KEYS[2]=stream; ARGV[1]=max score, ARGV[2]=count, ARGV[3]=maxlen (0 = no trim)
+# Returns {next remaining score or "", moved members...}
+PROMOTE_DUE_LUA = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, tonumber(ARGV[2]))
+local result = {''}
+for i = 1, #due, 2 do
+    if tonumber(ARGV[3]) > 0 then
+        redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[3], '*', 'task_id', due[i], 'due_ts', due[i + 1])
+    else
+        redis.call('XADD', KEYS[2], '*', 'task_id', due[i], 'due_ts', due[i + 1])
+    end
+    redis.call('ZREM', KEYS[1], due[i])
+    table.insert(result, due[i])
+end
+local nxt = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if #nxt > 0 then
+    result[1] = nxt[2]
+end
+return result
+"""
+
 # Create the connection pool with error handling
 def create_redis_client():
     """
@@ -428,6 +668,7 @@ class RedisClient:
         if not self._initialized:
             self._client = None
             self._fallback = None  # In-memory fallback
+            self._promote_script = None  # PROMOTE_DUE_LUA, registered on first use
             self._use_fallback = False
             self._initialize_client()
             RedisClient._initialized = True
@@ -721,6 +962,17 @@ class RedisClient:
             logger.error(f"Redis ZCARD failed for key {key}: {e}")
             self._enable_fallback()
             return await self._fallback.zcard(key)
+
+    async def zremrangebyscore(self, key: str, min_score: str, max_score: str) -> int:
+        """Remove sorted set members by score with fallback handling"""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            return await store.zremrangebyscore(key, min_score, max_score)
+        except Exception as e:
+            logger.error(f"Redis ZREMRANGEBYSCORE failed for key {key}: {e}")
+            self._enable_fallback()
+            return await self._fallback.zremrangebyscore(key, min_score, max_score)
     
     async def keys(self, pattern: str) -> list:
         """Get keys matching pattern with fallback handling"""
@@ -830,6 +1082,17 @@ class RedisClient:
             self._enable_fallback()
             return await self._fallback.hset(name, key, value, mapping)
     
+    async def hsetnx(self, name: str, key: str, value: str) -> bool:
+        """Set hash field only if absent (atomic) with fallback handling"""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            return bool(await store.hsetnx(name, key, value))
+        except Exception as e:
+            logger.error(f"Redis HSETNX failed for {name}.{key}: {e}")
+            self._enable_fallback()
+            return await self._fallback.hsetnx(name, key, value)
+    
     async def hget(self, name: str, key: str) -> Optional[str]:
         """Get hash field with fallback handling"""
         await self._check_connection()
@@ -851,6 +1114,217 @@ class RedisClient:
             logger.error(f"Redis HGETALL failed for {name}: {e}")
             self._enable_fallback()
             return await self._fallback.hgetall(name)
+    
+    async def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        """Atomically increment hash field with fallback handling"""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            return await store.hincrby(name, key, amount)
+        except Exception as e:
+            logger.error(f"Redis HINCRBY failed for {name}.{key}: {e}")
+            self._enable_fallback()
+            return await self._fallback.hincrby(name, key, amount)
+    
+    async def hdel(self, name: str, *keys: str) -> int:
+        """Delete hash fields with fallback handling"""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            return await store.hdel(name, *keys)
+        except Exception as e:
+            logger.error(f"Redis HDEL failed for {name}: {e}")
+            self._enable_fallback()
+            return await self._fallback.hdel(name, *keys)
+    
+    async def rename(self, src: str, dst: str) -> bool:
+        """Atomically rename key. Returns False if src does not exist."""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            if self._use_fallback:
+                return await store.rename(src, dst)
+            await store.rename(src, dst)
+            return True
+        except ResponseError:
+            return False  # "no such key" - not a connection problem
+        except Exception as e:
+            logger.error(f"Redis RENAME failed for {src}: {e}")
+            self._enable_fallback()
+            return await self._fallback.rename(src, dst)
+    
+    # ─────────────────────────────────────────────────────────
+    # BLOCKING QUEUES & STREAMS (event-driven workers)
+    # ─────────────────────────────────────────────────────────
+    # Pool sockets time out after 5s, so blocking calls are capped below that;
+    # callers simply loop.
+    MAX_BLOCK_SECONDS = 4
+    
+    def _block_seconds(self, timeout: float) -> float:
+        return min(timeout, self.MAX_BLOCK_SECONDS) if timeout else self.MAX_BLOCK_SECONDS
+    
+    async def brpop(self, keys, timeout: float = 0) -> Optional[Tuple[str, str]]:
+        """Blocking right pop. Returns (key, value) or None on timeout."""
+        await self._check_connection()
+        store = self._get_store()
+        timeout = self._block_seconds(timeout)
+        try:
+            result = await store.brpop(keys, timeout=timeout)
+            return tuple(result) if result else None
+        except Exception as e:
+            logger.error(f"Redis BRPOP failed for {keys}: {e}")
+            self._enable_fallback()
+            return await self._fallback.brpop(keys, timeout=timeout)
+    
+    async def xadd(self, name: str, fields: dict, maxlen: Optional[int] = None) -> Optional[str]:
+        """Append to a stream (approximate MAXLEN trimming). Returns entry id."""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            if self._use_fallback:
+                return await store.xadd(name, fields, maxlen=maxlen)
+            return await store.xadd(name, fields, maxlen=maxlen, approximate=True)
+        except Exception as e:
+            logger.error(f"Redis XADD failed for {name}: {e}")
+            self._enable_fallback()
+            return await self._fallback.xadd(name, fields, maxlen=maxlen)
+    
+    async def zmove_due_to_stream(
+        self, key: str, stream: str, max_score: float, count: int, maxlen: Optional[int] = None
+    ) -> Tuple[List[str], Optional[float]]:
+        """
+        Atomically move up to count members with score <= max_score from a
+        ZSET into a stream (fields task_id/due_ts). The XADD and ZREM run in
+        one Lua script, so a crash can neither lose nor duplicate a member.
+        Returns (moved members, next remaining score or None).
+        """
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            if self._use_fallback:
+                return await store.zmove_due_to_stream(key, stream, max_score, count, maxlen)
+            if self._promote_script is None:
+                self._promote_script = self._client.register_script(PROMOTE_DUE_LUA)
+            result = await self._promote_script(
+                keys=[key, stream], args=[max_score, count, maxlen or 0]
+            )
+            next_score = float(result[0]) if result and result[0] not in ("", b"") else None
+            return [str(member) for member in result[1:]], next_score
+        except Exception as e:
+            logger.error(f"Redis due-member promotion failed for {key}: {e}")
+            self._enable_fallback()
+            return await self._fallback.zmove_due_to_stream(key, stream, max_score, count, maxlen)
+    
+    async def xgroup_create(self, name: str, group: str, id: str = "0") -> bool:
+        """Create consumer group (and stream). False if the group already exists."""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            if self._use_fallback:
+                return await store.xgroup_create(name, group, id=id, mkstream=True)
+            await store.xgroup_create(name, group, id=id, mkstream=True)
+            return True
+        except ResponseError as e:
+            if "BUSYGROUP" in str(e):
+                return False
+            raise
+        except Exception as e:
+            logger.error(f"Redis XGROUP CREATE failed for {name}/{group}: {e}")
+            self._enable_fallback()
+            return await self._fallback.xgroup_create(name, group, id=id, mkstream=True)
+    
+    async def xreadgroup(
+        self, name: str, group: str, consumer: str, count: int = 10, block_ms: Optional[int] = None
+    ) -> List[Tuple[str, dict]]:
+        """Read new entries for consumer from ONE stream as [(id, fields)]"""
+        await self._check_connection()
+        store = self._get_store()
+        if block_ms is not None:
+            block_ms = int(self._block_seconds(block_ms / 1000) * 1000)
+        try:
+            if self._use_fallback:
+                return await store.xreadgroup(name, group, consumer, count=count, block_ms=block_ms)
+            response = await store.xreadgroup(group, consumer, {name: ">"}, count=count, block=block_ms)
+            entries = []
+            for _, stream_entries in response or []:
+                entries.extend((entry_id, fields) for entry_id, fields in stream_entries)
+            return entries
+        except ResponseError:
+            raise  # e.g. NOGROUP - caller recreates the group
+        except Exception as e:
+            logger.error(f"Redis XREADGROUP failed for {name}/{group}: {e}")
+            self._enable_fallback()
+            return await self._fallback.xreadgroup(name, group, consumer, count=count, block_ms=block_ms)
+    
+    async def xack(self, name: str, group: str, *ids: str) -> int:
+        """Acknowledge processed stream entries"""
+        if not ids:
+            return 0
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            return await store.xack(name, group, *ids)
+        except Exception as e:
+            logger.error(f"Redis XACK failed for {name}/{group}: {e}")
+            self._enable_fallback()
+            return await self._fallback.xack(name, group, *ids)
+    
+    async def xautoclaim(
+        self, name: str, group: str, consumer: str, min_idle_ms: int, count: int = 100
+    ) -> List[Tuple[str, dict]]:
+        """Take ownership of entries a dead consumer left pending"""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            if self._use_fallback:
+                return await store.xautoclaim(name, group, consumer, min_idle_ms, count=count)
+            response = await store.xautoclaim(name, group, consumer, min_idle_ms, start_id="0-0", count=count)
+            return [(entry_id, fields) for entry_id, fields in (response[1] if response else []) if fields]
+        except Exception as e:
+            logger.error(f"Redis XAUTOCLAIM failed for {name}/{group}: {e}")
+            self._enable_fallback()
+            return await self._fallback.xautoclaim(name, group, consumer, min_idle_ms, count=count)
+    
+    # ─────────────────────────────────────────────────────────
+    # PUB/SUB (cross-process cache invalidation)
+    # ─────────────────────────────────────────────────────────
+    
+    async def publish(self, channel: str, message: str) -> int:
+        """Publish message with fallback handling. Returns receiver count."""
+        await self._check_connection()
+        store = self._get_store()
+        try:
+            return await store.publish(channel, message)
+        except Exception as e:
+            logger.error(f"Redis PUBLISH failed for {channel}: {e}")
+            self._enable_fallback()
+            return await self._fallback.publish(channel, message)
+    
+    async def subscribe(self, channel: str):
+        """
+        Async iterator over messages published on channel.
+        
+        Uses a dedicated pub/sub connection from the pool. Raises on
+        connection loss so callers can resubscribe (see key_vault listener).
+        """
+        await self._check_connection()
+        if self._use_fallback:
+            async for message in self._fallback.subscribe(channel):
+                yield message
+            return
+        
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(channel)
+            async for message in pubsub.listen():
+                if message and message.get("type") == "message":
+                    yield message["data"]
+        finally:
+            try:
+                await pubsub.unsubscribe(channel)
+                await pubsub.close()
+            except Exception:
+                pass
 
 # Global Redis client instance
 redis_client = RedisClient()
@@ -884,22 +1358,10 @@ async def verify_otp(email: str, provided_otp: str) -> bool:
 async def check_rate_limit(user_id: str, action: str, max_requests: int = 100, window_minutes: int = 60) -> bool:
     """
     Check if user is within rate limits.
-    Redis key: RATE:{userId}:{action} = count
+    Delegates to the unified sliding-window limiter (app.utils.rate_limiter).
     """
-    key = f"RATE:{user_id}:{action}"
-    current_count = await redis_client.get(key)
-    
-    if current_count is None:
-        # First request - set counter with expiry
-        await redis_client.set(key, "1", ex=window_minutes * 60)
-        return True
-    
-    if int(current_count) >= max_requests:
-        return False  # Rate limit exceeded
-    
-    # Increment counter
-    await redis_client.incr(key)
-    return True
+    from app.utils.rate_limiter import rate_limiter
+    return await rate_limiter.is_allowed(f"{action}:{user_id}", max_requests, window_minutes * 60)
 
 # 🎫 SESSION TOKEN MANAGEMENT  
 async def store_session_token(user_id: str, token: str, expires_hours: int = 24):
@@ -982,7 +1444,7 @@ async def get_user_last_activity(user_id: str) -> Optional[datetime]:
 async def clear_user_cache(user_id: str):
     """Clear all Redis entries for a user"""
     patterns = [
-        f"RATE:{user_id}:*",
+        f"ratelimit:*:{user_id}:*",
         f"SESSION:{user_id}",
         f"TEMP_CHAT:{user_id}:*", 
         f"LAST_ACTIVE:{user_id}"
@@ -0,0 +1,225 @@
+"""
+🗂️ SESSION SCHEMA - Canonical (user_id, chat_id) Chat Sessions
+================================================================
+
+Chat sessions were written under two naming schemes (chat_id/user_id and
+sessionId/userId), so every lookup matched
+    {"$or": [chat_id, sessionId]} AND {"$or": [user_id, userId]}
+which MongoDB can only answer with index unions - or a collection scan
+when one branch has no index.
+
+This module owns the canonical shape:
+
+1. session_filter(chat_id, user_id) / user_sessions_filter(user_id) build
+   the query for a session. Until the migration has completed they return
+   the legacy $or filter (compatibility read path); afterwards plain
+   equality on the canonical fields, served by one unique compound index.
+2. canonical_fields(chat_id, user_id) is merged into every insert so new
+   documents are born canonical. Legacy fields are kept for older readers.
+3. A one-time background migration backfills chat_id/user_id (user_id as
+   ObjectId), renames the rare duplicate pair out of the way, builds the
+   (user_id, chat_id) unique, (user_id, updated_at) and chat_id indexes
+   and records a marker in db.migrations. One instance migrates (Redis lock); the others
+   poll the marker and switch when it appears.
+
+Usage:
+```python
+from app.db.session_schema import session_filter
+session = await sessions_collection.find_one(session_filter(chat_id, user_id))
+```
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+MIGRATION_ID = "sessions_canonical_v1"
+MIGRATION_LOCK_KEY = "migrations:sessions_canonical_v1:lock"
+MIGRATION_LOCK_TTL_SECONDS = 3600
+MIGRATION_BATCH_SIZE = 500
+MIGRATION_BATCH_PAUSE_SECONDS = 0.05  # yield to live traffic between batches
+MARKER_POLL_SECONDS = 60
+UNIQUE_INDEX_NAME = "user_id_1_chat_id_1"
+DUPLICATE_SUFFIX = "~dup~"
+SESSION_INDEXES = [
+    ([("user_id", 1), ("chat_id", 1)], {"unique": True, "name": UNIQUE_INDEX_NAME}),
+    ([("user_id", 1), ("updated_at", -1)], {}),
+    ([("chat_id", 1)], {}),  # lookups that don't know the owner
+]
+
+
+def _as_object_id(user_id: Any) -> Any:
+    """ObjectId for valid 24-hex strings, anything else unchanged"""
+    from bson import ObjectId
+
+    if isinstance(user_id, str) and ObjectId.is_valid(user_id):
+        return ObjectId(user_id)
+    return user_id
+
+
+def _user_values(user_id: Any) -> list:
+    oid = _as_object_id(user_id)
+    return [oid] if oid == user_id else [oid, user_id]
+
+
+def canonical_fields(chat_id: str, user_id: Any) -> Dict[str, Any]:
+    """The canonical identity fields to merge into a new session document"""
+    return {"chat_id": chat_id, "user_id": _as_object_id(user_id)}
+
+
+class SessionSchema:
+    """Tracks whether the canonical shape can be relied on and runs the migration"""
+
+    def __init__(self):
+        self.canonical = False
+        self._job: Optional[asyncio.Task] = None
+        self.backfilled = 0
+        self.duplicates_renamed = 0
+
+    # ---------- filters ----------
+
+    def session_filter(self, chat_id: str, user_id: Any = None) -> Dict[str, Any]:
+        if self.canonical:
+            query: Dict[str, Any] = {"chat_id": chat_id}
+            if user_id is not None:
+                query["user_id"] = _as_object_id(user_id)
+            return query
+
+        clauses = [{"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]}]
+        if user_id is not None:
+            users = _user_values(user_id)
+            clauses.append({"$or": [{"user_id": {"$in": users}}, {"userId": {"$in": users}}]})
+        return {"$and": clauses}
+
+    def user_sessions_filter(self, user_id: Any) -> Dict[str, Any]:
+        if self.canonical:
+            return {"user_id": _as_object_id(user_id)}
+        users = _user_values(user_id)
+        return {"$or": [{"user_id": {"$in": users}}, {"userId": {"$in": users}}]}
+
+    # ---------- migration ----------
+
+    async def _load_marker(self) -> bool:
+        from app.db.mongo_client import db
+
+        marker = await db.migrations.find_one({"_id": MIGRATION_ID})
+        if marker and marker.get("completed_at"):
+            if not self.canonical:
+                logger.info("🗂️ Session schema: canonical (user_id, chat_id) lookups enabled")
+            self.canonical = True
+        return self.canonical
+
+    async def _backfill(self, sessions) -> int:
+        """Copy legacy sessionId/userId into chat_id/user_id where missing"""
+        from pymongo import UpdateOne
+
+        query = {"$or": [
+            {"chat_id": {"$exists": False}},
+            {"user_id": {"$exists": False}},
+            {"user_id": {"$regex": "^[0-9a-fA-F]{24}$"}},  # ObjectId stored as a string
+        ]}
+        projection = {"chat_id": 1, "sessionId": 1, "user_id": 1, "userId": 1}
+        updated = 0
+        while True:
+            docs = await sessions.find(query, projection).limit(MIGRATION_BATCH_SIZE).to_list(MIGRATION_BATCH_SIZE)
+            ops = []
+            for doc in docs:
+                chat_id = doc.get("chat_id") or doc.get("sessionId") or str(doc["_id"])
+                user_id = doc.get("user_id") if doc.get("user_id") is not None else doc.get("userId")
+                ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"chat_id": chat_id, "user_id": _as_object_id(user_id)}}))
+            if ops:
+                await sessions.bulk_write(ops, ordered=False)
+                updated += len(ops)
+            if len(docs) < MIGRATION_BATCH_SIZE:
+                return updated
+            await asyncio.sleep(MIGRATION_BATCH_PAUSE_SECONDS)
+
+    async def _rename_duplicates(self, sessions) -> int:
+        """Keep the most recently updated session per (user_id, chat_id); suffix the rest"""
+        pipeline = [
+            {"$sort": {"updated_at": -1}},
+            {"$group": {"_id": {"user_id": "$user_id", "chat_id": "$chat_id"}, "ids": {"$push": "$_id"}, "n": {"$sum": 1}}},
+            {"$match": {"n": {"$gt": 1}}},
+        ]
+        renamed = 0
+        async for group in sessions.aggregate(pipeline, allowDiskUse=True):
+            chat_id = group["_id"]["chat_id"]
+            for doc_id in group["ids"][1:]:
+                await sessions.update_one({"_id": doc_id}, {"$set": {"chat_id": f"{chat_id}{DUPLICATE_SUFFIX}{doc_id}"}})
+                renamed += 1
+        if renamed:
+            logger.warning(f"⚠️ Session schema: renamed {renamed} duplicate (user_id, chat_id) session(s)")
+        return renamed
+
+    async def migrate(self) -> bool:
+        """Run the migration if no other instance holds the lock. True once complete."""
+        from app.db.mongo_client import db, sessions_collection
+
+        if await self._load_marker():
+            return True
+        if not await redis_client.set(MIGRATION_LOCK_KEY, "1", ex=MIGRATION_LOCK_TTL_SECONDS, nx=True):
+            return False
+        try:
+            started = datetime.utcnow()
+            logger.info("🗂️ Session schema migration started")
+            self.backfilled += await self._backfill(sessions_collection)
+            self.duplicates_renamed += await self._rename_duplicates(sessions_collection)
+            for keys, options in SESSION_INDEXES:
+                await sessions_collection.create_index(keys, **options)
+            # Sweep documents written by not-yet-upgraded instances during the build
+            self.backfilled += await self._backfill(sessions_collection)
+            await db.migrations.update_one(
+                {"_id": MIGRATION_ID},
+                {"$set": {"started_at": started, "completed_at": datetime.utcnow(),
+                          "backfilled": self.backfilled, "duplicates_renamed": self.duplicates_renamed}},
+                upsert=True,
+            )
+            self.canonical = True
+            logger.info(f"✅ Session schema migration complete ({self.backfilled} backfilled)")
+            return True
+        finally:
+            await redis_client.delete(MIGRATION_LOCK_KEY)
+
+    async def _job_loop(self):
+        while True:
+            try:
+                if await self.migrate():
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Session schema migration error: {e}")
+            await asyncio.sleep(MARKER_POLL_SECONDS)
+
+    def start(self):
+        """Start the migration / marker poller (call from app lifespan)"""
+        if self._job is None or self._job.done():
+            self._job = asyncio.create_task(self._job_loop())
+
+    async def stop(self):
+        if self._job:
+            self._job.cancel()
+            try:
+                await self._job
+            except asyncio.CancelledError:
+                pass
+            self._job = None
+
+    def get_stats(self) -> dict:
+        return {
+            "canonical": self.canonical,
+            "backfilled": self.backfilled,
+            "duplicates_renamed": self.duplicates_renamed,
+        }
+
+
+# Global singleton
+session_schema = SessionSchema()
+session_filter = session_schema.session_filter
+user_sessions_filter = session_schema.user_sessions_filter
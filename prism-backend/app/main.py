@@ -57,8 +57,10 @@ from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime, timezone
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse
 from app.config import settings
-from app.utils.security import SecurityMiddleware
+from app.utils.security import SecurityMiddleware, is_trusted_proxy
+from app.utils.rate_limiter import RateLimitMiddleware
 
 # Configure logging
 logging.basicConfig(
@@ -249,14 +251,63 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"⚠️ Groq Pool warmup failed: {e}")
     
-    # 5. Schedule ONLY nearest task (not all tasks)
+    # 5. 🔐 BYOK key vault invalidation listener (Redis pub/sub)
+    try:
+        from app.services.key_vault import key_vault
+        key_vault.start()
+        logger.info("✅ Key vault invalidation listener started")
+    except Exception as e:
+        logger.warning(f"⚠️ Key vault listener failed to start: {e}")
+    
+    # 6. 📊 Usage counter flusher (Redis counters -> Mongo bulk writes)
+    try:
+        from app.services.usage_counters import usage_counters
+        usage_counters.start()
+        logger.info("✅ Usage counter flusher started")
+    except Exception as e:
+        logger.warning(f"⚠️ Usage counter flusher failed to start: {e}")
+    
+    # 7. ⏱️ Reminder scheduler (rolling 10-minute window of due tasks)
     try:
         from app.services.scheduler_service import schedule_next_task
-        await schedule_next_task()  # Schedules only the next pending task
-        logger.info("✅ Nearest task scheduled")
+        await schedule_next_task()  # Starts the heap-driven reminder loop
+        logger.info("✅ Reminder scheduler started")
     except Exception as e:
         logger.warning(f"⚠️ Task scheduler warmup failed: {e}")
     
+    # 8. 🩺 Event-loop lag monitor + stall watchdog (admin profiling)
+    if settings.LOOP_MONITOR_ENABLED:
+        try:
+            from app.utils.profiling import loop_monitor
+            loop_monitor.start()
+            logger.info("✅ Event loop monitor started")
+        except Exception as e:
+            logger.warning(f"⚠️ Event loop monitor failed to start: {e}")
+    
+    # 9. 📈 Analytics rollup job (hourly/daily admin dashboard stats)
+    try:
+        from app.services.analytics_rollups import analytics_rollups
+        analytics_rollups.start()
+        logger.info("✅ Analytics rollup job started")
+    except Exception as e:
+        logger.warning(f"⚠️ Analytics rollup job failed to start: {e}")
+    
+    # 10. 🗂️ Session schema migration (canonical user_id/chat_id lookups)
+    try:
+        from app.db.session_schema import session_schema
+        session_schema.start()
+        logger.info("✅ Session schema migration job started")
+    except Exception as e:
+        logger.warning(f"⚠️ Session schema migration job failed to start: {e}")
+    
+    # 11. 📮 Finalize queue consumer (write-behind chat message persistence)
+    try:
+        from app.services.finalize_queue import finalize_queue
+        finalize_queue.start()
+        logger.info("✅ Finalize queue consumer started")
+    except Exception as e:
+        logger.warning(f"⚠️ Finalize queue consumer failed to start: {e}")
+    
     print("🔌 Validating connection pools...")
     from app.db.connection_pool import validate_all_pools
     pools_ok = await validate_all_pools()
@@ -279,6 +330,66 @@ async def lifespan(app: FastAPI):
             except asyncio.CancelledError:
                 print("✅ Worker shut down successfully.")
         
+        try:
+            from app.services.key_vault import key_vault
+            await key_vault.stop()
+        except Exception:
+            pass
+        
+        print("🛑 Flushing usage counters...")
+        try:
+            from app.services.usage_counters import usage_counters
+            await usage_counters.stop()
+        except Exception:
+            pass
+        
+        try:
+            from app.services.scheduler_service import reminder_scheduler
+            await reminder_scheduler.stop()
+        except Exception:
+            pass
+        
+        try:
+            from app.db.neo4j_client import graph_write_batcher
+            await graph_write_batcher.flush_all()
+        except Exception:
+            pass
+        
+        try:
+            from app.services.mail_transport import mail_transport
+            await mail_transport.close()
+        except Exception:
+            pass
+        
+        try:
+            await tracer.stop()
+        except Exception:
+            pass
+        
+        try:
+            from app.utils.profiling import loop_monitor
+            await loop_monitor.stop()
+        except Exception:
+            pass
+        
+        try:
+            from app.services.analytics_rollups import analytics_rollups
+            await analytics_rollups.stop()
+        except Exception:
+            pass
+        
+        try:
+            from app.db.session_schema import session_schema
+            await session_schema.stop()
+        except Exception:
+            pass
+        
+        try:
+            from app.services.finalize_queue import finalize_queue
+            await finalize_queue.stop()
+        except Exception:
+            pass
+        
         print("🛑 Closing all connections...")
         from app.db.connection_pool import cleanup_all_connections
         await cleanup_all_connections()
@@ -300,11 +411,15 @@ app = FastAPI(
 # 🚀 Part 19: Structured Logging Middleware (ULTRA-OPTIMIZED)
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from app.utils.tracing import tracer
 import time
 
 # 🚀 SKIP LOGGING FOR HIGH-FREQUENCY ENDPOINTS (Reduces overhead)
 SKIP_LOGGING_PATHS = {"/health", "/api/streaming/stream/", "/static/", "/favicon.ico"}
 
+# 🔭 Never traced (probes and static assets)
+UNTRACED_PATH_PREFIXES = ("/health", "/static/", "/favicon.ico")
+
 # 🚨 SLOW REQUEST THRESHOLD (milliseconds)
 SLOW_REQUEST_THRESHOLD_MS = 2000
 
@@ -317,7 +432,23 @@ class StructuredLoggingMiddleware(BaseHTTPMiddleware):
     
     async def dispatch(self, request: Request, call_next):
         path = request.url.path
+        if path.startswith(UNTRACED_PATH_PREFIXES):
+            return await call_next(request)
         
+        # 🔭 Root span (sampled); streamed bodies outlive call_next, so SSE
+        # work shows up as child spans that end after this one.
+        with tracer.start_trace(
+            "http.request",
+            traceparent=request.headers.get("traceparent"),
+            trusted=is_trusted_proxy(request.client.host if request.client else None),
+            method=request.method,
+            path=path,
+        ) as request_span:
+            response = await self._dispatch(request, call_next, path)
+            request_span.set(status_code=response.status_code)
+            return response
+    
+    async def _dispatch(self, request: Request, call_next, path: str):
         # 🚀 FAST PATH: Skip logging for high-frequency/streaming endpoints
         if any(skip in path for skip in SKIP_LOGGING_PATHS):
             return await call_next(request)
@@ -369,6 +500,9 @@ app.add_middleware(SecurityMiddleware)
 # 🚀 Part 19: Structured Logging (added after security)
 app.add_middleware(StructuredLoggingMiddleware)
 
+# 🚦 Per-route rate limits (sliding window, Redis-backed)
+app.add_middleware(RateLimitMiddleware)
+
 # CORS (Frontend ↔ Backend) - Allow frontend connection
 app.add_middleware(
     CORSMiddleware,
@@ -431,6 +565,14 @@ async def performance_stats():
         return {"status": "error", "message": str(e)}
 
 
+# 📊 Memory metrics (Prometheus scrape target)
+@app.get("/health/memory/metrics")
+async def memory_metrics_prometheus():
+    """Memory-system counters and latency quantiles in Prometheus text format"""
+    from app.services.memory_observability import memory_observer
+    return PlainTextResponse(memory_observer.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
 # Celery Health Check
 @app.get("/health/celery")
 async def celery_health_check():
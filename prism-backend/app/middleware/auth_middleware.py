@@ -7,6 +7,7 @@ import json
 from datetime import datetime, timezone
 from app.db.redis_client import redis_client
 from app.config import settings
+from app.utils.tracing import tracer
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +29,20 @@ class AuthMiddleware(BaseHTTPMiddleware):
         # Skip auth for public endpoints to save resources
         if request.url.path.startswith(("/health", "/static", "/docs", "/openapi.json", "/auth/login", "/auth/signup")):
             return await call_next(request)
-            
+        
+        # 🔭 Child of the request trace started by the logging middleware
+        with tracer.span("auth.middleware") as auth_span:
+            user_data = await self._resolve_user(request, auth_span)
+        
+        # 4. Attach to request state
+        request.state.user = user_data # Dict or None
+        
+        # Call next middleware/route
+        response = await call_next(request)
+        return response
+    
+    async def _resolve_user(self, request: Request, span):
+        """Session cookie -> user dict (Redis cache first, MongoDB on miss)"""
         # 1. Try to get Session ID from Cookie (Preferred)
         session_id = request.cookies.get(settings.SESSION_COOKIE_NAME)
         
@@ -48,6 +62,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
                 except:
                     # Invalid cache data
                     user_data = None
+            span.set(cache_hit=user_data is not None)
         
         # 3. If cache miss, but session_id exists, resolve from MongoDB
         if not user_data and session_id:
@@ -86,10 +101,6 @@ class AuthMiddleware(BaseHTTPMiddleware):
                                 logger.info(f"💾 Auth Resolved & Cached: {user_data['email']}")
             except Exception as e:
                 logger.error(f"❌ Auth Resolution Error: {e}")
-                
-        # 4. Attach to request state
-        request.state.user = user_data # Dict or None
         
-        # Call next middleware/route
-        response = await call_next(request)
-        return response
+        span.set(authenticated=user_data is not None)
+        return user_data
@@ -1,11 +1,21 @@
 
-from fastapi import APIRouter, HTTPException, Depends, status, Request
+from fastapi import APIRouter, HTTPException, Depends, status, Request, Query
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from app.db.mongo_client import users_collection, sessions_collection, db
 from app.utils.auth import get_current_user_from_session, AuthUtils, create_session_for_user
 from app.db.redis_client import redis_client
+from app.services.analytics_rollups import analytics_rollups
+from app.services.finalize_queue import finalize_queue
+from app.services.mini_agent_cache import mini_agent_cache
+from app.services.load_aware_router import load_aware_router
+from app.services.prompt_assembly import prompt_assembly
+from app.utils.resilience import resilience_stats
+from app.utils.profiling import (
+    ProfilerBusy, cpu_profiler, loop_monitor, allocation_tracker, task_counts, MAX_PROFILE_SECONDS
+)
 from bson import ObjectId
 import logging
 import json
@@ -42,6 +52,10 @@ class AdminAction(BaseModel):
     action: str  # "ban", "unban", "reset_password", "promote", "demote"
     reason: Optional[str] = None
 
+class SlowCallbackLogging(BaseModel):
+    enabled: bool
+    threshold_ms: Optional[float] = None
+
 class BroadcastMessage(BaseModel):
     title: str
     message: str
@@ -54,25 +68,11 @@ class BroadcastMessage(BaseModel):
 async def get_admin_stats(admin: dict = Depends(require_admin)):
     """
     Get aggregated high-level statistics for the dashboard.
+    Served from pre-aggregated rollups (no collection scans).
     """
     try:
-        total_users = await users_collection.count_documents({})
-        active_users_24h = await users_collection.count_documents({
-            "last_login": {"$gte": datetime.now(timezone.utc) - timedelta(hours=24)}
-        })
-        
-        total_sessions = await sessions_collection.count_documents({})
-        
-        # Calculate growth (Mock comparison for now)
-        growth_rate = 12.5 # Placeholder or allow real calculation if strict history exists
-        
-        return {
-            "total_users": total_users,
-            "active_users_24h": active_users_24h,
-            "total_sessions": total_sessions,
-            "growth_rate": growth_rate,
-            "system_status": "OPTIMAL"
-        }
+        overview = await analytics_rollups.get_overview()
+        return {**overview, "system_status": "OPTIMAL"}
     except Exception as e:
         logger.error(f"Stats error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -102,11 +102,105 @@ async def get_system_health(admin: dict = Depends(require_admin)):
             "memory_usage": memory.percent,
             "db_latency_ms": round(db_latency, 2),
             "redis_latency_ms": round(redis_latency, 2),
+            "backends": resilience_stats(),
+            "finalize_queue": finalize_queue.get_stats(),
+            "mini_agent_cache": await mini_agent_cache.hit_rates(),
+            "model_health": load_aware_router.get_stats(),
+            "prompt_assembly": prompt_assembly.get_stats(),
             "server_time": datetime.now(timezone.utc).isoformat()
         }
     except Exception as e:
         return {"status": "Critical Error", "detail": str(e)}
 
+@router.get("/analytics/rollups")
+async def get_analytics_rollups(
+    period: str = Query("day", pattern="^(hour|day)$"),
+    limit: int = Query(30, ge=1, le=366),
+    admin: dict = Depends(require_admin),
+):
+    """
+    Hourly/daily signup, login and session rollups (newest first).
+    """
+    return {"period": period, "rollups": await analytics_rollups.get_series(period, limit)}
+
+# --- PROFILING (diagnose production slowdowns without redeploying) ---
+
+@router.get("/profile/cpu")
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0, le=MAX_PROFILE_SECONDS),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    all_threads: bool = False,
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+    admin: dict = Depends(require_admin)
+):
+    """
+    Sampling CPU profile of this worker process for N seconds.
+    `collapsed` output feeds straight into flamegraph.pl / speedscope.
+    """
+    try:
+        report = await cpu_profiler.profile(seconds=seconds, interval_ms=interval_ms, all_threads=all_threads)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "collapsed":
+        return PlainTextResponse(report["collapsed"])
+    return report
+
+@router.get("/profile/loop")
+async def profile_event_loop(admin: dict = Depends(require_admin)):
+    """
+    Event-loop lag (p50/p99/max) and recent stalls with the blocking stack.
+    """
+    return loop_monitor.get_stats()
+
+@router.post("/profile/loop/slow-callbacks")
+async def toggle_slow_callback_logging(
+    payload: SlowCallbackLogging,
+    admin: dict = Depends(require_admin)
+):
+    """
+    Toggle asyncio debug-mode slow callback logging (adds overhead - turn off after use).
+    """
+    admin_email = admin.get("email") if isinstance(admin, dict) else getattr(admin, "email", None)
+    logger.warning(f"🩺 asyncio slow-callback logging set to {payload.enabled} by {admin_email or 'admin'}")
+    return loop_monitor.set_slow_callback_logging(payload.enabled, payload.threshold_ms)
+
+@router.get("/profile/tasks")
+async def profile_tasks(limit: int = Query(50, ge=1, le=500), admin: dict = Depends(require_admin)):
+    """
+    Live asyncio tasks grouped by coroutine name.
+    """
+    return task_counts(limit)
+
+@router.post("/profile/memory/start")
+async def start_allocation_tracking(admin: dict = Depends(require_admin)):
+    """
+    Start tracemalloc and take the baseline snapshot.
+    """
+    return await allocation_tracker.start()
+
+@router.get("/profile/memory/diff")
+async def allocation_diff(
+    limit: int = Query(25, ge=1, le=200),
+    key_type: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+    rebase: bool = False,
+    admin: dict = Depends(require_admin)
+):
+    """
+    Top allocation growth since the baseline (rebase=true moves the baseline forward).
+    """
+    try:
+        return await allocation_tracker.diff(limit=limit, key_type=key_type, rebase=rebase)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.post("/profile/memory/stop")
+async def stop_allocation_tracking(admin: dict = Depends(require_admin)):
+    """
+    Stop tracemalloc and drop the baseline (tracing costs memory + CPU).
+    """
+    return allocation_tracker.stop()
+
 # --- USER MANAGEMENT ---
 
 @router.get("/users")
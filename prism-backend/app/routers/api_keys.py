@@ -29,12 +29,13 @@ import hashlib
 import asyncio
 
 from cryptography.fernet import Fernet
-import json as json_module  # For Redis caching
 
 from app.db.mongo_client import db, mongo_retry
 from app.utils.auth import get_current_user_from_session
 from app.config import settings
 from app.db.redis_client import get_redis_client  # For caching API key lookups
+from app.services.key_vault import key_vault  # Process-local decrypted key cache
+from app.services.usage_counters import usage_counters  # Atomic Redis usage counters
 
 logger = logging.getLogger(__name__)
 
@@ -284,6 +285,7 @@ async def reset_exhausted_keys_if_new_day(user_id: str):
     )
     
     if result.modified_count > 0:
+        await key_vault.invalidate(user_id)
         logger.info(f"♻️ Reset {result.modified_count} exhausted keys for user {user_id[:8]}... (new day)")
 
 
@@ -311,13 +313,9 @@ async def mark_key_exhausted(key_id: ObjectId, user_id: str = None):
         }
     )
     
-    # Invalidate cache so next request gets fresh data
+    # Flip the vault copy and invalidate it on other instances
     if user_id:
-        try:
-            redis_client = await get_redis_client()
-            await redis_client.delete(f"user_keys:{user_id}")
-        except Exception:
-            pass
+        await key_vault.mark_exhausted(user_id, key_id)
     
     logger.info(f"⚠️ API key {key_id} marked as exhausted for today")
 
@@ -327,59 +325,20 @@ async def get_next_available_key(user_id: str, exclude_key_id: ObjectId = None)
     Find the next available (non-exhausted) key for user.
     
     🚀 OPTIMIZED:
-    - Uses Redis cache for key list (avoids DB on every request)
+    - Served from the process-local key vault (zero DB calls on hit)
+    - Secret already decrypted in the vault (no Fernet per request)
     - Priority ordering: lowest priority number = used first
     - Automatic rotation: if key exhausted, moves to next
     - Maximum 5 keys per user
     
-    Returns the key document or None.
+    Returns a key dict (with decrypted "api_key") or None.
     """
     import time
     start = time.time()
     
-    # 🚀 FAST PATH: Try Redis cache first
-    try:
-        redis_client = await get_redis_client()
-        cache_key = f"user_keys:{user_id}"
-        cached = await redis_client.get(cache_key)
-        
-        if cached:
-            keys_data = json_module.loads(cached)
-            # Find first non-exhausted key
-            for key_data in keys_data:
-                if not key_data.get("is_exhausted_today", False):
-                    if exclude_key_id and str(key_data["_id"]) == str(exclude_key_id):
-                        continue
-                    # Return full key from DB (we need encrypted_key)
-                    key = await api_keys_collection.find_one({"_id": ObjectId(key_data["_id"])})
-                    if key and not key.get("is_exhausted_today", False):
-                        logger.debug(f"⚡ Key lookup from cache [{(time.time()-start)*1000:.0f}ms]")
-                        return key
-    except Exception as e:
-        logger.warning(f"Redis cache miss for keys: {e}")
+    key = await key_vault.next_available(user_id, exclude_key_id)
     
-    # 🐢 SLOW PATH: Query MongoDB
-    query = {
-        "user_id": user_id,
-        "is_exhausted_today": {"$ne": True}
-    }
-    
-    if exclude_key_id:
-        query["_id"] = {"$ne": exclude_key_id}
-    
-    # Get keys ordered by priority (ascending), then creation date
-    key = await api_keys_collection.find_one(query, sort=[("priority", 1), ("created_at", 1)])
-    
-    # Update cache with all user keys (for future lookups)
-    try:
-        all_keys = await api_keys_collection.find({"user_id": user_id}).sort([("priority", 1)]).to_list(5)
-        if all_keys:
-            cache_data = [{"_id": str(k["_id"]), "priority": k.get("priority", 999), "is_exhausted_today": k.get("is_exhausted_today", False)} for k in all_keys]
-            await redis_client.set(f"user_keys:{user_id}", json_module.dumps(cache_data), ex=60)  # 1 min cache
-    except Exception:
-        pass
-    
-    logger.debug(f"🔍 Key lookup from DB [{(time.time()-start)*1000:.0f}ms]")
+    logger.debug(f"⚡ Key lookup from vault [{(time.time()-start)*1000:.0f}ms]")
     return key
 
 
@@ -397,98 +356,43 @@ async def activate_key(key_id: ObjectId, user_id: str):
         UpdateOne({"_id": key_id}, {"$set": {"is_active": True}})
     ], ordered=True)
     
-    # Invalidate cache
-    try:
-        redis_client = await get_redis_client()
-        await redis_client.delete(f"user_keys:{user_id}")
-    except Exception:
-        pass
+    # Invalidate vault (all instances)
+    await key_vault.invalidate(user_id)
 
 
 # ============ ENDPOINTS ============
 
-# 🚀 CACHE TTL for usage stats (seconds) - INCREASED for better performance
-USAGE_CACHE_TTL = 30  # 🔧 Increased from 10s to 30s - reduces DB load by 3x
-USAGE_EXTENDED_CACHE_TTL = 60  # For users with no recent changes
-
 @router.get("/usage", response_model=UsageStatsResponse)
 async def get_usage_stats(current_user = Depends(get_current_user_from_session)):
     """
     Get user's usage statistics including free requests remaining.
-    Uses retry logic for MongoDB connection resilience.
-    🚀 CACHED: Results cached in Redis for 30s to reduce DB load.
+    
+    🚀 SERVED FROM COUNTERS: today's usage comes from the Redis usage hash
+    (one HGETALL) and the key list from the process-local key vault -
+    no MongoDB reads on the hot path.
     """
     user_id = current_user.user_id
-    today = get_today_str()
-    cache_key = f"usage_stats:{user_id}:{today}"
-    
-    # 🚀 TRY CACHE FIRST
-    try:
-        redis_client = await get_redis_client()
-        cached = await redis_client.get(cache_key)
-        if cached:
-            cached_data = json_module.loads(cached)
-            return UsageStatsResponse(**cached_data)
-    except Exception:
-        pass  # Cache miss or error, continue to DB
     
     try:
-        # 🚀 PARALLEL PRE-FLIGHT: Fetch usage/keys in one go
-        # Optimized: Use projection for keys to fetch only what we need (speed boost)
-        keys_projection = {
-            "is_exhausted_today": 1, 
-            "is_active": 1, 
-            "requests_today": 1, 
-            "label": 1, 
-            "priority": 1
-        }
-        
-        # Fire-and-forget the reset check to avoid blocking the response
-        # Reset keys if new day (Fast check)
+        # Reset keys if new day (Redis-gated, at most once per user/day)
         await reset_exhausted_keys_if_new_day(user_id)
         
-        # 🛡️ SEQUENTIAL EXECUTION (Fixes "coroutine expected, got Future" error in some environments)
-        usage = await usage_collection.find_one({"user_id": user_id})
-        all_keys = await api_keys_collection.find({"user_id": user_id}, keys_projection).to_list(100)
-        
-        if not usage:
-            usage = {
-                "user_id": user_id,
-                "free_requests_used": 0,
-                "free_limit": FREE_REQUEST_LIMIT,
-                "last_reset_date": today,
-                "created_at": datetime.utcnow()
-            }
-            # Background insert to save time
-            asyncio.create_task(usage_collection.insert_one(usage))
-        else:
-            # Check if we need to reset free usage (new day)
-            last_reset = usage.get("last_reset_date", "")
-            if last_reset != today:
-                asyncio.create_task(usage_collection.update_one(
-                    {"user_id": user_id},
-                    {
-                        "$set": {
-                            "free_requests_used": 0,
-                            "last_reset_date": today,
-                            "last_reset_at": datetime.utcnow(),
-                            "counted_generation_ids": []
-                        }
-                    }
-                ))
-                usage["free_requests_used"] = 0
+        counters, all_keys = await asyncio.gather(
+            usage_counters.get_day(user_id),
+            key_vault.get_keys(user_id)
+        )
         
         total_keys = len(all_keys)
-        exhausted_keys = sum(1 for k in all_keys if k.get("is_exhausted_today", False))
+        exhausted_keys = sum(1 for k in all_keys if k.is_exhausted_today)
         active_keys = total_keys - exhausted_keys
         
         # Calculate total requests today across all keys
-        total_requests_today = sum(k.get("requests_today", 0) for k in all_keys)
+        total_requests_today = sum(usage_counters.key_requests(counters, k.id) for k in all_keys)
         
         # Find active key (handling possibility of multiple actives gracefully)
-        active_key = next((k for k in all_keys if k.get("is_active", False)), None)
+        active_key = next((k for k in all_keys if k.is_active), None)
         
-        free_used = usage.get("free_requests_used", 0) if usage else 0
+        free_used = min(counters.get("free", 0), FREE_REQUEST_LIMIT)
         free_remaining = max(0, FREE_REQUEST_LIMIT - free_used)
         has_keys = total_keys > 0
         
@@ -515,7 +419,7 @@ async def get_usage_stats(current_user = Depends(get_current_user_from_session))
         if exhausted_keys > 0 or warning_level:
             reset_seconds, reset_formatted = get_seconds_until_midnight_utc()
         
-        response_data = UsageStatsResponse(
+        return UsageStatsResponse(
             free_requests_used=free_used,
             free_limit=FREE_REQUEST_LIMIT,
             free_requests_remaining=free_remaining,
@@ -526,25 +430,12 @@ async def get_usage_stats(current_user = Depends(get_current_user_from_session))
             max_keys_allowed=MAX_API_KEYS_PER_USER,
             can_make_requests=can_make,
             current_key_source=current_source,
-            active_key_label=active_key.get("label") if active_key else None,
+            active_key_label=active_key.label if active_key else None,
             warning_level=warning_level,
             reset_time_seconds=reset_seconds,
             reset_time_formatted=reset_formatted,
             total_requests_today=total_requests_today + free_used
         )
-        
-        # 🚀 CACHE THE RESPONSE (10s TTL)
-        try:
-            redis_client = await get_redis_client()
-            await redis_client.setex(
-                cache_key, 
-                USAGE_CACHE_TTL, 
-                json_module.dumps(response_data.model_dump())
-            )
-        except Exception:
-            pass  # Cache write failure is non-critical
-        
-        return response_data
     except Exception as e:
         # Graceful degradation - return default stats if DB is temporarily unavailable
         logger.error(f"❌ get_usage_stats error (returning defaults): {e}")
@@ -617,20 +508,12 @@ async def list_api_keys(current_user = Depends(get_current_user_from_session)):
     # Reset exhausted keys if new day
     await reset_exhausted_keys_if_new_day(user_id)
     
-    # Also reset daily request counters if new day
-    today = get_today_str()
-    await api_keys_collection.update_many(
-        {
-            "user_id": user_id,
-            "last_request_date": {"$ne": today}
-        },
-        {
-            "$set": {"requests_today": 0, "last_request_date": today}
-        }
+    # Daily request counts come from the usage counters (reset by date key)
+    keys, counters = await asyncio.gather(
+        api_keys_collection.find({"user_id": user_id}).sort([("priority", 1), ("created_at", 1)]).to_list(100),
+        usage_counters.get_day(user_id)
     )
     
-    keys = await api_keys_collection.find({"user_id": user_id}).sort([("priority", 1), ("created_at", 1)]).to_list(100)
-    
     result = []
     for key in keys:
         try:
@@ -652,7 +535,7 @@ async def list_api_keys(current_user = Depends(get_current_user_from_session)):
             created_at=key["created_at"].isoformat() if isinstance(key["created_at"], datetime) else key["created_at"],
             last_used=key.get("last_used").isoformat() if key.get("last_used") else None,
             priority=key.get("priority", 1),
-            requests_today=key.get("requests_today", 0)
+            requests_today=usage_counters.key_requests(counters, key["_id"])
         ))
     
     return result
@@ -824,12 +707,8 @@ async def add_api_key(request: AddApiKeyRequest, current_user = Depends(get_curr
     
     result = await api_keys_collection.insert_one(key_doc)
     
-    # 🚀 Invalidate cache so new key is immediately available
-    try:
-        redis_client = await get_redis_client()
-        await redis_client.delete(f"user_keys:{user_id}")
-    except Exception:
-        pass
+    # 🚀 Invalidate vault so new key is immediately available
+    await key_vault.invalidate(user_id)
     
     logger.info(f"✅ API key added for user {user_id[:8]}... (label: {key_doc['label']}, active: {should_activate}, priority: {priority})")
     
@@ -900,12 +779,8 @@ async def delete_api_key(key_id: str, current_user = Depends(get_current_user_fr
     # Delete the key
     await api_keys_collection.delete_one({"_id": key_oid})
     
-    # 🚀 Invalidate cache
-    try:
-        redis_client = await get_redis_client()
-        await redis_client.delete(f"user_keys:{user_id}")
-    except Exception:
-        pass
+    # 🚀 Invalidate vault
+    await key_vault.invalidate(user_id)
     
     logger.info(f"🗑️ API key deleted for user {user_id[:8]}... (label: {key.get('label')})")
     
@@ -952,12 +827,8 @@ async def reorder_api_keys(request: ReorderKeysRequest, current_user = Depends(g
         except Exception as e:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid key ID: {key_id}")
     
-    # 🚀 Invalidate cache after reorder
-    try:
-        redis_client = await get_redis_client()
-        await redis_client.delete(f"user_keys:{user_id}")
-    except Exception:
-        pass
+    # 🚀 Invalidate vault after reorder
+    await key_vault.invalidate(user_id)
     
     logger.info(f"🔄 Reordered {len(request.key_ids)} keys for user {user_id[:8]}...")
     return {"message": "✅ Keys reordered successfully"}
@@ -1140,11 +1011,10 @@ async def get_api_key_for_user(user_id: str) -> Tuple[str | None, str, str | Non
     3. If user has no keys and free limit exceeded → error (must add key)
     4. Free counter resets daily at midnight
     
-    🚀 ULTRA-OPTIMIZED V3:
-    - Redis-first with 90s cache (increased from 60s)
-    - Skip reset check if cache hit
-    - Parallel cache + platform key return
-    - Pipeline Redis operations for <1ms response
+    🚀 ULTRA-OPTIMIZED V4:
+    - Free usage read from the atomic Redis usage counter (no MongoDB)
+    - Own keys resolved from the process-local key vault (no MongoDB)
+    - Daily reset is implicit: counters are keyed by date
     
     Returns: (api_key, source, error_code, model)
         - source: "platform" (free), "user" (own key), or "none" (error)
@@ -1154,63 +1024,15 @@ async def get_api_key_for_user(user_id: str) -> Tuple[str | None, str, str | Non
     import time
     start_time = time.time()
     
-    today = get_today_str()
+    # Fire-and-forget reset check (Redis-gated, once per user/day)
+    asyncio.create_task(reset_exhausted_keys_if_new_day(user_id))
     
-    # 🚀 ULTRA-FAST PATH: Try Redis cache FIRST (skip ALL DB calls on hit)
     try:
-        redis_client = await get_redis_client()
-        cache_key = f"usage_cache:{user_id}:{today}"  # Include date for auto-invalidation
-        cached = await redis_client.get(cache_key)
-        
-        if cached:
-            cached_data = json_module.loads(cached)
-            free_used = cached_data.get("free_requests_used", 0)
-            # 🚀 INSTANT RETURN on cache hit - ZERO DB calls
-            if free_used < FREE_REQUEST_LIMIT:
-                elapsed = (time.time() - start_time) * 1000
-                logger.info(f"🆓 User {user_id[:8]}... using platform key ({FREE_REQUEST_LIMIT - free_used} free left) [{elapsed:.0f}ms]")
-                return settings.GROQ_API_KEY, "platform", None, "llama-3.1-8b-instant"
-            # Cache hit but limit exceeded - check for user keys in cache
-            user_key_data = cached_data.get("user_key")
-            if user_key_data:
-                elapsed = (time.time() - start_time) * 1000
-                logger.info(f"🔑 User {user_id[:8]}... using cached OWN key [{elapsed:.0f}ms]")
-                return user_key_data["key"], "user", None, user_key_data.get("model", "llama-3.1-8b-instant")
+        free_used = await usage_counters.get_free_used(user_id)
     except Exception as e:
-        logger.debug(f"Redis cache miss/error: {e}")
-    
-    # 🐢 SLOW PATH: Cache miss - check DB (should be rare)
-    # Fire-and-forget reset check to not block response
-    asyncio.create_task(reset_exhausted_keys_if_new_day(user_id))
-    
-    # Check MongoDB for usage with minimal projection
-    usage = await usage_collection.find_one({"user_id": user_id}, {"free_requests_used": 1, "last_reset_date": 1})
-    
-    # Handle daily reset inline
-    if usage:
-        last_reset = usage.get("last_reset_date", "")
-        if last_reset != today:
-            free_used = 0  # New day = reset
-            # Fire-and-forget the DB update
-            asyncio.create_task(usage_collection.update_one(
-                {"user_id": user_id},
-                {"$set": {"free_requests_used": 0, "last_reset_date": today, "counted_generation_ids": []}}
-            ))
-        else:
-            free_used = usage.get("free_requests_used", 0)
-    else:
+        logger.warning(f"Usage counter unavailable, assuming free quota: {e}")
         free_used = 0
     
-    # Build cache data for future requests
-    cache_data = {"free_requests_used": free_used, "cached_at": time.time()}
-    
-    # 🚀 Update cache with 90s TTL (date in key auto-invalidates at midnight)
-    try:
-        redis_client = await get_redis_client()
-        await redis_client.set(f"usage_cache:{user_id}:{today}", json_module.dumps(cache_data), ex=90)
-    except Exception:
-        pass
-    
     # 🆓 If free requests remaining → use platform key
     if free_used < FREE_REQUEST_LIMIT:
         elapsed = (time.time() - start_time) * 1000
@@ -1222,49 +1044,28 @@ async def get_api_key_for_user(user_id: str) -> Tuple[str | None, str, str | Non
     
     if available_key:
         try:
-            decrypted = decrypt_api_key(available_key["encrypted_key"])
+            decrypted = available_key["api_key"]
             
             # Get user's preferred model from their key config
             user_model = available_key.get("model", "llama-3.1-8b-instant")
             
-            # 🚀 Fire-and-forget: Don't wait for activation/update
+            # 🚀 Fire-and-forget: Don't wait for activation
             async def update_key_usage_background():
                 try:
-                    # Ensure this key is active
+                    # Ensure this key is active (usage itself is counted at finalize)
                     if not available_key.get("is_active", False):
                         await activate_key(available_key["_id"], user_id)
-                    
-                    # Update last_used timestamp
-                    update_doc = {
-                        "$set": {"last_used": datetime.utcnow(), "last_request_date": today},
-                        "$inc": {"requests_today": 1}
-                    }
-                    if available_key.get("last_request_date") != today:
-                        update_doc["$set"]["requests_today"] = 1
-                    
-                    await api_keys_collection.update_one(
-                        {"_id": available_key["_id"]},
-                        update_doc
-                    )
                 except Exception as e:
                     logger.warning(f"Background key update failed: {e}")
             
             asyncio.create_task(update_key_usage_background())
             
-            # 🚀 Cache the user key for future requests (avoid DB next time)
-            try:
-                cache_data["user_key"] = {"key": decrypted, "model": user_model}
-                redis_client = await get_redis_client()
-                await redis_client.set(f"usage_cache:{user_id}:{today}", json_module.dumps(cache_data), ex=90)
-            except Exception:
-                pass
-            
             elapsed = (time.time() - start_time) * 1000
             logger.info(f"🔑 User {user_id[:8]}... using OWN key + model {user_model} [{elapsed:.0f}ms]")
             return decrypted, "user", None, user_model
             
         except Exception as e:
-            logger.error(f"Failed to decrypt API key: {e}")
+            logger.error(f"Failed to resolve API key: {e}")
             asyncio.create_task(mark_key_exhausted(available_key["_id"], user_id))
             # Try next key recursively
             return await get_api_key_for_user(user_id)
@@ -1301,7 +1102,7 @@ async def handle_key_exhaustion(user_id: str, current_key_id: str | None = None)
     
     if next_key:
         try:
-            decrypted = decrypt_api_key(next_key["encrypted_key"])
+            decrypted = next_key["api_key"]
             await activate_key(next_key["_id"], user_id)
             logger.info(f"🔄 Switched to next API key for user {user_id[:8]}...")
             return decrypted, None
@@ -1319,25 +1120,20 @@ async def increment_free_usage(user_id: str, generation_id: str = None) -> dict:
     Called after a successful LLM request using platform key.
     
     Features:
-    - Atomic increment to prevent race conditions
-    - Daily reset check (if new day, reset counter first)
+    - Atomic HINCRBY on the per-user/day Redis counter (no MongoDB write;
+      the usage flusher persists aggregated counts in bulk)
+    - Daily reset is implicit (counter key includes the date)
     - Prevents over-counting (won't increment past limit)
-    - Returns the updated count for logging/debugging
-    - Audit trail with generation_id
+    - Idempotent per generation_id (Redis SET NX)
     
     Returns: {"success": bool, "new_count": int, "was_reset": bool, "message": str}
     """
-    today = get_today_str()
-    
-    # Single DB call to get current state
-    usage = await usage_collection.find_one({"user_id": user_id})
-    was_reset = False
-    
-    # IDEMPOTENCY CHECK: If generation_id provided, check if already counted
-    if generation_id and usage:
-        counted_generations = usage.get("counted_generation_ids", [])
-        if generation_id in counted_generations:
-            current_count = usage.get("free_requests_used", 0)
+    # IDEMPOTENCY CHECK: If generation_id provided, only count it once
+    if generation_id:
+        redis_client = await get_redis_client()
+        first = await redis_client.set(f"usage:counted:{generation_id}", "1", ex=86400, nx=True)
+        if not first:
+            current_count = await usage_counters.get_free_used(user_id)
             logger.info(f"🔄 Idempotent: Generation {generation_id[:8]}... already counted for user {user_id[:8]}...")
             return {
                 "success": False, 
@@ -1347,135 +1143,37 @@ async def increment_free_usage(user_id: str, generation_id: str = None) -> dict:
                 "idempotent": True
             }
     
-    # Check if we need to reset (new day)
-    if usage:
-        last_reset = usage.get("last_reset_date", "")
-        if last_reset != today:
-            # New day - reset counter and clear idempotency list
-            await usage_collection.update_one(
-                {"user_id": user_id},
-                {
-                    "$set": {
-                        "free_requests_used": 0,
-                        "last_reset_date": today,
-                        "last_reset_at": datetime.utcnow(),
-                        "counted_generation_ids": []  # Clear for new day
-                    }
-                }
-            )
-            was_reset = True
-            logger.info(f"♻️ Reset free usage counter for user {user_id[:8]}... (new day)")
-    
-    # Handle new user - create document first
-    if not usage:
-        try:
-            await usage_collection.insert_one({
-                "user_id": user_id,
-                "free_requests_used": 1,
-                "free_limit": FREE_REQUEST_LIMIT,
-                "created_at": datetime.utcnow(),
-                "last_reset_date": today,
-                "last_used_at": datetime.utcnow(),
-                "last_generation_id": generation_id,
-                "counted_generation_ids": [generation_id] if generation_id else []
-            })
-            logger.info(f"📊 User {user_id[:8]}... free usage: 1/{FREE_REQUEST_LIMIT} (new record)")
-            return {
-                "success": True,
-                "new_count": 1,
-                "was_reset": False,
-                "message": f"Incremented to 1/{FREE_REQUEST_LIMIT}"
-            }
-        except Exception as e:
-            # Duplicate key race condition - another request created it first
-            logger.warning(f"⚠️ Insert race condition for {user_id[:8]}..., retrying update: {e}")
-            # Fall through to update path
-    
-    # Build update operation for existing document
-    update_op = {
-        "$inc": {"free_requests_used": 1},
-        "$set": {
-            "last_used_at": datetime.utcnow(),
-            "last_generation_id": generation_id
-        }
-    }
-    
-    # Add generation_id to tracking list (for idempotency)
-    if generation_id:
-        update_op["$push"] = {"counted_generation_ids": {
-            "$each": [generation_id],
-            "$slice": -100  # Keep only last 100 to prevent unbounded growth
-        }}
-    
-    # Atomic increment with safety check (don't go over limit)
-    result = await usage_collection.find_one_and_update(
-        {
-            "user_id": user_id,
-            "free_requests_used": {"$lt": FREE_REQUEST_LIMIT}  # Safety: don't increment past limit
-        },
-        update_op,
-        return_document=True  # Return updated document
-    )
-    
-    if result:
-        new_count = result.get("free_requests_used", 0)
-        logger.info(f"📊 User {user_id[:8]}... free usage: {new_count}/{FREE_REQUEST_LIMIT}")
-        return {
-            "success": True, 
-            "new_count": new_count, 
-            "was_reset": was_reset,
-            "message": f"Incremented to {new_count}/{FREE_REQUEST_LIMIT}"
-        }
-    else:
-        # Increment failed (likely already at limit)
-        current = await usage_collection.find_one({"user_id": user_id})
-        current_count = current.get("free_requests_used", 0) if current else 0
-        logger.warning(f"⚠️ Free usage increment skipped for {user_id[:8]}... (at limit: {current_count})")
+    # Check + increment in one step: overshooting increments are rolled back
+    counted, new_count = await usage_counters.incr_free(user_id, limit=FREE_REQUEST_LIMIT)
+    if not counted:
+        logger.warning(f"⚠️ Free usage increment skipped for {user_id[:8]}... (at limit: {new_count})")
         return {
             "success": False, 
-            "new_count": current_count, 
-            "was_reset": was_reset,
-            "message": f"Already at limit ({current_count}/{FREE_REQUEST_LIMIT})"
+            "new_count": new_count, 
+            "was_reset": False,
+            "message": f"Already at limit ({new_count}/{FREE_REQUEST_LIMIT})"
         }
+    
+    logger.info(f"📊 User {user_id[:8]}... free usage: {new_count}/{FREE_REQUEST_LIMIT}")
+    return {
+        "success": True, 
+        "new_count": new_count, 
+        "was_reset": False,
+        "message": f"Incremented to {new_count}/{FREE_REQUEST_LIMIT}"
+    }
 
 
 async def increment_user_key_usage(user_id: str, key_id: str, generation_id: str = None) -> dict:
     """
     Increment usage counter for a user's own API key.
     Tracks per-key usage for analytics and key rotation decisions.
+    Atomic Redis counter; persisted to MongoDB by the usage flusher.
     
     Returns: {"success": bool, "requests_today": int}
     """
-    today = get_today_str()
-    
     try:
-        key_oid = ObjectId(key_id) if isinstance(key_id, str) else key_id
-        
-        # Check if new day - reset counter
-        key_doc = await api_keys_collection.find_one({"_id": key_oid})
-        if key_doc and key_doc.get("last_request_date") != today:
-            # New day - reset daily counter
-            await api_keys_collection.update_one(
-                {"_id": key_oid},
-                {"$set": {"requests_today": 0, "last_request_date": today}}
-            )
-        
-        # Atomic increment
-        result = await api_keys_collection.find_one_and_update(
-            {"_id": key_oid, "user_id": user_id},
-            {
-                "$inc": {"requests_today": 1, "total_requests": 1},
-                "$set": {
-                    "last_used": datetime.utcnow(),
-                    "last_generation_id": generation_id
-                }
-            },
-            return_document=True
-        )
-        
-        if result:
-            return {"success": True, "requests_today": result.get("requests_today", 0)}
-        return {"success": False, "requests_today": 0}
+        requests_today = await usage_counters.incr_key(user_id, str(key_id))
+        return {"success": True, "requests_today": requests_today}
         
     except Exception as e:
         logger.error(f"Failed to increment user key usage: {e}")
@@ -13,10 +13,13 @@ from app.utils.auth import (
     get_current_user_from_session,
 )
 from app.utils.security import form_input_validator, auth_security
+from app.utils.rate_limiter import email_rate_limit
 from app.services.global_user_service import add_user_to_global
+from app.services.analytics_rollups import analytics_rollups
 from app.services.email_queue_service import enqueue_otp
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
+import asyncio
 import random
 import os
 import json
@@ -196,7 +199,7 @@ async def check_email(email: EmailStr):
         raise HTTPException(status_code=500, detail=f"DB check failed: {e}")
 
 
-@router.post("/login")
+@router.post("/login", dependencies=[Depends(email_rate_limit("auth_login"))])
 async def simple_login(payload: LoginRequest, response: Response, request: Request):
     """
     Simple login that works with new signup.
@@ -387,6 +390,7 @@ async def login(payload: LoginRequest):
             {"_id": user["_id"]},
             {"$set": {"last_login": datetime.now(timezone.utc)}}
         )
+        await analytics_rollups.record_login(str(user["_id"]))
         
         # Create JWT token
         access_token = AuthUtils.create_access_token(
@@ -412,7 +416,7 @@ async def login(payload: LoginRequest):
         )
 
 # OTP-based signup endpoint
-@router.post("/signup")
+@router.post("/signup", dependencies=[Depends(email_rate_limit("auth_signup"))])
 async def signup_with_otp(payload: SignupRequest):
     """Signup with OTP verification via SendGrid"""
     
@@ -667,128 +671,32 @@ async def send_otp_email(email: str, otp: str):
     print(f"{'='*60}\n")
     
     try:
-        api_key = settings.SENDGRID_API_KEY
-        from_addr = settings.SENDER_EMAIL
+        from app.services.email_service import render_signup_otp_email
+        from app.services.mail_transport import mail_transport
         
-        if not api_key or not from_addr:
+        if not settings.SENDER_EMAIL or not (settings.SENDGRID_API_KEY or settings.SMTP_HOST):
             logger.warning("⚠️ SendGrid not configured")
             return {"success": False, "error": "Email service not configured"}
         
-        from sendgrid import SendGridAPIClient
-        from sendgrid.helpers.mail import Mail, Email, Content, Personalization
-        
-        # 🎨 PROFESSIONAL EMAIL TEMPLATE - Clean & Official
-        html_template = f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>PRISM AI - Verification Code</title>
-</head>
-<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f4f4f5;">
-    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background-color: #f4f4f5;">
-        <tr>
-            <td style="padding: 40px 20px;">
-                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 480px; margin: 0 auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 24px rgba(0, 0, 0, 0.08);">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #6366f1 0%, #8b5cf6 50%, #a855f7 100%); padding: 32px 40px; text-align: center;">
-                            <h1 style="margin: 0; color: #ffffff; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">PRISM AI</h1>
-                            <p style="margin: 8px 0 0 0; color: rgba(255, 255, 255, 0.9); font-size: 14px; font-weight: 400;">Secure Email Verification</p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Body -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <h2 style="margin: 0 0 16px 0; color: #18181b; font-size: 20px; font-weight: 600;">Verify Your Email Address</h2>
-                            <p style="margin: 0 0 24px 0; color: #52525b; font-size: 15px; line-height: 1.6;">
-                                Hello! You've requested to verify your email address for your PRISM AI account. Please use the verification code below:
-                            </p>
-                            
-                            <!-- OTP Code Box -->
-                            <div style="background: linear-gradient(135deg, #f8fafc 0%, #f1f5f9 100%); border: 2px solid #e2e8f0; border-radius: 12px; padding: 24px; text-align: center; margin: 24px 0;">
-                                <p style="margin: 0 0 8px 0; color: #64748b; font-size: 12px; text-transform: uppercase; letter-spacing: 1px; font-weight: 600;">Your Verification Code</p>
-                                <div style="font-size: 36px; font-weight: 700; color: #6366f1; letter-spacing: 8px; font-family: 'SF Mono', Monaco, 'Cascadia Code', monospace;">{otp}</div>
-                            </div>
-                            
-                            <!-- Expiry Notice -->
-                            <div style="background-color: #fef3c7; border-left: 4px solid #f59e0b; padding: 12px 16px; border-radius: 0 8px 8px 0; margin: 24px 0;">
-                                <p style="margin: 0; color: #92400e; font-size: 13px;">
-                                    <strong>⏱️ This code expires in 10 minutes.</strong> Do not share this code with anyone.
-                                </p>
-                            </div>
-                            
-                            <p style="margin: 24px 0 0 0; color: #71717a; font-size: 13px; line-height: 1.6;">
-                                If you didn't request this verification code, you can safely ignore this email. Your account remains secure.
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background-color: #fafafa; padding: 24px 40px; border-top: 1px solid #e4e4e7;">
-                            <p style="margin: 0 0 8px 0; color: #a1a1aa; font-size: 12px; text-align: center;">
-                                This is an automated message from PRISM AI Studio.
-                            </p>
-                            <p style="margin: 0; color: #a1a1aa; font-size: 11px; text-align: center;">
-                                © 2026 PRISM AI. All rights reserved.
-                            </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-"""
-
-        plain_text = f"""
-PRISM AI - Email Verification
-
-Your verification code is: {otp}
-
-This code expires in 10 minutes. Do not share this code with anyone.
-
-If you didn't request this code, please ignore this email.
-
-© 2026 PRISM AI. All rights reserved.
-"""
-
-        # Create email message
-        msg = Mail(
-            from_email=Email(from_addr, "PRISM AI"),
-            to_emails=email,
-            subject="PRISM AI - Your Verification Code",
-            html_content=html_template,
-            plain_text_content=plain_text
-        )
+        # 🎨 PROFESSIONAL EMAIL TEMPLATE - pre-compiled in email_service
+        subject, html_template, plain_text = render_signup_otp_email(otp)
         
-        # Send via SendGrid
-        sg = SendGridAPIClient(api_key)
-        response = sg.send(msg)
+        # Send via the pooled transport (warm keep-alive connections)
+        await mail_transport.send(email, subject, html_template, text=plain_text, from_name="PRISM AI")
         
-        if 200 <= response.status_code < 300:
-            # ✅ Mark as sent to prevent duplicates (60 second cooldown)
-            await redis_client.set(rate_limit_key, "sent", ex=60)
-            
-            logger.info(f"✅ OTP email DELIVERED to {email} (Status: {response.status_code})")
-            print(f"✅ Email DELIVERED to {email} via SendGrid!")
-            return {"success": True, "message": f"Email sent to {email}"}
-        else:
-            logger.error(f"❌ SendGrid error: Status {response.status_code}")
-            return {"success": False, "error": f"SendGrid status {response.status_code}"}
+        # ✅ Mark as sent to prevent duplicates (60 second cooldown)
+        await redis_client.set(rate_limit_key, "sent", ex=60)
+        
+        logger.info(f"✅ OTP email DELIVERED to {email}")
+        print(f"✅ Email DELIVERED to {email} via SendGrid!")
+        return {"success": True, "message": f"Email sent to {email}"}
                 
     except Exception as e:
         logger.error(f"❌ Email send error: {e}")
         print(f"❌ Email failed: {e}")
         return {"success": False, "error": str(e)}
 
-@router.post("/verify-otp")
+@router.post("/verify-otp", dependencies=[Depends(email_rate_limit("auth_otp"))])
 async def verify_otp(payload: OTPVerify, response: Response, request: Request):
     """Verify OTP, complete user registration, and establish a login session."""
     try:
@@ -818,6 +726,7 @@ async def verify_otp(payload: OTPVerify, response: Response, request: Request):
                         "profile": {"name": "Super Admin"}
                     }
                     res = await users_collection.insert_one(admin_doc)
+                    await analytics_rollups.record_signup()
                     admin_user = await users_collection.find_one({"_id": res.inserted_id})
                 else:
                     # Ensure role is admin
@@ -924,6 +833,7 @@ async def verify_otp(payload: OTPVerify, response: Response, request: Request):
         # Insert the verified user into database
         insert_result = await users_collection.insert_one(final_user_doc)
         user_id = str(insert_result.inserted_id)
+        await analytics_rollups.record_signup()
         
         # Add user to global collection (preserved even after deletion)
         try:
@@ -992,7 +902,7 @@ async def verify_otp(payload: OTPVerify, response: Response, request: Request):
             detail="OTP verification failed"
         )
 
-@router.post("/forgot-password")
+@router.post("/forgot-password", dependencies=[Depends(email_rate_limit("auth_reset"))])
 async def forgot_password(payload: ForgotPasswordRequest, background_tasks: BackgroundTasks):
     """Send password reset OTP - Fast async response with background email"""
     try:
@@ -1029,7 +939,7 @@ async def forgot_password(payload: ForgotPasswordRequest, background_tasks: Back
         print(f"{'='*60}\n")
         
         # Queue email sending in background (non-blocking)
-        background_tasks.add_task(send_reset_email_sync, email, reset_otp)
+        background_tasks.add_task(send_reset_email, email, reset_otp)
         
         logger.info(f"Password reset initiated for {email}")
         return {"message": "If an account exists, a reset code will be sent."}
@@ -1038,116 +948,29 @@ async def forgot_password(payload: ForgotPasswordRequest, background_tasks: Back
         logger.error(f"Forgot password failed: {e}")
         return {"message": "If an account exists, a reset code will be sent."}
 
-def send_reset_email_sync(email: str, reset_otp: str):
-    """Send password reset email (synchronous for background task)"""
+async def send_reset_email(email: str, reset_otp: str):
+    """Send password reset email through the shared async mail transport"""
     try:
-        from_addr = getattr(settings, "SENDER_EMAIL", "") or getattr(settings, "MAIL_FROM", "")
-        api_key = getattr(settings, "SENDGRID_API_KEY", "")
+        from app.services.email_service import render_reset_email
+        from app.services.mail_transport import mail_transport
         
-        if not from_addr or not api_key:
+        from_addr = getattr(settings, "SENDER_EMAIL", "") or getattr(settings, "MAIL_FROM", "")
+        if not from_addr or not (settings.SENDGRID_API_KEY or settings.SMTP_HOST):
             logger.warning("Email sending disabled - missing configuration")
             return
         
-        html_content = f"""
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>PRISM AI - Password Reset</title>
-</head>
-<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f4f4f5;">
-    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background-color: #f4f4f5;">
-        <tr>
-            <td style="padding: 40px 20px;">
-                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 480px; margin: 0 auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 24px rgba(0, 0, 0, 0.08);">
-                    
-                    <!-- Header -->
-                    <tr>
-                        <td style="background: linear-gradient(135deg, #6366f1 0%, #8b5cf6 50%, #a855f7 100%); padding: 32px 40px; text-align: center;">
-                            <h1 style="margin: 0; color: #ffffff; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">PRISM AI</h1>
-                            <p style="margin: 8px 0 0 0; color: rgba(255, 255, 255, 0.9); font-size: 14px; font-weight: 400;">Password Reset Request</p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Body -->
-                    <tr>
-                        <td style="padding: 40px;">
-                            <h2 style="margin: 0 0 16px 0; color: #18181b; font-size: 20px; font-weight: 600;">Reset Your Password</h2>
-                            <p style="margin: 0 0 24px 0; color: #52525b; font-size: 15px; line-height: 1.6;">
-                                You've requested to reset your password. Use the verification code below to continue:
-                            </p>
-                            
-                            <!-- OTP Code Box -->
-                            <div style="background: linear-gradient(135deg, #f8fafc 0%, #f1f5f9 100%); border: 2px solid #e2e8f0; border-radius: 12px; padding: 24px; text-align: center; margin: 24px 0;">
-                                <p style="margin: 0 0 8px 0; color: #64748b; font-size: 12px; text-transform: uppercase; letter-spacing: 1px; font-weight: 600;">Your Reset Code</p>
-                                <div style="font-size: 36px; font-weight: 700; color: #6366f1; letter-spacing: 8px; font-family: 'SF Mono', Monaco, 'Cascadia Code', monospace;">{reset_otp}</div>
-                            </div>
-                            
-                            <!-- Expiry Notice -->
-                            <div style="background-color: #fef3c7; border-left: 4px solid #f59e0b; padding: 12px 16px; border-radius: 0 8px 8px 0; margin: 24px 0;">
-                                <p style="margin: 0; color: #92400e; font-size: 13px;">
-                                    <strong>⏱️ This code expires in 15 minutes.</strong> Do not share this code with anyone.
-                                </p>
-                            </div>
-                            
-                            <!-- Security Note -->
-                            <p style="margin: 24px 0 0 0; color: #71717a; font-size: 13px; line-height: 1.5;">
-                                If you didn't request this password reset, you can safely ignore this email. Your password will remain unchanged.
-                            </p>
-                        </td>
-                    </tr>
-                    
-                    <!-- Footer -->
-                    <tr>
-                        <td style="background-color: #f9fafb; padding: 20px 40px; border-top: 1px solid #e5e7eb;">
-                            <p style="margin: 0; color: #9ca3af; font-size: 12px; text-align: center;">
-                                Secured by PRISM AI • Your Personal AI Assistant
-                            </p>
-                        </td>
-                    </tr>
-                    
-                </table>
-            </td>
-        </tr>
-    </table>
-</body>
-</html>
-"""
-        
-        plain_text = f"""
-PRISM AI - Password Reset
-
-Your password reset code: {reset_otp}
-
-This code expires in 15 minutes.
-Do not share this code with anyone.
-
-If you didn't request this, please ignore this email.
-
-- PRISM AI Team
-"""
-        
-        msg = Mail(
-            from_email=from_addr,
-            to_emails=email,
-            subject="PRISM AI - Password Reset Code",
-            html_content=html_content,
-            plain_text_content=plain_text
-        )
-        
-        sg = SendGridAPIClient(api_key)
-        response = sg.send(msg)
-        logger.info(f"Password reset email sent to {email} (status: {response.status_code})")
+        subject, html_content, plain_text = render_reset_email(reset_otp)
+        await mail_transport.send(email, subject, html_content, text=plain_text)
+        logger.info(f"Password reset email sent to {email}")
         
     except Exception as e:
         logger.error(f"Failed to send reset email: {e}")
 
-async def send_reset_email(email: str, reset_otp: str):
-    """Send password reset email (async wrapper - kept for compatibility)"""
-    send_reset_email_sync(email, reset_otp)
+def send_reset_email_sync(email: str, reset_otp: str):
+    """Blocking wrapper (kept for compatibility with non-async callers)"""
+    asyncio.run(send_reset_email(email, reset_otp))
 
-@router.post("/verify-reset-otp")
+@router.post("/verify-reset-otp", dependencies=[Depends(email_rate_limit("auth_otp"))])
 async def verify_reset_otp(payload: VerifyResetOTPRequest):
     """Verify the password reset OTP"""
     try:
@@ -1201,7 +1024,7 @@ async def verify_reset_otp(payload: VerifyResetOTPRequest):
             detail="Verification failed"
         )
 
-@router.post("/reset-password")
+@router.post("/reset-password", dependencies=[Depends(email_rate_limit("auth_reset"))])
 async def reset_password(payload: ResetPasswordRequest):
     """Reset password after OTP verification"""
     try:
@@ -10,7 +10,7 @@ Using the exact architecture you specified:
 """
 
 import logging
-from fastapi import APIRouter, HTTPException, Query, Body, Depends
+from fastapi import APIRouter, HTTPException, Query, Body, Depends, Header, Response
 from fastapi.responses import StreamingResponse
 from app.models.chat_models import ChatRequest, ChatResponse
 from app.models.perfect_models import SendMessageRequest, CreateUserRequest
@@ -18,6 +18,7 @@ from app.models.perfect_models import SendMessageRequest, CreateUserRequest
 # from app.services.perfect_memory_pipeline import process_message, get_user_summary
 from app.db.mongo_client import users_collection, sessions_collection, mini_agents_collection
 from app.db.mongo_client import db
+from app.db.session_schema import canonical_fields, session_filter, user_sessions_filter
 
 # Get highlights collection
 highlights_collection = db.message_highlights
@@ -29,6 +30,7 @@ from app.services.main_brain import generate_response as main_brain_generate_res
 from pydantic import BaseModel, EmailStr
 from app.routers.auth import User
 from app.utils.auth import get_current_user_from_session
+from app.utils.rate_limiter import user_rate_limit
 from app.utils.timeout_utils import tracked_timeout, TimeoutConfig
 from app.utils.preprocess import preprocess as safe_preprocess
 from app.cognitive.router_engine import route_message
@@ -37,6 +39,13 @@ from app.db.mongo_client import tasks_collection
 from app.services.task_service import create_task
 from bson import ObjectId
 from app.services.email_queue_service import remove_scheduled_email, schedule_task_reminder
+from app.services.scheduler_service import notify_task_changed
+from app.services.analytics_rollups import analytics_rollups
+from app.services.session_loader import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, bump_session_version, embed_highlights, etag_matches,
+    format_highlight, format_mini_agent, group_mini_agent_messages, make_etag, session_header,
+    session_loader, session_version,
+)
 logger = logging.getLogger(__name__)
 logger = logging.getLogger(__name__)
 
@@ -81,9 +90,8 @@ async def create_new_chat(
         print(f"🆕 Creating new session: {session_id} for user: {user_id}")
 
         new_session = {
-            "chat_id": session_id,
+            **canonical_fields(session_id, user_id),
             "sessionId": session_id,  # Also store as sessionId for compatibility
-            "user_id": user_id,
             "userId": user_id,  # Also store as userId for compatibility
             "title": request.title or "New Chat",
             "messages": [],
@@ -101,6 +109,7 @@ async def create_new_chat(
         if not result.inserted_id:
             print(f"❌ Failed to insert session {session_id} into MongoDB")
             raise HTTPException(status_code=500, detail="Failed to create chat session in database")
+        await analytics_rollups.record_session()
         
         print(f"✅ Session {session_id} stored in MongoDB with ID: {result.inserted_id}")
         
@@ -147,12 +156,10 @@ async def rename_chat_title(
         user_id = ObjectId(current_user.user_id)
         # Find and update
         result = await sessions_collection.update_one(
-            {
-                "$or": [{"chat_id": chat_id}, {"sessionId": chat_id}],
-                "user_id": user_id
-            },
+            session_filter(chat_id, user_id),
             {"$set": {"title": request.title, "updated_at": datetime.utcnow()}}
         )
+        await bump_session_version(chat_id)
         
         if result.modified_count == 0 and result.matched_count == 0:
              raise HTTPException(status_code=404, detail="Chat not found or unauthorized")
@@ -172,12 +179,10 @@ async def pin_chat_session(
     try:
         user_id = ObjectId(current_user.user_id)
         result = await sessions_collection.update_one(
-            {
-                "$or": [{"chat_id": chat_id}, {"sessionId": chat_id}],
-                "user_id": user_id
-            },
+            session_filter(chat_id, user_id),
             {"$set": {"isPinned": request.isPinned, "updated_at": datetime.utcnow()}}
         )
+        await bump_session_version(chat_id)
         if result.matched_count == 0:
              raise HTTPException(status_code=404, detail="Chat not found")
         return {"status": "success", "isPinned": request.isPinned}
@@ -194,12 +199,10 @@ async def save_chat_session(
     try:
         user_id = ObjectId(current_user.user_id)
         result = await sessions_collection.update_one(
-            {
-                "$or": [{"chat_id": chat_id}, {"sessionId": chat_id}],
-                "user_id": user_id
-            },
+            session_filter(chat_id, user_id),
             {"$set": {"isSaved": request.isSaved, "updated_at": datetime.utcnow()}}
         )
+        await bump_session_version(chat_id)
         if result.matched_count == 0:
              raise HTTPException(status_code=404, detail="Chat not found")
         return {"status": "success", "isSaved": request.isSaved}
@@ -403,7 +406,7 @@ async def get_user_chats(
         
         # Query: Filter by userId AND not deleted
         query = {
-            "$or": [{"user_id": user_id}, {"userId": user_id}],
+            **user_sessions_filter(user_id),
             "isDeleted": {"$ne": True}
         }
         
@@ -464,12 +467,7 @@ async def get_chat_history(
     """
     user_id = ObjectId(current_user.user_id)
     # Support both chat_id and sessionId field names
-    session = await sessions_collection.find_one({
-        "$and": [
-            {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-            {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-        ]
-    })
+    session = await sessions_collection.find_one(session_filter(chat_id, user_id))
 
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
@@ -486,16 +484,24 @@ async def get_chat_history(
 @router.get("/{chat_id}/data")
 async def get_session_data(
     chat_id: str,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user_from_session)
 ):
     """
     ⚡ AGGREGATED SESSION DATALOADER
     Fetches Messages, Highlights, and Mini Agents in ONE parallel call.
     Drastically reduces frontend load time and network requests.
+    Answers 304 while the session version is unchanged; long conversations
+    should use /{chat_id}/data/page instead.
     """
     try:
         user_id = ObjectId(current_user.user_id)
-        
+
+        etag = make_etag(await session_version(chat_id), current_user.user_id, chat_id, "all")
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
         # Define collections
         # highlights_collection is already imported
         mini_agent_threads_coll = db.mini_agent_threads
@@ -503,12 +509,7 @@ async def get_session_data(
 
         # Define tasks for parallel execution
         async def fetch_session():
-            return await sessions_collection.find_one({
-                "$and": [
-                    {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-                    {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-                ]
-            })
+            return await sessions_collection.find_one(session_filter(chat_id, user_id))
 
         async def fetch_highlights():
             return await highlights_collection.find({
@@ -542,104 +543,28 @@ async def get_session_data(
                 {"_id": 0}
             ).sort("createdAt", 1).to_list(length=None)
 
-        # Group messages by threadId
-        messages_by_thread = {}
-        for msg in mini_agent_messages:
-            tid = msg.get("threadId")
-            if tid not in messages_by_thread:
-                messages_by_thread[tid] = []
-            
-            # Normalize message
-            created_at = msg.get("createdAt")
-            if isinstance(created_at, datetime):
-                created_at = created_at.isoformat()
-
-            normalized_msg = {
-                "id": msg.get("id", f"msg_{tid}_{len(messages_by_thread[tid])}"),
-                "role": msg.get("role", msg.get("sender", "assistant")).replace("ai", "assistant"),
-                "content": msg.get("content", msg.get("text", "")),
-                "timestamp": created_at
-            }
-            if not normalized_msg["content"]: 
-                normalized_msg["content"] = "[Content unavailable]"
-                
-            messages_by_thread[tid].append(normalized_msg)
-
-        # Format Highlights
-        formatted_highlights = []
-        for h in highlights:
-            created_at = h.get("createdAt")
-            if isinstance(created_at, datetime):
-                created_at = created_at.isoformat()
-
-            formatted_highlights.append({
-                "highlightId": h.get("highlightId"),
-                "messageId": h.get("messageId"),
-                "text": h.get("text"),
-                "color": h.get("color"),
-                "startOffset": h.get("startIndex"),
-                "endOffset": h.get("endIndex"),
-                "note": h.get("note"),
-                "createdAt": created_at
-            })
-
-        # Format Mini Agents (Attach messages)
-        formatted_mini_agents = []
-        for agent in threads:
-            agent_id = agent.get("id")
-            msgs = messages_by_thread.get(agent_id, [])
-            created_at = agent.get("createdAt")
-            if isinstance(created_at, datetime):
-                created_at = created_at.isoformat()
-            
-            formatted_mini_agents.append({
-                "agentId": agent_id,
-                "messageId": agent.get("messageId"),
-                "selectedText": agent.get("selectedText"),
-                "messages": msgs,
-                "hasConversation": len(msgs) > 0,
-                "createdAt": created_at,
-                "sessionId": agent.get("sessionId")
-            })
+        # Group messages by threadId, format highlights and mini agents
+        messages_by_thread = group_mini_agent_messages(mini_agent_messages)
+        formatted_highlights = [format_highlight(h) for h in highlights]
+        formatted_mini_agents = [
+            format_mini_agent(agent, messages_by_thread.get(agent.get("id"), []))
+            for agent in threads
+        ]
 
         # 🚀 EMBED HIGHLIGHTS INTO MESSAGES (Frontend Requirement)
         session_messages = session.get("messages", [])
-        
-        # Create a map of messageId -> highlights list
-        highlights_by_message = {}
-        for h in formatted_highlights:
-            mid = h.get("messageId")
-            if mid:
-                if mid not in highlights_by_message:
-                    highlights_by_message[mid] = []
-                highlights_by_message[mid].append(h)
-        
-        # Attach highlights to messages
-        for msg in session_messages:
-            # Handle various ID fields (id, message_id)
-            msg_id = msg.get("id") or msg.get("message_id")
-            if msg_id and msg_id in highlights_by_message:
-                msg["highlights"] = highlights_by_message[msg_id]
-            else:
-                msg["highlights"] = []
+        embed_highlights(session_messages, formatted_highlights)
 
-        # Serialize session timestamps
-        session_updated = session.get("updated_at")
-        if isinstance(session_updated, datetime):
-            session_updated = session_updated.isoformat()
-
-        return {
-            "session": {
-                "id": chat_id,
-                "title": session.get("title", "New Chat"),
-                "updated_at": session_updated,
-                "isPinned": session.get("isPinned", False),
-                "isSaved": session.get("isSaved", False)
-            },
+        body = {
+            "session": session_header(chat_id, session),
             "messages": session_messages, # Includes embedded highlights
             "highlights": formatted_highlights, # Kept for backward compatibility
             "miniAgents": formatted_mini_agents
         }
+        if etag:
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "private, no-cache"
+        return body
 
     except HTTPException:
         raise
@@ -649,6 +574,40 @@ async def get_session_data(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Failed to fetch session data: {str(e)}")
 
+@router.get("/{chat_id}/data/page")
+async def get_session_data_page(
+    chat_id: str,
+    response: Response,
+    before: Optional[int] = Query(None, ge=0, description="Cursor: index of the oldest message already loaded"),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user_from_session)
+):
+    """
+    📄 PAGINATED SESSION DATALOADER
+    Latest `limit` messages first; pass page.before back as `before` to load
+    older ones on scroll. Highlights and mini agents cover the page only.
+    """
+    try:
+        etag = make_etag(await session_version(chat_id), current_user.user_id, chat_id, before, limit)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+        page = await session_loader.load_page(chat_id, ObjectId(current_user.user_id), before, limit)
+        if page is None:
+            raise HTTPException(status_code=404, detail="Chat session not found")
+
+        if etag:
+            response.headers["ETag"] = etag
+            response.headers["Cache-Control"] = "private, no-cache"
+        return page
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Error fetching session page: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch session data: {str(e)}")
+
 @router.delete("/{chat_id}", status_code=200)
 async def delete_chat(chat_id: str, current_user: User = Depends(get_current_user_from_session)):
     """
@@ -660,23 +619,14 @@ async def delete_chat(chat_id: str, current_user: User = Depends(get_current_use
     user_id = ObjectId(current_user.user_id)
     
     # First verify the session exists and belongs to user
-    session = await sessions_collection.find_one({
-        "$and": [
-            {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-            {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-        ]
-    })
+    session = await sessions_collection.find_one(session_filter(chat_id, user_id))
     
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
     # Hard delete - remove completely from MongoDB
-    result = await sessions_collection.delete_one({
-        "$and": [
-            {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-            {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-        ]
-    })
+    result = await sessions_collection.delete_one(session_filter(chat_id, user_id))
+    await bump_session_version(chat_id)
 
     if result.deleted_count == 0:
         raise HTTPException(status_code=500, detail="Failed to delete chat session")
@@ -697,12 +647,7 @@ async def rename_chat(
     """
     user_id = ObjectId(current_user.user_id)
     result = await sessions_collection.update_one(
-        {
-            "$and": [
-                {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-                {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-            ]
-        },
+        session_filter(chat_id, user_id),
         {
             "$set": {
                 "title": request.title,
@@ -711,6 +656,7 @@ async def rename_chat(
             }
         }
     )
+    await bump_session_version(chat_id)
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Chat session not found")
@@ -729,12 +675,7 @@ async def pin_chat(
     """
     user_id = ObjectId(current_user.user_id)
     result = await sessions_collection.update_one(
-        {
-            "$and": [
-                {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-                {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-            ]
-        },
+        session_filter(chat_id, user_id),
         {
             "$set": {
                 "isPinned": request.isPinned,
@@ -743,6 +684,7 @@ async def pin_chat(
             }
         }
     )
+    await bump_session_version(chat_id)
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Chat session not found")
@@ -761,12 +703,7 @@ async def save_chat(
     """
     user_id = ObjectId(current_user.user_id)
     result = await sessions_collection.update_one(
-        {
-            "$and": [
-                {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-                {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-            ]
-        },
+        session_filter(chat_id, user_id),
         {
             "$set": {
                 "isSaved": request.isSaved,
@@ -775,13 +712,14 @@ async def save_chat(
             }
         }
     )
+    await bump_session_version(chat_id)
 
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Chat session not found")
 
     return {"message": "Chat save status updated", "isSaved": request.isSaved}
 
-@router.post("/message")
+@router.post("/message", dependencies=[Depends(user_rate_limit("chat_send"))])
 async def send_message(
     request: MessageRequest,
     current_user: User = Depends(get_current_user_from_session)
@@ -791,12 +729,7 @@ async def send_message(
     # Support both chat_id and sessionId field names
     # ⏱️ FAIL FAST: 300ms timeout for MongoDB session lookup
     session = await tracked_timeout(
-        sessions_collection.find_one({
-            "$and": [
-                {"$or": [{"chat_id": request.chatId}, {"sessionId": request.chatId}]},
-                {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-            ]
-        }),
+        sessions_collection.find_one(session_filter(request.chatId, user_id)),
         timeout_ms=TimeoutConfig.MONGODB_FIND,
         service_name="MongoDB FIND (session)",
         fallback=None
@@ -835,6 +768,7 @@ async def send_message(
         service_name="MongoDB UPDATE (user message)",
         fallback=None
     )
+    await bump_session_version(request.chatId)
 
     # Cognitive routing payload (for executor/LLM grounding)
     routing = await route_message(str(user_id), request.chatId, _raw_text)
@@ -868,10 +802,11 @@ async def send_message(
         service_name="MongoDB UPDATE (AI message)",
         fallback=None
     )
+    await bump_session_version(request.chatId)
 
     return {"response": ai_response_content, "message_id": ai_message["id"], "timestamp": ai_message["timestamp"], "routing": routing_payload}
 
-@router.post("/message/stream")
+@router.post("/message/stream", dependencies=[Depends(user_rate_limit("chat_send"))])
 async def send_message_stream(
     request: MessageRequest,
     current_user: User = Depends(get_current_user_from_session)
@@ -916,12 +851,7 @@ async def send_message_stream(
     # Find session
     # ⏱️ FAIL FAST: 300ms timeout for MongoDB session lookup
     session = await tracked_timeout(
-        sessions_collection.find_one({
-            "$and": [
-                {"$or": [{"chat_id": request.chatId}, {"sessionId": request.chatId}]},
-                {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-            ]
-        }),
+        sessions_collection.find_one(session_filter(request.chatId, user_id)),
         timeout_ms=TimeoutConfig.MONGODB_FIND,
         service_name="MongoDB FIND (session stream)",
         fallback=None
@@ -963,6 +893,7 @@ async def send_message_stream(
         service_name="MongoDB UPDATE (user message stream)",
         fallback=None
     )
+    await bump_session_version(request.chatId)
     logger.info(f"✅ [Step] User message persisted to MongoDB")
     
     # ✅ STEP 1.5: Save user message to Redis history for recall (CRITICAL)
@@ -1140,6 +1071,7 @@ async def send_message_stream(
                             {"_id": obj_id, "userId": str(user_id)},
                             {"$set": {"status": "canceled", "updated_at": datetime.utcnow()}}
                         )
+                        notify_task_changed(obj_id, status="canceled")
                         try:
                             await remove_scheduled_email(str(obj_id))
                         except Exception:
@@ -1183,6 +1115,7 @@ async def send_message_stream(
                             {"_id": obj_id, "userId": str(user_id)},
                             {"$set": {"due_date": aware_utc, "updated_at": _dt.datetime.now(_dt.timezone.utc)}}
                         )
+                        notify_task_changed(obj_id, aware_utc)
                         # Reschedule email job: remove then add
                         try:
                             await remove_scheduled_email(str(obj_id))
@@ -1451,6 +1384,7 @@ async def send_message_stream(
                                      {"_id": session["_id"]},
                                      {"$set": {"title": new_title}}
                                 )
+                                await bump_session_version(request.chatId)
                                 yield f"event: title\ndata: {json.dumps({'title': new_title})}\n\n"
                                 logger.info(f"✅ [Step] Auto-renamed chat to: {new_title}")
                     except Exception as e:
@@ -1490,6 +1424,7 @@ async def send_message_stream(
                                         {"_id": session["_id"]},
                                         {"$set": {"title": new_title}}
                                 )
+                                await bump_session_version(request.chatId)
                                 yield f"event: title\ndata: {json.dumps({'title': new_title})}\n\n"
                     except Exception as e:
                         logger.warning(f"⚠️ Title generation failed: {e}") 
@@ -1527,6 +1462,7 @@ async def send_message_stream(
                     }
                 }
             )
+            await bump_session_version(request.chatId)
             logger.info(f"✅ [Step] AI response persisted to MongoDB")
             
             # ✅ STEP 4.5: Save to Redis history for recall (CRITICAL for conversation history)
@@ -2258,6 +2194,7 @@ async def delete_session(session_id: str, user_id: str):
             "sessionId": session_id,
             "userId": ObjectId(user_id)  # CRITICAL: Verify ownership
         })
+        await bump_session_version(session_id)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Session not found or access denied")
@@ -2478,6 +2415,7 @@ async def delete_session(session_id: str, user_id: str):
         {"sessionId": session_id, "user_id": user_id},
         {"$set": {"isActive": False, "deletedAt": datetime.utcnow()}}
     )
+    await bump_session_version(session_id)
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Session not found")
@@ -2532,6 +2470,7 @@ async def create_highlight(
         }
         
         await highlights_collection.insert_one(highlight)
+        await bump_session_version(request.sessionId)
         
         # 🗑️ Invalidate cache after creating highlight
         await cache_service.invalidate_highlights(request.sessionId)
@@ -2628,6 +2567,7 @@ async def delete_highlight(
             "highlightId": highlight_id,
             "$or": [{"userId": user_id}, {"user_id": user_id}]
         })
+        await bump_session_version(session_id)
         
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Highlight not found")
@@ -2666,6 +2606,9 @@ async def update_highlight_note(
         
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Highlight not found")
+
+        highlight = await highlights_collection.find_one({"highlightId": highlight_id}, {"sessionId": 1})
+        await bump_session_version((highlight or {}).get("sessionId"))
         
         return {"status": "updated", "highlightId": highlight_id, "note": note}
     except HTTPException:
@@ -2763,12 +2706,7 @@ async def create_mini_agent(
         print(f"✨ Creating NEW Mini Agent: {agent_id} for message: {message_id}")
         
         # Verify session belongs to user (security check)
-        session = await sessions_collection.find_one({
-            "$and": [
-                {"$or": [{"chat_id": session_id}, {"sessionId": session_id}]},
-                {"$or": [{"user_id": user_id}, {"userId": user_id}]}
-            ]
-        })
+        session = await sessions_collection.find_one(session_filter(session_id, user_id))
         
         if not session:
             raise HTTPException(status_code=404, detail="Session not found or unauthorized")
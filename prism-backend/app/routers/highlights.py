@@ -2,10 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import List
 from datetime import datetime
 import asyncio
-import hashlib
 import json
 import logging
-import re
 from app.models.highlight_models import (
     HighlightData, 
     CreateHighlightRequest, 
@@ -20,6 +18,9 @@ from app.models.highlight_models import (
     UpdateMiniAgentSnippetRequest
 )
 from app.db.mongo_client import get_database
+from app.services.mini_agent_cache import get_cache_ttl, mini_agent_cache
+from app.services.rendered_text_index import CLEAN_RULES, MARKDOWN_RULES, apply_rules, rendered_text_index
+from app.services.session_loader import bump_session_version
 from app.utils.llm_client import get_llm_client, get_llm_response
 from app.utils.auth import get_current_user_from_session
 
@@ -37,40 +38,18 @@ def strip_markdown(content: str) -> str:
     This matches what the user sees in the DOM after markdown rendering.
     
     IMPORTANT: Must stay in sync with Frontend/src/lib/semanticHighlight.tsx
+    (the rules live in rendered_text_index.MARKDOWN_RULES)
     """
     if not content:
         return ""
-    stripped = content
-    
-    # 1. Remove bold markers **text** → text
-    stripped = re.sub(r'\*\*([^*]+)\*\*', r'\1', stripped)
-    # 2. Remove italic markers *text* or _text_ → text
-    stripped = re.sub(r'(?<!\*)\*([^*]+)\*(?!\*)', r'\1', stripped)
-    stripped = re.sub(r'_([^_]+)_', r'\1', stripped)
-    # 3. Remove inline code backticks `code` → code
-    stripped = re.sub(r'`([^`]+)`', r'\1', stripped)
-    # 4. Remove strikethrough ~~text~~ → text
-    stripped = re.sub(r'~~([^~]+)~~', r'\1', stripped)
-    # 5. Remove headers # ## ### etc (keep the text)
-    stripped = re.sub(r'^#{1,6}\s+', '', stripped, flags=re.MULTILINE)
-    # 6. Remove link syntax [text](url) → text
-    stripped = re.sub(r'\[([^\]]+)\]\([^)]+\)', r'\1', stripped)
-    
-    return stripped
+    return apply_rules(content, MARKDOWN_RULES)
 
 
 def clean_message_content(content: str) -> str:
     """Remove internal metadata from message content."""
     if not content:
         return ""
-    clean = content
-    
-    # Remove THINKING_DATA blocks
-    clean = re.sub(r'<!--\s*THINKING_DATA:.*?-->', '', clean, flags=re.DOTALL)
-    # Remove ACTION blocks
-    clean = re.sub(r'<!--\s*ACTION:.*?-->', '', clean, flags=re.DOTALL)
-    
-    return clean.strip()
+    return apply_rules(content, CLEAN_RULES).strip()
 
 
 def get_rendered_text(content: str) -> str:
@@ -380,44 +359,6 @@ Always suggest related learning:
 - ❌ Never: "Feel free to ask" (robotic)
 """
 
-def generate_cache_key(snippet: str, question: str) -> str:
-    """Generate consistent cache key from snippet + question"""
-    snippet_normalized = snippet[:100].strip().lower()
-    question_normalized = question.strip().lower()
-    
-    snippet_hash = hashlib.md5(snippet_normalized.encode()).hexdigest()[:12]
-    question_hash = hashlib.md5(question_normalized.encode()).hexdigest()[:12]
-    
-    return f"MINI_CACHE:{snippet_hash}:{question_hash}"
-
-def classify_question_type(question: str) -> str:
-    """Classify question to determine cache TTL"""
-    lower_q = question.lower().strip()
-    
-    # Definition questions - cache longest (24 hours)
-    if any(word in lower_q for word in ['what is', 'what does', 'define', 'meaning of', 'means']):
-        return 'definition'
-    
-    # Clarification questions - cache medium (1 hour)
-    if any(word in lower_q for word in ['why', 'how', 'can you', 'could you']):
-        return 'clarification'
-    
-    # Example questions - cache shortest (30 minutes)
-    if any(word in lower_q for word in ['example', 'instance', 'show me']):
-        return 'example'
-    
-    return 'general'
-
-def get_cache_ttl(question_type: str) -> int:
-    """Get cache TTL based on question type"""
-    ttl_map = {
-        'definition': 24 * 3600,  # 24 hours
-        'clarification': 1 * 3600,  # 1 hour
-        'example': 30 * 60,  # 30 minutes
-        'general': 1 * 3600  # 1 hour
-    }
-    return ttl_map.get(question_type, 3600)
-
 # =====================================================
 
 def generate_highlight_id(session_id: str, message_id: str, start_index: int, end_index: int) -> str:
@@ -472,7 +413,9 @@ async def create_highlight(request: CreateHighlightRequest):
         
         # 🔧 USE RENDERED TEXT (markdown stripped) for validation
         # This is critical: DOM selection offsets are based on what user SEES (no markdown syntax)
-        rendered_text = get_rendered_text(request.messageText)
+        # Precomputed at finalize time for assistant messages (cached by content hash)
+        rendered_index = await rendered_text_index.get(request.messageText)
+        rendered_text = rendered_index.text
         message_length = len(rendered_text)
         
         logger.info(f"🔍 Highlight validation: rendered_length={message_length}, original_length={len(request.messageText)}")
@@ -551,8 +494,9 @@ async def create_highlight(request: CreateHighlightRequest):
         request.endIndex = final_end
         logger.info(f"✅ Validated highlight: '{request.text[:30]}...' at [{final_start}:{final_end}]")
         
-        # 5. Generate message hash for drift detection (use rendered text for consistency)
-        message_hash = hashlib.sha256(rendered_text.encode('utf-8')).hexdigest()
+        # 5. Message hash for drift detection (sha256 of the rendered text, from the index)
+        message_hash = rendered_index.message_hash
+        raw_start, raw_end = rendered_index.raw_span(request.startIndex, request.endIndex)
         
         # ============================================
         # 🔑 ID GENERATION & DUPLICATE CHECK
@@ -589,6 +533,10 @@ async def create_highlight(request: CreateHighlightRequest):
         }).to_list(length=None)
         
         for existing_h in message_highlights:
+            # Offsets of a highlight made on a drifted version are not comparable
+            if existing_h.get("messageHash") not in (None, message_hash):
+                continue
+
             # Check if ranges overlap
             existing_start = existing_h.get("startIndex", 0)
             existing_end = existing_h.get("endIndex", 0)
@@ -629,6 +577,8 @@ async def create_highlight(request: CreateHighlightRequest):
             "messageId": request.messageId,
             "startIndex": request.startIndex,
             "endIndex": request.endIndex,
+            "rawStartIndex": raw_start,  # Position in the stored markdown
+            "rawEndIndex": raw_end,
             "color": request.color,
             "text": request.text.strip(),
             "messageHash": message_hash,  # ✅ NEW: Drift detection
@@ -795,6 +745,7 @@ async def create_mini_agent_thread(
                     {"_id": existing_thread["_id"]}, # Use _id for safe update
                     {"$set": {"selectedText": request.selectedText}}
                 )
+                await bump_session_version(request.sessionId)
                 logger.info(f"📝 Updated snippet for thread: {thread_id}")
             
             # Load messages
@@ -859,6 +810,7 @@ async def create_mini_agent_thread(
         result = await mini_agents_collection.insert_one(thread_data)
         
         if result.inserted_id:
+            await bump_session_version(request.sessionId)
             # Clean up response
             if "_id" in thread_data:
                 del thread_data["_id"]
@@ -1012,11 +964,12 @@ async def delete_mini_agent_thread(thread_id: str):
         messages_collection = db.mini_agent_messages
         
         # Delete thread
-        result = await mini_agents_collection.delete_one({"id": thread_id})
+        thread = await mini_agents_collection.find_one_and_delete({"id": thread_id}, projection={"sessionId": 1})
         
-        if result.deleted_count > 0:
+        if thread:
             # Delete associated messages
             await messages_collection.delete_many({"threadId": thread_id})
+            await bump_session_version(thread.get("sessionId"))
             return {"success": True}
         else:
             raise HTTPException(status_code=404, detail="Mini-agent thread not found")
@@ -1031,12 +984,14 @@ async def update_mini_agent_snippet(thread_id: str, request: UpdateMiniAgentSnip
         db = get_database()
         mini_agents_collection = db.mini_agent_threads
         
-        result = await mini_agents_collection.update_one(
+        thread = await mini_agents_collection.find_one_and_update(
             {"id": thread_id},
-            {"$set": {"selectedText": request.selectedText}}
+            {"$set": {"selectedText": request.selectedText}},
+            projection={"sessionId": 1}
         )
         
-        if result.matched_count > 0:
+        if thread:
+            await bump_session_version(thread.get("sessionId"))
             return {"success": True}
         else:
             raise HTTPException(status_code=404, detail="Mini-agent thread not found")
@@ -1070,20 +1025,15 @@ async def add_mini_agent_message(thread_id: str, request: AddMiniAgentMessageReq
         user_id = thread.get("sessionId")
         
         # ✅ STEP 2: Check cache FIRST (instant response if hit)
-        from app.db.redis_client import redis_client, format_mini_agent_history, store_mini_agent_context
-        
-        cache_key = generate_cache_key(snippet_text, request.text)
+        from app.db.redis_client import format_mini_agent_history, store_mini_agent_context
         
-        # Check cache in parallel with history fetch
-        cache_task = redis_client.get(cache_key)
-        history_task = format_mini_agent_history(user_id, message_id) if (user_id and message_id) else None
+        conversation_history = ""
+        if user_id and message_id:
+            conversation_history = await format_mini_agent_history(user_id, message_id)
         
-        # Parallel execution
-        if history_task:
-            cached_response, conversation_history = await asyncio.gather(cache_task, history_task)
-        else:
-            cached_response = await cache_task
-            conversation_history = ""
+        # Canonical question -> exact key, then nearest paraphrase for this snippet
+        follow_up = bool(conversation_history)
+        cached_response = await mini_agent_cache.get(snippet_text, request.text, follow_up=follow_up)
         
         # CACHE HIT - Return immediately (no LLM call needed!)
         if cached_response:
@@ -1126,12 +1076,12 @@ async def add_mini_agent_message(thread_id: str, request: AddMiniAgentMessageReq
                 else:
                     ai_response_text = "Could you provide more context or rephrase your question?"
             
-            # ✅ STEP 5: Cache the response
-            question_type = classify_question_type(request.text)
-            cache_ttl = get_cache_ttl(question_type)
-            
-            await redis_client.setex(cache_key, cache_ttl, ai_response_text)
-            logger.info(f"💾 Cached response ({question_type}) for {cache_ttl}s")
+            # ✅ STEP 5: Cache the response (not follow-ups: they answer this thread's history)
+            question_type = await mini_agent_cache.put(
+                snippet_text, request.text, ai_response_text, follow_up=follow_up
+            )
+            if question_type:
+                logger.info(f"💾 Cached response ({question_type}) for {get_cache_ttl(question_type)}s")
         
         # ✅ STEP 6: Prepare messages for database
         timestamp = datetime.utcnow()
@@ -1174,6 +1124,7 @@ async def add_mini_agent_message(thread_id: str, request: AddMiniAgentMessageReq
             result, _ = await asyncio.gather(insert_task, context_task)
         else:
             result = await insert_task
+        await bump_session_version(thread.get("sessionId"))
         
         # Get inserted IDs
         inserted_ids = result.inserted_ids if hasattr(result, 'inserted_ids') else []
@@ -22,12 +22,12 @@ from app.services.generation_manager import GenerationManager, GenerationState
 from app.services.input_validator import InputValidator, default_validator
 from app.db.mongo_client import get_database
 from app.utils.auth import get_current_user_from_session
+from app.utils.rate_limiter import user_rate_limit
 from app.db.redis_client import get_redis_client
 from app.services.main_brain import generate_response_stream
+from app.utils.tracing import NOOP_SPAN, tracer, traced
 from app.models.chat_models import MessageRole
 from app.routers.api_keys import (
-    increment_free_usage,
-    increment_user_key_usage,
     get_api_key_for_user,
     handle_key_exhaustion,
     get_current_key_id_for_user,
@@ -89,6 +89,7 @@ class FinalizeRequest(BaseModel):
 
 
 @router.post("/chat/{chat_id}/finalize/{generation_id}")
+@traced("streaming.finalize")
 async def finalize_generation(
     chat_id: str,
     generation_id: str,
@@ -100,38 +101,26 @@ async def finalize_generation(
     Finalize and persist a completed generation.
     Safe, idempotent, and reload-proof.
     
-    🚀 OPTIMIZED V2: Parallel operations for faster response
+    🚀 OPTIMIZED V3: One ledger claim + one stream append; the finalize
+    queue persists the messages and runs the follow-up jobs.
     """
-    from app.db.mongo_client import sessions_collection
-    from bson import ObjectId
+    from app.utils.idempotency import FinalizeLedger
+    from app.services.finalize_queue import finalize_queue
     import uuid
-    
-    try:
-        mongo_user_id = ObjectId(user_id)
-    except:
-        mongo_user_id = user_id
 
-    # 🚀 PARALLEL: Check idempotency AND fetch state simultaneously
-    existing_msg_task = sessions_collection.find_one(
-        {
-            "$and": [
-                {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-                {"$or": [{"user_id": mongo_user_id}, {"userId": user_id}]},
-                {"messages.generation_id": generation_id}
-            ]
-        },
-        {"_id": 1}
+    # 🚀 PARALLEL: Claim the generation (O(1) ledger lookup) AND fetch state simultaneously
+    claim, state = await asyncio.gather(
+        FinalizeLedger.claim(generation_id, chat_id, user_id),
+        gen_manager.get_generation(generation_id)
     )
-    state_task = gen_manager.get_generation(generation_id)
     
-    existing_msg, state = await asyncio.gather(existing_msg_task, state_task)
-    
-    if existing_msg:
-        logger.info(f"✅ Generation {generation_id} already persisted. Returning 200 OK (Idempotent).")
-        asyncio.create_task(gen_manager.cleanup(generation_id))  # Fire-and-forget
+    if claim != "claimed":
+        logger.info(f"✅ Generation {generation_id} {'already persisted' if claim == 'done' else 'being finalized by another request'}. Returning 200 OK (Idempotent).")
+        if claim == "done":
+            asyncio.create_task(gen_manager.cleanup(generation_id))  # Fire-and-forget
         return {
             "status": "ok",
-            "message": "Already finalized",
+            "message": "Already finalized" if claim == "done" else "Finalize in progress",
             "generation_id": generation_id
         }
     
@@ -140,6 +129,7 @@ async def finalize_generation(
     # Don't error, just assume success.
     if not state:
         logger.info(f"⚠️ Finalize called for missing generation {generation_id}. Assuming already cleaned/done. Returning 200 OK.")
+        await FinalizeLedger.release(generation_id)
         return {
             "status": "ok",
             "message": "Generation not found (likely already cleaned)",
@@ -148,6 +138,7 @@ async def finalize_generation(
     
     # 4. Verify Ownership (Security)
     if state.user_id != user_id:
+        await FinalizeLedger.release(generation_id)
         raise HTTPException(status_code=403, detail="Unauthorized")
 
     # 5. Handle Statuses
@@ -156,6 +147,7 @@ async def finalize_generation(
     # If already cancelled, failed, or unknown -> return 200 OK
     if state.status in ["cancelled", "failed", "cleaned"]:
         logger.info(f"Generation {generation_id} is {state.status}. Skipping persistence.")
+        await FinalizeLedger.release(generation_id)
         asyncio.create_task(gen_manager.cleanup(generation_id))
         return {
             "status": "ok",
@@ -174,6 +166,7 @@ async def finalize_generation(
     if not final_content:
         logger.warning(f"Finalize called without content for {generation_id}. Marking complete without saving messages.")
         await gen_manager.update_status(generation_id, "completed")
+        await FinalizeLedger.release(generation_id)
         asyncio.create_task(gen_manager.cleanup(generation_id))
         return {
              "status": "ok", 
@@ -181,7 +174,8 @@ async def finalize_generation(
              "generation_id": generation_id
         }
 
-    # 6. Persist to MongoDB (The Real Work)
+    # 6. Queue for persistence (The Real Work)
+    queued = False
     try:
         now_utc = datetime.utcnow()
         now_iso = now_utc.isoformat()
@@ -214,116 +208,30 @@ async def finalize_generation(
             "chunks_sent": state.chunks_sent
         }
         
-        # Atomic Push
-        result = await sessions_collection.update_one(
-            {
-                "$and": [
-                    {"$or": [{"chat_id": chat_id}, {"sessionId": chat_id}]},
-                    {"$or": [{"user_id": mongo_user_id}, {"userId": user_id}]}
-                ]
+        # Write-behind: one XADD, the finalize queue consumer does the $push
+        # and the follow-up jobs (once per generation: we hold the ledger claim)
+        await finalize_queue.enqueue(
+            chat_id=chat_id,
+            user_id=user_id,
+            generation_id=generation_id,
+            messages=[user_message_doc, assistant_message_doc],
+            jobs={
+                "commit_usage": {"key_source": state.key_source, "key_id": state.key_id},
+                "cleanup_generation": True,
+                "auto_rename": {"prompt": state.prompt, "response": final_content},
             },
-            {
-                "$push": {
-                    "messages": {
-                        "$each": [user_message_doc, assistant_message_doc]
-                    }
-                },
-                "$set": {
-                    "updated_at": now_utc,
-                    "updatedAt": now_utc
-                }
-            }
         )
+        queued = True
+        await FinalizeLedger.mark_done(generation_id)
         
-        if result.matched_count == 0:
-            # Session lost?
-            logger.warning(f"Session {chat_id} not found during finalize. Msg not saved.")
-            # Don't error, just return OK. It's not the client's fault session is gone.
-            return {"status": "ok", "message": "Session not found, but accepted"}
-
-        # 7. � SINGLE-SHOT Usage Tracking (prevents double counting)
-        async def commit_usage_once():
-            """
-            Commit usage exactly ONCE per generation_id.
-            Uses atomic Redis lock to prevent race conditions.
-            """
-            try:
-                # 🔒 Atomic check: Only the first caller wins
-                should_commit, reason = await gen_manager.commit_usage(generation_id)
-                
-                if not should_commit:
-                    logger.debug(f"🔄 Usage already committed for {generation_id[:8]}... ({reason})")
-                    return {"committed": False, "reason": reason}
-                
-                # ✅ First caller - actually increment usage
-                if state.key_source == "platform":
-                    usage_result = await increment_free_usage(user_id, generation_id)
-                    if usage_result.get("success"):
-                        logger.info(f"✅ [SINGLE-SHOT] Free usage: {usage_result['new_count']}/10 for user {user_id[:8]}...")
-                    return {"committed": True, "usage": usage_result}
-                else:
-                    key_id = state.key_id or await get_current_key_id_for_user(user_id)
-                    if key_id:
-                        result = await increment_user_key_usage(user_id, key_id, generation_id)
-                        logger.info(f"✅ [SINGLE-SHOT] User key usage tracked for {user_id[:8]}...")
-                        return {"committed": True, "usage": result}
-                    return {"committed": True, "usage": None}
-                    
-            except Exception as e:
-                logger.warning(f"⚠️ Single-shot usage commit error: {e}")
-                return {"committed": False, "error": str(e)}
-        
-        # 🚀 Fire-and-forget: Don't wait for usage tracking
-        asyncio.create_task(commit_usage_once())
-
-        # 8. 🚀 OPTIMIZED: Parallel status update + cleanup trigger
-        asyncio.create_task(gen_manager.update_status(generation_id, "finalized"))
-        asyncio.create_task(gen_manager.cleanup(generation_id))
-        
-        # 9. ✨ PRO AUTO-RENAME: Generating perfect titles automatically
-        # Runs in background to keep UI snappy
-        async def auto_rename_pro():
-            try:
-                # Check current title
-                current_session = await sessions_collection.find_one(
-                    {"chat_id": chat_id}, 
-                    {"title": 1, "messages": 1}
-                )
-                
-                if not current_session: return
-                
-                current_title = current_session.get("title", "New Chat")
-                # Default variations to catch (including simple greetings)
-                is_default = current_title in ["New Chat", "Chat", "Untitled", "New Conversation", "New Beginning", "New Idea"]
-                
-                # Only rename if default and early in conversation (<= 4 messages)
-                msg_count = len(current_session.get("messages", []))
-                
-                if is_default and msg_count <= 6:  # Allow up to 3 turns before giving up on renaming
-                    from app.utils.llm_client import generate_chat_title
-                    
-                    # Generate punchy title using the prompt + response context
-                    new_title = await generate_chat_title(state.prompt, final_content)
-                    
-                    if new_title and len(new_title) > 2:
-                        await sessions_collection.update_one(
-                            {"chat_id": chat_id},
-                            {"$set": {"title": new_title}}
-                        )
-                        logger.info(f"✨ Auto-Renamed Session {chat_id} -> '{new_title}'")
-            except Exception as e:
-                logger.warning(f"⚠️ Auto-rename failed: {e}")
-
-        asyncio.create_task(auto_rename_pro())
-        
-        logger.info(f"✅ State Machine: {generation_id} -> finalized -> cleanup")
+        logger.info(f"✅ State Machine: {generation_id} -> queued for persistence")
         
         # Build response with usage info for frontend
         # 🚀 Note: usage_result tracked in background, frontend will poll /api-keys/usage
         response_data = {
             "message_id": assistant_message_id,
             "generation_id": generation_id,
-            "status": "persisted",
+            "status": "accepted",
             "key_source": state.key_source,  # "platform" or "user"
             "model": state.model_used or "llama-3.1-8b-instant",
         }
@@ -332,6 +240,9 @@ async def finalize_generation(
     
     except Exception as e:
         logger.error(f"❌ Finalize Logic Error: {e}", exc_info=True)
+        if not queued:
+            # Nothing was queued - let the client's retry claim it again
+            await FinalizeLedger.release(generation_id)
         # Even on error, return 200 OK so frontend doesn't crash?
         # User said "Finalize should never break the system".
         # But if we failed to save, maybe we should let them retry?
@@ -352,7 +263,7 @@ async def finalize_generation(
 
 
 
-@router.post("/chat/{chat_id}/generate", response_model=GenerateResponse)
+@router.post("/chat/{chat_id}/generate", response_model=GenerateResponse, dependencies=[Depends(user_rate_limit("generate"))])
 async def create_generation(
     chat_id: str,
     request: GenerateRequest,
@@ -471,7 +382,7 @@ async def create_generation(
 # Result: User sees response begin in <100ms instead of waiting 2-7 seconds.
 # ============================================================================
 
-@router.post("/chat/{chat_id}/stream-now")
+@router.post("/chat/{chat_id}/stream-now", dependencies=[Depends(user_rate_limit("generate"))])
 async def speculative_stream(
     chat_id: str,
     request: GenerateRequest,
@@ -500,6 +411,10 @@ async def speculative_stream(
         """SSE generator with speculative start"""
         generation_id = None
         state = None
+        sse_span = tracer.span("sse.stream", endpoint="stream-now", chat_id=chat_id)
+        setup_span = NOOP_SPAN
+        flushes = 0
+        sent_chars = 0
         
         try:
             # ========================================
@@ -548,6 +463,7 @@ async def speculative_stream(
                 return
             
             # 2b. API Key check (may hit cache or DB)
+            setup_span = sse_span.child("sse.setup")
             user_api_key, key_source, error_code, selected_model = await get_api_key_for_user(user_id)
             
             if not user_api_key:
@@ -613,6 +529,7 @@ async def speculative_stream(
                     }
                 return
             
+            setup_span.set(key_source=key_source, generation_id=generation_id).end()
             validation_complete_time = (time.time() - start_time) * 1000
             logger.info(
                 f"⚡ Speculative validation complete [{validation_complete_time:.0f}ms] | "
@@ -666,7 +583,8 @@ async def speculative_stream(
                 state.chat_id,
                 api_key=state.api_key,
                 key_source=state.key_source,
-                model=state.model_used or "llama-3.1-8b-instant"
+                model=state.model_used or "llama-3.1-8b-instant",
+                parent_span=sse_span
             ):
                 clean_chunk = clean_for_sse(chunk_text)
                 if not clean_chunk:
@@ -697,6 +615,10 @@ async def speculative_stream(
                 )
                 
                 if should_flush and sse_buffer:
+                    if not flushes:
+                        sse_span.event("first_flush")
+                    flushes += 1
+                    sent_chars += len(sse_buffer)
                     yield {
                         "event": "chunk",
                         "data": json.dumps({"content": sse_buffer})
@@ -747,6 +669,7 @@ async def speculative_stream(
                     await gen_manager.update_status(generation_id, "failed")
                 except Exception:
                     pass
+            sse_span.set(error=type(e).__name__)
             yield {
                 "event": "error",
                 "data": json.dumps({
@@ -754,6 +677,10 @@ async def speculative_stream(
                     "message": str(e)
                 })
             }
+        
+        finally:
+            setup_span.end()
+            sse_span.set(generation_id=generation_id, flushes=flushes, sent_chars=sent_chars).end()
     
     return EventSourceResponse(speculative_event_generator())
 
@@ -766,7 +693,8 @@ async def generate_ai_stream(
     chat_id: str,
     api_key: str | None = None,  # 🔑 User's API key
     key_source: str = "platform",  # 🔑 "platform" or "user"
-    model: str = "llama-3.1-8b-instant"  # 🎯 User's selected model
+    model: str = "llama-3.1-8b-instant",  # 🎯 User's selected model
+    parent_span=None  # 🔭 SSE span; generator spans are never activated across a yield
 ) -> AsyncGenerator[str, None]:
     """
     Generate AI response stream using Main Brain.
@@ -839,7 +767,8 @@ async def generate_ai_stream(
             session_id=chat_id,
             api_key=api_key,
             key_source=key_source,
-            model=model  # 🎯 Pass user's selected model
+            model=model,  # 🎯 Pass user's selected model
+            _parent_span=parent_span
         ):
             # 🚀 Skip empty tokens immediately
             if not token:
@@ -954,6 +883,9 @@ async def stream_response(
     async def event_generator():
         """SSE event generator"""
         import time
+        sse_span = tracer.span("sse.stream", endpoint="stream", generation_id=generation_id)
+        flushes = 0
+        sent_chars = 0
         try:
             # If already completed/cancelled, send final event
             if state.status in ["completed", "cancelled", "failed"]:
@@ -1010,7 +942,8 @@ async def stream_response(
                 state.chat_id,
                 api_key=state.api_key,
                 key_source=state.key_source,
-                model=state.model_used or "llama-3.1-8b-instant"
+                model=state.model_used or "llama-3.1-8b-instant",
+                parent_span=sse_span
             ):
                 # 🛡️ Apply final safety filter
                 clean_chunk = clean_for_sse(chunk_text)
@@ -1047,6 +980,10 @@ async def stream_response(
                 )
                 
                 if should_flush_sse and sse_buffer:
+                    if not flushes:
+                        sse_span.event("first_flush")
+                    flushes += 1
+                    sent_chars += len(sse_buffer)
                     yield {
                         "event": "chunk",
                         "data": json.dumps({"content": sse_buffer})
@@ -1091,6 +1028,7 @@ async def stream_response(
         
         except Exception as e:
             logger.error(f"Stream error for generation {generation_id}: {e}", exc_info=True)
+            sse_span.set(error=type(e).__name__)
             try:
                 await gen_manager.update_status(generation_id, "failed")
             except Exception as update_error:
@@ -1110,6 +1048,7 @@ async def stream_response(
                 await gen_manager.release_chat_lock(chat_id)
             except Exception as lock_error:
                 logger.error(f"Failed to release chat lock in finally block: {lock_error}")
+            sse_span.set(flushes=flushes, sent_chars=sent_chars).end()
     
     # 🚀 ULTRA-FAST SSE: Disable ping interval, set no-cache headers
     return EventSourceResponse(
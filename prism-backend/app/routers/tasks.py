@@ -11,7 +11,7 @@ from pydantic import BaseModel
 from app.db.mongo_client import tasks_collection
 from app.utils.auth import get_current_user_from_session
 from app.models.user_models import User
-from app.services.scheduler_service import schedule_next_task
+from app.services.scheduler_service import notify_task_changed
 from app.services.email_queue_service import schedule_task_reminder, remove_scheduled_email
 from app.services.cache_service import cache_service  # Part 10: Smart caching
 from app.utils.structured_logging import log_task_operation  # 🚀 Part 19
@@ -288,6 +288,7 @@ async def confirm_task(
         result = await tasks_collection.insert_one(doc)
         task_id = str(result.inserted_id)
         logger.info(f"✅ Task saved to MongoDB: {task_id} for user {user_id}")
+        notify_task_changed(task_id, due_dt_naive)
         
     except Exception as db_error:
         logger.error(f"❌ Failed to save task to MongoDB: {db_error}")
@@ -570,6 +571,7 @@ async def update_task(
     await cache_service.invalidate_tasks(user_id)
 
     updated = await tasks_collection.find_one({"_id": obj_id})
+    notify_task_changed(obj_id, updated.get("due_date"), updated.get("status", "pending"))
     
     # Generate meaningful confirmation
     desc = updated.get("description", "")
@@ -620,6 +622,7 @@ async def cancel_task(
         {"_id": obj_id},
         {"$set": {"status": "cancelled", "updated_at": now}},
     )
+    notify_task_changed(obj_id, status="cancelled")
     
     # 🚀 Part 10: Invalidate cache on CANCEL
     await cache_service.invalidate_tasks(user_id)
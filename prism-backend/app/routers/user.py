@@ -490,6 +490,8 @@ async def create_user_perfect(request: CreateUserRequest):
         # Insert into MongoDB
         result = await users_collection.insert_one(new_user.dict(by_alias=True))
         user_id = str(result.inserted_id)
+        from app.services.analytics_rollups import analytics_rollups
+        await analytics_rollups.record_signup()
         
         # Create user in Neo4j graph
         await create_user_in_graph(user_id, request.email, request.name)
@@ -884,18 +886,16 @@ async def get_system_overview():
         return {"error": str(e), "success": False}
 
 async def get_mongo_stats():
-    """Get MongoDB statistics"""
+    """Get MongoDB statistics (from analytics rollups, no collection scans)"""
     try:
-        user_count = await users_collection.count_documents({})
-        session_count = await users_collection.database.sessions.count_documents({})
-        task_count = await tasks_collection.count_documents({})
-        memory_count = await memory_collection.count_documents({})
+        from app.services.analytics_rollups import analytics_rollups
+        totals = await analytics_rollups.get_totals()
         
         return {
-            "users": user_count,
-            "sessions": session_count,  
-            "tasks": task_count,
-            "memories": memory_count
+            "users": totals["users"],
+            "sessions": totals["sessions"],
+            "tasks": totals["tasks"],
+            "memories": totals["memories"]
         }
     except Exception as e:
         return {"error": str(e)}
@@ -205,6 +205,11 @@ class AdaptiveQualityService:
         
         return total_score
     
+    def get_load_score(self) -> float:
+        """Current load score (0.0 = idle, 1.0+ = overloaded) for routing decisions"""
+        self._cleanup_stale_slow_clients()
+        return self._calculate_load_score()
+    
     def get_recommended_preset(self, user_id: Optional[str] = None) -> QualityPreset:
         """
         Get recommended quality preset based on current conditions.
@@ -340,9 +345,18 @@ async def get_adaptive_model_params(
     return params, preset.name
 
 
-def record_generation_metrics(latency_ms: float, success: bool = True):
-    """Fire-and-forget metric recording"""
+def record_generation_metrics(
+    latency_ms: float,
+    success: bool = True,
+    model: Optional[str] = None,
+    intent: Optional[str] = None,
+    output_tokens: Optional[int] = None
+):
+    """Fire-and-forget metric recording (plus output-length learning when tokens are known)"""
     asyncio.create_task(adaptive_quality.record_generation_end(latency_ms, success))
+    if success and model and output_tokens is not None:
+        from app.services.output_estimator import output_estimator
+        output_estimator.record(model, intent, output_tokens, latency_ms / 1000)
 
 
 def record_generation_start():
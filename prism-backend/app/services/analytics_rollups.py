@@ -0,0 +1,269 @@
+"""
+📈 ANALYTICS ROLLUPS - Pre-Aggregated Admin Dashboard Stats
+============================================================
+
+The admin dashboard used to run count_documents over users and sessions
+(plus a 24h last_login filter) on every load. Now:
+
+1. Signup / login / chat-session creation do a few O(1) Redis writes:
+       analytics:totals                 -> {"users": n, "sessions": n, "logins": n}
+       analytics:hour:{YYYY-MM-DDTHH}   -> {"signups": n, "logins": n, "sessions": n}
+       analytics:active                 -> zset user_id -> last login (unix)
+2. A background job writes hourly/daily rollup documents to MongoDB
+   (db.analytics_rollups) from those hashes - absolute values, so a rerun
+   is idempotent - and once a day reconciles the totals against MongoDB
+   counts to absorb writers that bypass the hooks (deletes, scripts).
+3. Admin endpoints read ONLY the Redis totals and the rollup documents, so
+   a dashboard load costs the same with 100 users or 10 million.
+
+The totals hash is seeded from MongoDB the first time it is needed; the
+seed marker lives inside the hash, so it vanishes with it.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+TOTALS_KEY = "analytics:totals"
+HOUR_KEY_TEMPLATE = "analytics:hour:{hour}"
+ACTIVE_KEY = "analytics:active"
+RECONCILE_LOCK_KEY = "analytics:reconcile_lock"
+HOUR_FORMAT = "%Y-%m-%dT%H"
+HOUR_TTL_SECONDS = 3 * 86400           # hashes outlive the rollup job by days
+ACTIVE_WINDOW_SECONDS = 24 * 3600
+ROLLUP_INTERVAL_SECONDS = 300
+RECONCILE_INTERVAL_SECONDS = 86400
+SEED_FIELD = "_seeded"
+EVENT_FIELDS = ("signups", "logins", "sessions")
+TOTAL_FIELDS = ("users", "sessions", "logins", "tasks", "memories")
+
+
+def _hour_key(moment: datetime) -> str:
+    return HOUR_KEY_TEMPLATE.format(hour=moment.strftime(HOUR_FORMAT))
+
+
+def _as_ints(raw: Optional[dict], fields) -> Dict[str, int]:
+    raw = raw or {}
+    return {name: int(raw.get(name) or 0) for name in fields}
+
+
+class AnalyticsRollups:
+    """
+    Usage:
+    ```python
+    from app.services.analytics_rollups import analytics_rollups
+    await analytics_rollups.record_signup()               # never raises
+    overview = await analytics_rollups.get_overview()     # Redis + one indexed find
+    ```
+    """
+
+    def __init__(self):
+        self._job: Optional[asyncio.Task] = None
+        self._seeded_at = 0.0
+        self.rollups_written = 0
+        self.reconciles = 0
+
+    # ---------- writes (hot path) ----------
+
+    async def _record(self, event: str, total_field: Optional[str], user_id: Optional[str] = None):
+        try:
+            now = datetime.utcnow()
+            hour_key = _hour_key(now)
+            if await redis_client.hincrby(hour_key, event, 1) == 1:
+                await redis_client.expire(hour_key, HOUR_TTL_SECONDS)
+            if total_field:
+                await redis_client.hincrby(TOTALS_KEY, total_field, 1)
+            if user_id and event == "logins":
+                await redis_client.zadd(ACTIVE_KEY, {str(user_id): time.time()})
+        except Exception as e:
+            logger.debug(f"Analytics rollup update skipped ({event}): {e}")
+
+    async def record_signup(self):
+        await self._record("signups", "users")
+
+    async def record_login(self, user_id: Optional[str]):
+        await self._record("logins", "logins", user_id)
+
+    async def record_session(self):
+        await self._record("sessions", "sessions")
+
+    # ---------- totals ----------
+
+    async def _ensure_seeded(self):
+        """
+        One-time seed of the totals hash from MongoDB counts. HSETNX on a
+        marker inside the hash elects a single seeder; HINCRBY keeps hook
+        increments that raced ahead of the seed.
+        """
+        if time.monotonic() - self._seeded_at < ROLLUP_INTERVAL_SECONDS:
+            return
+        if await redis_client.hsetnx(TOTALS_KEY, SEED_FIELD, "1"):
+            try:
+                for name, value in (await self._count_from_mongo()).items():
+                    await redis_client.hincrby(TOTALS_KEY, name, value)
+            except Exception as e:
+                logger.warning(f"⚠️ Analytics totals seed from Mongo failed: {e}")
+                await redis_client.hdel(TOTALS_KEY, SEED_FIELD)
+                return
+        self._seeded_at = time.monotonic()
+
+    async def _count_from_mongo(self) -> Dict[str, int]:
+        from app.db.mongo_client import memory_collection, sessions_collection, tasks_collection, users_collection
+
+        users, sessions, tasks, memories = await asyncio.gather(
+            users_collection.count_documents({}),
+            sessions_collection.count_documents({}),
+            tasks_collection.estimated_document_count(),
+            memory_collection.estimated_document_count(),
+        )
+        return {"users": users, "sessions": sessions, "tasks": tasks, "memories": memories}
+
+    async def get_totals(self) -> Dict[str, int]:
+        await self._ensure_seeded()
+        return _as_ints(await redis_client.hgetall(TOTALS_KEY), TOTAL_FIELDS)
+
+    async def get_active_users_24h(self) -> int:
+        await redis_client.zremrangebyscore(ACTIVE_KEY, "-inf", str(time.time() - ACTIVE_WINDOW_SECONDS))
+        return await redis_client.zcard(ACTIVE_KEY)
+
+    async def get_hour(self, moment: Optional[datetime] = None) -> Dict[str, int]:
+        return _as_ints(await redis_client.hgetall(_hour_key(moment or datetime.utcnow())), EVENT_FIELDS)
+
+    # ---------- reads (admin) ----------
+
+    async def get_series(self, period: str = "day", limit: int = 30) -> List[dict]:
+        """Newest-first rollup documents for period "hour" or "day" """
+        from app.db.mongo_client import db
+
+        cursor = db.analytics_rollups.find({"period": period}).sort("start", -1).limit(limit)
+        docs = await cursor.to_list(limit)
+        for doc in docs:
+            doc["id"] = doc.pop("_id")
+            doc["start"] = doc["start"].isoformat()
+            doc.pop("updated_at", None)
+        return docs
+
+    async def get_overview(self) -> dict:
+        """Dashboard numbers: Redis counters + the last 7 daily rollups"""
+        totals, active, days = await asyncio.gather(
+            self.get_totals(),
+            self.get_active_users_24h(),
+            self.get_series("day", limit=7),
+        )
+        signups_7d = sum(day.get("signups", 0) for day in days)
+        previous_users = totals["users"] - signups_7d
+        growth_rate = round(100.0 * signups_7d / previous_users, 1) if previous_users > 0 else 0.0
+        return {
+            "total_users": totals["users"],
+            "active_users_24h": active,
+            "total_sessions": totals["sessions"],
+            "signups_7d": signups_7d,
+            "growth_rate": growth_rate,
+        }
+
+    # ---------- rollup job ----------
+
+    async def write_rollups(self, now: Optional[datetime] = None) -> int:
+        """
+        Upsert the current and previous hour plus today's (and, right after
+        midnight, yesterday's) day document. Values are absolute, so the
+        job can rerun or run on several instances without double counting.
+        """
+        from pymongo import UpdateOne
+        from app.db.mongo_client import db
+
+        now = now or datetime.utcnow()
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        totals = await self.get_totals()
+        active = await self.get_active_users_24h()
+        snapshot = {
+            "active_users": active,
+            "total_users": totals["users"],
+            "total_sessions": totals["sessions"],
+            "updated_at": now,
+        }
+
+        ops = []
+        for start in (hour_start - timedelta(hours=1), hour_start):
+            counts = await self.get_hour(start)
+            ops.append(UpdateOne(
+                {"_id": f"hour:{start.strftime(HOUR_FORMAT)}"},
+                {"$set": {"period": "hour", "start": start, **counts, **snapshot}},
+                upsert=True,
+            ))
+
+        days = {hour_start.replace(hour=0), (hour_start - timedelta(hours=1)).replace(hour=0)}
+        for day_start in sorted(days):
+            counts = dict.fromkeys(EVENT_FIELDS, 0)
+            for offset in range(24):
+                moment = day_start + timedelta(hours=offset)
+                if moment > hour_start:
+                    break
+                for name, value in (await self.get_hour(moment)).items():
+                    counts[name] += value
+            ops.append(UpdateOne(
+                {"_id": f"day:{day_start.strftime('%Y-%m-%d')}"},
+                {"$set": {"period": "day", "start": day_start, **counts, **snapshot}},
+                upsert=True,
+            ))
+
+        await db.analytics_rollups.bulk_write(ops, ordered=False)
+        self.rollups_written += len(ops)
+        return len(ops)
+
+    async def reconcile(self) -> bool:
+        """
+        Overwrite the totals with real MongoDB counts (at most once per
+        RECONCILE_INTERVAL_SECONDS across all instances). Off the request
+        path, so the full counts are fine here.
+        """
+        if not await redis_client.set(RECONCILE_LOCK_KEY, "1", ex=RECONCILE_INTERVAL_SECONDS, nx=True):
+            return False
+        counts = await self._count_from_mongo()
+        await redis_client.hset(TOTALS_KEY, mapping={**{k: str(v) for k, v in counts.items()}, SEED_FIELD: "1"})
+        self.reconciles += 1
+        logger.info(f"📈 Analytics totals reconciled: {counts}")
+        return True
+
+    async def _job_loop(self):
+        while True:
+            try:
+                await self.reconcile()
+                await self.write_rollups()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Analytics rollup job error: {e}")
+            await asyncio.sleep(ROLLUP_INTERVAL_SECONDS)
+
+    def start(self):
+        """Start the periodic rollup job (call from app lifespan)"""
+        if self._job is None or self._job.done():
+            self._job = asyncio.create_task(self._job_loop())
+
+    async def stop(self):
+        if self._job:
+            self._job.cancel()
+            try:
+                await self._job
+            except asyncio.CancelledError:
+                pass
+            self._job = None
+
+    def get_stats(self) -> dict:
+        return {
+            "rollups_written": self.rollups_written,
+            "reconciles": self.reconciles,
+            "job_running": bool(self._job and not self._job.done()),
+        }
+
+
+# Global singleton
+analytics_rollups = AnalyticsRollups()
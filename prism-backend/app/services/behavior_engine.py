@@ -291,53 +291,65 @@ class BehaviorEngine:
     async def build_dynamic_prompt_async(self, core_identity: str, behavior_profile: BehaviorProfile, memory_context: str, user_id: str = None, user_profile: Dict = None) -> str:
         """
         Async version of prompt builder to support database lookups.
+        The static prefix (identity, bio, anchor, style, format rules) comes
+        from prompt_assembly and is rebuilt only when its inputs change; the
+        memory context is appended as the per-turn tail.
         """
+        from app.services.prompt_assembly import fingerprint, prompt_assembly
+
         # 🔹 INTERACTION ANCHOR BLENDING
-        anchor = None
-        anchor_instruction = ""
-        
-        # 🔹 STATIC PROFILE BLENDING
-        bio_instruction = ""
-        if user_profile:
-             # Extract key fields nicely
-             name = user_profile.get("username", "User")
-             email = user_profile.get("email", "")
-             # If we have explicit preferences/bio in user_profile, usage them
-             bio_instruction = f"""
+        anchor = await self.get_interaction_anchor(user_id) if user_id else None
+        if anchor and anchor.get('relationship_style') in ['romantic', 'close_friend', 'playful']:
+            # Anchor overrides generic tone instructions if strong
+            behavior_profile.tone = anchor.get('emotional_mode', behavior_profile.tone)
+            behavior_profile.warmth = max(behavior_profile.warmth, 0.8)
+
+        # 🔹 STATIC PROFILE BLENDING (only the fields the prefix uses)
+        bio_fields = {"username": user_profile.get("username", "User"), "email": user_profile.get("email", "")} if user_profile else None
+        style_str = self._style_summary(behavior_profile)
+
+        key = prompt_assembly.prefix_key(
+            core_identity,
+            fingerprint(bio_fields),
+            f"{style_str}|{behavior_profile.tone}",
+            fingerprint(anchor),
+        )
+        prefix = prompt_assembly.get_or_build(key, lambda: self._construct_prompt_prefix(
+            core_identity,
+            behavior_profile,
+            self._anchor_instruction(anchor, behavior_profile, bio_fields["username"] if bio_fields else "User"),
+            self._bio_instruction(bio_fields),
+        ))
+        tail = self._construct_context_tail(memory_context)
+        prompt_assembly.record_sizes(prefix, tail)
+        return f"{prefix}\n\n{tail}"
+
+    def _bio_instruction(self, bio_fields: Optional[Dict[str, str]]) -> str:
+        if not bio_fields:
+            return ""
+        return f"""
 ### USER BIO (Static Profile)
-- **Name**: {name}
-- **Email**: {email}
-""" 
-        
-        if user_id:
-            anchor = await self.get_interaction_anchor(user_id)
-            if anchor:
-                # Blend anchor into instructions
-                anchor_instruction = f"""
+- **Name**: {bio_fields['username']}
+- **Email**: {bio_fields['email']}
+"""
+
+    def _anchor_instruction(self, anchor: Optional[Dict[str, Any]], behavior_profile: BehaviorProfile, user_name: str = "User") -> str:
+        if not anchor:
+            return ""
+        return f"""
 ### ACTIVE INTERACTION MODE (Permanent User Preference)
 You have been assigned a specific persona/mode by the user:
 - **Relationship Tone**: {anchor.get('relationship_style', 'standard')}
 - **My Nickname**: {anchor.get('assistant_nickname', 'Prism')}
-- **User Nickname**: {anchor.get('user_nickname', name)}
+- **User Nickname**: {anchor.get('user_nickname', user_name)}
 - **Emotional Mode**: {anchor.get('emotional_mode', behavior_profile.tone)}
 
 **CRITICAL IDENTITY RULE**: Do NOT self-identify as a generic AI or mentioning 'Prism' unless explicitly asked. 
 Stay in character as '{anchor.get('assistant_nickname', 'Prism')}' and maintain the requested '{anchor.get('relationship_style')}' connection.
 If the user asks "who are you", answer softly as {anchor.get('assistant_nickname', 'Prism')}, referencing this specific conversation context.
 """
-                # Anchor overrides generic tone instructions if strong
-                if anchor.get('relationship_style') in ['romantic', 'close_friend', 'playful']:
-                     behavior_profile.tone = anchor.get('emotional_mode', behavior_profile.tone)
-                     behavior_profile.warmth = max(behavior_profile.warmth, 0.8)
 
-        # Reuse sync logic for the rest
-        return self._construct_prompt_text(core_identity, behavior_profile, memory_context, anchor_instruction, anchor, bio_instruction)
-
-    def _construct_prompt_text(self, core_identity, behavior_profile, memory_context, anchor_instruction, anchor, bio_instruction=""):
-        """
-        ENHANCED: Rich formatting guidelines for pro-quality responses.
-        """
-        # Build style hints
+    def _style_summary(self, behavior_profile: BehaviorProfile) -> str:
         style_hints = []
         if behavior_profile.warmth > 0.7:
             style_hints.append("warm & empathetic")
@@ -349,18 +361,19 @@ If the user asks "who are you", answer softly as {anchor.get('assistant_nickname
         elif behavior_profile.response_length == "detailed":
             style_hints.append("comprehensive explanations")
         
-        style_str = ", ".join(style_hints) if style_hints else "balanced"
+        return ", ".join(style_hints) if style_hints else "balanced"
+
+    def _construct_prompt_prefix(self, core_identity, behavior_profile, anchor_instruction, bio_instruction=""):
+        """
+        ENHANCED: Rich formatting guidelines for pro-quality responses.
+        Static per (identity, bio, anchor, style) - no per-turn data in here.
+        """
+        style_str = self._style_summary(behavior_profile)
         
-        # ENHANCED PROMPT with better structure
-        dynamic_prompt = f"""{core_identity}
+        prefix = f"""{core_identity}
 {bio_instruction}
 {anchor_instruction}
 
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-📊 CURRENT CONTEXT
-━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
-{memory_context if memory_context else "No prior context available."}
-
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 🎨 ACTIVE STYLE: {style_str} | Tone: {behavior_profile.tone}
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -398,7 +411,18 @@ If the user asks "who are you", answer softly as {anchor.get('assistant_nickname
 
 ❌ NEVER respond without emojis - use them to convey warmth & intelligence!
 """
-        return dynamic_prompt.strip()
+        return prefix.strip()
+
+    def _construct_context_tail(self, memory_context):
+        """Per-turn section, always last so the prefix stays byte-identical"""
+        return f"""━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+📊 CURRENT CONTEXT
+━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
+{memory_context if memory_context else "No prior context available."}""".rstrip()
+
+    def _construct_prompt_text(self, core_identity, behavior_profile, memory_context, anchor_instruction, anchor, bio_instruction=""):
+        prefix = self._construct_prompt_prefix(core_identity, behavior_profile, anchor_instruction, bio_instruction)
+        return f"{prefix}\n\n{self._construct_context_tail(memory_context)}"
 
     # KEEP SYNC VERSION FOR BACKWARD COMPATIBILITY IF NEEDED (BUT REDUCE LOGIC)
     def build_dynamic_prompt(self, core_identity: str, behavior_profile: BehaviorProfile, memory_context: str, user_id: str = None) -> str:
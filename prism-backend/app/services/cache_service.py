@@ -176,7 +176,10 @@ class CacheService:
         user_id: str,
         session_id: str
     ) -> bool:
-        """Invalidate cached session data"""
+        """Invalidate cached session data (and the session's ETag version)"""
+        from app.services.session_loader import bump_session_version
+
+        await bump_session_version(session_id)
         key = self._generate_key("session", user_id, session_id)
         return await self.invalidate(key)
     
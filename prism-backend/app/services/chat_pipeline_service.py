@@ -4,10 +4,12 @@ from datetime import datetime, timezone
 import logging
 from bson import ObjectId
 from app.db.mongo_client import sessions_collection
+from app.db.session_schema import session_filter
 from app.utils.timeout_utils import tracked_timeout, TimeoutConfig
 from app.utils.preprocess import preprocess as safe_preprocess
 from app.cognitive.router_engine import route_message
 from app.db.redis_client import add_message_to_history
+from app.services.session_loader import bump_session_version
 
 logger = logging.getLogger(__name__)
 
@@ -40,12 +42,7 @@ class ChatPipelineService:
         # 1. MongoDB Update
         await tracked_timeout(
             sessions_collection.update_one(
-                {
-                    "$and": [
-                        {"$or": [{"chat_id": session_id}, {"sessionId": session_id}]},
-                        {"$or": [{"user_id": ObjectId(user_id)}, {"userId": ObjectId(user_id)}]}
-                    ]
-                },
+                session_filter(session_id, ObjectId(user_id)),
                 {
                     "$push": {"messages": user_message_doc},
                     "$set": {
@@ -58,6 +55,7 @@ class ChatPipelineService:
             service_name="MongoDB UPDATE (user message)",
             fallback=None
         )
+        await bump_session_version(session_id)
 
         # 2. Redis History
         try:
@@ -71,7 +69,7 @@ class ChatPipelineService:
             "working_text": _working_text
         }
 
-    async def persist_ai_message(self, session_id: str, content: str, role: str = "assistant") -> Dict[str, Any]:
+    async def persist_ai_message(self, session_id: str, content: str, role: str = "assistant", user_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Persists an AI response to MongoDB.
         """
@@ -87,9 +85,7 @@ class ChatPipelineService:
 
         await tracked_timeout(
             sessions_collection.update_one(
-                {
-                    "$or": [{"chat_id": session_id}, {"sessionId": session_id}]
-                },
+                session_filter(session_id, user_id),
                 {
                     "$push": {"messages": ai_message_doc},
                     "$set": {
@@ -102,6 +98,7 @@ class ChatPipelineService:
             service_name="MongoDB UPDATE (AI message)",
             fallback=None
         )
+        await bump_session_version(session_id)
 
         return ai_message_doc
 
@@ -202,6 +202,9 @@ async def cleanup_user_completely(user_id: str, email: str = None) -> dict:
             }
             
             logger.info(f"✅ Neo4j cleanup completed: {nodes_deleted} nodes deleted")
+        
+        from app.services.graph_snapshot import graph_snapshots
+        await graph_snapshots.invalidate(user_id)
             
     except Exception as e:
         cleanup_results["neo4j"] = {"status": "error", "error": str(e)}
@@ -0,0 +1,221 @@
+"""
+📦 CONTEXT PACKER - Token-Budgeted Prompt Context
+==================================================
+
+Context used to be trimmed ad hoc: every history message cut to 500/800
+chars (and again to 4 x 500 in llm_client), while memories, graph facts
+and tasks were concatenated into the memory block with no global limit.
+Long sessions paid for the worst of both - clipped turns, unbounded
+memory lists.
+
+pack() now fills one token budget per model (CONTEXT_TOKEN_BUDGETS),
+greedily, in priority order:
+
+    profile > recent turns > relevant memories > graph facts > tasks > session
+
+- tokens are estimated with the shared ~4 chars/token approximation
+  (output_estimator.estimate_tokens), charged at the size each item will
+  have once enrich_master_prompt formats it
+- recent turns go newest first and stop at the first turn that does not
+  fit (a truncated turn is kept if at least MIN_TURN_TOKENS remain), so
+  the kept history is a contiguous tail; turns may use at most
+  MAX_TURNS_SHARE of the budget so memories are never starved, and always
+  get at least MIN_TURNS_SHARE: global stats are dropped before they eat
+  into that reserve, and a profile that does is logged as a budget overrun
+- memories / graph facts / tasks are deduplicated on normalized text,
+  including against the kept turns, and lower-priority items still fill
+  whatever room the larger ones left
+
+The result keeps the holographic context's shape, so
+enrich_master_prompt formats it exactly as before.
+"""
+
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from app.services.output_estimator import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+CONTEXT_TOKEN_BUDGETS: Dict[str, int] = {
+    "llama-3.1-8b-instant": 1800,
+    "gemma2-9b-it": 2400,
+    "llama-3.1-70b-versatile": 3200,
+    "llama-3.3-70b-versatile": 3200,
+}
+DEFAULT_CONTEXT_BUDGET = 2000
+MAX_TURNS_SHARE = 0.6
+MIN_TURNS_SHARE = 0.25          # reserved for recent turns whatever the profile costs
+MIN_TURN_TOKENS = 40
+TURN_OVERHEAD_TOKENS = 4        # role + message framing
+PROFILE_OVERHEAD_TOKENS = 120   # headings and "don't ask" instructions around the profile
+BLOCK_OVERHEAD_TOKENS = 130     # memory block header + CRITICAL INTELLIGENCE RULES footer
+LIST_TIERS = ("memories", "relationships", "tasks")
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def budget_for_model(model: Optional[str]) -> int:
+    return CONTEXT_TOKEN_BUDGETS.get(model or "", DEFAULT_CONTEXT_BUDGET)
+
+
+def _normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", (text or "").lower()).strip()
+
+
+def _item_text(tier: str, item: Any) -> str:
+    """The line enrich_master_prompt will render for an item"""
+    if tier == "memories":
+        return f"  - {item.get('text', '')} (confidence: 0.00)"
+    if tier == "relationships":
+        reasoning = f" ({item['reasoning']})" if item.get("reasoning") else ""
+        return f"  - {item.get('type')} → {item.get('target')}{reasoning}"
+    return f"  - ✅ {item.get('title')} [{item.get('status')}]"
+
+
+def _dedup_text(tier: str, item: Any) -> str:
+    if tier == "memories":
+        return item.get("text", "")
+    if tier == "relationships":
+        return f"{item.get('type')} {item.get('target')}"
+    return item.get("title") or ""
+
+
+@dataclass
+class PackedContext:
+    context: Dict[str, Any]
+    history: List[Dict[str, str]]
+    budget: int
+    used_tokens: int
+    dropped: Dict[str, int] = field(default_factory=dict)
+    duplicates: int = 0
+
+    def summary(self) -> dict:
+        return {
+            "context_budget": self.budget,
+            "context_tokens": self.used_tokens,
+            "context_dropped": sum(self.dropped.values()),
+            "context_duplicates": self.duplicates,
+        }
+
+
+class ContextPacker:
+    """
+    Usage:
+    ```python
+    from app.services.context_packer import context_packer
+    packed = context_packer.pack(holographic_context, conversation_history, model=selected_model)
+    memory_section, _ = unified_memory_orchestrator.enrich_master_prompt("", packed.context, [])
+    history = packed.history
+    ```
+    """
+
+    def pack(
+        self,
+        context: Optional[Dict[str, Any]],
+        history: Optional[List[Dict[str, str]]] = None,
+        model: Optional[str] = None,
+        budget: Optional[int] = None,
+    ) -> PackedContext:
+        context = context or {}
+        history = history or []
+        budget = budget if budget is not None else budget_for_model(model)
+        remaining = budget
+        dropped: Dict[str, int] = {}
+        duplicates = 0
+        seen: List[str] = []
+
+        def is_duplicate(text: str) -> bool:
+            norm = _normalize(text)
+            if not norm:
+                return True
+            return any(norm == other or (len(norm) >= 12 and norm in other) for other in seen)
+
+        # 1. Profile - always kept, it is what "don't ask me" rests on;
+        #    global stats only while they leave the turn reserve intact
+        packed = {key: ([] if key in LIST_TIERS else value) for key, value in context.items()}
+        turns_reserve = int(budget * MIN_TURNS_SHARE) if history else 0
+        if any(context.values()):
+            remaining -= BLOCK_OVERHEAD_TOKENS
+        for key in ("profile", "global_stats"):
+            if context.get(key):
+                cost = estimate_tokens(json.dumps(context[key], default=str))
+                cost += PROFILE_OVERHEAD_TOKENS if key == "profile" else 0
+                if key == "global_stats" and cost > remaining - turns_reserve:
+                    packed[key] = {}
+                    dropped[key] = 1
+                    continue
+                remaining -= cost
+        if remaining < turns_reserve:
+            logger.warning(
+                f"⚠️ Context packer: profile leaves {remaining} of {budget} tokens, "
+                f"keeping {turns_reserve} for recent turns (budget overrun)"
+            )
+
+        # 2. Recent turns - newest first, contiguous, between the reserve and a capped share of the budget
+        turns_budget = min(max(remaining, turns_reserve), int(budget * MAX_TURNS_SHARE))
+        kept_turns: List[Dict[str, str]] = []
+        for turn in reversed(history):
+            content = turn.get("content", "")
+            cost = estimate_tokens(content) + TURN_OVERHEAD_TOKENS
+            if cost <= turns_budget:
+                kept_turns.append(turn)
+                turns_budget -= cost
+                continue
+            room = turns_budget - TURN_OVERHEAD_TOKENS
+            if room >= MIN_TURN_TOKENS:
+                kept_turns.append({**turn, "content": content[:room * CHARS_PER_TOKEN - 1].rstrip() + "…"})
+            break
+        dropped["turns"] = len(history) - len(kept_turns)
+        kept_turns.reverse()
+        remaining -= sum(estimate_tokens(t["content"]) + TURN_OVERHEAD_TOKENS for t in kept_turns)
+        seen.extend(_normalize(t["content"]) for t in kept_turns)
+
+        # 3-5. Memories > graph facts > tasks - deduplicated, greedy fill
+        for tier in LIST_TIERS:
+            for item in context.get(tier) or []:
+                if is_duplicate(_dedup_text(tier, item)):
+                    duplicates += 1
+                    continue
+                cost = estimate_tokens(_item_text(tier, item)) + 1
+                if cost > remaining:
+                    dropped[tier] = dropped.get(tier, 0) + 1
+                    continue
+                packed[tier].append(item)
+                seen.append(_normalize(_dedup_text(tier, item)))
+                remaining -= cost
+
+        # 6. Session facts - whatever room is left
+        if context.get("session"):
+            session = {}
+            for key, value in context["session"].items():
+                if key == "timestamp":  # not rendered
+                    session[key] = value
+                    continue
+                cost = estimate_tokens(f"  - {key}: {value}") + 1
+                if cost <= remaining:
+                    session[key] = value
+                    remaining -= cost
+                else:
+                    dropped["session"] = dropped.get("session", 0) + 1
+            packed["session"] = session
+
+        result = PackedContext(
+            context=packed,
+            history=kept_turns,
+            budget=budget,
+            used_tokens=budget - remaining,
+            dropped={tier: count for tier, count in dropped.items() if count},
+            duplicates=duplicates,
+        )
+        if result.dropped or duplicates:
+            logger.debug(f"📦 Context packed {result.used_tokens}/{budget} tokens, dropped={result.dropped}, dup={duplicates}")
+        return result
+
+
+# Global singleton
+context_packer = ContextPacker()
@@ -2,7 +2,13 @@ import json
 import time
 from datetime import datetime, timezone
 
-from app.db.redis_client import redis_client, EMAIL_HIGH_PRIORITY_QUEUE, EMAIL_SCHEDULED_QUEUE, EMAIL_DAILY_LIMIT_KEY_TEMPLATE
+from app.db.redis_client import (
+    redis_client,
+    EMAIL_HIGH_PRIORITY_QUEUE,
+    EMAIL_SCHEDULED_QUEUE,
+    EMAIL_SCHEDULED_WAKE,
+    EMAIL_DAILY_LIMIT_KEY_TEMPLATE,
+)
 from app.config import settings
 
 # Backwards-compatible aliases matching product brief
@@ -57,6 +63,9 @@ async def schedule_task_reminder(task_id: str, user_id: str, due_timestamp: floa
         raise ValueError("Daily email limit reached.")
 
     await redis_client.zadd(QUEUE_SCHEDULED, {task_id: due_timestamp})
+    # Wake a promoter sleeping until a later reminder (one token is enough)
+    await redis_client.lpush(EMAIL_SCHEDULED_WAKE, "1")
+    await redis_client.ltrim(EMAIL_SCHEDULED_WAKE, 0, 0)
 
     # 🚀 PRO LEVEL UPGRADE: Dispatch to Celery if available for EXACT time execution
     try:
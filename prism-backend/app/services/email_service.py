@@ -1,10 +1,11 @@
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 from app.config import settings
+from app.services.mail_transport import MailMessageError, mail_transport
 from app.utils.llm_client import get_llm_response
 import json
 from datetime import datetime
-from typing import Optional
+from html import escape
+from string import Template
+from typing import Optional, Tuple
 
 
 async def extract_email_details(message: str) -> dict:
@@ -45,63 +46,21 @@ async def send_email_notification(message: str):
     if not details.get("recipient_email"):
         return "❌ I couldn't find an email address in your request. Please specify who to email."
 
-    # 2. Construct Email
-    email_msg = Mail(
-        from_email=settings.SENDER_EMAIL,
-        to_emails=details["recipient_email"],
-        subject=details["subject"],
-        html_content=f"<p>{details['body']}</p><br><em>Sent by PRISM AI</em>"
-    )
-
-    # 3. Send via SendGrid
+    # 2. Send via the shared transport
     try:
-        sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-        response = sg.send(email_msg)
-        
-        # ADD THIS PRINT STATEMENT
-        print(f"SendGrid Status: {response.status_code}") 
-        print(f"SendGrid Body: {response.body}")
-        
+        await mail_transport.send(
+            details["recipient_email"],
+            details["subject"],
+            f"<p>{details['body']}</p><br><em>Sent by PRISM AI</em>",
+        )
         return f"📧 Email sent to {details['recipient_email']}! (Subject: {details['subject']})"
     except Exception as e:
         print(f"SendGrid Error: {e}")
         return f"❌ Failed to send email. Error: {str(e)}"
 
 
-async def send_professional_email(task: dict, retry_count: int = 0, max_retries: int = 3):
-    """
-    Sends a polished HTML reminder email for a completed task.
-    Includes retry logic for failed attempts.
-    """
-    user_name = task.get("user_name") or "Chief"
-    user_email = task.get("user_email") or task.get("email")
-    
-    # Validation
-    if not user_email:
-        print("❌ No user email provided in task, cannot send notification")
-        raise ValueError("User email is required")
-    
-    if not user_email or '@' not in user_email:
-        print(f"❌ Invalid email address: {user_email}")
-        raise ValueError(f"Invalid email address: {user_email}")
-
-    description = task.get("description", "Your scheduled task")
-    
-    # ☁️ Use display_time if available (shows IST to user), otherwise format due_date
-    display_time = task.get("display_time")
-    if display_time:
-        time_str = display_time  # Already formatted as "2025-12-16 09:00 PM IST"
-        date_str = display_time.split(" IST")[0] if " IST" in display_time else display_time
-    else:
-        due_date = task.get("due_date")
-        if isinstance(due_date, datetime):
-            time_str = due_date.strftime("%A, %B %d at %I:%M %p")
-            date_str = due_date.strftime("%Y-%m-%d %H:%M")
-        else:
-            time_str = "Soon"
-            date_str = "N/A"
-
-    html_content = f"""
+# Compiled once at import - reminder rendering is a plain substitution
+_REMINDER_TEMPLATE = Template("""
     <!DOCTYPE html>
     <html>
     <head>
@@ -118,15 +77,15 @@ async def send_professional_email(task: dict, retry_count: int = 0, max_retries:
             
             <!-- Body -->
             <div style="padding: 40px 30px;">
-                <p style="font-size: 18px; color: #333333; margin: 0 0 12px 0;">Hello <strong style="color: #667eea;">{user_name}</strong>, 👋</p>
+                <p style="font-size: 18px; color: #333333; margin: 0 0 12px 0;">Hello <strong style="color: #667eea;">$user_name</strong>, 👋</p>
                 <p style="font-size: 16px; color: #666666; margin: 0 0 24px 0; line-height: 1.5;">It's time! You asked me to remind you about this:</p>
                 
                 <!-- Task Card -->
                 <div style="background: linear-gradient(135deg, #f3f4f6 0%, #e5e7eb 100%); padding: 20px; border-radius: 8px; border-left: 5px solid #667eea; margin: 0 0 24px 0;">
-                    <h2 style="margin: 0 0 12px 0; color: #111827; font-size: 20px; font-weight: 600;">{description}</h2>
+                    <h2 style="margin: 0 0 12px 0; color: #111827; font-size: 20px; font-weight: 600;">$description</h2>
                     <div style="display: flex; align-items: center; gap: 8px; color: #6b7280; font-size: 14px;">
                         <span style="font-weight: 500;">📅 Scheduled:</span>
-                        <span>{time_str}</span>
+                        <span>$time_str</span>
                     </div>
                 </div>
                 
@@ -148,13 +107,286 @@ async def send_professional_email(task: dict, retry_count: int = 0, max_retries:
                     Sent with 💜 by <strong>PRISM AI</strong>
                 </p>
                 <p style="margin: 0; color: #9ca3af; font-size: 11px;">
-                    {datetime.now().strftime("%B %d, %Y at %I:%M %p")}
+                    $sent_at
+                </p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """)
+
+
+def render_reminder_email(task: dict) -> Tuple[str, str]:
+    """
+    Render (subject, html) for a reminder from the cached template.
+    Raises MailMessageError (a ValueError) when the task has no usable
+    recipient address.
+    """
+    user_name = task.get("user_name") or "Chief"
+    user_email = task.get("user_email") or task.get("email")
+    
+    # Validation
+    if not user_email:
+        print("❌ No user email provided in task, cannot send notification")
+        raise MailMessageError("User email is required")
+    
+    if not user_email or '@' not in user_email:
+        print(f"❌ Invalid email address: {user_email}")
+        raise MailMessageError(f"Invalid email address: {user_email}")
+
+    description = task.get("description", "Your scheduled task")
+    
+    # ☁️ Use display_time if available (shows IST to user), otherwise format due_date
+    display_time = task.get("display_time")
+    if display_time:
+        time_str = display_time  # Already formatted as "2025-12-16 09:00 PM IST"
+    else:
+        due_date = task.get("due_date")
+        if isinstance(due_date, datetime):
+            time_str = due_date.strftime("%A, %B %d at %I:%M %p")
+        else:
+            time_str = "Soon"
+
+    html_content = _REMINDER_TEMPLATE.substitute(
+        user_name=escape(str(user_name)),
+        description=escape(str(description)),
+        time_str=escape(str(time_str)),
+        sent_at=datetime.now().strftime("%B %d, %Y at %I:%M %p"),
+    )
+    return f"⏰ Reminder: {description}", html_content
+
+
+# OTP / password-reset bodies - compiled once so bursts only substitute the code
+_OTP_DIRECT_TEMPLATE = Template("""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    </head>
+    <body style="margin: 0; padding: 20px; background-color: #f5f5f5; font-family: 'Helvetica Neue', Arial, sans-serif;">
+        <div style="max-width: 500px; margin: 0 auto; background-color: #ffffff; border: 1px solid #e5e7eb; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
+            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 24px; text-align: center;">
+                <h1 style="color: white; margin: 0; font-size: 24px; font-weight: 600;">PRISM AI</h1>
+                <p style="color: rgba(255, 255, 255, 0.9); margin: 8px 0 0 0; font-size: 14px;">Verification Code</p>
+            </div>
+            <div style="padding: 32px; text-align: center;">
+                <p style="color: #6b7280; font-size: 16px; margin-bottom: 24px;">Here is your secure verification code:</p>
+                <div style="background-color: #F3F4F6; display: inline-block; padding: 20px 40px; border-radius: 8px; letter-spacing: 8px; font-weight: bold; font-size: 36px; color: #111827; border: 2px solid #E5E7EB;">
+                    $otp
+                </div>
+                <p style="color: #9ca3af; font-size: 14px; margin-top: 24px; line-height: 1.6;">
+                    This code expires in <strong>10 minutes</strong>.<br>
+                    If you didn't request this, please ignore this email.
                 </p>
             </div>
+            <div style="background-color: #f9fafb; padding: 16px; text-align: center; border-top: 1px solid #e5e7eb;">
+                <p style="color: #9ca3af; font-size: 12px; margin: 0;">Secured by PRISM Personal AI Assistant</p>
+            </div>
         </div>
     </body>
     </html>
+    """)
+
+_OTP_DIRECT_TEXT = Template("""
+PRISM AI Verification Code
+
+Your verification code: $otp
+
+This code expires in 10 minutes.
+If you didn't request this, please ignore this email.
+
+Secured by PRISM Personal AI Assistant
+    """)
+
+_SIGNUP_OTP_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>PRISM AI - Verification Code</title>
+</head>
+<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f4f4f5;">
+    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background-color: #f4f4f5;">
+        <tr>
+            <td style="padding: 40px 20px;">
+                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 480px; margin: 0 auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 24px rgba(0, 0, 0, 0.08);">
+                    
+                    <!-- Header -->
+                    <tr>
+                        <td style="background: linear-gradient(135deg, #6366f1 0%, #8b5cf6 50%, #a855f7 100%); padding: 32px 40px; text-align: center;">
+                            <h1 style="margin: 0; color: #ffffff; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">PRISM AI</h1>
+                            <p style="margin: 8px 0 0 0; color: rgba(255, 255, 255, 0.9); font-size: 14px; font-weight: 400;">Secure Email Verification</p>
+                        </td>
+                    </tr>
+                    
+                    <!-- Body -->
+                    <tr>
+                        <td style="padding: 40px;">
+                            <h2 style="margin: 0 0 16px 0; color: #18181b; font-size: 20px; font-weight: 600;">Verify Your Email Address</h2>
+                            <p style="margin: 0 0 24px 0; color: #52525b; font-size: 15px; line-height: 1.6;">
+                                Hello! You've requested to verify your email address for your PRISM AI account. Please use the verification code below:
+                            </p>
+                            
+                            <!-- OTP Code Box -->
+                            <div style="background: linear-gradient(135deg, #f8fafc 0%, #f1f5f9 100%); border: 2px solid #e2e8f0; border-radius: 12px; padding: 24px; text-align: center; margin: 24px 0;">
+                                <p style="margin: 0 0 8px 0; color: #64748b; font-size: 12px; text-transform: uppercase; letter-spacing: 1px; font-weight: 600;">Your Verification Code</p>
+                                <div style="font-size: 36px; font-weight: 700; color: #6366f1; letter-spacing: 8px; font-family: 'SF Mono', Monaco, 'Cascadia Code', monospace;">$otp</div>
+                            </div>
+                            
+                            <!-- Expiry Notice -->
+                            <div style="background-color: #fef3c7; border-left: 4px solid #f59e0b; padding: 12px 16px; border-radius: 0 8px 8px 0; margin: 24px 0;">
+                                <p style="margin: 0; color: #92400e; font-size: 13px;">
+                                    <strong>⏱️ This code expires in 10 minutes.</strong> Do not share this code with anyone.
+                                </p>
+                            </div>
+                            
+                            <p style="margin: 24px 0 0 0; color: #71717a; font-size: 13px; line-height: 1.6;">
+                                If you didn't request this verification code, you can safely ignore this email. Your account remains secure.
+                            </p>
+                        </td>
+                    </tr>
+                    
+                    <!-- Footer -->
+                    <tr>
+                        <td style="background-color: #fafafa; padding: 24px 40px; border-top: 1px solid #e4e4e7;">
+                            <p style="margin: 0 0 8px 0; color: #a1a1aa; font-size: 12px; text-align: center;">
+                                This is an automated message from PRISM AI Studio.
+                            </p>
+                            <p style="margin: 0; color: #a1a1aa; font-size: 11px; text-align: center;">
+                                © 2026 PRISM AI. All rights reserved.
+                            </p>
+                        </td>
+                    </tr>
+                    
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+""")
+
+_SIGNUP_OTP_TEXT = Template("""
+PRISM AI - Email Verification
+
+Your verification code is: $otp
+
+This code expires in 10 minutes. Do not share this code with anyone.
+
+If you didn't request this code, please ignore this email.
+
+© 2026 PRISM AI. All rights reserved.
+""")
+
+_RESET_TEMPLATE = Template("""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>PRISM AI - Password Reset</title>
+</head>
+<body style="margin: 0; padding: 0; font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif; background-color: #f4f4f5;">
+    <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="background-color: #f4f4f5;">
+        <tr>
+            <td style="padding: 40px 20px;">
+                <table role="presentation" cellspacing="0" cellpadding="0" border="0" width="100%" style="max-width: 480px; margin: 0 auto; background-color: #ffffff; border-radius: 16px; overflow: hidden; box-shadow: 0 4px 24px rgba(0, 0, 0, 0.08);">
+                    
+                    <!-- Header -->
+                    <tr>
+                        <td style="background: linear-gradient(135deg, #6366f1 0%, #8b5cf6 50%, #a855f7 100%); padding: 32px 40px; text-align: center;">
+                            <h1 style="margin: 0; color: #ffffff; font-size: 28px; font-weight: 700; letter-spacing: -0.5px;">PRISM AI</h1>
+                            <p style="margin: 8px 0 0 0; color: rgba(255, 255, 255, 0.9); font-size: 14px; font-weight: 400;">Password Reset Request</p>
+                        </td>
+                    </tr>
+                    
+                    <!-- Body -->
+                    <tr>
+                        <td style="padding: 40px;">
+                            <h2 style="margin: 0 0 16px 0; color: #18181b; font-size: 20px; font-weight: 600;">Reset Your Password</h2>
+                            <p style="margin: 0 0 24px 0; color: #52525b; font-size: 15px; line-height: 1.6;">
+                                You've requested to reset your password. Use the verification code below to continue:
+                            </p>
+                            
+                            <!-- OTP Code Box -->
+                            <div style="background: linear-gradient(135deg, #f8fafc 0%, #f1f5f9 100%); border: 2px solid #e2e8f0; border-radius: 12px; padding: 24px; text-align: center; margin: 24px 0;">
+                                <p style="margin: 0 0 8px 0; color: #64748b; font-size: 12px; text-transform: uppercase; letter-spacing: 1px; font-weight: 600;">Your Reset Code</p>
+                                <div style="font-size: 36px; font-weight: 700; color: #6366f1; letter-spacing: 8px; font-family: 'SF Mono', Monaco, 'Cascadia Code', monospace;">$otp</div>
+                            </div>
+                            
+                            <!-- Expiry Notice -->
+                            <div style="background-color: #fef3c7; border-left: 4px solid #f59e0b; padding: 12px 16px; border-radius: 0 8px 8px 0; margin: 24px 0;">
+                                <p style="margin: 0; color: #92400e; font-size: 13px;">
+                                    <strong>⏱️ This code expires in 15 minutes.</strong> Do not share this code with anyone.
+                                </p>
+                            </div>
+                            
+                            <!-- Security Note -->
+                            <p style="margin: 24px 0 0 0; color: #71717a; font-size: 13px; line-height: 1.5;">
+                                If you didn't request this password reset, you can safely ignore this email. Your password will remain unchanged.
+                            </p>
+                        </td>
+                    </tr>
+                    
+                    <!-- Footer -->
+                    <tr>
+                        <td style="background-color: #f9fafb; padding: 20px 40px; border-top: 1px solid #e5e7eb;">
+                            <p style="margin: 0; color: #9ca3af; font-size: 12px; text-align: center;">
+                                Secured by PRISM AI • Your Personal AI Assistant
+                            </p>
+                        </td>
+                    </tr>
+                    
+                </table>
+            </td>
+        </tr>
+    </table>
+</body>
+</html>
+""")
+
+_RESET_TEXT = Template("""
+PRISM AI - Password Reset
+
+Your password reset code: $otp
+
+This code expires in 15 minutes.
+Do not share this code with anyone.
+
+If you didn't request this, please ignore this email.
+
+- PRISM AI Team
+""")
+
+
+def render_signup_otp_email(otp: str) -> Tuple[str, str, str]:
+    """(subject, html, text) for the signup/login verification email"""
+    return (
+        "PRISM AI - Your Verification Code",
+        _SIGNUP_OTP_TEMPLATE.substitute(otp=escape(str(otp))),
+        _SIGNUP_OTP_TEXT.substitute(otp=otp),
+    )
+
+
+def render_reset_email(otp: str) -> Tuple[str, str, str]:
+    """(subject, html, text) for the password reset email"""
+    return (
+        "PRISM AI - Password Reset Code",
+        _RESET_TEMPLATE.substitute(otp=escape(str(otp))),
+        _RESET_TEXT.substitute(otp=otp),
+    )
+
+
+async def send_professional_email(task: dict, retry_count: int = 0, max_retries: int = 3):
     """
+    Sends a polished HTML reminder email for a completed task.
+    Includes retry logic for failed attempts.
+    """
+    subject, html_content = render_reminder_email(task)
+    user_email = task.get("user_email") or task.get("email")
+    description = task.get("description", "Your scheduled task")
 
     from_addr = getattr(settings, "SENDER_EMAIL", None) or getattr(settings, "MAIL_FROM", None)
     if not from_addr:
@@ -162,30 +394,14 @@ async def send_professional_email(task: dict, retry_count: int = 0, max_retries:
         print(error_msg)
         raise ValueError(error_msg)
 
-    msg = Mail(
-        from_email=from_addr,
-        to_emails=user_email,
-        subject=f"⏰ Reminder: {description}",
-        html_content=html_content,
-    )
-
     try:
         print(f"📧 Attempting to send email to {user_email}...")
         print(f"   From: {from_addr}")
         print(f"   Subject: Reminder: {description}")
         
-        sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-        response = sg.send(msg)
-        
-        print(f"✅ SendGrid Response: {response.status_code}")
-        print(f"   Body: {response.body}")
-        print(f"   Headers: {response.headers}")
-        
-        if response.status_code in [200, 201, 202]:
-            print(f"✅ Email successfully sent to {user_email}")
-            return True
-        else:
-            raise Exception(f"Unexpected status code: {response.status_code}")
+        await mail_transport.send(user_email, subject, html_content)
+        print(f"✅ Email successfully sent to {user_email}")
+        return True
             
     except Exception as e:
         error_msg = f"❌ SendGrid Error (Attempt {retry_count + 1}/{max_retries}): {str(e)}"
@@ -219,74 +435,20 @@ async def send_otp_email_direct(to_email: str, otp_code: str, subject: Optional[
         raise ValueError("SENDER_EMAIL not configured")
 
     api_key = getattr(settings, "SENDGRID_API_KEY", None)
-    if not api_key:
+    if not api_key and not settings.SMTP_HOST:
         print("⚠️ SendGrid API key not configured - OTP email cannot be sent")
         raise ValueError("SendGrid API key not configured")
 
     subject = subject or "PRISM AI Verification Code"
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    </head>
-    <body style="margin: 0; padding: 20px; background-color: #f5f5f5; font-family: 'Helvetica Neue', Arial, sans-serif;">
-        <div style="max-width: 500px; margin: 0 auto; background-color: #ffffff; border: 1px solid #e5e7eb; border-radius: 12px; overflow: hidden; box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);">
-            <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 24px; text-align: center;">
-                <h1 style="color: white; margin: 0; font-size: 24px; font-weight: 600;">PRISM AI</h1>
-                <p style="color: rgba(255, 255, 255, 0.9); margin: 8px 0 0 0; font-size: 14px;">Verification Code</p>
-            </div>
-            <div style="padding: 32px; text-align: center;">
-                <p style="color: #6b7280; font-size: 16px; margin-bottom: 24px;">Here is your secure verification code:</p>
-                <div style="background-color: #F3F4F6; display: inline-block; padding: 20px 40px; border-radius: 8px; letter-spacing: 8px; font-weight: bold; font-size: 36px; color: #111827; border: 2px solid #E5E7EB;">
-                    {otp_code}
-                </div>
-                <p style="color: #9ca3af; font-size: 14px; margin-top: 24px; line-height: 1.6;">
-                    This code expires in <strong>10 minutes</strong>.<br>
-                    If you didn't request this, please ignore this email.
-                </p>
-            </div>
-            <div style="background-color: #f9fafb; padding: 16px; text-align: center; border-top: 1px solid #e5e7eb;">
-                <p style="color: #9ca3af; font-size: 12px; margin: 0;">Secured by PRISM Personal AI Assistant</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-
-    plain_text_content = f"""
-PRISM AI Verification Code
-
-Your verification code: {otp_code}
-
-This code expires in 10 minutes.
-If you didn't request this, please ignore this email.
-
-Secured by PRISM Personal AI Assistant
-    """
-
     try:
-        msg = Mail(
-            from_email=from_addr,
-            to_emails=to_email,
-            subject=subject,
-            html_content=html_content,
-            plain_text_content=plain_text_content,
+        await mail_transport.send(
+            to_email,
+            subject,
+            _OTP_DIRECT_TEMPLATE.substitute(otp=escape(str(otp_code))),
+            text=_OTP_DIRECT_TEXT.substitute(otp=otp_code),
         )
-
-        sg = SendGridAPIClient(api_key)
-        response = sg.send(msg)
-        
-        status_code = int(getattr(response, "status_code", 0))
-        
-        if 200 <= status_code < 300:
-            print(f"✅ OTP email sent successfully to {to_email} (Status: {status_code})")
-            return True
-        else:
-            error_msg = f"SendGrid returned status {status_code}"
-            print(f"❌ {error_msg}")
-            raise Exception(error_msg)
+        print(f"✅ OTP email sent successfully to {to_email}")
+        return True
             
     except Exception as e:
         print(f"❌ Failed to send OTP email to {to_email}: {e}")
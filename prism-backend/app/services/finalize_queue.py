@@ -0,0 +1,376 @@
+"""
+📮 FINALIZE QUEUE - Write-Behind Persistence for Chat Messages
+================================================================
+
+finalize_generation used to $push both messages synchronously and then
+spawn asyncio.create_task jobs (usage commit, generation cleanup, auto
+rename) that died with the process. Now:
+
+1. finalize appends ONE entry to the chat:finalize stream (XADD) holding
+   the message documents plus what the follow-up jobs need, and answers
+   the client straight away.
+2. A consumer (one per app instance, one shared consumer group) reads
+   batches and applies them with a single ordered bulk_write, so messages
+   of the same chat land in order. Each update is guarded by
+   messages.generation_id $ne, so a redelivered entry never duplicates.
+3. The follow-up jobs (and the rendered-text index highlights use) run
+   after the write, and the entry is acknowledged only after they ran, so
+   a restart re-delivers instead of losing them (usage commit is
+   single-shot per generation, the rest is idempotent).
+4. Failed entries stay pending and are re-claimed (XAUTOCLAIM) after
+   CLAIM_IDLE_MS; after MAX_ATTEMPTS they go to the chat:finalize:dlq list.
+   An update that matched no session goes there at once, and its ledger
+   record is revoked so the client's retry can finalize it again.
+
+Without Redis the InMemoryStore stream would die with the process, so
+enqueue writes through to MongoDB instead.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from app.db.redis_client import redis_client
+from app.services.rendered_text_index import rendered_text_index
+from app.services.session_loader import bump_session_version
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+FINALIZE_STREAM = "chat:finalize"
+FINALIZE_GROUP = "finalize-writers"
+FINALIZE_DLQ = "chat:finalize:dlq"
+ATTEMPTS_KEY = "chat:finalize:attempts"
+STREAM_MAXLEN = 100_000
+BATCH_SIZE = 50
+BLOCK_SECONDS = 2
+MAX_ATTEMPTS = 5
+CLAIM_IDLE_MS = 30 * 1000
+CLAIM_INTERVAL_SECONDS = 15
+CONSUMER_NAME = f"{socket.gethostname()}-{os.getpid()}"
+WRITE_THROUGH_ID = "direct"  # entry id reported when enqueue wrote to MongoDB itself
+DEFAULT_TITLES = ("New Chat", "Chat", "Untitled", "New Conversation", "New Beginning", "New Idea")
+
+
+def _dumps(payload: dict) -> str:
+    return json.dumps(payload, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+
+
+def _restore_timestamps(message: dict) -> dict:
+    if isinstance(message.get("timestamp"), str):
+        message["timestamp"] = datetime.fromisoformat(message["timestamp"])
+    return message
+
+
+class FinalizeQueue:
+    """
+    Usage:
+    ```python
+    from app.services.finalize_queue import finalize_queue
+    await finalize_queue.enqueue(chat_id=..., user_id=..., generation_id=..., messages=[...], jobs={...})
+    ```
+    """
+
+    def __init__(self):
+        self._consumer: Optional[asyncio.Task] = None
+        self._follow_ups: Set[asyncio.Task] = set()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dead_lettered = 0
+
+    # ---------- producer (request path) ----------
+
+    async def enqueue(
+        self,
+        chat_id: str,
+        user_id: str,
+        generation_id: str,
+        messages: List[dict],
+        jobs: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """
+        Durably accept a finalize. One XADD; returns the stream entry id.
+        Without Redis the messages are written before returning (raises if
+        they could not be), and the follow-up jobs run in the background.
+        """
+        payload = _dumps({
+            "chat_id": chat_id,
+            "user_id": user_id,
+            "generation_id": generation_id,
+            "messages": messages,
+            "jobs": jobs or {},
+            "enqueued_at": datetime.utcnow(),
+        })
+        if redis_client.is_using_fallback():
+            return await self._write_through(json.loads(payload))
+        entry_id = await redis_client.xadd(FINALIZE_STREAM, {"payload": payload}, maxlen=STREAM_MAXLEN)
+        self.enqueued += 1
+        return entry_id
+
+    async def _write_through(self, payload: dict) -> str:
+        """Synchronous write for when the stream would only live in this process"""
+        written, failed, missed = await self._write([(WRITE_THROUGH_ID, payload)])
+        if failed or missed:
+            error = failed[0][2] if failed else "session not found"
+            raise RuntimeError(f"Finalize write for {payload['generation_id'][:8]} failed: {error}")
+        task = asyncio.create_task(self._follow_up(written))
+        self._follow_ups.add(task)
+        task.add_done_callback(self._follow_ups.discard)
+        return WRITE_THROUGH_ID
+
+    # ---------- consumer ----------
+
+    def _build_op(self, payload: dict):
+        from pymongo import UpdateOne
+        from app.db.session_schema import session_filter
+
+        updated_at = datetime.fromisoformat(payload["enqueued_at"])
+        return UpdateOne(
+            {
+                **session_filter(payload["chat_id"], payload["user_id"]),
+                "messages.generation_id": {"$ne": payload["generation_id"]},
+            },
+            {
+                "$push": {"messages": {"$each": [_restore_timestamps(m) for m in payload["messages"]]}},
+                "$set": {"updated_at": updated_at, "updatedAt": updated_at},
+            },
+        )
+
+    async def _write(
+        self, batch: List[Tuple[str, dict]]
+    ) -> Tuple[List[Tuple[str, dict]], List[Tuple[str, dict, str]], List[Tuple[str, dict]]]:
+        """
+        Apply a batch with ordered bulk_write. An ordered batch stops at the
+        first failing op: everything before it is applied, the failing entry
+        is reported, and the remainder is retried right away. Applied ops
+        that matched fewer sessions than they number are re-checked one by
+        one: an update matches nothing both when it was already written
+        (redelivery) and when its session does not exist (missed).
+        """
+        from pymongo.errors import BulkWriteError
+        from app.db.mongo_client import sessions_collection
+
+        written: List[Tuple[str, dict]] = []
+        failed: List[Tuple[str, dict, str]] = []
+        missed: List[Tuple[str, dict]] = []
+        remaining = batch
+        while remaining:
+            try:
+                result = await sessions_collection.bulk_write([self._build_op(p) for _, p in remaining], ordered=True)
+                applied, matched = remaining, result.matched_count
+                remaining = []
+            except BulkWriteError as e:
+                details = e.details or {}
+                errors = details.get("writeErrors") or [{"index": 0, "errmsg": str(e)}]
+                index = errors[0].get("index", 0)
+                applied, matched = remaining[:index], details.get("nMatched", index)
+                entry_id, payload = remaining[index]
+                failed.append((entry_id, payload, errors[0].get("errmsg", str(e))))
+                remaining = remaining[index + 1:]
+            except Exception as e:
+                failed.extend((entry_id, payload, str(e)) for entry_id, payload in remaining)
+                break
+            if matched >= len(applied):
+                written.extend(applied)
+                continue
+            try:
+                found = await asyncio.gather(*(
+                    sessions_collection.find_one(self._landed_filter(payload), {"_id": 1})
+                    for _, payload in applied
+                ))
+            except Exception as e:
+                # Safe to retry: the generation_id guard skips what did land
+                failed.extend((entry_id, payload, f"re-check failed: {e}") for entry_id, payload in applied)
+                continue
+            for entry, doc in zip(applied, found):
+                (written if doc else missed).append(entry)
+        self.batches += 1
+        self.written += len(written)
+        return written, failed, missed
+
+    def _landed_filter(self, payload: dict) -> dict:
+        from app.db.session_schema import session_filter
+
+        return {**session_filter(payload["chat_id"], payload["user_id"]), "messages.generation_id": payload["generation_id"]}
+
+    async def _run_jobs(self, payload: dict):
+        """Follow-up work that used to be fire-and-forget in finalize"""
+        jobs = payload.get("jobs") or {}
+        generation_id = payload["generation_id"]
+        work = []
+        if jobs.get("commit_usage"):
+            work.append(self._commit_usage(payload["user_id"], generation_id, jobs["commit_usage"]))
+        if jobs.get("auto_rename"):
+            work.append(self._auto_rename(payload["chat_id"], payload["user_id"], jobs["auto_rename"]))
+        if jobs.get("cleanup_generation"):
+            work.append(self._finish_generation(generation_id))
+        work.extend(
+            rendered_text_index.precompute(m["content"])
+            for m in payload["messages"]
+            if m.get("role") == "assistant" and m.get("content")
+        )
+        for outcome in await asyncio.gather(*work, return_exceptions=True):
+            if isinstance(outcome, Exception):
+                logger.warning(f"⚠️ Finalize follow-up job failed for {generation_id[:8]}: {outcome}")
+
+    async def _commit_usage(self, user_id: str, generation_id: str, usage: dict):
+        """Exactly once per generation_id (GenerationManager.commit_usage is SETNX-guarded)"""
+        from app.routers.api_keys import get_current_key_id_for_user, increment_free_usage, increment_user_key_usage
+        from app.services.generation_manager import GenerationManager
+
+        gen_manager = GenerationManager(redis_client)
+        should_commit, reason = await gen_manager.commit_usage(generation_id)
+        if not should_commit:
+            logger.debug(f"🔄 Usage already committed for {generation_id[:8]}... ({reason})")
+            return
+        if usage.get("key_source") == "platform":
+            usage_result = await increment_free_usage(user_id, generation_id)
+            if usage_result.get("success"):
+                logger.info(f"✅ [SINGLE-SHOT] Free usage: {usage_result['new_count']}/10 for user {user_id[:8]}...")
+        else:
+            key_id = usage.get("key_id") or await get_current_key_id_for_user(user_id)
+            if key_id:
+                await increment_user_key_usage(user_id, key_id, generation_id)
+                logger.info(f"✅ [SINGLE-SHOT] User key usage tracked for {user_id[:8]}...")
+
+    async def _finish_generation(self, generation_id: str):
+        from app.services.generation_manager import GenerationManager
+
+        gen_manager = GenerationManager(redis_client)
+        await gen_manager.update_status(generation_id, "finalized")
+        await gen_manager.cleanup(generation_id)
+
+    async def _auto_rename(self, chat_id: str, user_id: str, context: dict):
+        """Title a chat that still has a default title after its first turns"""
+        from app.db.mongo_client import sessions_collection
+        from app.db.session_schema import session_filter
+
+        session = await sessions_collection.find_one(session_filter(chat_id, user_id), {"title": 1, "messages": 1})
+        if not session:
+            return
+        if session.get("title", "New Chat") not in DEFAULT_TITLES or len(session.get("messages", [])) > 6:
+            return
+
+        from app.utils.llm_client import generate_chat_title
+
+        new_title = await generate_chat_title(context.get("prompt", ""), context.get("response", ""))
+        if new_title and len(new_title) > 2:
+            await sessions_collection.update_one(session_filter(chat_id, user_id), {"$set": {"title": new_title}})
+            logger.info(f"✨ Auto-Renamed Session {chat_id} -> '{new_title}'")
+
+    async def _fail(self, entry_id: str, payload: dict, error: str):
+        """Count a failed attempt; dead-letter the entry once it ran out of attempts"""
+        attempts = await redis_client.hincrby(ATTEMPTS_KEY, entry_id, 1)
+        if attempts < MAX_ATTEMPTS:
+            logger.warning(f"⚠️ Finalize write {entry_id} failed (attempt {attempts}/{MAX_ATTEMPTS}): {error}")
+            return
+        logger.error(f"💀 Finalize write {entry_id} failed permanently, moving to DLQ: {error}")
+        await self._dead_letter(entry_id, payload, error)
+
+    async def _miss(self, entry_id: str, payload: dict):
+        """The update matched no session: retrying can't help, and the ledger must not say "done" """
+        from app.utils.idempotency import FinalizeLedger
+
+        logger.error(f"💀 Finalize write {entry_id} matched no session {payload['chat_id']}, moving to DLQ")
+        await self._dead_letter(entry_id, payload, "session not found")
+        await FinalizeLedger.revoke(payload["generation_id"])
+
+    async def _dead_letter(self, entry_id: str, payload: dict, error: str):
+        await redis_client.lpush(FINALIZE_DLQ, _dumps({"entry_id": entry_id, "payload": payload, "error": error}))
+        await redis_client.xack(FINALIZE_STREAM, FINALIZE_GROUP, entry_id)
+        await redis_client.hdel(ATTEMPTS_KEY, entry_id)
+        self.dead_lettered += 1
+
+    async def _follow_up(self, written: List[Tuple[str, dict]]):
+        await asyncio.gather(*(self._run_jobs(payload) for _, payload in written))
+        # after the jobs: auto-rename changes the title the page shows
+        await asyncio.gather(*(bump_session_version(c) for c in {p["chat_id"] for _, p in written}))
+
+    async def process_batch(self, entries: List[Tuple[str, dict]]) -> int:
+        """Write, run follow-ups, acknowledge. Returns the number of entries acknowledged."""
+        batch = []
+        for entry_id, fields in entries:
+            try:
+                batch.append((entry_id, json.loads(fields["payload"])))
+            except Exception as e:
+                await redis_client.lpush(FINALIZE_DLQ, _dumps({"entry_id": entry_id, "fields": fields, "error": f"bad payload: {e}"}))
+                await redis_client.xack(FINALIZE_STREAM, FINALIZE_GROUP, entry_id)
+
+        written, failed, missed = await self._write(batch)
+        await self._follow_up(written)
+        if written:
+            ids = [entry_id for entry_id, _ in written]
+            await redis_client.xack(FINALIZE_STREAM, FINALIZE_GROUP, *ids)
+            await redis_client.hdel(ATTEMPTS_KEY, *ids)
+        for entry_id, payload, error in failed:
+            await self._fail(entry_id, payload, error)
+        for entry_id, payload in missed:
+            await self._miss(entry_id, payload)
+        return len(written)
+
+    async def _consume(self):
+        from redis.exceptions import ResponseError
+
+        await redis_client.xgroup_create(FINALIZE_STREAM, FINALIZE_GROUP)
+        loop = asyncio.get_running_loop()
+        last_claim = 0.0
+        while True:
+            try:
+                entries = []
+                if loop.time() - last_claim >= CLAIM_INTERVAL_SECONDS:
+                    last_claim = loop.time()
+                    entries = await redis_client.xautoclaim(
+                        FINALIZE_STREAM, FINALIZE_GROUP, CONSUMER_NAME, CLAIM_IDLE_MS, count=BATCH_SIZE,
+                    )
+                if not entries:
+                    entries = await redis_client.xreadgroup(
+                        FINALIZE_STREAM, FINALIZE_GROUP, CONSUMER_NAME,
+                        count=BATCH_SIZE, block_ms=BLOCK_SECONDS * 1000,
+                    )
+                if entries:
+                    await self.process_batch(entries)
+            except asyncio.CancelledError:
+                raise
+            except ResponseError as e:
+                if "NOGROUP" in str(e):
+                    await redis_client.xgroup_create(FINALIZE_STREAM, FINALIZE_GROUP)
+                    continue
+                logger.error(f"❌ Finalize consumer error: {e}")
+                await asyncio.sleep(1)
+            except Exception as e:
+                logger.error(f"❌ Finalize consumer error: {e}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        """Start the consumer (call from app lifespan)"""
+        if self._consumer is None or self._consumer.done():
+            self._consumer = asyncio.create_task(self._consume())
+
+    async def stop(self):
+        if self._consumer:
+            self._consumer.cancel()
+            try:
+                await self._consumer
+            except asyncio.CancelledError:
+                pass
+            self._consumer = None
+        if self._follow_ups:
+            await asyncio.gather(*self._follow_ups, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "dead_lettered": self.dead_lettered,
+            "consumer_running": bool(self._consumer and not self._consumer.done()),
+        }
+
+
+# Global singleton
+finalize_queue = FinalizeQueue()
@@ -1,5 +1,6 @@
 from app.db.neo4j_client import query_graph
 from app.utils.llm_client import get_llm_response
+from app.services.graph_snapshot import graph_snapshots
 import json
 from typing import List, Dict, Any
 
@@ -108,6 +109,7 @@ async def save_knowledge(user_id: str, text: str):
                     "MATCH (u:User {id: $user_id})-[r:LIVES_IN]->() DELETE r",
                     {"user_id": user_id}
                 )
+                await graph_snapshots.remove_edge(user_id, "LIVES_IN")
 
             if head.lower() == "user":
                 query = f"""
@@ -116,6 +118,7 @@ async def save_knowledge(user_id: str, text: str):
                 MERGE (u)-[:{rel_type}]->(t)
                 """
                 await query_graph(query, params)
+                await graph_snapshots.record_edges(user_id, [(rel_type, tail, "Entity")])
             else:
                 # Fallback for non-user heads: still use MERGE to avoid duplicates
                 query = f"""
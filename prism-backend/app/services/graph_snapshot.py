@@ -0,0 +1,274 @@
+"""
+🕸️ GRAPH SNAPSHOT CACHE - Per-User Knowledge Graph in Redis
+===========================================================
+
+The memory graph page and every history turn used to rebuild the user's
+graph from Neo4j. Each user now has a compact snapshot in ONE Redis hash:
+
+    graph:snapshot:{user_id}
+        _v                -> version (bumped on every change)
+        _ok               -> "1" once a full load from Neo4j completed
+        e:{REL}|{target}  -> "{label}|{updated_at}"     (direct edges)
+        x:{target}        -> [[rel, name], ...]          (2-hop neighbours)
+
+Write paths (graph write batcher, orchestrator store/delete, graph_service)
+patch the hash incrementally, so reads never touch Neo4j unless the snapshot
+is missing or has expired (SNAPSHOT_TTL bounds staleness of 2-hop data and
+of writers that bypass these hooks).
+"""
+
+import asyncio
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+SNAPSHOT_KEY_TEMPLATE = "graph:snapshot:{user_id}"
+SNAPSHOT_TTL_SECONDS = 6 * 3600
+VERSION_FIELD = "_v"
+COMPLETE_FIELD = "_ok"
+EDGE_PREFIX = "e:"
+RELATED_PREFIX = "x:"
+MAX_EDGES = 200
+MAX_RELATED_PER_NODE = 5
+
+SNAPSHOT_QUERY = """
+MATCH (u:User {id: $user_id})-[r]->(n)
+WITH u, r, n, coalesce(r.updatedAt, r.createdAt, r.created_at, "") AS ts
+ORDER BY ts DESC
+LIMIT $max_edges
+OPTIONAL MATCH (n)-[r2]->(related)
+WHERE NOT (u)-->(related)
+WITH r, n, ts, collect(DISTINCT [type(r2), related.name])[..$max_related] AS related
+RETURN type(r) AS rel,
+       coalesce(n.name, n.title, n.value) AS target,
+       labels(n) AS labels,
+       ts,
+       related
+"""
+
+
+@dataclass
+class GraphEdge:
+    rel_type: str
+    target: str
+    label: str
+    updated_at: str
+
+
+@dataclass
+class GraphSnapshot:
+    """Decoded snapshot; edges are newest first"""
+    user_id: str
+    version: int
+    edges: List[GraphEdge] = field(default_factory=list)
+    related: Dict[str, List[Tuple[str, str]]] = field(default_factory=dict)
+
+    def to_visualization(self, limit: int = 100) -> Dict[str, List[dict]]:
+        """Nodes/links for the force-directed memory graph"""
+        nodes = [{"id": self.user_id, "name": "Me", "group": "user", "val": 20}]
+        links = []
+        seen = {self.user_id}
+        for edge in self.edges[:limit]:
+            target_id = f"node_{edge.target}"
+            if target_id not in seen:
+                nodes.append({"id": target_id, "name": edge.target, "group": edge.label, "val": 10})
+                seen.add(target_id)
+            links.append({"source": self.user_id, "target": target_id, "label": edge.rel_type})
+        return {"nodes": nodes, "links": links}
+
+    def to_relationships(self, limit: int = 15) -> List[dict]:
+        """Direct + inferred (2-hop) relationships for prompt context"""
+        relationships = []
+        seen = set()
+        for edge in self.edges:
+            if len(relationships) >= limit:
+                break
+            if edge.target not in seen:
+                relationships.append({"type": edge.rel_type, "target": edge.target, "depth": 1})
+                seen.add(edge.target)
+            for _, name in self.related.get(edge.target, []):
+                if name and name not in seen:
+                    relationships.append({
+                        "type": "RELATED_VIA_" + edge.target,
+                        "target": name,
+                        "depth": 2,
+                        "reasoning": f"Because you like {edge.target}",
+                    })
+                    seen.add(name)
+        return relationships
+
+
+def _edge_field(rel_type: str, target: str) -> str:
+    return f"{EDGE_PREFIX}{rel_type}|{target}"
+
+
+class GraphSnapshotCache:
+    """
+    Usage:
+    ```python
+    from app.services.graph_snapshot import graph_snapshots
+    snapshot = await graph_snapshots.get(user_id)          # None if unavailable
+    await graph_snapshots.record_edges(user_id, [("LIKES", "ai", "Interest")])
+    await graph_snapshots.remove_edge(user_id, "LIKES", "ai")
+    ```
+    """
+
+    def __init__(self):
+        self._rebuilding: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.rebuilds = 0
+
+    @staticmethod
+    def _key(user_id: str) -> str:
+        return SNAPSHOT_KEY_TEMPLATE.format(user_id=user_id)
+
+    # ---------- reads ----------
+
+    @staticmethod
+    def _decode(user_id: str, raw: Dict[str, str]) -> GraphSnapshot:
+        snapshot = GraphSnapshot(user_id=user_id, version=int(raw.get(VERSION_FIELD, 0) or 0))
+        for name, value in raw.items():
+            if name.startswith(EDGE_PREFIX):
+                rel_type, _, target = name[len(EDGE_PREFIX):].partition("|")
+                label, _, updated_at = str(value).partition("|")
+                snapshot.edges.append(GraphEdge(rel_type, target, label or "Entity", updated_at))
+            elif name.startswith(RELATED_PREFIX):
+                try:
+                    snapshot.related[name[len(RELATED_PREFIX):]] = [tuple(pair) for pair in json.loads(value)]
+                except (TypeError, ValueError):
+                    continue
+        snapshot.edges.sort(key=lambda edge: edge.updated_at, reverse=True)
+        return snapshot
+
+    async def get(self, user_id: str) -> Optional[GraphSnapshot]:
+        """Serve from Redis; rebuild from Neo4j only when missing/expired"""
+        raw = await redis_client.hgetall(self._key(user_id)) or {}
+        if raw.get(COMPLETE_FIELD):
+            self.hits += 1
+            return self._decode(user_id, raw)
+
+        pending = self._rebuilding.get(user_id)
+        if pending:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._rebuilding[user_id] = future
+        try:
+            snapshot = await self._rebuild(user_id)
+        except Exception as e:
+            logger.warning(f"🕸️ Graph snapshot rebuild failed for {user_id}: {e}")
+            snapshot = None
+        finally:
+            self._rebuilding.pop(user_id, None)
+        future.set_result(snapshot)
+        return snapshot
+
+    async def _rebuild(self, user_id: str) -> Optional[GraphSnapshot]:
+        from app.db.neo4j_client import neo4j_client
+
+        if not neo4j_client.is_available:
+            return None
+
+        key = self._key(user_id)
+        version_before = await redis_client.hget(key, VERSION_FIELD)
+        records = await neo4j_client.read(SNAPSHOT_QUERY, {
+            "user_id": user_id,
+            "max_edges": MAX_EDGES,
+            "max_related": MAX_RELATED_PER_NODE,
+        }, strict=True)
+        if records is None:
+            return None
+        self.rebuilds += 1
+
+        mapping: Dict[str, str] = {}
+        for record in records:
+            target = record.get("target")
+            if not target:
+                continue
+            target = str(target)
+            label = (record.get("labels") or ["Entity"])[0]
+            mapping[_edge_field(record["rel"], target)] = f"{label}|{record.get('ts') or ''}"
+            related = [pair for pair in record.get("related") or [] if pair and pair[1]]
+            if related:
+                mapping[f"{RELATED_PREFIX}{target}"] = json.dumps(related)
+
+        existing = await redis_client.hgetall(key) or {}
+        stale = [
+            name for name in existing
+            if name.startswith((EDGE_PREFIX, RELATED_PREFIX)) and name not in mapping
+        ]
+        if stale:
+            await redis_client.hdel(key, *stale)
+        if mapping:
+            await redis_client.hset(key, mapping=mapping)
+
+        # A concurrent write/delete landed while we were reading Neo4j: keep
+        # the hash but leave it incomplete so the next read reloads.
+        if await redis_client.hget(key, VERSION_FIELD) == version_before:
+            await redis_client.hset(key, COMPLETE_FIELD, "1")
+        await redis_client.expire(key, SNAPSHOT_TTL_SECONDS)
+
+        return self._decode(user_id, {**mapping, VERSION_FIELD: version_before or 0})
+
+    # ---------- incremental updates ----------
+
+    async def record_edges(self, user_id: str, edges: Iterable[Tuple[str, str, str]]):
+        """Upsert direct edges (rel_type, target, label); never raises"""
+        timestamp = datetime.utcnow().isoformat()
+        mapping = {
+            _edge_field(rel_type, str(target)): f"{label}|{timestamp}"
+            for rel_type, target, label in edges
+            if rel_type and target
+        }
+        if not mapping:
+            return
+        key = self._key(user_id)
+        try:
+            await redis_client.hset(key, mapping=mapping)
+            await self._bump_version(key)
+        except Exception as e:
+            logger.debug(f"Graph snapshot update failed, invalidating: {e}")
+            await self.invalidate(user_id)
+
+    async def remove_edge(self, user_id: str, rel_type: str, target: Optional[str] = None):
+        """Drop one edge, or every edge of rel_type when target is None"""
+        key = self._key(user_id)
+        try:
+            if target is not None:
+                fields = [_edge_field(rel_type, target)]
+            else:
+                prefix = _edge_field(rel_type, "")
+                fields = [name for name in (await redis_client.hgetall(key) or {}) if name.startswith(prefix)]
+            if fields:
+                await redis_client.hdel(key, *fields)
+            await self._bump_version(key)
+        except Exception as e:
+            logger.debug(f"Graph snapshot removal failed, invalidating: {e}")
+            await self.invalidate(user_id)
+
+    @staticmethod
+    async def _bump_version(key: str):
+        if await redis_client.hincrby(key, VERSION_FIELD, 1) == 1:
+            # Fresh (incomplete) hash - make sure it can't outlive a snapshot
+            await redis_client.expire(key, SNAPSHOT_TTL_SECONDS)
+
+    async def invalidate(self, user_id: str):
+        """Forget the snapshot entirely (bulk deletes, account removal)"""
+        try:
+            await redis_client.delete(self._key(user_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Graph snapshot invalidation failed for {user_id}: {e}")
+
+    def get_stats(self) -> dict:
+        return {"hits": self.hits, "rebuilds": self.rebuilds}
+
+
+# Global singleton
+graph_snapshots = GraphSnapshotCache()
@@ -7,6 +7,9 @@ Manages multiple Groq API keys with:
 - Real-time rate tracking in Redis
 - Instant failover on errors
 - Zero-overhead key selection
+- Token-per-minute admission: callers pass the predicted prompt + output
+  tokens (see output_estimator), keys that cannot absorb them are skipped,
+  and the reservation is settled to the real count after the stream
 
 Capacity: 5 keys × 30 req/min = 150 req/min = 2000+ users
 """
@@ -27,6 +30,8 @@ UNHEALTHY_COOLDOWN = 60  # seconds to wait before re-enabling a key
 RATE_LIMIT_COOLDOWN = 60  # seconds to wait after rate limit
 ERROR_COOLDOWN = 30  # seconds to wait after other errors
 USAGE_KEY_TTL = 120  # seconds for usage counter TTL
+DEFAULT_TOKEN_LIMIT = 6000  # tokens per minute per key (prompt + output)
+TOKEN_USAGE_KEY = "groq_pool:tokens:{minute}"  # hash: key index -> tokens this minute
 
 
 # ============ REDIS HELPER ============
@@ -60,6 +65,7 @@ class GroqKeyConfig:
     index: int
     label: str
     rate_limit: int = DEFAULT_RATE_LIMIT
+    token_limit: int = DEFAULT_TOKEN_LIMIT
     is_healthy: bool = True
     last_error_time: float = field(default=0.0)
     error_count: int = field(default=0)
@@ -118,11 +124,13 @@ class GroqKeyPool:
                         raw_keys.append(key.strip())
             
             # Create key configs and clients
+            token_limit = getattr(settings, 'GROQ_TOKENS_PER_MINUTE', None) or DEFAULT_TOKEN_LIMIT
             for idx, key in enumerate(raw_keys):
                 config = GroqKeyConfig(
                     key=key,
                     index=idx,
-                    label=f"Platform Key #{idx + 1}"
+                    label=f"Platform Key #{idx + 1}",
+                    token_limit=token_limit
                 )
                 self.keys.append(config)
                 self.clients[idx] = AsyncGroq(api_key=key)
@@ -130,11 +138,26 @@ class GroqKeyPool:
             self._initialized = True
             logger.info(f"⚡ Groq Pool initialized with {len(self.keys)} keys (capacity: {len(self.keys) * 30} req/min)")
     
-    async def get_best_key(self) -> Tuple[Optional[GroqKeyConfig], Optional[AsyncGroq]]:
+    async def _token_usage(self, redis) -> Dict[int, int]:
+        """Tokens admitted per key index in the current minute"""
+        if not redis:
+            return {}
+        try:
+            raw = await redis.hgetall(TOKEN_USAGE_KEY.format(minute=int(time.time() // 60)))
+            return {int(k): int(v) for k, v in (raw or {}).items()}
+        except Exception as e:
+            logger.warning(f"⚠️ Token usage read failed: {e}")
+            return {}
+    
+    async def get_best_key(self, estimated_tokens: int = 0) -> Tuple[Optional[GroqKeyConfig], Optional[AsyncGroq]]:
         """
         Get the best available key using least-used strategy.
+        Keys whose token budget this minute cannot absorb estimated_tokens
+        are skipped (they would 429 mid-stream). An estimate above a whole
+        minute's budget is clamped to it, so such a request waits for an
+        idle key instead of skipping every key.
         Time complexity: O(n) where n = number of keys (max 5)
-        Redis calls: n GETs (batched via asyncio.gather)
+        Redis calls: n GETs (batched via asyncio.gather) + 1 HGETALL
         
         Returns: (key_config, client) or (None, None) if all exhausted
         """
@@ -152,7 +175,9 @@ class GroqKeyPool:
             
             # Batch get all key usages (using our helper since RedisClient lacks mget)
             usage_keys = [f"groq_pool:usage:{k.index}:{current_minute}" for k in self.keys]
-            usages = await redis_mget(redis, usage_keys)
+            usages, token_usage = await asyncio.gather(
+                redis_mget(redis, usage_keys), self._token_usage(redis)
+            )
             
             # Find healthy key with lowest usage
             best_key = None
@@ -176,6 +201,11 @@ class GroqKeyPool:
                 if usage >= config.rate_limit:
                     continue
                 
+                # Skip if the predicted tokens would blow the TPM budget
+                needed = min(estimated_tokens, config.token_limit)
+                if needed and token_usage.get(config.index, 0) + needed > config.token_limit:
+                    continue
+                
                 if usage < lowest_usage:
                     lowest_usage = usage
                     best_key = config
@@ -230,6 +260,44 @@ class GroqKeyPool:
         except Exception as e:
             logger.warning(f"⚠️ Failed to increment usage: {e}")
     
+    async def reserve_tokens(self, key_index: int, tokens: int) -> int:
+        """
+        Charge predicted tokens to a key's current-minute budget.
+        Returns the minute bucket to hand back to settle_tokens.
+        """
+        current_minute = int(time.time() // 60)
+        try:
+            redis = get_redis()
+            if redis and tokens > 0:
+                usage_key = TOKEN_USAGE_KEY.format(minute=current_minute)
+                await redis.hincrby(usage_key, str(key_index), int(tokens))
+                await redis.expire(usage_key, USAGE_KEY_TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to reserve tokens: {e}")
+        return current_minute
+    
+    async def settle_tokens(self, key_index: int, minute: int, reserved: int, actual: int) -> None:
+        """Correct a reservation to the real token count once the stream ended"""
+        delta = int(actual) - int(reserved)
+        if not delta:
+            return
+        try:
+            redis = get_redis()
+            if redis:
+                await redis.hincrby(TOKEN_USAGE_KEY.format(minute=minute), str(key_index), delta)
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to settle tokens: {e}")
+    
+    async def token_headroom(self) -> int:
+        """Largest token budget any healthy key can still admit this minute"""
+        if not self._initialized:
+            await self.initialize()
+        token_usage = await self._token_usage(get_redis())
+        return max(
+            (max(0, k.token_limit - token_usage.get(k.index, 0)) for k in self.keys if k.is_healthy),
+            default=0,
+        )
+    
     async def mark_unhealthy(self, key_index: int, duration_seconds: int = UNHEALTHY_COOLDOWN) -> None:
         """Temporarily mark a key as unhealthy (e.g., after error)"""
         try:
@@ -277,6 +345,7 @@ class GroqKeyPool:
                 "keys": []
             }
             
+            token_usage = await self._token_usage(redis)
             for config in self.keys:
                 usage = 0
                 if redis:
@@ -295,6 +364,8 @@ class GroqKeyPool:
                     "usage": usage,
                     "limit": config.rate_limit,
                     "available": max(0, config.rate_limit - usage),
+                    "tokens_used": token_usage.get(config.index, 0),
+                    "token_limit": config.token_limit,
                     "is_healthy": config.is_healthy,
                     "error_count": config.error_count,
                     "time_until_recovery": round(time_until_recovery, 1)
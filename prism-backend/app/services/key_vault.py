@@ -0,0 +1,280 @@
+"""
+🔐 USER KEY VAULT - Process-Local BYOK Key Cache
+================================================
+
+Resolving a user's own (BYOK) API key used to cost a Redis GET for the key
+list, a MongoDB find_one for `encrypted_key` and a Fernet decrypt on EVERY
+generation. The vault keeps each user's ordered key list - with the secret
+already decrypted - in process memory only:
+
+- Hit path: zero database round-trips, zero decryption
+- Short TTL (60s) + daily rollover bound staleness
+- Explicit invalidation on add/delete/reorder/activate/exhaust, broadcast to
+  every app instance over Redis pub/sub
+- Decrypted secrets never leave the process (never written to Redis)
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+VAULT_TTL_SECONDS = 60
+VAULT_MAX_USERS = 10_000
+PLAINTEXT_MEMO_SIZE = 4_096
+INVALIDATION_CHANNEL = "keyvault:invalidate"
+LISTENER_RETRY_SECONDS = 5
+
+
+@dataclass
+class VaultKey:
+    """One decrypted user API key plus the fields key rotation needs"""
+    id: ObjectId
+    label: str
+    model: str
+    priority: int
+    is_active: bool
+    is_exhausted_today: bool
+    last_request_date: Optional[str]
+    api_key: str = field(repr=False)
+
+    def as_doc(self) -> dict:
+        """Shape compatible with the api_keys document callers expect"""
+        return {
+            "_id": self.id,
+            "label": self.label,
+            "model": self.model,
+            "priority": self.priority,
+            "is_active": self.is_active,
+            "is_exhausted_today": self.is_exhausted_today,
+            "last_request_date": self.last_request_date,
+            "api_key": self.api_key,
+        }
+
+
+@dataclass
+class _VaultEntry:
+    keys: List[VaultKey]
+    loaded_at: float
+    day: str
+
+    def is_fresh(self) -> bool:
+        return (
+            time.monotonic() - self.loaded_at < VAULT_TTL_SECONDS
+            and self.day == date.today().isoformat()
+        )
+
+
+class UserKeyVault:
+    """
+    Per-process cache of decrypted user API keys.
+
+    Usage:
+    ```python
+    from app.services.key_vault import key_vault
+    key = await key_vault.next_available(user_id)   # dict with "api_key"
+    await key_vault.invalidate(user_id)             # after any key mutation
+    ```
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, _VaultEntry]" = OrderedDict()
+        self._plaintext: "OrderedDict[str, str]" = OrderedDict()  # ciphertext -> plaintext
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Invalidation epochs: a load is cached only if its user wasn't
+        # dropped after the load started (it may hold a deleted/rotated key)
+        self._epoch = 0
+        self._dropped_at: Dict[str, int] = {}
+        self._inflight_epochs: List[int] = []
+        self._instance_id = uuid.uuid4().hex[:12]
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- decryption memo ----------
+
+    def _decrypt(self, ciphertext: str) -> str:
+        cached = self._plaintext.get(ciphertext)
+        if cached is not None:
+            self._plaintext.move_to_end(ciphertext)
+            return cached
+        from app.routers.api_keys import decrypt_api_key
+        plaintext = decrypt_api_key(ciphertext)
+        self._plaintext[ciphertext] = plaintext
+        if len(self._plaintext) > PLAINTEXT_MEMO_SIZE:
+            self._plaintext.popitem(last=False)
+        return plaintext
+
+    # ---------- loading ----------
+
+    async def _load(self, user_id: str) -> _VaultEntry:
+        """One MongoDB query for all of a user's keys, ordered by priority"""
+        from app.db.mongo_client import db
+
+        docs = await db.api_keys.find(
+            {"user_id": user_id},
+            {
+                "encrypted_key": 1, "label": 1, "model": 1, "priority": 1,
+                "is_active": 1, "is_exhausted_today": 1, "last_exhausted_date": 1,
+                "last_request_date": 1, "created_at": 1,
+            },
+        ).sort([("priority", 1), ("created_at", 1)]).to_list(100)
+
+        today = date.today().isoformat()
+        keys: List[VaultKey] = []
+        for doc in docs:
+            try:
+                secret = self._decrypt(doc["encrypted_key"])
+            except Exception as e:
+                # Undecryptable keys are treated as unavailable
+                logger.error(f"🔐 Vault could not decrypt key {doc.get('_id')}: {type(e).__name__}")
+                continue
+            keys.append(VaultKey(
+                id=doc["_id"],
+                label=doc.get("label", "My API Key"),
+                model=doc.get("model", "llama-3.1-8b-instant"),
+                priority=doc.get("priority", 999),
+                is_active=doc.get("is_active", False),
+                # Exhaustion only counts for the day it happened (daily provider reset)
+                is_exhausted_today=bool(doc.get("is_exhausted_today")) and doc.get("last_exhausted_date") == today,
+                last_request_date=doc.get("last_request_date"),
+                api_key=secret,
+            ))
+
+        return _VaultEntry(keys=keys, loaded_at=time.monotonic(), day=today)
+
+    async def get_keys(self, user_id: str) -> List[VaultKey]:
+        """Return the user's keys (priority order), loading at most once concurrently"""
+        entry = self._entries.get(user_id)
+        if entry and entry.is_fresh():
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return entry.keys
+
+        self.misses += 1
+        pending = self._loading.get(user_id)
+        if pending:
+            return (await asyncio.shield(pending)).keys
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        started = self._epoch
+        self._inflight_epochs.append(started)
+        try:
+            entry = await self._load(user_id)
+            if self._dropped_at.get(user_id, 0) <= started:
+                self._entries[user_id] = entry
+                self._entries.move_to_end(user_id)
+                if len(self._entries) > VAULT_MAX_USERS:
+                    self._entries.popitem(last=False)
+            future.set_result(entry)
+            return entry.keys
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so waiters-less futures don't log warnings
+            future.exception()
+            raise
+        finally:
+            self._inflight_epochs.remove(started)
+            if self._loading.get(user_id) is future:
+                self._loading.pop(user_id, None)
+
+    async def next_available(self, user_id: str, exclude_key_id: Optional[ObjectId] = None) -> Optional[dict]:
+        """First non-exhausted key by priority, or None"""
+        exclude = str(exclude_key_id) if exclude_key_id else None
+        for key in await self.get_keys(user_id):
+            if key.is_exhausted_today or str(key.id) == exclude:
+                continue
+            return key.as_doc()
+        return None
+
+    # ---------- invalidation ----------
+
+    def _drop(self, user_id: str):
+        self._entries.pop(user_id, None)
+        self._epoch += 1
+        self._dropped_at[user_id] = self._epoch
+        # An in-flight load may predate the change; later callers must reload
+        self._loading.pop(user_id, None)
+        if len(self._dropped_at) > VAULT_MAX_USERS:
+            # Drops older than every in-flight load can't affect anything
+            floor = min(self._inflight_epochs, default=self._epoch)
+            self._dropped_at = {uid: epoch for uid, epoch in self._dropped_at.items() if epoch > floor}
+
+    async def mark_exhausted(self, user_id: str, key_id: ObjectId):
+        """Flip the local copy immediately, then tell other instances"""
+        entry = self._entries.get(user_id)
+        if entry:
+            for key in entry.keys:
+                if str(key.id) == str(key_id):
+                    key.is_exhausted_today = True
+        await self._broadcast(user_id)
+
+    async def invalidate(self, user_id: str):
+        """Drop the user's entry here and on every other instance"""
+        self._drop(user_id)
+        await self._broadcast(user_id)
+
+    async def _broadcast(self, user_id: str):
+        try:
+            from app.db.redis_client import redis_client
+            await redis_client.publish(INVALIDATION_CHANNEL, f"{self._instance_id}:{user_id}")
+        except Exception as e:
+            logger.warning(f"⚠️ Vault invalidation broadcast failed: {e}")
+
+    # ---------- pub/sub listener ----------
+
+    def start(self):
+        """Start the invalidation listener (call from app lifespan)"""
+        if self._listener is None or self._listener.done():
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        from app.db.redis_client import redis_client
+
+        while True:
+            try:
+                async for message in redis_client.subscribe(INVALIDATION_CHANNEL):
+                    origin, _, user_id = str(message).partition(":")
+                    if origin != self._instance_id:
+                        self._drop(user_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Missed messages are possible while disconnected - start clean
+                logger.warning(f"⚠️ Vault listener disconnected ({e}); clearing cache and retrying")
+            for user_id in list(self._entries) + list(self._loading):
+                self._drop(user_id)
+            await asyncio.sleep(LISTENER_RETRY_SECONDS)
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "users_cached": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "listener_running": bool(self._listener and not self._listener.done()),
+        }
+
+
+# Global singleton
+key_vault = UserKeyVault()
@@ -0,0 +1,214 @@
+"""
+🚦 LOAD-AWARE ROUTER - Complexity + Live Model Health
+======================================================
+
+SmartModelRouter.estimate_complexity picks a model from the prompt alone,
+and AdaptiveQualityService watches load but only turns sampling knobs.
+This router combines the complexity tier with live signals:
+
+- per-model rolling time-to-first-token (p50/p95) and error rate, fed by
+  llm_client after every stream via record_model_outcome()
+- the system load score from adaptive_quality
+- the Groq pool's token headroom against output_estimator predictions
+
+decide() starts at the complexity tier and walks DOWN the ladder until a
+model is healthy (p95 TTFT inside its budget, error rate under
+MAX_ERROR_RATE) and its predicted prompt + output fits the headroom. It
+never upgrades past the complexity tier. A model that keeps being skipped
+gets every PROBE_INTERVAL-th request anyway, so its window refreshes and it
+can recover once the provider does. decide() is a pure function of
+its inputs plus the router's own health windows, so routing_simulator can
+replay recorded traces through the exact same code.
+"""
+
+import logging
+import math
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.services.model_router import MODEL_LADDER, ModelType, SmartModelRouter
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+WINDOW_SIZE = 100               # recent streams kept per model
+MIN_HEALTH_SAMPLES = 10         # below this a model is assumed healthy
+MAX_ERROR_RATE = 0.25
+PROBE_INTERVAL = 20            # every Nth skip of an unhealthy model lets one request through
+OVERLOAD_SCORE = 0.9            # adaptive_quality "turbo" threshold: skip one rung
+PROMPT_OVERHEAD_TOKENS = 1200   # system prompt + history, built after routing
+TTFT_P95_BUDGET_MS: Dict[str, float] = {
+    "instant": 1000,
+    "balanced": 1800,
+    "powerful": 3000,
+}
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q / 100 * len(ordered))) - 1]
+
+
+@dataclass
+class ModelHealth:
+    """Rolling TTFT and outcome window for one model"""
+    ttft_ms: deque = field(default_factory=lambda: deque(maxlen=WINDOW_SIZE))
+    outcomes: deque = field(default_factory=lambda: deque(maxlen=WINDOW_SIZE))
+    skips: int = 0
+
+    def record(self, ttft_ms: Optional[float], success: bool):
+        self.outcomes.append(0 if success else 1)
+        if success and ttft_ms is not None:
+            self.ttft_ms.append(ttft_ms)
+
+    @property
+    def error_rate(self) -> float:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def snapshot(self) -> dict:
+        samples = list(self.ttft_ms)
+        p50, p95 = percentile(samples, 50), percentile(samples, 95)
+        return {
+            "samples": len(self.outcomes),
+            "p50_ttft_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ttft_ms": round(p95, 1) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+        }
+
+
+class LoadAwareRouter:
+    """
+    Usage:
+    ```python
+    from app.services.load_aware_router import load_aware_router
+    decision = await load_aware_router.route(message, intent)
+    decision["name"], decision["downgraded"], decision["reasons"]
+    ```
+    """
+
+    def __init__(self, estimator=None):
+        self._health: Dict[str, ModelHealth] = {}
+        self._estimator = estimator  # None -> the global output_estimator
+
+    @property
+    def estimator(self):
+        if self._estimator is None:
+            from app.services.output_estimator import output_estimator
+            return output_estimator
+        return self._estimator
+
+    def record(self, model: str, ttft_ms: Optional[float] = None, success: bool = True):
+        """Feed one finished (or failed) stream"""
+        if model:
+            self._health.setdefault(model, ModelHealth()).record(ttft_ms, success)
+
+    def health(self, model: str) -> dict:
+        return self._health.get(model, ModelHealth()).snapshot()
+
+    def _unhealthy_reason(self, model_type: str) -> Optional[str]:
+        health = self._health.get(SmartModelRouter.MODELS[model_type].name)
+        if not health or len(health.outcomes) < MIN_HEALTH_SAMPLES:
+            return None
+        if health.error_rate > MAX_ERROR_RATE:
+            return "error_rate"
+        p95 = percentile(list(health.ttft_ms), 95)
+        if p95 is not None and p95 > TTFT_P95_BUDGET_MS[model_type]:
+            return "p95_ttft"
+        return None
+
+    def decide(
+        self,
+        complexity: ModelType,
+        intent: str = "general",
+        prompt_tokens: int = 0,
+        headroom: Optional[int] = None,
+        load_score: float = 0.0,
+    ) -> Dict:
+        """
+        Pick a model for a request with the given complexity tier.
+
+        Args:
+            complexity: Tier from SmartModelRouter.estimate_complexity (the ceiling)
+            intent: Detected intent (keys the output-length prediction)
+            prompt_tokens: Estimated prompt size
+            headroom: Tokens the pool can still admit this minute (None = unknown)
+            load_score: adaptive_quality load score
+
+        Returns:
+            Dict with name, type, complexity, downgraded, reasons
+        """
+        start = MODEL_LADDER.index(complexity)
+        reasons = []
+        if load_score >= OVERLOAD_SCORE and start < len(MODEL_LADDER) - 1:
+            start += 1
+            reasons.append("overloaded")
+
+        chosen = None
+        for model_type in MODEL_LADDER[start:]:
+            config = SmartModelRouter.MODELS[model_type]
+            unhealthy = self._unhealthy_reason(model_type)
+            if unhealthy:
+                health = self._health[config.name]
+                health.skips += 1
+                if health.skips < PROBE_INTERVAL:
+                    reasons.append(f"{model_type}:{unhealthy}")
+                    continue
+                health.skips = 0
+                reasons.append(f"{model_type}:probe")
+            if headroom is not None:
+                predicted = self.estimator.predict(config.name, intent, config.max_tokens)["tokens"]
+                if prompt_tokens + predicted > headroom:
+                    reasons.append(f"{model_type}:token_headroom")
+                    continue
+            chosen = model_type
+            break
+        if chosen is None:
+            chosen = MODEL_LADDER[-1]
+            reasons.append("fallback")
+
+        return {
+            "name": SmartModelRouter.MODELS[chosen].name,
+            "type": chosen,
+            "complexity": complexity,
+            "downgraded": chosen != complexity,
+            "reasons": reasons,
+        }
+
+    async def route(self, prompt: str, intent: str = "general") -> Dict:
+        """Live decision: complexity from the prompt, load and headroom from the running services"""
+        from app.services.adaptive_quality import adaptive_quality
+        from app.services.groq_pool import get_groq_pool
+        from app.services.output_estimator import estimate_tokens
+
+        complexity = SmartModelRouter.estimate_complexity(prompt, intent)
+        try:
+            headroom = await (await get_groq_pool()).token_headroom()
+        except Exception as e:
+            logger.debug(f"Token headroom unavailable: {e}")
+            headroom = None
+        decision = self.decide(
+            complexity,
+            intent,
+            estimate_tokens(prompt) + PROMPT_OVERHEAD_TOKENS,
+            headroom,
+            adaptive_quality.get_load_score(),
+        )
+        if decision["downgraded"]:
+            logger.info(f"🚦 Routed {complexity} -> {decision['type']} ({', '.join(decision['reasons'])})")
+        return decision
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {model: health.snapshot() for model, health in self._health.items()}
+
+
+# Global singleton
+load_aware_router = LoadAwareRouter()
+
+
+def record_model_outcome(model: str, ttft_ms: Optional[float] = None, success: bool = True):
+    """Live feedback hook for llm_client"""
+    load_aware_router.record(model, ttft_ms, success)
@@ -0,0 +1,301 @@
+"""
+📮 MAIL TRANSPORT - Pooled Async Delivery for OTP, Reset and Reminder Emails
+=============================================================================
+
+Every email used to build a fresh SendGridAPIClient (new TLS handshake per
+message), and password resets ran sync SendGrid calls in a background
+thread. All app-side email now goes through ONE shared transport:
+
+- SendGrid: a keep-alive httpx.AsyncClient (connection pool of
+  MAIL_POOL_SIZE), so bursts reuse warm TLS connections
+- SMTP relay (when SMTP_HOST is set): a pool of persistent, authenticated
+  SMTP connections; each send runs in a worker thread
+- Bounded concurrency (MAIL_POOL_SIZE in flight) and backpressure: once
+  MAIL_MAX_PENDING sends are queued, send() fails fast with MailTransportBusy
+  instead of letting latency grow without bound
+
+Clients are bound to the event loop that created them; Celery tasks run
+their sends through run_sync(), which closes the loop's clients before the
+loop goes away.
+"""
+
+import asyncio
+import logging
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from typing import Awaitable, List, Optional, TypeVar
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# ============ CONSTANTS ============
+SENDGRID_BASE_URL = "https://api.sendgrid.com"
+SEND_TIMEOUT_SECONDS = 15.0
+SMTP_IDLE_CHECK_SECONDS = 60  # NOOP-probe pooled SMTP connections idle longer than this
+DEFAULT_PLAIN_TEXT = "This message is best viewed in an HTML-capable mail client."
+
+
+class MailTransportBusy(Exception):
+    """Raised when too many sends are already queued (backpressure)"""
+
+
+class MailMessageError(ValueError):
+    """
+    Problem with ONE specific message (e.g. missing/invalid recipient).
+    Retrying it can't help. Configuration gaps raise plain ValueError.
+    """
+
+
+class _SmtpConnection:
+    __slots__ = ("smtp", "last_used")
+
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except Exception:
+            pass  # QUIT fails on a dropped connection - the socket still needs closing
+        finally:
+            self.smtp.close()
+
+
+class MailTransport:
+    """
+    Shared async mail sender.
+
+    Usage:
+    ```python
+    from app.services.mail_transport import mail_transport
+    await mail_transport.send(to_email, subject, html, text=plain_text)
+    ```
+    """
+
+    def __init__(self, pool_size: Optional[int] = None, max_pending: Optional[int] = None):
+        self.pool_size = pool_size or settings.MAIL_POOL_SIZE
+        self.max_pending = max_pending or settings.MAIL_MAX_PENDING
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._http = None
+        self._smtp_idle: List[_SmtpConnection] = []
+        self._smtp_lock = threading.Lock()  # sends run in worker threads
+        self._pending = 0
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+
+    # ---------- loop binding ----------
+
+    def _bind_loop(self):
+        """(Re)create loop-bound state when called from a different event loop"""
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        # The previous loop is gone (Celery asyncio.run) - its client can't be reused
+        self._http = None
+        self._close_smtp_pool()
+        self._loop = loop
+        self._semaphore = asyncio.Semaphore(self.pool_size)
+        self._pending = 0
+
+    @staticmethod
+    def _from_addr() -> str:
+        from_addr = getattr(settings, "SENDER_EMAIL", None) or getattr(settings, "MAIL_FROM", None)
+        if not from_addr:
+            raise ValueError("SENDER_EMAIL not configured in environment")
+        return from_addr
+
+    # ---------- public API ----------
+
+    async def send(
+        self,
+        to_email: str,
+        subject: str,
+        html: str,
+        text: Optional[str] = None,
+        from_name: Optional[str] = None,
+    ) -> None:
+        """
+        Deliver one message. Raises MailTransportBusy under overload,
+        MailMessageError for a bad recipient, ValueError for missing
+        configuration, Exception on provider errors.
+        """
+        if not to_email or "@" not in str(to_email):
+            raise MailMessageError(f"Invalid recipient address: {to_email!r}")
+        self._bind_loop()
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise MailTransportBusy(f"Mail transport saturated ({self._pending} pending)")
+
+        from_addr = self._from_addr()
+        self._pending += 1
+        try:
+            async with self._semaphore:
+                if settings.SMTP_HOST:
+                    await self._send_smtp(from_addr, from_name, to_email, subject, html, text)
+                else:
+                    await self._send_sendgrid(from_addr, from_name, to_email, subject, html, text)
+            self.sent += 1
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    # ---------- SendGrid (keep-alive HTTP) ----------
+
+    def _get_http(self):
+        if self._http is None:
+            import httpx
+
+            if not settings.SENDGRID_API_KEY:
+                raise ValueError("SendGrid API key not configured")
+            self._http = httpx.AsyncClient(
+                base_url=SENDGRID_BASE_URL,
+                headers={"Authorization": f"Bearer {settings.SENDGRID_API_KEY}"},
+                timeout=SEND_TIMEOUT_SECONDS,
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+            )
+        return self._http
+
+    async def _send_sendgrid(self, from_addr, from_name, to_email, subject, html, text):
+        sender = {"email": from_addr}
+        if from_name:
+            sender["name"] = from_name
+        # v3 mail/send requires text/plain before text/html
+        payload = {
+            "personalizations": [{"to": [{"email": to_email}]}],
+            "from": sender,
+            "subject": subject,
+            "content": [
+                {"type": "text/plain", "value": text or DEFAULT_PLAIN_TEXT},
+                {"type": "text/html", "value": html},
+            ],
+        }
+        response = await self._get_http().post("/v3/mail/send", json=payload)
+        if not 200 <= response.status_code < 300:
+            raise Exception(f"SendGrid returned status {response.status_code}: {response.text[:200]}")
+
+    # ---------- SMTP (persistent connection pool) ----------
+
+    @staticmethod
+    def _smtp_connect() -> _SmtpConnection:
+        smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=SEND_TIMEOUT_SECONDS)
+        conn = _SmtpConnection(smtp)
+        ready = False
+        try:
+            if settings.SMTP_USE_TLS:
+                smtp.starttls()
+            if settings.SMTP_USERNAME:
+                smtp.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
+            ready = True
+            return conn
+        finally:
+            if not ready:
+                conn.close()
+
+    def _take_idle_smtp(self) -> Optional[_SmtpConnection]:
+        with self._smtp_lock:
+            return self._smtp_idle.pop() if self._smtp_idle else None
+
+    def _checkout_smtp(self) -> _SmtpConnection:
+        """Reuse an idle connection (probing stale ones) or open a new one"""
+        while True:
+            conn = self._take_idle_smtp()
+            if conn is None:
+                break
+            if time.monotonic() - conn.last_used < SMTP_IDLE_CHECK_SECONDS:
+                return conn
+            try:
+                if conn.smtp.noop()[0] == 250:
+                    return conn
+            except smtplib.SMTPException:
+                pass
+            conn.close()
+        return self._smtp_connect()
+
+    def _deliver_smtp(self, message: EmailMessage):
+        """Runs in a worker thread; the semaphore bounds pool size"""
+        conn = self._checkout_smtp()
+        delivered = False
+        try:
+            try:
+                conn.smtp.send_message(message)
+            except smtplib.SMTPServerDisconnected:
+                # Relay dropped the connection between probe and send - retry once
+                conn.close()
+                conn = self._smtp_connect()
+                conn.smtp.send_message(message)
+            delivered = True
+        finally:
+            if delivered:
+                conn.last_used = time.monotonic()
+                with self._smtp_lock:
+                    self._smtp_idle.append(conn)
+            else:
+                conn.close()
+
+    async def _send_smtp(self, from_addr, from_name, to_email, subject, html, text):
+        message = EmailMessage()
+        message["From"] = f"{from_name} <{from_addr}>" if from_name else from_addr
+        message["To"] = to_email
+        message["Subject"] = subject
+        message.set_content(text or DEFAULT_PLAIN_TEXT)
+        message.add_alternative(html, subtype="html")
+        await asyncio.to_thread(self._deliver_smtp, message)
+
+    def _close_smtp_pool(self):
+        with self._smtp_lock:
+            idle, self._smtp_idle = self._smtp_idle, []
+        for conn in idle:
+            conn.close()
+
+    # ---------- lifecycle ----------
+
+    async def close(self):
+        """Close pooled connections (call from app lifespan shutdown)"""
+        if self._http is not None:
+            try:
+                await self._http.aclose()
+            except Exception as e:
+                logger.debug(f"Mail HTTP client close failed: {e}")
+            self._http = None
+        await asyncio.to_thread(self._close_smtp_pool)
+
+    def run_sync(self, coro: Awaitable[T]) -> T:
+        """
+        Run a coroutine that sends mail from synchronous code (Celery tasks)
+        on a fresh event loop, closing this loop's pooled clients before the
+        loop is torn down so nothing leaks between tasks.
+        """
+        async def _run():
+            try:
+                return await coro
+            finally:
+                await self.close()
+
+        return asyncio.run(_run())
+
+    def get_stats(self) -> dict:
+        return {
+            "backend": "smtp" if settings.SMTP_HOST else "sendgrid",
+            "pending": self._pending,
+            "smtp_idle_connections": len(self._smtp_idle),
+            "sent": self.sent,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+# Global singleton
+mail_transport = MailTransport()
@@ -23,10 +23,17 @@ import asyncio
 import re
 
 from app.utils.llm_client import get_llm_response, get_llm_response_stream
+from app.utils.tracing import NOOP_SPAN, tracer
+from app.config import settings
+from app.services.load_aware_router import load_aware_router
+from app.services.model_router import SmartModelRouter
+from app.services.context_packer import context_packer
+from app.services.output_estimator import estimate_tokens
 from app.db.redis_client import add_message_to_history, get_recent_history, redis_client
 from app.services.memory_manager import retrieve_long_term_memory, save_long_term_memory
 from app.services.graph_service import save_knowledge, retrieve_knowledge
 from app.db.mongo_client import db, sessions_collection
+from app.db.session_schema import session_filter
 
 # 🧠 Import Unified Memory Orchestrator & Behavior Engine
 from app.services.unified_memory_orchestrator import (
@@ -57,6 +64,9 @@ logger = logging.getLogger(__name__)
 # Mongo collection for mood history
 mood_collection = db.mood_history
 
+# Safety cap per history message - the real limit is the token budget in context_packer
+MAX_HISTORY_MESSAGE_CHARS = 4000
+
 # 🚀 OPTIMIZED CORE IDENTITY - Enhanced with Pro Formatting & Beautiful Suggestions
 # 🚀 OPTIMIZED CORE IDENTITY - Enhanced with Pro Formatting & Beautiful Suggestions
 CORE_IDENTITY = """
@@ -219,7 +229,7 @@ Type this EXACTLY (including all line breaks):
 
 
 # 🆕 MULTI-TURN CONTEXT HELPER (ULTRA-OPTIMIZED)
-async def get_session_conversation_history(session_id: str, limit: int = 6) -> List[Dict[str, str]]:
+async def get_session_conversation_history(session_id: str, limit: int = 6, user_id: Optional[str] = None) -> List[Dict[str, str]]:
     """
     Fetch recent conversation turns from MongoDB session for multi-turn LLM context.
     
@@ -239,7 +249,7 @@ async def get_session_conversation_history(session_id: str, limit: int = 6) -> L
         # 🚀 OPTIMIZED: Use projection and timeout
         session = await asyncio.wait_for(
             sessions_collection.find_one(
-                {"$or": [{"sessionId": session_id}, {"chat_id": session_id}]},
+                session_filter(session_id, user_id),
                 {
                     "messages": {"$slice": -(limit * 2)},  # Get both user + assistant
                     "_id": 0
@@ -264,11 +274,9 @@ async def get_session_conversation_history(session_id: str, limit: int = 6) -> L
                 content = content.split("<!--")[0].strip()
             
             if role in ["user", "human"]:
-                # 🚀 Truncate user messages to 500 chars max
-                conversation_history.append({"role": "user", "content": content[:500]})
+                conversation_history.append({"role": "user", "content": content[:MAX_HISTORY_MESSAGE_CHARS]})
             elif role in ["assistant", "ai"]:
-                # 🚀 Truncate assistant to 800 chars max
-                conversation_history.append({"role": "assistant", "content": content[:800]})
+                conversation_history.append({"role": "assistant", "content": content[:MAX_HISTORY_MESSAGE_CHARS]})
         
         return conversation_history[-limit*2:]  # Ensure we don't exceed limit
         
@@ -665,10 +673,14 @@ Your goal is to explain/analyze/act on THIS TEXT.
         intent=intent
     )
     
+    # 📦 Fit memories / graph facts / tasks into the answering model's token budget
+    selected_model = "llama-3.3-70b-versatile"  # get_llm_response's default
+    packed = context_packer.pack(holographic_context, model=selected_model)
+
     # Enrich Prompt (Get the memory block string)
     memory_section, enrichment_logs = unified_memory_orchestrator.enrich_master_prompt(
         base_prompt="", 
-        context=holographic_context,
+        context=packed.context,
         debug_logs=[]
     )
     
@@ -701,6 +713,7 @@ Your goal is to explain/analyze/act on THIS TEXT.
             prompt=message,
             system_prompt=system_prompt,
             image_url=image_url,
+            model=selected_model,
         )
         
         # Quality Check
@@ -770,6 +783,40 @@ async def generate_response_stream(
         api_key: Optional[str] = None,  # 🔑 User's API key (None = platform key)
         key_source: str = "platform",  # 🔑 "platform" or "user"
         model: str = "llama-3.1-8b-instant",  # 🎯 User's selected model
+        _parent_span=None,  # 🔭 Caller's span (e.g. the SSE stream); defaults to the active one
+    ):
+    """
+    🔭 Traced entry point for the streaming pipeline.
+    The turn span is passed down explicitly (never activated across a yield).
+    """
+    if _parent_span is not None:
+        turn_span = _parent_span.child("brain.turn", model=model, key_source=key_source)
+    else:
+        turn_span = tracer.span("brain.turn", model=model, key_source=key_source)
+    error = None
+    try:
+        async for chunk in _generate_response_stream(
+            user_id, message, search_results, image_url, session_id,
+            api_key, key_source, model, _span=turn_span,
+        ):
+            yield chunk
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        turn_span.end(error)
+
+
+async def _generate_response_stream(
+        user_id: str,
+        message: str,
+        search_results: Optional[str] = None,
+        image_url: Optional[str] = None,
+        session_id: Optional[str] = None,
+        api_key: Optional[str] = None,
+        key_source: str = "platform",
+        model: str = "llama-3.1-8b-instant",
+        _span=NOOP_SPAN,
     ):
     """
     🧠 PROCESSED PIPELINE (STREAMING):
@@ -824,13 +871,14 @@ Your goal is to explain/analyze/act on THIS TEXT.
 
     # 🧠 SMART MEMORY EXTRACTION - Extract and store user info IMMEDIATELY
     # This ensures "my name is X", age, location, etc. are captured right away
-    try:
-        from app.services.enhanced_memory_system import enhanced_memory
-        extraction_result = await enhanced_memory.process_message(user_id, message)
-        if extraction_result.get("stored"):
-            logger.info(f"🧠 [Memory] Extracted and stored: {extraction_result['stored']}")
-    except Exception as e:
-        logger.warning(f"⚠️ [Memory] Enhanced extraction failed (non-blocking): {e}")
+    with _span.child("brain.memory_extraction"):
+        try:
+            from app.services.enhanced_memory_system import enhanced_memory
+            extraction_result = await enhanced_memory.process_message(user_id, message)
+            if extraction_result.get("stored"):
+                logger.info(f"🧠 [Memory] Extracted and stored: {extraction_result['stored']}")
+        except Exception as e:
+            logger.warning(f"⚠️ [Memory] Enhanced extraction failed (non-blocking): {e}")
     
     # 0️⃣ PRONOUN RESOLUTION LAYER (Conversational Continuity)
     # Critical: Resolve "him", "it", "that" BEFORE any processing
@@ -868,6 +916,7 @@ Your goal is to explain/analyze/act on THIS TEXT.
         intent = "coding"
     else:
         intent = "general"
+    _span.set(intent=intent)
 
     # 2️⃣ PARALLEL DATA FETCHING (Async I/O) - 🚀 ULTRA-OPTIMIZED V3
     from app.services.cleanup_service import verify_user_exists_in_mongodb
@@ -917,7 +966,7 @@ Your goal is to explain/analyze/act on THIS TEXT.
         """Session history with 500ms timeout"""
         try:
             return await asyncio.wait_for(
-                get_session_conversation_history(session_id, limit=history_limit),
+                get_session_conversation_history(session_id, limit=history_limit, user_id=user_id),
                 timeout=0.5
             )
         except asyncio.TimeoutError:
@@ -991,6 +1040,7 @@ Enjoy the vibes! 🎧"""
                 prompt=song_info_prompt,
                 system_prompt=system_prompt_media,
                 model=model,
+                intent="media",
             ):
                 song_info += chunk
                 yield chunk  # Stream to user
@@ -1008,13 +1058,14 @@ Enjoy the vibes! 🎧"""
     # Execute ALL in parallel with timeout
     # 🚀 Identity queries need more time for profile retrieval
     fetch_timeout = 2.5 if intent == "identity" else 1.5
-    user_profile, memory_result, conversation_history, location_context = await parallel_fetch(
-        fast_user_check(),
-        fast_memory(),
-        fast_history(),
-        fast_location(),
-        timeout=fetch_timeout
-    )
+    with _span.child("brain.parallel_fetch", skip_memory=skip_memory, timeout_s=fetch_timeout):
+        user_profile, memory_result, conversation_history, location_context = await parallel_fetch(
+            fast_user_check(),
+            fast_memory(),
+            fast_history(),
+            fast_location(),
+            timeout=fetch_timeout
+        )
     
     # Unpack memory result
     holographic_context, debug_logs = memory_result if memory_result else ({}, [])
@@ -1030,6 +1081,12 @@ Enjoy the vibes! 🎧"""
     # 🎯 Use user's selected model (passed from their API key config)
     # Can auto-upgrade to 70B if context is too large
     selected_model = model  # Use the model passed from user's API key
+    complexity = SmartModelRouter.estimate_complexity(message, intent)
+    if key_source == "platform" and settings.ENABLE_LOAD_AWARE_ROUTING:
+        # 🚦 Platform turns: complexity tier, stepped down by live TTFT/errors/headroom
+        decision = await load_aware_router.route(message, intent)
+        selected_model = decision["name"]
+        _span.set(route_type=decision["type"], route_downgraded=decision["downgraded"])
     
     logger.info(f"🚀 [Speed] Model: {selected_model} (Intent: {intent}, Source: {key_source})")
 
@@ -1222,10 +1279,17 @@ Or say **"No"** to cancel and try again.
 
     # 7️⃣ GENERIC LLM GENERATION (Fallback)
     
+    prompt_span = _span.child("brain.prompt_build")
+
+    # 📦 Pack profile > recent turns > memories > graph facts > tasks into the model's token budget
+    packed = context_packer.pack(holographic_context, conversation_history, model=selected_model)
+    conversation_history = packed.history
+    prompt_span.set(**packed.summary())
+    
     # Enrich Prompt with Context
     memory_section, enrichment_logs = unified_memory_orchestrator.enrich_master_prompt(
         base_prompt="", 
-        context=holographic_context,
+        context=packed.context,
         debug_logs=[]
     )
     
@@ -1336,6 +1400,8 @@ Or say **"No"** to cancel and try again.
             system_prompt += f"RESPOND CONFIDENTLY: 'Your name is {profile['name']}' or similar warm acknowledgment."
             logger.info(f"🔥 [Identity Override] Added explicit name instruction: {profile['name']}")
     
+    prompt_span.set(prompt_chars=len(system_prompt)).end()
+    
     # 6️⃣ STREAMING LLM RESPONSE
     full_response = ""
     # Use selected model (from router or user pref)
@@ -1346,12 +1412,29 @@ Or say **"No"** to cancel and try again.
         image_url=image_url,
         model=selected_model,
         conversation_history=conversation_history,  # 🔥 THIS WAS MISSING!
-        api_key=api_key
+        api_key=api_key,
+        intent=intent
     )
     
-    async for chunk in response_stream:
-        full_response += chunk
-        yield chunk
+    # intent/complexity/prompt size make exported spans replayable by routing_simulator
+    llm_span = _span.child(
+        "llm.stream", model=selected_model, intent=intent, complexity=complexity,
+        prompt_tokens=estimate_tokens(system_prompt) + estimate_tokens(message)
+    )
+    chunk_count = 0
+    try:
+        async for chunk in response_stream:
+            if not chunk_count:
+                llm_span.event("first_token")
+                llm_span.set(ttft_ms=round(llm_span.elapsed_ms(), 1))
+            chunk_count += 1
+            full_response += chunk
+            yield chunk
+    except Exception as e:
+        llm_span.end(e)
+        raise
+    finally:
+        llm_span.set(chunks=chunk_count, response_chars=len(full_response)).end()
     
     # 8️⃣ YIELD MEDIA ACTION (if pending) AFTER LLM completes
     if media_action_pending:
@@ -1375,8 +1458,9 @@ Or say **"No"** to cancel and try again.
     # MongoDB persistence is handled by streaming finalize endpoint to avoid duplicates.
 
     # Add to Redis (Fast short-term context)
-    await add_message_to_history(user_id, "user", message)
-    await add_message_to_history(user_id, "assistant", full_response)
+    with _span.child("brain.history_write"):
+        await add_message_to_history(user_id, "user", message)
+        await add_message_to_history(user_id, "assistant", full_response)
 
     # 🔒 THINKING METADATA (Append to end of stream)
     # This ensures "How I understood this" feature works for saved messages
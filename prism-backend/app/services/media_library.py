@@ -7,66 +7,32 @@ Manages user's personal media collection with Neo4j storage
 from typing import Optional, List, Dict
 from datetime import datetime, timedelta
 import logging
-import time
+
+from app.utils.resilience import get_backend
 
 logger = logging.getLogger(__name__)
 
 # 🔇 Track if Neo4j unavailability has been logged (reduce noise)
 _neo4j_unavailable_logged = False
 
-# 🔌 Circuit Breaker State (prevents repeated slow failures)
-_circuit_breaker = {
-    "state": "closed",  # closed (normal), open (failing fast), half-open (testing)
-    "failures": 0,
-    "last_failure_time": None,
-    "cooldown_seconds": 30,  # How long to wait before retrying after failure
-    "failure_threshold": 3   # Number of failures before opening circuit
-}
+# 🔌 Circuit Breaker: the shared "neo4j" breaker (app.utils.resilience), so
+# media calls and every other graph caller see the same open/closed state
+_circuit_breaker = get_backend("neo4j").breaker
 
 
 def _is_circuit_open() -> bool:
     """Check if circuit breaker is open (should skip Neo4j calls)"""
-    global _circuit_breaker
-    
-    if _circuit_breaker["state"] == "closed":
-        return False
-    
-    if _circuit_breaker["state"] == "open":
-        # Check if cooldown period has passed
-        if _circuit_breaker["last_failure_time"]:
-            elapsed = time.time() - _circuit_breaker["last_failure_time"]
-            if elapsed >= _circuit_breaker["cooldown_seconds"]:
-                # Move to half-open state to test connection
-                _circuit_breaker["state"] = "half-open"
-                logger.info("🔌 Neo4j circuit breaker: half-open (testing connection)")
-                return False
-        return True
-    
-    # half-open state - allow one request to test
-    return False
+    return _circuit_breaker.is_open()
 
 
 def _record_success():
     """Record a successful Neo4j call"""
-    global _circuit_breaker
-    if _circuit_breaker["state"] != "closed":
-        logger.info("✅ Neo4j circuit breaker: closed (connection restored)")
-    _circuit_breaker["state"] = "closed"
-    _circuit_breaker["failures"] = 0
-    _circuit_breaker["last_failure_time"] = None
+    _circuit_breaker.record_success()
 
 
 def _record_failure(error: Exception):
     """Record a failed Neo4j call"""
-    global _circuit_breaker, _neo4j_unavailable_logged
-    
-    _circuit_breaker["failures"] += 1
-    _circuit_breaker["last_failure_time"] = time.time()
-    
-    if _circuit_breaker["failures"] >= _circuit_breaker["failure_threshold"]:
-        if _circuit_breaker["state"] != "open":
-            logger.warning(f"🔌 Neo4j circuit breaker: OPEN (too many failures, will retry in {_circuit_breaker['cooldown_seconds']}s)")
-        _circuit_breaker["state"] = "open"
+    _circuit_breaker.record_failure()
 
 
 def _is_neo4j_connection_error(error: Exception) -> bool:
@@ -5,6 +5,8 @@ except ImportError:
     print("Warning: fastembed not installed, memory features may be limited")
     TextEmbedding = None
 from app.config import settings
+from app.utils.resilience import get_backend
+import asyncio
 import uuid
 from datetime import datetime
 import hashlib
@@ -82,11 +84,15 @@ async def save_long_term_memory(user_id: str, text: str, memory_type: str = "fac
     # 🧠 MEMORY HARDENING - Semantic Deduplicator
     # Skip saving if a very similar memory already exists (>95% similarity)
     try:
-        existing = index.query(
-            vector=vector,
-            top_k=1,
-            include_metadata=True,
-            filter={"user_id": user_id}
+        existing = await get_backend("pinecone").call(
+            lambda: asyncio.to_thread(
+                index.query,
+                vector=vector,
+                top_k=1,
+                include_metadata=True,
+                filter={"user_id": user_id}
+            ),
+            hedge=True,
         )
 
         if existing and getattr(existing, "matches", None):
@@ -174,11 +180,15 @@ async def retrieve_long_term_memory(user_id: str, query: str, top_k: int = 5):
         vector = await get_embedding(query)
 
         # Get top 5 matches (we'll filter by score)
-        results = index.query(
-            vector=vector,
-            top_k=top_k,
-            include_metadata=True,
-            filter={"user_id": user_id}   # Only load this user's memories
+        results = await get_backend("pinecone").call(
+            lambda: asyncio.to_thread(
+                index.query,
+                vector=vector,
+                top_k=top_k,
+                include_metadata=True,
+                filter={"user_id": user_id}   # Only load this user's memories
+            ),
+            hedge=True,
         )
 
         valid_memories = []
@@ -11,6 +11,16 @@ Key Features:
 - Debugging tools for memory inspection
 - Audit trail for compliance
 - Health checks and diagnostics
+- Prometheus text exposition (render_prometheus)
+
+Hot-path cost is O(1) and memory is fixed: latencies go into log-bucketed
+histograms (no sample lists, no sorting), audit/error logs are preallocated
+ring buffers, and user hashes are memoized. Everything runs on the event
+loop thread, so no locks are taken.
+
+Quantiles (p50/p99, alerts, Prometheus) cover only the most recent
+max_latency_samples operations, so a latency alert clears once the
+backend recovers. Counts, sums and averages cover the process lifetime.
 
 Usage:
     from app.services.memory_observability import MemoryObserver, memory_observer
@@ -24,17 +34,167 @@ Usage:
 
 import logging
 import hashlib
+import math
 import time
-from typing import Any, Dict, List, Optional, Callable
-from datetime import datetime, timedelta
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Callable
+from datetime import datetime
 from collections import defaultdict
-from functools import wraps
+from functools import lru_cache, wraps
 from dataclasses import dataclass, field
 from enum import Enum
-import statistics
 
 logger = logging.getLogger(__name__)
 
+# Latency histogram: log buckets growing by 4% from 10µs to ~2 minutes
+# (~420 buckets, quantiles within ±2% relative error)
+SKETCH_MIN_MS = 0.01
+SKETCH_GROWTH = 1.04
+SKETCH_BUCKETS = 420
+_LOG_GROWTH = math.log(SKETCH_GROWTH)
+# p99 alert evaluation walks the histogram, so only do it every N operations
+ALERT_LATENCY_CHECK_EVERY = 50
+# Quantile window: the newest LATENCY_WINDOW_SAMPLES, kept as rotating slices
+LATENCY_WINDOW_SAMPLES = 1000
+LATENCY_WINDOW_SLICES = 4
+
+
+@lru_cache(maxsize=16384)
+def _hash_user_id_cached(user_id: str) -> str:
+    return hashlib.sha256(user_id.encode()).hexdigest()[:12]
+
+
+class LatencySketch:
+    """
+    Fixed-memory streaming latency histogram (HDR-style log buckets).
+
+    record() is O(1); quantile() walks the bucket array once.
+    """
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts = array("L", bytes(array("L").itemsize * SKETCH_BUCKETS))
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    @staticmethod
+    def _bucket(value: float) -> int:
+        if value <= SKETCH_MIN_MS:
+            return 0
+        return min(int(math.log(value / SKETCH_MIN_MS) / _LOG_GROWTH) + 1, SKETCH_BUCKETS - 1)
+
+    @staticmethod
+    def _bucket_value(index: int) -> float:
+        """Representative (geometric midpoint) value of a bucket"""
+        if index == 0:
+            return SKETCH_MIN_MS
+        return SKETCH_MIN_MS * SKETCH_GROWTH ** (index - 0.5)
+
+    def record(self, value: float):
+        self.counts[self._bucket(value)] += 1
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    @classmethod
+    def merged(cls, sketches: List["LatencySketch"]) -> "LatencySketch":
+        result = cls()
+        for sketch in sketches:
+            if not sketch.count:
+                continue
+            for index, bucket_count in enumerate(sketch.counts):
+                if bucket_count:
+                    result.counts[index] += bucket_count
+            result.count += sketch.count
+            result.total += sketch.total
+            result.min = min(result.min, sketch.min)
+            result.max = max(result.max, sketch.max)
+        return result
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if not bucket_count:
+                continue
+            seen += bucket_count
+            if seen >= rank:
+                if index == SKETCH_BUCKETS - 1:
+                    return self.max  # overflow bucket has no upper bound
+                # Clamp to observed extremes so small samples stay exact-ish
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+
+class WindowedLatencySketch:
+    """
+    Quantiles over roughly the last `window` samples.
+
+    Samples go into LATENCY_WINDOW_SLICES sketches of window/slices each; when
+    the current slice is full the oldest one is replaced, so the
+    window slides by one slice at a time and memory stays fixed.
+    """
+    __slots__ = ("slices", "slice_size", "current")
+
+    def __init__(self, window: int = LATENCY_WINDOW_SAMPLES):
+        self.slice_size = max(1, window // LATENCY_WINDOW_SLICES)
+        self.slices = [LatencySketch() for _ in range(LATENCY_WINDOW_SLICES)]
+        self.current = 0
+
+    def record(self, value: float):
+        sketch = self.slices[self.current]
+        if sketch.count >= self.slice_size:
+            self.current = (self.current + 1) % len(self.slices)
+            sketch = self.slices[self.current] = LatencySketch()
+        sketch.record(value)
+
+    @property
+    def count(self) -> int:
+        return sum(sketch.count for sketch in self.slices)
+
+    def quantile(self, q: float) -> float:
+        return LatencySketch.merged(self.slices).quantile(q)
+
+
+class RingBuffer:
+    """Preallocated fixed-size buffer; append overwrites the oldest slot"""
+    __slots__ = ("_items", "_capacity", "_next", "_size")
+
+    def __init__(self, capacity: int):
+        self._items: List[Any] = [None] * capacity
+        self._capacity = capacity
+        self._next = 0
+        self._size = 0
+
+    def append(self, item: Any):
+        self._items[self._next] = item
+        self._next = (self._next + 1) % self._capacity
+        if self._size < self._capacity:
+            self._size += 1
+
+    def newest_first(self) -> Iterator[Any]:
+        for offset in range(1, self._size + 1):
+            yield self._items[(self._next - offset) % self._capacity]
+
+    def clear(self):
+        self._items = [None] * self._capacity
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
 
 class OperationType(Enum):
     """Memory operation types for tracking"""
@@ -64,8 +224,25 @@ class OperationMetrics:
     total_count: int = 0
     success_count: int = 0
     error_count: int = 0
-    latencies_ms: List[float] = field(default_factory=list)
-    last_operation: Optional[datetime] = None
+    latency: LatencySketch = field(default_factory=LatencySketch)            # lifetime: count/sum/mean
+    recent: WindowedLatencySketch = field(default_factory=WindowedLatencySketch)  # quantiles
+    last_operation_ts: Optional[float] = None
+    
+    def record(self, success: bool, latency_ms: float, now: float):
+        self.total_count += 1
+        if success:
+            self.success_count += 1
+        else:
+            self.error_count += 1
+        self.latency.record(latency_ms)
+        self.recent.record(latency_ms)
+        self.last_operation_ts = now
+    
+    @property
+    def last_operation(self) -> Optional[datetime]:
+        if self.last_operation_ts is None:
+            return None
+        return datetime.utcfromtimestamp(self.last_operation_ts)
     
     @property
     def success_rate(self) -> float:
@@ -81,29 +258,21 @@ class OperationMetrics:
     
     @property
     def avg_latency_ms(self) -> float:
-        if not self.latencies_ms:
-            return 0.0
-        return statistics.mean(self.latencies_ms)
+        return self.latency.mean
     
     @property
     def p50_latency_ms(self) -> float:
-        if not self.latencies_ms:
-            return 0.0
-        return statistics.median(self.latencies_ms)
+        return self.recent.quantile(0.50)
     
     @property
     def p99_latency_ms(self) -> float:
-        if len(self.latencies_ms) < 2:
-            return self.avg_latency_ms
-        sorted_latencies = sorted(self.latencies_ms)
-        idx = int(len(sorted_latencies) * 0.99)
-        return sorted_latencies[min(idx, len(sorted_latencies) - 1)]
+        return self.recent.quantile(0.99)
 
 
 @dataclass
 class AuditEntry:
     """Audit log entry for compliance"""
-    timestamp: datetime
+    timestamp: float  # epoch seconds (converted on read)
     operation: str
     user_hash: str  # Hashed user_id for privacy
     success: bool
@@ -119,23 +288,25 @@ class MemoryObserver:
     All user data is hashed/anonymized in logs for privacy.
     """
     
-    def __init__(self, max_audit_entries: int = 10000, max_latency_samples: int = 1000):
+    def __init__(self, max_audit_entries: int = 10000, max_latency_samples: int = LATENCY_WINDOW_SAMPLES):
+        # Quantile window size (samples) for every operation/backend
+        self._max_latency_samples = max_latency_samples
+
         # Metrics storage
         self._metrics: Dict[OperationType, OperationMetrics] = {
-            op: OperationMetrics() for op in OperationType
+            op: self._new_metrics() for op in OperationType
         }
         
         # Per-backend metrics
-        self._backend_metrics: Dict[str, OperationMetrics] = defaultdict(OperationMetrics)
+        self._backend_metrics: Dict[str, OperationMetrics] = defaultdict(self._new_metrics)
         
         # Audit log (ring buffer)
-        self._audit_log: List[AuditEntry] = []
+        self._audit_log = RingBuffer(max_audit_entries)
         self._max_audit_entries = max_audit_entries
-        self._max_latency_samples = max_latency_samples
         
         # Error tracking
-        self._recent_errors: List[Dict[str, Any]] = []
         self._max_errors = 100
+        self._recent_errors = RingBuffer(self._max_errors)
         
         # Custom alert callbacks
         self._alert_callbacks: List[Callable] = []
@@ -152,11 +323,14 @@ class MemoryObserver:
         
         logger.info("📊 MemoryObserver initialized")
     
+    def _new_metrics(self) -> OperationMetrics:
+        return OperationMetrics(recent=WindowedLatencySketch(self._max_latency_samples))
+
     def _hash_user_id(self, user_id: str) -> str:
         """Hash user_id for privacy in logs"""
         if not user_id:
             return "anonymous"
-        return hashlib.sha256(user_id.encode()).hexdigest()[:12]
+        return _hash_user_id_cached(str(user_id))
     
     def log_operation(
         self,
@@ -179,53 +353,30 @@ class MemoryObserver:
             details: Additional details (sensitive data will be filtered)
         """
         user_hash = self._hash_user_id(user_id)
-        now = datetime.utcnow()
+        now = time.time()
         
         # Update operation metrics
         metrics = self._metrics[operation]
-        metrics.total_count += 1
-        metrics.last_operation = now
-        
+        metrics.record(success, latency_ms, now)
         if success:
-            metrics.success_count += 1
             self._consecutive_errors = 0
         else:
-            metrics.error_count += 1
             self._consecutive_errors += 1
         
-        # Track latency (keep recent samples only)
-        metrics.latencies_ms.append(latency_ms)
-        if len(metrics.latencies_ms) > self._max_latency_samples:
-            metrics.latencies_ms = metrics.latencies_ms[-self._max_latency_samples:]
-        
         # Update backend metrics if specified
         if backend:
-            backend_metrics = self._backend_metrics[backend]
-            backend_metrics.total_count += 1
-            backend_metrics.last_operation = now
-            if success:
-                backend_metrics.success_count += 1
-            else:
-                backend_metrics.error_count += 1
-            backend_metrics.latencies_ms.append(latency_ms)
-            if len(backend_metrics.latencies_ms) > self._max_latency_samples:
-                backend_metrics.latencies_ms = backend_metrics.latencies_ms[-self._max_latency_samples:]
+            self._backend_metrics[backend].record(success, latency_ms, now)
         
         # Create audit entry (filter sensitive data)
-        safe_details = self._filter_sensitive_data(details or {})
-        audit_entry = AuditEntry(
+        safe_details = self._filter_sensitive_data(details) if details else {}
+        self._audit_log.append(AuditEntry(
             timestamp=now,
             operation=operation.value,
             user_hash=user_hash,
             success=success,
             latency_ms=latency_ms,
             details=safe_details
-        )
-        
-        # Add to audit log (ring buffer)
-        self._audit_log.append(audit_entry)
-        if len(self._audit_log) > self._max_audit_entries:
-            self._audit_log = self._audit_log[-self._max_audit_entries:]
+        ))
         
         # Log error details
         if not success:
@@ -234,14 +385,15 @@ class MemoryObserver:
         # Check alert thresholds
         self._check_alerts(operation, metrics)
         
-        # Structured logging
+        # Structured logging (skip formatting when the level is disabled)
         log_level = logging.DEBUG if success else logging.WARNING
-        logger.log(
-            log_level,
-            f"{'✅' if success else '❌'} Memory {operation.value}: "
-            f"user={user_hash}, latency={latency_ms:.1f}ms, "
-            f"backend={backend or 'default'}"
-        )
+        if logger.isEnabledFor(log_level):
+            logger.log(
+                log_level,
+                f"{'✅' if success else '❌'} Memory {operation.value}: "
+                f"user={user_hash}, latency={latency_ms:.1f}ms, "
+                f"backend={backend or 'default'}"
+            )
     
     def _filter_sensitive_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Filter sensitive data from details dict"""
@@ -281,8 +433,6 @@ class MemoryObserver:
         }
         
         self._recent_errors.append(error_entry)
-        if len(self._recent_errors) > self._max_errors:
-            self._recent_errors = self._recent_errors[-self._max_errors:]
     
     def _check_alerts(self, operation: OperationType, metrics: OperationMetrics):
         """Check if any alert thresholds are exceeded"""
@@ -297,8 +447,11 @@ class MemoryObserver:
                 "threshold": self.ALERT_THRESHOLDS["error_rate"]
             })
         
-        # Latency alert
-        if metrics.p99_latency_ms > self.ALERT_THRESHOLDS["latency_p99_ms"]:
+        # Latency alert (sampled - quantiles walk the histogram)
+        if (
+            metrics.total_count % ALERT_LATENCY_CHECK_EVERY == 0
+            and metrics.p99_latency_ms > self.ALERT_THRESHOLDS["latency_p99_ms"]
+        ):
             alerts.append({
                 "type": "high_latency",
                 "operation": operation.value,
@@ -376,9 +529,48 @@ class MemoryObserver:
             return 1.0
         return round(successes / total, 4)
     
+    def render_prometheus(self) -> str:
+        """
+        Metrics in Prometheus text exposition format (version 0.0.4).
+        Latencies are exported as summaries with p50/p90/p99 quantiles.
+        """
+        lines = [
+            "# HELP prism_memory_operations_total Memory operations by outcome",
+            "# TYPE prism_memory_operations_total counter",
+        ]
+        series = [("operation", op.value, m) for op, m in self._metrics.items()]
+        series += [("backend", name, m) for name, m in self._backend_metrics.items()]
+        for label, value, metrics in series:
+            lines.append(f'prism_memory_operations_total{{{label}="{value}",outcome="success"}} {metrics.success_count}')
+            lines.append(f'prism_memory_operations_total{{{label}="{value}",outcome="error"}} {metrics.error_count}')
+        
+        lines += [
+            "# HELP prism_memory_latency_ms Memory operation latency in milliseconds",
+            "# TYPE prism_memory_latency_ms summary",
+        ]
+        for label, value, metrics in series:
+            sketch = metrics.latency
+            window = LatencySketch.merged(metrics.recent.slices)
+            for q in (0.5, 0.9, 0.99):
+                lines.append(f'prism_memory_latency_ms{{{label}="{value}",quantile="{q}"}} {window.quantile(q):.3f}')
+            lines.append(f'prism_memory_latency_ms_sum{{{label}="{value}"}} {sketch.total:.3f}')
+            lines.append(f'prism_memory_latency_ms_count{{{label}="{value}"}} {sketch.count}')
+        
+        lines += [
+            "# HELP prism_memory_consecutive_errors Consecutive failed memory operations",
+            "# TYPE prism_memory_consecutive_errors gauge",
+            f"prism_memory_consecutive_errors {self._consecutive_errors}",
+        ]
+        return "\n".join(lines) + "\n"
+    
     def get_recent_errors(self, limit: int = 20) -> List[Dict[str, Any]]:
         """Get recent errors for debugging"""
-        return self._recent_errors[-limit:]
+        newest = []
+        for entry in self._recent_errors.newest_first():
+            if len(newest) >= limit:
+                break
+            newest.append(entry)
+        return newest[::-1]
     
     def get_audit_log(
         self,
@@ -397,18 +589,19 @@ class MemoryObserver:
             limit: Maximum entries to return
         """
         filtered = []
+        since_ts = since.timestamp() if since else None
         
-        for entry in reversed(self._audit_log):
+        for entry in self._audit_log.newest_first():
             # Apply filters
             if operation and entry.operation != operation.value:
                 continue
             if user_hash and entry.user_hash != user_hash:
                 continue
-            if since and entry.timestamp < since:
-                continue
+            if since_ts is not None and entry.timestamp < since_ts:
+                break  # newest first - everything after is older
             
             filtered.append({
-                "timestamp": entry.timestamp.isoformat(),
+                "timestamp": datetime.utcfromtimestamp(entry.timestamp).isoformat(),
                 "operation": entry.operation,
                 "user_hash": entry.user_hash,
                 "success": entry.success,
@@ -475,9 +668,10 @@ class MemoryObserver:
     
     def reset_metrics(self):
         """Reset all metrics (for testing or new period)"""
-        self._metrics = {op: OperationMetrics() for op in OperationType}
+        self._metrics = {op: self._new_metrics() for op in OperationType}
         self._backend_metrics.clear()
         self._consecutive_errors = 0
+        _hash_user_id_cached.cache_clear()
         logger.info("📊 Metrics reset")
     
     def get_debug_snapshot(self, user_id: str) -> Dict[str, Any]:
@@ -497,7 +691,7 @@ class MemoryObserver:
         # Calculate user-specific stats
         if user_operations:
             user_success_rate = sum(1 for op in user_operations if op["success"]) / len(user_operations)
-            user_avg_latency = statistics.mean(op["latency_ms"] for op in user_operations)
+            user_avg_latency = sum(op["latency_ms"] for op in user_operations) / len(user_operations)
         else:
             user_success_rate = None
             user_avg_latency = None
@@ -528,7 +722,7 @@ def observe_memory_operation(
         @wraps(func)
         async def wrapper(*args, **kwargs):
             user_id = kwargs.get("user_id") or (args[0] if args else "unknown")
-            start_time = time.time()
+            start_time = time.perf_counter()
             success = True
             details = {}
             
@@ -540,7 +734,7 @@ def observe_memory_operation(
                 details["error"] = str(e)[:100]
                 raise
             finally:
-                latency_ms = (time.time() - start_time) * 1000
+                latency_ms = (time.perf_counter() - start_time) * 1000
                 memory_observer.log_operation(
                     operation=operation,
                     user_id=user_id,
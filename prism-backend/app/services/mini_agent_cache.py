@@ -0,0 +1,318 @@
+"""
+🧩 MINI-AGENT CACHE - Shared Answers for Paraphrased Snippet Questions
+=======================================================================
+
+The mini-agent endpoint cached answers under MD5(first 100 chars of the
+snippet) + MD5(exact question), so "what does X mean" and "define X" on the
+same highlighted paragraph always missed. Now:
+
+1. Canonical questions: the question is normalized (case, contractions,
+   filler, trailing punctuation) and rewritten into a canonical form when
+   it matches a known intent - "what does X mean" / "meaning of X" /
+   "define X" all become "define x", "can you explain this?" becomes
+   "explain this", and so on. The intent also picks the question type
+   (and the TTL).
+2. Exact tier: mini_cache:{snippet}:{canonical} - one GET. The snippet part
+   is a fingerprint of the normalized snippet the LLM actually sees.
+3. Neighbour tier: every stored answer also lands in a small per-snippet
+   bucket (mini_cache:nn:{snippet}) with a feature-hashed vector of the
+   canonical question (words + word bigrams). A miss on the exact tier
+   compares against the bucket and serves the nearest answer above
+   NEIGHBOUR_THRESHOLD, then writes the exact key for the new phrasing so
+   the next user asking it that way hits tier 2. Entries are shared by all
+   users and instances.
+4. Hit rates (exact / neighbour / miss) are counted per question type,
+   locally and in the mini_cache:stats hash.
+
+Follow-up questions (the thread already has history) only use the exact
+tier: a neighbour's answer was written for a different conversation. Their
+own answers depend on that history, so they are never stored.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import re
+import time
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+KEY_PREFIX = "mini_cache"
+STATS_KEY = "mini_cache:stats"
+SNIPPET_CHARS = 1000                  # the prompt uses snippet_text[:1000]
+VECTOR_DIMENSIONS = 1024
+NEIGHBOUR_THRESHOLD = 0.85
+BUCKET_SIZE = 32
+BUCKET_TTL_SECONDS = 24 * 3600
+
+CACHE_TTLS = {
+    "definition": 24 * 3600,   # 24 hours
+    "clarification": 1 * 3600, # 1 hour
+    "example": 30 * 60,        # 30 minutes
+    "general": 1 * 3600,       # 1 hour
+}
+
+CONTRACTIONS = {
+    "what's": "what is", "whats": "what is", "what're": "what are",
+    "it's": "it is", "that's": "that is", "how's": "how is",
+    "why's": "why is", "doesn't": "does not", "don't": "do not",
+    "eli5": "explain simply",
+}
+FILLER = re.compile(
+    r"\b(?:please|pls|kindly|can you|could you|would you|will you|can u|"
+    r"i want to know|i want you to|i'd like to know|tell me|help me understand|just|"
+    r"actually|basically|quickly|briefly)\b"
+)
+SNIPPET_REFERENCE = re.compile(
+    r"\b(?:this|that|the) (?:text|part|sentence|paragraph|line|snippet|passage|section|bit)\b"
+    r"|\bthe (?:highlighted|selected) (?:text|part)\b|\bhere\b"
+)
+
+# (question type, canonical verb, pattern with a "term" group), first match wins
+CANONICAL_FORMS = [
+    ("definition", "define", re.compile(r"^what (?:is|are) (?:the )?(?:meaning|definition) of (?P<term>.+)$")),
+    ("definition", "define", re.compile(r"^what (?:does|do|is|are) (?P<term>.+?) (?:mean|means|stand for|stands for)$")),
+    ("definition", "define", re.compile(r"^(?:meaning|definition) of (?P<term>.+)$")),
+    ("definition", "define", re.compile(r"^define (?P<term>.+)$")),
+    ("definition", "define", re.compile(r"^(?P<term>[\w\- ]{1,40}) meaning$")),
+    ("clarification", "explain", re.compile(
+        r"^(?:explain|elaborate|clarify|simplify|break down|unpack)(?: (?:on|about))?(?P<term>.*?)(?: (?:simply|in simple terms|like i am 5|like i'm 5))?$"
+    )),
+    ("clarification", "explain", re.compile(r"^what is (?P<term>.+) (?:about|saying|trying to say)$")),
+    ("example", "example", re.compile(
+        r"^(?:give|show|provide)?(?: me)? ?(?:an |some |a few )?(?:examples?|instances?)(?: of| for)?(?P<term>.*)$"
+    )),
+    ("example", "example", re.compile(r"^(?:for example|for instance)(?P<term>.*)$")),
+    ("general", "summarize", re.compile(r"^(?:summarize|summarise|sum up|tl;?dr|summary of)(?P<term>.*)$")),
+    ("definition", "define", re.compile(r"^what (?:is|are) (?:a |an |the )?(?P<term>[\w\- ]{1,40})$")),
+]
+
+STOPWORDS = frozenset({
+    "a", "an", "the", "of", "in", "on", "to", "for", "about", "is", "are", "was", "were",
+    "it", "its", "this", "that", "these", "those", "me", "my", "i", "you", "do", "does", "be",
+})
+
+
+def classify_question_type(question: str) -> str:
+    """Keyword classification for questions without a canonical form"""
+    lower_q = question.lower().strip()
+
+    # Definition questions - cache longest (24 hours)
+    if any(word in lower_q for word in ['what is', 'what does', 'define', 'meaning of', 'means']):
+        return 'definition'
+
+    # Clarification questions - cache medium (1 hour)
+    if any(word in lower_q for word in ['why', 'how', 'can you', 'could you']):
+        return 'clarification'
+
+    # Example questions - cache shortest (30 minutes)
+    if any(word in lower_q for word in ['example', 'instance', 'show me']):
+        return 'example'
+
+    return 'general'
+
+
+def get_cache_ttl(question_type: str) -> int:
+    """Get cache TTL based on question type"""
+    return CACHE_TTLS.get(question_type, 3600)
+
+
+def normalize_question(question: str) -> str:
+    text = " ".join(question.lower().replace("’", "'").split())
+    for short, full in CONTRACTIONS.items():
+        text = re.sub(rf"(?<![\w']){re.escape(short)}(?![\w'])", full, text)
+    text = FILLER.sub(" ", text)
+    text = SNIPPET_REFERENCE.sub(" this ", text)
+    text = re.sub(r"[\"“”`]", "", text)
+    text = re.sub(r"[?!.,;:]+", " ", text)
+    return " ".join(text.split())
+
+
+def canonicalize(question: str) -> Tuple[str, str]:
+    """(question type, canonical form) - paraphrases of one intent share the canonical form"""
+    normalized = normalize_question(question)
+    for question_type, verb, pattern in CANONICAL_FORMS:
+        match = pattern.match(normalized)
+        if match:
+            term = match.group("term").strip() or "this"
+            if verb == "define" and term == "this":
+                # "what does this mean" asks for an explanation of the snippet
+                question_type, verb = "clarification", "explain"
+            return question_type, f"{verb} {term}"
+    return classify_question_type(question), normalized
+
+
+def snippet_fingerprint(snippet: str) -> str:
+    normalized = " ".join(re.sub(r"[^\w]+", " ", (snippet or "")[:SNIPPET_CHARS].lower()).split())
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def embed_question(canonical: str) -> Dict[int, float]:
+    """
+    Feature-hashed bag of words and word bigrams, L2-normalized. Cheap and
+    dependency-free; bigrams keep "why is X slow" away from "why is X fast".
+    """
+    words = [w for w in canonical.split() if w not in STOPWORDS]
+    features = Counter(words)
+    features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    vector: Dict[int, float] = {}
+    for feature, count in features.items():
+        index = int(hashlib.md5(feature.encode()).hexdigest()[:8], 16) % VECTOR_DIMENSIONS
+        vector[index] = vector.get(index, 0.0) + count
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {index: value / norm for index, value in vector.items()}
+
+
+def cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+
+class MiniAgentCache:
+    """
+    Usage:
+    ```python
+    from app.services.mini_agent_cache import mini_agent_cache
+    answer = await mini_agent_cache.get(snippet, question, follow_up=bool(history))
+    if answer is None:
+        answer = await call_llm(...)
+        await mini_agent_cache.put(snippet, question, answer, follow_up=bool(history))
+    ```
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, Counter] = {}
+
+    @staticmethod
+    def _answer_key(snippet_fp: str, canonical: str) -> str:
+        return f"{KEY_PREFIX}:{snippet_fp}:{hashlib.sha1(canonical.encode()).hexdigest()[:16]}"
+
+    @staticmethod
+    def _bucket_key(snippet_fp: str) -> str:
+        return f"{KEY_PREFIX}:nn:{snippet_fp}"
+
+    async def _count(self, question_type: str, outcome: str):
+        self.counts.setdefault(question_type, Counter())[outcome] += 1
+        try:
+            await redis_client.hincrby(STATS_KEY, f"{question_type}:{outcome}", 1)
+        except Exception:
+            pass
+
+    async def _nearest(self, snippet_fp: str, canonical: str) -> Optional[Tuple[float, dict]]:
+        bucket = await redis_client.hgetall(self._bucket_key(snippet_fp))
+        if not bucket:
+            return None
+        query = embed_question(canonical)
+        best: Optional[Tuple[float, dict]] = None
+        for raw in bucket.values():
+            try:
+                entry = json.loads(raw)
+            except (TypeError, ValueError):
+                continue
+            score = cosine(query, {int(i): v for i, v in entry["v"].items()})
+            if score >= NEIGHBOUR_THRESHOLD and (best is None or score > best[0]):
+                best = (score, entry)
+        return best
+
+    async def get(self, snippet: str, question: str, follow_up: bool = False) -> Optional[str]:
+        """Cached answer for this snippet + question (or a close paraphrase), else None"""
+        question_type, canonical = canonicalize(question)
+        snippet_fp = snippet_fingerprint(snippet)
+        try:
+            cached = await redis_client.get(self._answer_key(snippet_fp, canonical))
+            if cached:
+                await self._count(question_type, "exact")
+                return json.loads(cached)["answer"]
+
+            if not follow_up:
+                nearest = await self._nearest(snippet_fp, canonical)
+                if nearest:
+                    score, entry = nearest
+                    cached = await redis_client.get(entry["key"])
+                    if cached:
+                        await self._count(question_type, "neighbour")
+                        logger.info(f"🧩 Mini-agent neighbour hit ({score:.2f}): '{canonical}' ~ '{entry['q']}'")
+                        answer = json.loads(cached)["answer"]
+                        # Warm the exact key so this phrasing is a single GET next time
+                        await redis_client.setex(
+                            self._answer_key(snippet_fp, canonical),
+                            get_cache_ttl(question_type),
+                            json.dumps({"answer": answer, "type": question_type, "q": canonical}),
+                        )
+                        return answer
+        except Exception as e:
+            logger.warning(f"⚠️ Mini-agent cache lookup failed: {e}")
+        await self._count(question_type, "miss")
+        return None
+
+    async def put(self, snippet: str, question: str, answer: str, follow_up: bool = False) -> Optional[str]:
+        """
+        Store an answer under its canonical key and in the snippet's neighbour
+        bucket. Returns the question type, or None for a follow-up (not stored).
+        """
+        if follow_up:
+            return None
+        question_type, canonical = canonicalize(question)
+        snippet_fp = snippet_fingerprint(snippet)
+        answer_key = self._answer_key(snippet_fp, canonical)
+        ttl = get_cache_ttl(question_type)
+        try:
+            await redis_client.setex(answer_key, ttl, json.dumps({"answer": answer, "type": question_type, "q": canonical}))
+
+            bucket_key = self._bucket_key(snippet_fp)
+            await redis_client.hset(bucket_key, answer_key, json.dumps({
+                "key": answer_key,
+                "q": canonical,
+                "type": question_type,
+                "v": embed_question(canonical),
+                "at": time.time(),
+            }))
+            await redis_client.expire(bucket_key, BUCKET_TTL_SECONDS)
+            await self._trim_bucket(bucket_key)
+        except Exception as e:
+            logger.warning(f"⚠️ Mini-agent cache store failed: {e}")
+        return question_type
+
+    async def _trim_bucket(self, bucket_key: str):
+        bucket = await redis_client.hgetall(bucket_key)
+        if len(bucket) <= BUCKET_SIZE:
+            return
+        by_age = sorted(bucket.items(), key=lambda item: json.loads(item[1]).get("at", 0))
+        await redis_client.hdel(bucket_key, *[field for field, _ in by_age[:len(bucket) - BUCKET_SIZE]])
+
+    async def hit_rates(self) -> Dict[str, dict]:
+        """Hit rates per question type across all instances"""
+        raw = await redis_client.hgetall(STATS_KEY)
+        counts: Dict[str, Counter] = {}
+        for field, value in raw.items():
+            question_type, _, outcome = field.partition(":")
+            counts.setdefault(question_type, Counter())[outcome] += int(value)
+        return self._rates(counts)
+
+    @staticmethod
+    def _rates(counts: Dict[str, Counter]) -> Dict[str, dict]:
+        rates = {}
+        for question_type, c in counts.items():
+            total = c["exact"] + c["neighbour"] + c["miss"]
+            rates[question_type] = {
+                "exact": c["exact"],
+                "neighbour": c["neighbour"],
+                "miss": c["miss"],
+                "hit_rate_percent": round((c["exact"] + c["neighbour"]) / total * 100, 2) if total else 0.0,
+            }
+        return rates
+
+    def get_stats(self) -> Dict[str, dict]:
+        """Hit rates per question type in this process"""
+        return self._rates(self.counts)
+
+
+# Global singleton
+mini_agent_cache = MiniAgentCache()
@@ -0,0 +1,144 @@
+"""
+📏 OUTPUT ESTIMATOR - Running Output-Length and Tokens/sec Predictions
+=======================================================================
+
+Nothing upstream of the Groq call knew how long an answer would be, so the
+key pool admitted requests by request count alone and max_tokens came from
+coarse load scores. Now every completed generation feeds
+record_generation_metrics(..., model=, intent=, output_tokens=) and this
+estimator keeps, per (model, intent) and per model:
+
+- an EWMA of output tokens plus an EWMA of its variance, so predict()
+  returns a high-percentile size (mean + PREDICTION_Z * std) rather than
+  the average - admission should be pessimistic about long answers;
+- an EWMA of tokens/sec, so callers also get the expected stream duration.
+
+Lookups fall back (model, intent) -> (model, *) -> priors (the router's
+nominal tokens_per_second, DEFAULT_OUTPUT_TOKENS) until MIN_SAMPLES
+generations were seen. State is per process: every instance learns from
+the traffic it serves, which is the traffic it has to admit.
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+EWMA_ALPHA = 0.2
+MIN_SAMPLES = 5
+PREDICTION_Z = 1.28            # ~90th percentile under a normal approximation
+DEFAULT_OUTPUT_TOKENS = 350
+DEFAULT_TOKENS_PER_SECOND = 300.0
+CHARS_PER_TOKEN = 4
+ANY_INTENT = "*"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token count for prompts (~4 chars per token for English)"""
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+@dataclass
+class _Running:
+    samples: int = 0
+    mean_tokens: float = 0.0
+    var_tokens: float = 0.0
+    tokens_per_second: float = 0.0
+
+    def update(self, output_tokens: int, tokens_per_second: Optional[float]):
+        if self.samples == 0:
+            self.mean_tokens = float(output_tokens)
+            self.tokens_per_second = tokens_per_second or 0.0
+        else:
+            delta = output_tokens - self.mean_tokens
+            self.mean_tokens += EWMA_ALPHA * delta
+            self.var_tokens = (1 - EWMA_ALPHA) * (self.var_tokens + EWMA_ALPHA * delta * delta)
+            if tokens_per_second:
+                self.tokens_per_second = (
+                    tokens_per_second if not self.tokens_per_second
+                    else self.tokens_per_second + EWMA_ALPHA * (tokens_per_second - self.tokens_per_second)
+                )
+        self.samples += 1
+
+
+class OutputEstimator:
+    """
+    Usage:
+    ```python
+    from app.services.output_estimator import output_estimator
+    prediction = output_estimator.predict("llama-3.1-8b-instant", "coding", max_tokens=600)
+    prediction["tokens"], prediction["seconds"]
+    ```
+    """
+
+    def __init__(self):
+        self._stats: Dict[Tuple[str, str], _Running] = {}
+
+    def record(self, model: str, intent: Optional[str], output_tokens: int, duration_s: Optional[float] = None):
+        """Feed one completed generation (streamed chunk count is a fine token count for Groq)"""
+        if not model or output_tokens is None or output_tokens < 0:
+            return
+        tps = output_tokens / duration_s if duration_s and duration_s > 0 and output_tokens else None
+        for key in {(model, intent or ANY_INTENT), (model, ANY_INTENT)}:
+            self._stats.setdefault(key, _Running()).update(output_tokens, tps)
+
+    def _lookup(self, model: str, intent: Optional[str]) -> Optional[_Running]:
+        for key in ((model, intent or ANY_INTENT), (model, ANY_INTENT)):
+            running = self._stats.get(key)
+            if running and running.samples >= MIN_SAMPLES:
+                return running
+        return None
+
+    @staticmethod
+    def _prior_tps(model: str) -> float:
+        from app.services.model_router import SmartModelRouter
+
+        for config in SmartModelRouter.MODELS.values():
+            if config.name == model:
+                return float(config.tokens_per_second)
+        return DEFAULT_TOKENS_PER_SECOND
+
+    def predict(self, model: str, intent: Optional[str] = None, max_tokens: Optional[int] = None) -> dict:
+        """
+        Predicted output size (high percentile, capped by max_tokens), the
+        mean, tokens/sec and expected stream seconds for a generation.
+        """
+        running = self._lookup(model, intent)
+        if running:
+            mean = running.mean_tokens
+            tokens = mean + PREDICTION_Z * math.sqrt(max(running.var_tokens, 0.0))
+            tps = running.tokens_per_second or self._prior_tps(model)
+            samples = running.samples
+        else:
+            mean = tokens = float(DEFAULT_OUTPUT_TOKENS)
+            tps = self._prior_tps(model)
+            samples = 0
+        if max_tokens:
+            tokens = min(tokens, max_tokens)
+            mean = min(mean, max_tokens)
+        tokens = int(math.ceil(tokens))
+        return {
+            "tokens": tokens,
+            "mean_tokens": round(mean, 1),
+            "tokens_per_second": round(tps, 1),
+            "seconds": round(tokens / tps, 2) if tps else None,
+            "samples": samples,
+        }
+
+    def get_stats(self) -> Dict[str, dict]:
+        return {
+            f"{model}/{intent}": {
+                "samples": running.samples,
+                "mean_tokens": round(running.mean_tokens, 1),
+                "std_tokens": round(math.sqrt(max(running.var_tokens, 0.0)), 1),
+                "tokens_per_second": round(running.tokens_per_second, 1),
+            }
+            for (model, intent), running in self._stats.items()
+        }
+
+
+# Global singleton
+output_estimator = OutputEstimator()
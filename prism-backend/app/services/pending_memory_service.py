@@ -18,7 +18,7 @@ from typing import Any, Dict, List, Optional
 
 from app.db.mongo_client import db  # reuse main DB client
 from app.db.redis_client import redis_client
-from app.db.neo4j_client import AdvancedNeo4jClient
+from app.db.neo4j_client import GraphUpsert, graph_write_batcher, label_for_relation, neo4j_client
 
 logger = logging.getLogger(__name__)
 
@@ -180,16 +180,16 @@ async def sync_pending_graph_memories(
     """
     Background auto‑healing job:
     - Finds all pending memories that target Neo4j
-    - Tries to write them to Neo4j with per‑item timeouts
-    - Marks as synced (or keeps as pending on failure)
+    - Groups them per user and writes each user's batch as ONE UNWIND
+      statement in a managed transaction (per‑user timeout)
+    - Marks a user's drafts as synced with one update_many (or keeps them
+      pending on failure)
     """
     await _ensure_indexes()
 
-    neo4j_client_adv = AdvancedNeo4jClient()
-
     try:
         # Quick check: if Neo4j is not available, just exit fast
-        if not neo4j_client_adv.neo4j_client.is_available:
+        if not neo4j_client.is_available:
             logger.info("PendingMemory: Neo4j not available, skipping sync cycle")
             return
     except Exception as e:
@@ -201,50 +201,39 @@ async def sync_pending_graph_memories(
         "targets": {"$in": ["neo4j"]},
     }
 
-    cursor = pending_memory_collection.find(query).limit(max_items)
-
-    async for doc in cursor:
-        doc_id = doc.get("_id")
+    # user_id -> (upsert, [doc_ids])
+    batches: Dict[str, tuple] = {}
+    async for doc in pending_memory_collection.find(query).limit(max_items):
         user_id = doc.get("user_id")
         memory_type = doc.get("type")
         value = doc.get("value")
+        if not user_id:
+            continue
 
+        upsert, doc_ids = batches.setdefault(user_id, (GraphUpsert(), []))
         # Only graph‑style memories are handled here (interests, relations, etc.)
+        if memory_type in ("USER_INTEREST", "INTEREST", "HOBBY"):
+            upsert.add_relationship(str(value), "LIKES", label_for_relation("LIKES"), strength_inc=0.1)
+        elif memory_type == "USER_NAME":
+            # USER_NAME is typically stored in Mongo profile; we still make sure the node carries it
+            upsert.set_property("name", str(value))
+        else:
+            # Unknown type – skip but keep in pending for now
+            logger.info(f"PendingMemory: skipping unsupported graph memory type={memory_type}")
+            continue
+        doc_ids.append(doc["_id"])
+
+    for user_id, (upsert, doc_ids) in batches.items():
+        if not doc_ids:
+            continue
         try:
-            if memory_type in ("USER_INTEREST", "INTEREST", "HOBBY"):
-                async def apply_interest() -> bool:
-                    return await neo4j_client_adv.merge_user_relationship(
-                        user_id=user_id,
-                        relation_type="LIKES",
-                        target_value=str(value),
-                    )
-
-                success = await asyncio.wait_for(
-                    apply_interest(),
-                    timeout=per_item_timeout_seconds,
-                )
-            elif memory_type == "USER_NAME":
-                # USER_NAME is typically stored in Mongo profile; we still create/update a user node
-                async def apply_name() -> bool:
-                    # This is a soft operation, only to make sure graph node exists
-                    try:
-                        from app.db.neo4j_client import create_user_in_graph
-                    except Exception:
-                        return False
-                    return await create_user_in_graph(user_id, email="", name=str(value))
-
-                success = await asyncio.wait_for(
-                    apply_name(),
-                    timeout=per_item_timeout_seconds,
-                )
-            else:
-                # Unknown type – skip but keep in pending for now
-                logger.info(f"PendingMemory: skipping unsupported graph memory type={memory_type}")
-                continue
-
+            success = await asyncio.wait_for(
+                graph_write_batcher.submit(user_id, upsert),
+                timeout=per_item_timeout_seconds,
+            )
             if success:
-                await pending_memory_collection.update_one(
-                    {"_id": doc_id},
+                await pending_memory_collection.update_many(
+                    {"_id": {"$in": doc_ids}},
                     {
                         "$set": {
                             "status": "synced",
@@ -252,20 +241,10 @@ async def sync_pending_graph_memories(
                         }
                     },
                 )
-                logger.info(
-                    f"PendingMemory: synced draft for user={user_id}, type={memory_type}, value={value}"
-                )
+                logger.info(f"PendingMemory: synced {len(doc_ids)} drafts for user={user_id}")
             else:
-                logger.warning(
-                    f"PendingMemory: Neo4j sync returned False for user={user_id}, type={memory_type}"
-                )
+                logger.warning(f"PendingMemory: Neo4j batch sync returned False for user={user_id}")
         except asyncio.TimeoutError:
-            logger.warning(
-                f"PendingMemory: Neo4j sync timeout for user={user_id}, type={memory_type}"
-            )
+            logger.warning(f"PendingMemory: Neo4j sync timeout for user={user_id}")
         except Exception as e:
-            logger.error(
-                f"PendingMemory: error while syncing draft to Neo4j for user={user_id}, type={memory_type}: {e}"
-            )
-
-
+            logger.error(f"PendingMemory: error while syncing drafts to Neo4j for user={user_id}: {e}")
@@ -37,6 +37,7 @@ from app.db.mongo_client import (
     users_collection, sessions_collection, 
     tasks_collection, memory_collection
 )
+from app.db.session_schema import canonical_fields, session_filter
 from app.db.redis_client import (
     cache_temp_message, get_temp_messages, clear_temp_messages,
     track_user_activity
@@ -167,6 +168,8 @@ class PerfectMemoryPipeline:
                 )
                 
                 result = await users_collection.insert_one(new_user.dict(by_alias=True))
+                from app.services.analytics_rollups import analytics_rollups
+                await analytics_rollups.record_signup()
                 
                 # Create user in graph database too
                 await graph_memory.create_user_node(
@@ -337,15 +340,12 @@ class PerfectMemoryPipeline:
             ai_msg = MessageModel(role="assistant", text=ai_response)
             
             # Check if session exists
-            session = await sessions_collection.find_one({
-                "sessionId": session_id,
-                "userId": ObjectId(user_id)
-            })
+            session = await sessions_collection.find_one(session_filter(session_id, ObjectId(user_id)))
             
             if session:
                 # Add messages to existing session
                 await sessions_collection.update_one(
-                    {"sessionId": session_id, "userId": ObjectId(user_id)},
+                    session_filter(session_id, ObjectId(user_id)),
                     {
                         "$push": {
                             "messages": {
@@ -363,7 +363,12 @@ class PerfectMemoryPipeline:
                     messages=[user_msg, ai_msg]
                 )
                 
-                await sessions_collection.insert_one(new_session.dict(by_alias=True))
+                await sessions_collection.insert_one({
+                    **new_session.dict(by_alias=True),
+                    **canonical_fields(session_id, ObjectId(user_id)),
+                })
+                from app.services.analytics_rollups import analytics_rollups
+                await analytics_rollups.record_session()
             
             # Clear temporary Redis messages after saving
             await clear_temp_messages(user_id, session_id)
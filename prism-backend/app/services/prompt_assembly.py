@@ -0,0 +1,125 @@
+"""
+🧱 PROMPT ASSEMBLY CACHE - Memoized Static Prefix + Dynamic Tail
+=================================================================
+
+Every turn used to rebuild the whole system prompt through large f-string
+concatenations, with the per-turn memory context spliced into the middle.
+That costs CPU, and it also moves the bytes after the memory context on
+every turn, so provider-side prompt caching could never match more than
+the identity block.
+
+Now the system prompt is assembled as:
+
+    prefix (memoized)                       tail (per turn)
+    core identity + bio + anchor + style    CURRENT CONTEXT (memory, location,
+    + response-format rules                 ask-flow) + whatever main_brain appends
+
+The prefix is keyed by (core identity version, profile version, behavior
+key, anchor version) - each a short digest of exactly the inputs that reach
+the prefix text - so it is rebuilt only when one of them changes and stays
+byte-identical across turns otherwise. The orchestrator's profile-derived
+memory head (location, global stats, profile, preferences) is memoized the
+same way under its own key.
+
+Sizes of every assembled prompt are accounted (prefix vs tail chars and
+estimated tokens) and exposed in get_stats() for admin system-health.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable, Optional
+
+from app.services.output_estimator import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+MAX_ENTRIES = 1024
+
+
+@lru_cache(maxsize=16)
+def identity_version(core_identity: str) -> str:
+    """Digest of the core identity text (module constant, so this is computed once)"""
+    return hashlib.sha1(core_identity.encode("utf-8")).hexdigest()[:12]
+
+
+def fingerprint(value: Any) -> str:
+    """Stable short digest of a JSON-able value (dicts by sorted keys, None -> "-")"""
+    if value is None or value == {}:
+        return "-"
+    raw = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+class PromptAssemblyCache:
+    """
+    Usage:
+    ```python
+    from app.services.prompt_assembly import prompt_assembly
+    key = prompt_assembly.prefix_key(core_identity, profile_version, behavior_key, anchor_version)
+    prefix = prompt_assembly.get_or_build(key, lambda: build_prefix(...))
+    prompt_assembly.record_sizes(prefix, tail)
+    ```
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.prompts = 0
+        self.prefix_chars = 0
+        self.tail_chars = 0
+        self.prefix_tokens = 0
+        self.tail_tokens = 0
+        self.max_prompt_chars = 0
+
+    @staticmethod
+    def prefix_key(core_identity: str, profile_version: str, behavior_key: str, anchor_version: str) -> str:
+        return f"prefix:{identity_version(core_identity)}:{profile_version}:{behavior_key}:{anchor_version}"
+
+    def get_or_build(self, key: str, build: Callable[[], str]) -> str:
+        """Memoized text for key; build() runs only on a miss"""
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+        self.misses += 1
+        text = build()
+        self._entries[key] = text
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        return text
+
+    def record_sizes(self, prefix: str, tail: Optional[str] = ""):
+        """Account one assembled prompt (prefix is cacheable, tail changes per turn)"""
+        tail = tail or ""
+        self.prompts += 1
+        self.prefix_chars += len(prefix)
+        self.tail_chars += len(tail)
+        self.prefix_tokens += estimate_tokens(prefix)
+        self.tail_tokens += estimate_tokens(tail)
+        self.max_prompt_chars = max(self.max_prompt_chars, len(prefix) + len(tail))
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        total_chars = self.prefix_chars + self.tail_chars
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percent": round(self.hits / lookups * 100, 2) if lookups else 0.0,
+            "prompts": self.prompts,
+            "avg_prefix_tokens": round(self.prefix_tokens / self.prompts, 1) if self.prompts else 0.0,
+            "avg_tail_tokens": round(self.tail_tokens / self.prompts, 1) if self.prompts else 0.0,
+            "prefix_share_percent": round(self.prefix_chars / total_chars * 100, 2) if total_chars else 0.0,
+            "max_prompt_chars": self.max_prompt_chars,
+        }
+
+
+# Global singleton
+prompt_assembly = PromptAssemblyCache()
@@ -0,0 +1,208 @@
+"""
+🖍️ RENDERED TEXT INDEX - Precomputed Highlight Text and Offset Maps
+====================================================================
+
+Highlight offsets are positions in the RENDERED text (metadata blocks
+removed, markdown stripped - what the DOM shows). create_highlight used to
+re-run the regex pipeline over the full message for every highlight. Now:
+
+1. build_rendered_index runs the same rules once, but tracks where every
+   kept character came from, and stores the result as segments: rendered
+   [r_i, r_i+1) was copied from raw [w_i, ...). Translating an offset
+   either way is one bisect - O(log n) in the number of segments.
+2. The finalize queue consumer builds the index for each assistant message
+   right after it is persisted and caches it by the SHA-256 of the raw
+   content (rendered:{hash} in Redis, plus a small in-process LRU), so
+   highlight creation normally starts from a cache hit.
+3. The index carries the rendered-text hash highlights store as
+   messageHash, so drift checks compare hashes instead of re-rendering.
+
+CLEAN_RULES / MARKDOWN_RULES are the single definition of the rendering
+rules; routers/highlights.py applies the same lists.
+"""
+
+import hashlib
+import json
+import logging
+import re
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+KEY_TEMPLATE = "rendered:{content_hash}"
+CACHE_TTL_SECONDS = 7 * 86400
+LOCAL_CACHE_SIZE = 256
+
+# (pattern, group to keep or None to drop the match)
+CLEAN_RULES: List[Tuple[re.Pattern, Optional[int]]] = [
+    (re.compile(r'<!--\s*THINKING_DATA:.*?-->', re.DOTALL), None),   # THINKING_DATA blocks
+    (re.compile(r'<!--\s*ACTION:.*?-->', re.DOTALL), None),          # ACTION blocks
+]
+# IMPORTANT: Must stay in sync with Frontend/src/lib/semanticHighlight.tsx
+MARKDOWN_RULES: List[Tuple[re.Pattern, Optional[int]]] = [
+    (re.compile(r'\*\*([^*]+)\*\*'), 1),                 # bold **text**
+    (re.compile(r'(?<!\*)\*([^*]+)\*(?!\*)'), 1),        # italic *text*
+    (re.compile(r'_([^_]+)_'), 1),                       # italic _text_
+    (re.compile(r'`([^`]+)`'), 1),                       # inline code
+    (re.compile(r'~~([^~]+)~~'), 1),                     # strikethrough
+    (re.compile(r'^#{1,6}\s+', re.MULTILINE), None),     # headers (keep the text)
+    (re.compile(r'\[([^\]]+)\]\([^)]+\)'), 1),           # links [text](url)
+]
+
+
+def apply_rules(text: str, rules: List[Tuple[re.Pattern, Optional[int]]]) -> str:
+    """Plain re.sub pass over the rules (no offset tracking)"""
+    for pattern, group in rules:
+        text = pattern.sub(rf'\{group}' if group else '', text)
+    return text
+
+
+def _tracked_sub(pattern: re.Pattern, group: Optional[int], text: str, origin: List[int]) -> Tuple[str, List[int]]:
+    """re.sub that also carries each kept character's raw position along"""
+    out, out_origin, last = [], [], 0
+    for match in pattern.finditer(text):
+        out.append(text[last:match.start()])
+        out_origin.extend(origin[last:match.start()])
+        if group:
+            start, end = match.span(group)
+            out.append(text[start:end])
+            out_origin.extend(origin[start:end])
+        last = match.end()
+    out.append(text[last:])
+    out_origin.extend(origin[last:])
+    return "".join(out), out_origin
+
+
+@dataclass
+class RenderedTextIndex:
+    text: str
+    message_hash: str                 # sha256 of the rendered text (highlight messageHash)
+    rendered_starts: List[int]
+    raw_starts: List[int]
+
+    def to_raw(self, offset: int) -> int:
+        """Raw content position of a rendered offset"""
+        if not self.rendered_starts or offset >= len(self.text):
+            return (self.raw_starts[-1] + len(self.text) - self.rendered_starts[-1]) if self.rendered_starts else 0
+        i = bisect_right(self.rendered_starts, max(offset, 0)) - 1
+        return self.raw_starts[i] + offset - self.rendered_starts[i]
+
+    def raw_span(self, start: int, end: int) -> Tuple[int, int]:
+        """Raw [start, end) covering a rendered [start, end) selection"""
+        return self.to_raw(start), (self.to_raw(end - 1) + 1) if end > start else self.to_raw(start)
+
+    def to_rendered(self, raw_offset: int) -> int:
+        """Rendered offset of a raw position (markup positions snap to the next visible char)"""
+        i = bisect_right(self.raw_starts, raw_offset) - 1
+        if i < 0:
+            return 0
+        seg_end = self.rendered_starts[i + 1] if i + 1 < len(self.rendered_starts) else len(self.text)
+        return min(self.rendered_starts[i] + raw_offset - self.raw_starts[i], seg_end)
+
+    def to_json(self) -> str:
+        return json.dumps({"t": self.text, "h": self.message_hash, "r": self.rendered_starts, "w": self.raw_starts})
+
+    @classmethod
+    def from_json(cls, raw: str) -> "RenderedTextIndex":
+        data = json.loads(raw)
+        return cls(data["t"], data["h"], data["r"], data["w"])
+
+
+def build_rendered_index(content: str) -> RenderedTextIndex:
+    """Same output as get_rendered_text, plus the rendered <-> raw offset map"""
+    text, origin = content or "", list(range(len(content or "")))
+    for pattern, group in CLEAN_RULES:
+        text, origin = _tracked_sub(pattern, group, text, origin)
+    stripped = text.strip()
+    lead = len(text) - len(text.lstrip())
+    text, origin = stripped, origin[lead:lead + len(stripped)]
+    for pattern, group in MARKDOWN_RULES:
+        text, origin = _tracked_sub(pattern, group, text, origin)
+
+    rendered_starts, raw_starts = [], []
+    for i, raw in enumerate(origin):
+        if not raw_starts or raw != origin[i - 1] + 1:
+            rendered_starts.append(i)
+            raw_starts.append(raw)
+    return RenderedTextIndex(
+        text=text,
+        message_hash=hashlib.sha256(text.encode("utf-8")).hexdigest(),
+        rendered_starts=rendered_starts,
+        raw_starts=raw_starts,
+    )
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+class RenderedTextIndexCache:
+    """
+    Usage:
+    ```python
+    from app.services.rendered_text_index import rendered_text_index
+    index = await rendered_text_index.get(message_content)
+    raw_start, raw_end = index.raw_span(start, end)
+    ```
+    """
+
+    def __init__(self):
+        self._local: "OrderedDict[str, RenderedTextIndex]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, index: RenderedTextIndex):
+        self._local[key] = index
+        self._local.move_to_end(key)
+        while len(self._local) > LOCAL_CACHE_SIZE:
+            self._local.popitem(last=False)
+
+    async def get(self, content: str) -> RenderedTextIndex:
+        """Cached index for this content; built (and cached) on a miss"""
+        key = content_hash(content)
+        index = self._local.get(key)
+        if index is not None:
+            self._local.move_to_end(key)
+            self.hits += 1
+            return index
+        try:
+            cached = await redis_client.get(KEY_TEMPLATE.format(content_hash=key))
+            if cached:
+                index = RenderedTextIndex.from_json(cached)
+                self._remember(key, index)
+                self.hits += 1
+                return index
+        except Exception as e:
+            logger.debug(f"Rendered index cache read failed: {e}")
+        self.misses += 1
+        return await self.precompute(content)
+
+    async def precompute(self, content: str) -> RenderedTextIndex:
+        """Build and cache the index (finalize time). Never raises on cache errors."""
+        key = content_hash(content)
+        index = build_rendered_index(content)
+        self._remember(key, index)
+        try:
+            await redis_client.setex(KEY_TEMPLATE.format(content_hash=key), CACHE_TTL_SECONDS, index.to_json())
+        except Exception as e:
+            logger.debug(f"Rendered index cache write failed: {e}")
+        return index
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate_percent": round(self.hits / total * 100, 2) if total else 0.0,
+            "local_entries": len(self._local),
+        }
+
+
+# Global singleton
+rendered_text_index = RenderedTextIndexCache()
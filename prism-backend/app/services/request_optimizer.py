@@ -102,15 +102,11 @@ class RequestOptimizer:
         return []  # Will fall back to standard history lookup
     
     async def _check_rate_limit(self, user_id: str) -> bool:
-        """Fast rate limit check using Redis"""
-        key = f"opt:ratelimit:{user_id}"
+        """Fast rate limit check using the shared sliding-window limiter"""
+        from app.utils.rate_limiter import rate_limiter
         
         # Sliding window: 60 requests per minute
-        current = await self.redis.incr(key)
-        if current == 1:
-            await self.redis.expire(key, 60)
-        
-        return current <= 60
+        return await rate_limiter.is_allowed(f"opt:{user_id}", limit=60, window=60)
     
     async def _get_user_preferences(self, user_id: str) -> dict:
         """Get user's model/generation preferences"""
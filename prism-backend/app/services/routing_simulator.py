@@ -0,0 +1,257 @@
+"""
+🧪 ROUTING SIMULATOR - Replay Request Traces Against Stubbed Models
+====================================================================
+
+Compares routing policies offline before one is switched on in
+production. A trace is a list of requests (arrival time, intent,
+complexity tier, prompt and output tokens); load_trace() reads the
+llm.stream spans that tracing exports to TRACE_EXPORT_FILE, or plain JSON
+lines with the TraceRequest fields.
+
+Each policy replays the same trace against StubModels:
+- TTFT = base TTFT x (1 + slowdown x streams already in flight) x jitter
+- a shared per-minute token budget stands in for the key pool; requests
+  that do not fit are counted as rate limited (the 429 we try to avoid)
+- jitter and error rolls are drawn per request, not per model, so every
+  policy sees the same luck
+
+Policies observe their own outcomes, so LoadAwarePolicy exercises the
+same feedback loop (LoadAwareRouter.record + OutputEstimator.record) as
+the live path.
+
+Usage:
+    python -m app.services.routing_simulator traces.jsonl --budget 30000
+"""
+
+import argparse
+import json
+import random
+import sys
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from app.services.load_aware_router import LoadAwareRouter, percentile
+from app.services.model_router import MODEL_LADDER, SmartModelRouter
+from app.services.output_estimator import CHARS_PER_TOKEN, OutputEstimator
+
+# ============ CONSTANTS ============
+DEFAULT_TOKEN_BUDGET = 30000    # 5 keys x 6000 TPM
+DEFAULT_SEED = 7
+LOAD_SCORE_STREAMS = 10         # in-flight streams that count as load score 1.0
+BASE_TTFT_MS = {"instant": 250.0, "balanced": 450.0, "powerful": 800.0}
+
+
+@dataclass
+class TraceRequest:
+    arrival_s: float
+    intent: str = "general"
+    complexity: str = "instant"
+    prompt_tokens: int = 0
+    output_tokens: int = 0
+
+
+@dataclass
+class StubModel:
+    name: str
+    model_type: str
+    ttft_ms: float                      # unloaded time to first token
+    tokens_per_second: float
+    max_tokens: int
+    error_rate: float = 0.0
+    slowdown_per_stream: float = 0.15   # TTFT growth per concurrent stream on this model
+
+
+def default_models() -> Dict[str, StubModel]:
+    """One stub per SmartModelRouter model, from its nominal speed"""
+    return {
+        config.name: StubModel(
+            name=config.name,
+            model_type=model_type,
+            ttft_ms=BASE_TTFT_MS[model_type],
+            tokens_per_second=config.tokens_per_second,
+            max_tokens=config.max_tokens,
+        )
+        for model_type, config in SmartModelRouter.MODELS.items()
+    }
+
+
+def load_trace(path: str) -> List[TraceRequest]:
+    """Read exported llm.stream spans (or TraceRequest dicts) as a trace sorted by arrival"""
+    rows = []
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                rows.append(json.loads(line))
+    return trace_from_rows(rows)
+
+
+def trace_from_rows(rows: Iterable[dict]) -> List[TraceRequest]:
+    requests = []
+    for row in rows:
+        if "name" in row and "attributes" in row:
+            if row["name"] != "llm.stream":
+                continue
+            attrs = row["attributes"]
+            requests.append(TraceRequest(
+                arrival_s=row["start_unix_ns"] / 1e9,
+                intent=attrs.get("intent", "general"),
+                complexity=attrs.get("complexity", "instant"),
+                prompt_tokens=attrs.get("prompt_tokens") or attrs.get("prompt_chars", 0) // CHARS_PER_TOKEN,
+                output_tokens=attrs.get("chunks", 0),
+            ))
+        else:
+            requests.append(TraceRequest(**row))
+    requests.sort(key=lambda r: r.arrival_s)
+    if requests:
+        origin = requests[0].arrival_s
+        for request in requests:
+            request.arrival_s -= origin
+    return requests
+
+
+# ============ POLICIES ============
+
+class RoutingPolicy(ABC):
+    """Base policy: choose a model name per request, optionally learn from outcomes"""
+
+    @abstractmethod
+    def choose(self, request: TraceRequest, headroom: int, load_score: float) -> str:
+        ...
+
+    def observe(self, request: TraceRequest, model: str, ttft_ms: Optional[float], success: bool, duration_s: float):
+        pass
+
+
+class StaticPolicy(RoutingPolicy):
+    """Always the same model (today's platform default)"""
+
+    def __init__(self, model: str = SmartModelRouter.MODELS["instant"].name):
+        self.model = model
+
+    def choose(self, request, headroom, load_score):
+        return self.model
+
+
+class ComplexityPolicy(RoutingPolicy):
+    """SmartModelRouter heuristics only"""
+
+    def choose(self, request, headroom, load_score):
+        return SmartModelRouter.MODELS[request.complexity].name
+
+
+class LoadAwarePolicy(RoutingPolicy):
+    """LoadAwareRouter with its own health windows and output estimator"""
+
+    def __init__(self):
+        self.router = LoadAwareRouter(estimator=OutputEstimator())
+
+    def choose(self, request, headroom, load_score):
+        return self.router.decide(
+            request.complexity, request.intent, request.prompt_tokens, headroom, load_score
+        )["name"]
+
+    def observe(self, request, model, ttft_ms, success, duration_s):
+        self.router.record(model, ttft_ms, success)
+        if success:
+            self.router.estimator.record(model, request.intent, request.output_tokens, duration_s)
+
+
+# ============ SIMULATION ============
+
+def simulate(
+    trace: List[TraceRequest],
+    policy: RoutingPolicy,
+    models: Optional[Dict[str, StubModel]] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    seed: int = DEFAULT_SEED,
+) -> dict:
+    """Replay a trace through one policy; returns the aggregate report"""
+    models = models or default_models()
+    rng = random.Random(seed)
+    inflight: Dict[str, List[float]] = {name: [] for name in models}
+    admitted: List[tuple] = []          # (time, tokens) inside the trailing minute
+    ttfts, latencies = [], []
+    counts = {name: 0 for name in models}
+    errors = rate_limited = downgraded = 0
+
+    for request in trace:
+        now = request.arrival_s
+        jitter, roll = rng.uniform(0.8, 1.25), rng.random()
+        admitted = [(t, tokens) for t, tokens in admitted if now - t < 60]
+        headroom = max(0, token_budget - sum(tokens for _, tokens in admitted))
+        for name in inflight:
+            inflight[name] = [end for end in inflight[name] if end > now]
+        load_score = sum(len(ends) for ends in inflight.values()) / LOAD_SCORE_STREAMS
+
+        name = policy.choose(request, headroom, load_score)
+        stub = models[name]
+        counts[name] += 1
+        if MODEL_LADDER.index(stub.model_type) > MODEL_LADDER.index(request.complexity):
+            downgraded += 1
+
+        output_tokens = min(request.output_tokens, stub.max_tokens)
+        tokens = request.prompt_tokens + output_tokens
+        if tokens > headroom:
+            rate_limited += 1
+            policy.observe(request, name, None, False, 0.0)
+            continue
+        if roll < stub.error_rate:
+            errors += 1
+            policy.observe(request, name, None, False, 0.0)
+            continue
+
+        ttft_ms = stub.ttft_ms * (1 + stub.slowdown_per_stream * len(inflight[name])) * jitter
+        duration_s = ttft_ms / 1000 + output_tokens / stub.tokens_per_second
+        admitted.append((now, tokens))
+        inflight[name].append(now + duration_s)
+        ttfts.append(ttft_ms)
+        latencies.append(duration_s * 1000)
+        policy.observe(request, name, ttft_ms, True, duration_s)
+
+    total = len(trace)
+    return {
+        "requests": total,
+        "completed": len(ttfts),
+        "errors": errors,
+        "rate_limited": rate_limited,
+        "failure_rate": round((errors + rate_limited) / total, 4) if total else 0.0,
+        "downgraded": downgraded,
+        "p50_ttft_ms": round(percentile(ttfts, 50) or 0.0, 1),
+        "p95_ttft_ms": round(percentile(ttfts, 95) or 0.0, 1),
+        "p95_latency_ms": round(percentile(latencies, 95) or 0.0, 1),
+        "models": {name: count for name, count in counts.items() if count},
+    }
+
+
+def compare_policies(
+    trace: List[TraceRequest],
+    policies: Optional[Dict[str, RoutingPolicy]] = None,
+    models: Optional[Dict[str, StubModel]] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+    seed: int = DEFAULT_SEED,
+) -> Dict[str, dict]:
+    """Same trace, same seed, one report per policy"""
+    policies = policies or {
+        "static": StaticPolicy(),
+        "complexity": ComplexityPolicy(),
+        "load_aware": LoadAwarePolicy(),
+    }
+    return {
+        label: simulate(trace, policy, models=models, token_budget=token_budget, seed=seed)
+        for label, policy in policies.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay a request trace through the routing policies")
+    parser.add_argument("trace", help="JSON-lines file (TRACE_EXPORT_FILE spans or TraceRequest rows)")
+    parser.add_argument("--budget", type=int, default=DEFAULT_TOKEN_BUDGET, help="Pool tokens per minute")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    args = parser.parse_args()
+
+    trace = load_trace(args.trace)
+    if not trace:
+        print("❌ No llm.stream spans or trace rows found")
+        sys.exit(1)
+    print(json.dumps(compare_policies(trace, token_budget=args.budget, seed=args.seed), indent=2))
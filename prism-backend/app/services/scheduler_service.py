@@ -1,46 +1,37 @@
 import asyncio
-from datetime import datetime, timedelta
-from typing import Optional
+import heapq
+import itertools
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
 from calendar import monthrange
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from bson import ObjectId
+from pymongo import ReturnDocument
 
 from app.db.mongo_client import tasks_collection
 from app.services.pending_memory_service import sync_pending_graph_memories
 
 scheduler = AsyncIOScheduler()
 
-TASK_RUNNER_JOB_ID = "task_runner_next"
-
-
-async def _fetch_next_task():
-    """Get the next pending task ordered by due_date."""
-    return await tasks_collection.find_one(
-        {"status": "pending", "due_date": {"$ne": None}},
-        sort=[("due_date", 1)],
-    )
-
-
-async def _execute_task(task: dict):
-    """Send notification email and update or reschedule the task."""
+async def _execute_task(task: dict) -> Optional[datetime]:
+    """
+    Send notification email for a task already claimed by this instance
+    (status "sending"), then complete it or roll it to its next occurrence.
+    Returns the next due_date for recurring tasks.
+    """
     now = datetime.utcnow()
     task_id = task.get('_id')
     description = task.get('description', 'Task')
     user_email = task.get('user_email')
     
-    # 🚀 Part 15: Prevent duplicate execution - check status BEFORE sending email
-    current_task = await tasks_collection.find_one({"_id": task_id})
-    if not current_task or current_task.get("status") != "pending":
-        print(f"⚠️ Task {task_id} is not pending (status: {current_task.get('status') if current_task else 'not found'}), skipping execution")
-        return
-    
     print(f"🔔 Executing task {task_id}: {description}")
     print(f"📧 Scheduling email via Celery for: {user_email}")
     
     # Schedule email via Celery (immediate execution)
     email_success = False
     try:
-        from app.tasks.email_tasks import send_reminder_email_task
         from app.core.celery_app import CELERY_AVAILABLE, celery_app
         
         if CELERY_AVAILABLE and celery_app:
@@ -61,53 +52,55 @@ async def _execute_task(task: dict):
             
     except Exception as e:
         print(f"❌ Email scheduling failed for task {task_id}: {e}")
-        # Log error but continue with task completion
-        await tasks_collection.update_one(
-            {"_id": task_id},
-            {"$set": {"email_error": str(e), "email_sent": False, "updated_at": now}},
-        )
+        # Recorded with the status transition below
+    
+    release = {"updated_at": now, "email_sent": email_success}
+    if not email_success:
+        release["email_error"] = "dispatch_failed"
+    unset_claim = {"claimed_at": "", "claimed_by": ""}
     
-    # If task has a recurrence rule and is still active, compute the next run.
+    # If task has a recurrence rule, compute the next run.
     recurrence = task.get("recurrence") or {}
-    if recurrence and task.get("status") == "pending":
+    if recurrence:
         next_due = _compute_next_due_date(task.get("due_date"), recurrence)
         if next_due:
-            # 🚀 Part 15: Atomic update - only reschedule if status is still "pending"
+            # Atomic update - only the claim holder can release the task
             result = await tasks_collection.update_one(
-                {"_id": task_id, "status": "pending"},  # Atomic check
+                {"_id": task_id, "status": "sending"},
                 {
                     "$set": {
+                        **release,
+                        "status": "pending",
                         "due_date": next_due,
-                        "updated_at": now,
-                        "email_sent": email_success,
                         "last_notification_at": now,
-                    }
+                    },
+                    "$unset": unset_claim,
                 },
             )
             if result.modified_count > 0:
                 print(f"♻️ Rescheduled recurring task {task_id} for {next_due}")
-            else:
-                print(f"⚠️ Task {task_id} was already modified (prevented duplicate reschedule)")
-            return
+                return next_due
+            print(f"⚠️ Task {task_id} was already modified (prevented duplicate reschedule)")
+            return None
 
     # One-time tasks, or recurrence could not be computed → mark completed.
-    # 🚀 Part 15: Atomic update - only update if status is still "pending"
     result = await tasks_collection.update_one(
-        {"_id": task_id, "status": "pending"},  # Atomic check: only update if still pending
+        {"_id": task_id, "status": "sending"},
         {
             "$set": {
+                **release,
                 "status": "completed",
                 "completed_at": now,
-                "updated_at": now,
-                "email_sent": email_success,
                 "notified_at": now,
-            }
+            },
+            "$unset": unset_claim,
         },
     )
     if result.modified_count > 0:
         print(f"✅ Task {task_id} marked as completed")
     else:
         print(f"⚠️ Task {task_id} was already modified (prevented duplicate completion)")
+    return None
 
 
 def _compute_next_due_date(current_due, recurrence: dict) -> Optional[datetime]:
@@ -148,86 +141,245 @@ def _compute_next_due_date(current_due, recurrence: dict) -> Optional[datetime]:
     return None
 
 
-async def _run_and_reschedule(task_id):
-    # Reload to ensure status is still pending
-    task = await tasks_collection.find_one({"_id": task_id})
-    if not task or task.get("status") != "pending":
-        print(f"⚠️  Task {task_id} no longer pending, skipping...")
-        await schedule_next_task()
-        return
-    await _execute_task(task)
-    await schedule_next_task()
-
+# =============================================================================
+# ⏱️ REMINDER SCHEDULER (rolling window + min-heap, atomic claims)
+# =============================================================================
 
-async def schedule_next_task():
+class ReminderScheduler:
     """
-    Optimized scheduler:
-    - Finds the next pending task instantly
-    - Sends email 3 minutes before due time
-    - No busy-waiting, efficient event-driven execution
+    In-memory timing heap over a rolling window of pending tasks.
+
+    - ONE indexed query (status, due_date) loads every task due in the next
+      WINDOW into a min-heap keyed by notification time
+    - A single loop sleeps until the earliest entry (or a wake-up from a
+      create/reschedule/cancel), then fires every due task concurrently,
+      bounded by MAX_CONCURRENCY
+    - Each task is claimed with find_one_and_update (pending -> sending), so
+      several app instances can hold the same window without double-sending
     """
-    # Remove any existing job to avoid duplicates (fast operation)
-    try:
-        job = scheduler.get_job(TASK_RUNNER_JOB_ID)
-        if job:
-            scheduler.remove_job(TASK_RUNNER_JOB_ID)
-    except Exception:
-        pass
-
-    next_task = await _fetch_next_task()
-    if not next_task:
-        # Shorter idle check for faster response (5 min instead of 10)
-        run_at = datetime.utcnow() + timedelta(minutes=5)
-        scheduler.add_job(
-            schedule_next_task,
-            trigger="date",
-            run_date=run_at,
-            id=TASK_RUNNER_JOB_ID,
-            replace_existing=True,
-        )
-        return
 
-    due_date = next_task.get("due_date")
-    if not isinstance(due_date, datetime):
-        # Skip invalid and move on
-        await tasks_collection.update_one(
-            {"_id": next_task["_id"]}, {"$set": {"status": "invalid"}}
+    WINDOW = timedelta(minutes=10)
+    NOTIFY_ADVANCE = timedelta(minutes=3)      # Send email 3 minutes BEFORE due time
+    MAX_CONCURRENCY = 10
+    MAX_WINDOW_TASKS = 1000
+    STALE_CLAIM_AFTER = timedelta(minutes=5)
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._due: Dict[str, datetime] = {}       # task_id -> due_date currently armed
+        self._inflight: Set[str] = set()
+        self._fire_tasks: Set[asyncio.Task] = set()   # strong refs - the loop only keeps weak ones
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._next_refresh = datetime.min
+        self._instance_id = uuid.uuid4().hex[:12]
+        self.fired = 0
+        self.claims_lost = 0
+
+    # ---------- heap maintenance ----------
+
+    def _arm(self, task_id: str, due_date: datetime):
+        fire_at = due_date - self.NOTIFY_ADVANCE
+        self._due[task_id] = due_date
+        heapq.heappush(self._heap, (fire_at, next(self._seq), task_id))
+
+    def _in_window(self, due_date: datetime) -> bool:
+        return due_date - self.NOTIFY_ADVANCE <= datetime.utcnow() + self.WINDOW
+
+    async def refresh(self):
+        """Reload the rolling window with one indexed query"""
+        now = datetime.utcnow()
+        horizon = now + self.WINDOW + self.NOTIFY_ADVANCE
+
+        # Recover claims left behind by a crashed instance
+        await tasks_collection.update_many(
+            {"status": "sending", "claimed_at": {"$lt": now - self.STALE_CLAIM_AFTER}},
+            {"$set": {"status": "pending"}, "$unset": {"claimed_at": "", "claimed_by": ""}},
+        )
+        # Non-date due dates can never fire - park them once instead of per pass
+        await tasks_collection.update_many(
+            {"status": "pending", "due_date": {"$ne": None, "$not": {"$type": "date"}}},
+            {"$set": {"status": "invalid"}},
         )
-        await schedule_next_task()
-        return
 
-    # Send email 3 minutes BEFORE due time for better UX
-    now = datetime.utcnow()
-    time_until_due = (due_date - now).total_seconds()
-    notification_advance_time = 180  # 3 minutes = 180 seconds
-    
-    # Calculate when to send the email (3 min before due time)
-    time_until_notification = time_until_due - notification_advance_time
-    
-    if time_until_notification <= 0:  # Already time to notify or overdue
-        # Execute immediately - no delay
-        print(f"⚡ Sending notification NOW for task {next_task.get('_id')} (due in {time_until_due:.0f}s)")
-        
-        # Execute immediately in current event loop
-        import asyncio
-        asyncio.create_task(_run_and_reschedule(next_task["_id"]))
-    else:
-        # Schedule to wake up 3 minutes before due time
-        wake_time = due_date - timedelta(seconds=notification_advance_time)
-        print(f"📅 Scheduler armed: notify at {wake_time.strftime('%H:%M:%S')} (3 min before {due_date.strftime('%H:%M:%S')})")
-        
-        scheduler.add_job(
-            _run_and_reschedule,
-            trigger="date",
-            run_date=wake_time,
-            id=TASK_RUNNER_JOB_ID,
-            replace_existing=True,
-            args=[next_task["_id"]],
+        cursor = tasks_collection.find(
+            {"status": "pending", "due_date": {"$lte": horizon}},
+            {"_id": 1, "due_date": 1},
+        ).sort("due_date", 1).limit(self.MAX_WINDOW_TASKS)
+
+        self._heap.clear()
+        self._due.clear()
+        async for task in cursor:
+            self._arm(str(task["_id"]), task["due_date"])
+
+        self._next_refresh = now + self.WINDOW / 2
+        print(f"📅 Reminder window loaded: {len(self._due)} task(s) due before {horizon.strftime('%H:%M:%S')}")
+
+    def notify_task_changed(self, task_id: str, due_date: Optional[datetime] = None, status: str = "pending"):
+        """
+        Incremental update after create/reschedule/cancel.
+        Stale heap entries are skipped lazily when popped.
+        """
+        task_id = str(task_id)
+        if status != "pending" or not isinstance(due_date, datetime):
+            self._due.pop(task_id, None)
+            return
+        if due_date.tzinfo is not None:
+            due_date = due_date.astimezone(timezone.utc).replace(tzinfo=None)
+        if not self._in_window(due_date):
+            self._due.pop(task_id, None)
+            return
+        self._arm(task_id, due_date)
+        if self._wake:
+            self._wake.set()
+
+    def _pop_due(self, now: datetime) -> List[Tuple[str, datetime]]:
+        batch = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, task_id = heapq.heappop(self._heap)
+            due_date = self._due.get(task_id)
+            # Skip entries superseded by a reschedule/cancel
+            if due_date is None or due_date - self.NOTIFY_ADVANCE != fire_at or task_id in self._inflight:
+                continue
+            del self._due[task_id]
+            batch.append((task_id, due_date))
+        return batch
+
+    # ---------- firing ----------
+
+    async def _claim(self, task_id: str) -> Optional[dict]:
+        """
+        Atomic pending -> sending transition; None if another instance won.
+
+        Matches on a due_date range rather than the armed value: Mongo stores
+        milliseconds while the heap may hold microseconds, and a reschedule
+        to a later time must not be claimed by the stale heap entry.
+        """
+        send_before = datetime.utcnow() + self.NOTIFY_ADVANCE
+        return await tasks_collection.find_one_and_update(
+            {"_id": ObjectId(task_id), "status": "pending", "due_date": {"$lte": send_before}},
+            {"$set": {
+                "status": "sending",
+                "claimed_at": datetime.utcnow(),
+                "claimed_by": self._instance_id,
+            }},
+            return_document=ReturnDocument.AFTER,
         )
 
+    async def _fire(self, task_id: str, due_date: datetime):
+        async with self._semaphore:
+            self._inflight.add(task_id)
+            try:
+                task = await self._claim(task_id)
+                if task is None:
+                    self.claims_lost += 1
+                    return
+                next_due = await _execute_task(task)
+                self.fired += 1
+                if next_due:
+                    self.notify_task_changed(task_id, next_due)
+            except Exception as e:
+                print(f"❌ Reminder firing failed for task {task_id}: {e}")
+            finally:
+                self._inflight.discard(task_id)
+
+    def _spawn_fire(self, task_id: str, due_date: datetime):
+        task = asyncio.create_task(self._fire(task_id, due_date))
+        self._fire_tasks.add(task)
+        task.add_done_callback(self._fire_done)
+
+    def _fire_done(self, task: asyncio.Task):
+        self._fire_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Reminder firing task crashed: {task.exception()!r}")
+
+    async def _run(self):
+        while True:
+            try:
+                self._wake.clear()
+                now = datetime.utcnow()
+                if now >= self._next_refresh:
+                    await self.refresh()
+
+                batch = self._pop_due(now)
+                if batch:
+                    print(f"🔔 Firing {len(batch)} reminder(s)")
+                    for task_id, due_date in batch:
+                        self._spawn_fire(task_id, due_date)
+
+                next_wake = self._next_refresh
+                if self._heap:
+                    next_wake = min(next_wake, self._heap[0][0])
+                timeout = max(0.0, (next_wake - datetime.utcnow()).total_seconds())
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Reminder scheduler loop error: {e}")
+                self._next_refresh = datetime.utcnow() + timedelta(seconds=30)
+                await asyncio.sleep(5)
+
+    def start(self):
+        """Start the scheduler loop on the running event loop (idempotent)"""
+        if self._runner is None or self._runner.done():
+            self._wake = asyncio.Event()
+            self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENCY)
+            self._next_refresh = datetime.min
+            self._runner = asyncio.create_task(self._run())
+        else:
+            # Already running: force a window reload
+            self._next_refresh = datetime.min
+            self._wake.set()
+
+    async def stop(self):
+        if self._runner:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        for task in list(self._fire_tasks):
+            task.cancel()
+        if self._fire_tasks:
+            await asyncio.gather(*self._fire_tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "armed": len(self._due),
+            "inflight": len(self._inflight),
+            "fired": self.fired,
+            "claims_lost": self.claims_lost,
+            "running": bool(self._runner and not self._runner.done()),
+        }
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+def notify_task_changed(task_id, due_date: Optional[datetime] = None, status: str = "pending"):
+    """Hook for routers/services after a task is created, rescheduled or cancelled"""
+    try:
+        reminder_scheduler.notify_task_changed(task_id, due_date, status)
+    except Exception as e:
+        print(f"⚠️ Reminder scheduler notify failed for task {task_id}: {e}")
+
+
+async def schedule_next_task():
+    """
+    Start (or refresh) the reminder scheduler.
+    Kept under its historical name for the lifespan hook and older callers.
+    """
+    reminder_scheduler.start()
+
 
 def start_scheduler():
-    # Kick off task scheduler (sleep-based, no busy loop)
+    # Kick off reminder scheduler (heap-driven, no busy loop)
     scheduler.add_job(schedule_next_task, trigger="date", run_date=datetime.utcnow())
 
     # 🧠 Background auto-healing for pending memory → Neo4j
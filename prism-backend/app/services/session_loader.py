@@ -0,0 +1,262 @@
+"""
+📄 SESSION LOADER - Paginated Session Data with Projections and ETags
+======================================================================
+
+GET /chat/{chat_id}/data loads the whole session document, every highlight,
+every mini-agent thread and all of their messages, and rebuilds the maps in
+Python on every page load - cost grows with the conversation. Now:
+
+1. Pages: one aggregate over the session document returns the header fields,
+   the message count and a $slice of the messages (latest `limit` first,
+   older pages via the `before` cursor = absolute index of the oldest
+   message already loaded; the messages array is append-only, so a cursor
+   stays valid while new messages arrive).
+2. Projections: messages are $map-ped down to the fields the client renders,
+   highlights and mini-agent threads are fetched only for the message ids
+   on the page.
+3. Versions: every write that changes what a page shows calls
+   bump_session_version(chat_id), which stores a fresh token under
+   session:version:{chat_id}. The ETag is derived from that token (plus the
+   user and page), so an unchanged session answers 304 before any MongoDB
+   read. While Redis is on the per-process fallback the tokens are not
+   shared between instances, so no ETag is issued.
+"""
+
+import asyncio
+import hashlib
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+VERSION_KEY_TEMPLATE = "session:version:{chat_id}"
+VERSION_TTL_SECONDS = 30 * 86400
+RENDERED_MESSAGE_FIELDS = ("id", "message_id", "role", "content", "text", "timestamp", "action")
+
+
+def _iso(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# ============ VERSIONS / ETAGS ============
+
+async def session_version(chat_id: str) -> Optional[str]:
+    """Current version token of a session (created on first use), None when tokens are not shared"""
+    if redis_client.is_using_fallback():
+        return None
+    key = VERSION_KEY_TEMPLATE.format(chat_id=chat_id)
+    try:
+        version = await redis_client.get(key)
+        if version:
+            return version
+        fresh = uuid.uuid4().hex
+        if await redis_client.set(key, fresh, ex=VERSION_TTL_SECONDS, nx=True):
+            return fresh
+        return await redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"⚠️ Session version lookup failed for {chat_id}: {e}")
+        return None
+
+
+async def bump_session_version(chat_id: str):
+    """Mark a session as changed; call after any write the session page renders. Never raises."""
+    if not chat_id:
+        return
+    try:
+        await redis_client.set(
+            VERSION_KEY_TEMPLATE.format(chat_id=chat_id), uuid.uuid4().hex, ex=VERSION_TTL_SECONDS,
+        )
+    except Exception as e:
+        logger.warning(f"⚠️ Session version bump failed for {chat_id}: {e}")
+
+
+def make_etag(version: Optional[str], *parts: Any) -> Optional[str]:
+    """Weak ETag for one view (user, session, page) of one session version"""
+    if not version:
+        return None
+    digest = hashlib.sha1("|".join([version, *map(str, parts)]).encode()).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: Optional[str]) -> bool:
+    if not if_none_match or not etag:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+# ============ FORMATTERS (shared with the full loader) ============
+
+def format_highlight(h: dict) -> dict:
+    return {
+        "highlightId": h.get("highlightId"),
+        "messageId": h.get("messageId"),
+        "text": h.get("text"),
+        "color": h.get("color"),
+        "startOffset": h.get("startIndex"),
+        "endOffset": h.get("endIndex"),
+        "note": h.get("note"),
+        "createdAt": _iso(h.get("createdAt")),
+    }
+
+
+def group_mini_agent_messages(messages: List[dict]) -> Dict[str, List[dict]]:
+    by_thread: Dict[str, List[dict]] = {}
+    for msg in messages:
+        tid = msg.get("threadId")
+        thread_messages = by_thread.setdefault(tid, [])
+        thread_messages.append({
+            "id": msg.get("id", f"msg_{tid}_{len(thread_messages)}"),
+            "role": msg.get("role", msg.get("sender", "assistant")).replace("ai", "assistant"),
+            "content": msg.get("content", msg.get("text", "")) or "[Content unavailable]",
+            "timestamp": _iso(msg.get("createdAt")),
+        })
+    return by_thread
+
+
+def format_mini_agent(thread: dict, messages: List[dict]) -> dict:
+    return {
+        "agentId": thread.get("id"),
+        "messageId": thread.get("messageId"),
+        "selectedText": thread.get("selectedText"),
+        "messages": messages,
+        "hasConversation": len(messages) > 0,
+        "createdAt": _iso(thread.get("createdAt")),
+        "sessionId": thread.get("sessionId"),
+    }
+
+
+def embed_highlights(messages: List[dict], highlights: List[dict]):
+    """Attach each message's highlights in place (the client expects msg["highlights"])"""
+    by_message: Dict[str, List[dict]] = {}
+    for h in highlights:
+        if h.get("messageId"):
+            by_message.setdefault(h["messageId"], []).append(h)
+    for msg in messages:
+        msg["highlights"] = by_message.get(msg.get("id") or msg.get("message_id"), [])
+
+
+def session_header(chat_id: str, session: dict) -> dict:
+    return {
+        "id": chat_id,
+        "title": session.get("title", "New Chat"),
+        "updated_at": _iso(session.get("updated_at")),
+        "isPinned": session.get("isPinned", False),
+        "isSaved": session.get("isSaved", False),
+    }
+
+
+# ============ PAGED LOADER ============
+
+def page_pipeline(query: dict, before: Optional[int], limit: int) -> List[dict]:
+    """
+    One round trip: header fields, message count and the [start, end) slice
+    of messages projected to RENDERED_MESSAGE_FIELDS. $slice needs a positive
+    count, so an empty window fetches one element and is trimmed by the caller.
+    """
+    messages = {"$ifNull": ["$messages", []]}
+    size = {"$size": messages}
+    end = size if before is None else {"$min": [before, size]}
+    start = {"$max": [0, {"$subtract": [end, limit]}]}
+    return [
+        {"$match": query},
+        {"$limit": 1},
+        {"$project": {
+            "_id": 0,
+            "title": 1,
+            "isPinned": 1,
+            "isSaved": 1,
+            "updated_at": 1,
+            "total": size,
+            "start": start,
+            "end": end,
+            "messages": {"$map": {
+                "input": {"$slice": [messages, start, {"$max": [1, {"$subtract": [end, start]}]}]},
+                "as": "m",
+                "in": {
+                    **{field: f"$$m.{field}" for field in RENDERED_MESSAGE_FIELDS},
+                    "metadata": {"action_payload": "$$m.metadata.action_payload"},
+                },
+            }},
+        }},
+    ]
+
+
+class SessionLoader:
+    """
+    Usage:
+    ```python
+    from app.services.session_loader import session_loader
+    page = await session_loader.load_page(chat_id, user_id, before=None, limit=50)
+    ```
+    """
+
+    async def load_page(self, chat_id: str, user_id: Any, before: Optional[int], limit: int) -> Optional[dict]:
+        """One page of a session, or None when the session does not exist for this user"""
+        from app.db.mongo_client import db, sessions_collection
+        from app.db.session_schema import session_filter
+
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        docs = await sessions_collection.aggregate(
+            page_pipeline(session_filter(chat_id, user_id), before, limit)
+        ).to_list(length=1)
+        if not docs:
+            return None
+        session = docs[0]
+        start, end = session["start"], session["end"]
+        messages = session.get("messages", [])[:max(0, end - start)]
+        for msg in messages:
+            if not msg.get("metadata"):
+                msg.pop("metadata", None)
+
+        message_ids = [m.get("id") or m.get("message_id") for m in messages]
+        message_ids = [mid for mid in message_ids if mid]
+        highlights, threads = [], []
+        if message_ids:
+            highlights, threads = await asyncio.gather(
+                db.message_highlights.find(
+                    {"sessionId": chat_id, "messageId": {"$in": message_ids}},
+                    {"_id": 0, "highlightId": 1, "messageId": 1, "text": 1, "color": 1,
+                     "startIndex": 1, "endIndex": 1, "note": 1, "createdAt": 1},
+                ).to_list(length=None),
+                db.mini_agent_threads.find(
+                    {"sessionId": chat_id, "messageId": {"$in": message_ids}},
+                    {"_id": 0, "id": 1, "messageId": 1, "selectedText": 1, "createdAt": 1, "sessionId": 1},
+                ).to_list(length=None),
+            )
+
+        thread_ids = [t["id"] for t in threads if t.get("id")]
+        by_thread: Dict[str, List[dict]] = {}
+        if thread_ids:
+            by_thread = group_mini_agent_messages(await db.mini_agent_messages.find(
+                {"threadId": {"$in": thread_ids}},
+                {"_id": 0, "id": 1, "threadId": 1, "role": 1, "sender": 1, "content": 1, "text": 1, "createdAt": 1},
+            ).sort("createdAt", 1).to_list(length=None))
+
+        formatted_highlights = [format_highlight(h) for h in highlights]
+        embed_highlights(messages, formatted_highlights)
+        return {
+            "session": session_header(chat_id, session),
+            "messages": messages,
+            "highlights": formatted_highlights,
+            "miniAgents": [format_mini_agent(t, by_thread.get(t.get("id"), [])) for t in threads],
+            "page": {
+                "start": start,
+                "end": end,
+                "total": session["total"],
+                "limit": limit,
+                "hasMore": start > 0,
+                "before": start if start > 0 else None,
+            },
+        }
+
+
+# Global singleton
+session_loader = SessionLoader()
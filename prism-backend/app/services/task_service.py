@@ -6,6 +6,7 @@ from zoneinfo import ZoneInfo
 
 from dateutil import parser as date_parser
 from dateutil.tz import tzoffset
+from bson import ObjectId
 
 # IST Timezone (Asia/Kolkata) - All date/time calculations use this
 IST = ZoneInfo("Asia/Kolkata")
@@ -25,6 +26,7 @@ from app.utils.llm_client import get_llm_response
 from app.db.redis_client import redis_client
 from app.services.user_service import get_user_profile
 from app.services.email_queue_service import schedule_task_reminder, remove_scheduled_email
+from app.services.scheduler_service import notify_task_changed
 import json as _json
 
 
@@ -561,6 +563,7 @@ async def create_task(user_id: str, description: str, due_date_iso: str, user_em
 
     result = await tasks_collection.insert_one(task_doc)
     task_id_str = str(result.inserted_id)
+    notify_task_changed(task_id_str, task_doc["due_date"])
 
     # Schedule reminder in Redis (dual-lane producer). Best-effort; surface limit warning.
     try:
@@ -645,6 +648,7 @@ async def reschedule_task(task_id: str, new_due_date_iso: str, user_id: str) ->
     
     if result.matched_count == 0:
         raise ValueError("Task not found")
+    notify_task_changed(task_id, due_dt_utc.replace(tzinfo=None))
         
     # Reschedule in Redis/Celery
     await remove_scheduled_email(task_id) # Remove old schedule
@@ -671,6 +675,7 @@ async def cancel_task(task_id: str, user_id: str) -> dict:
     if result.matched_count == 0:
         raise ValueError("Task not found")
         
+    notify_task_changed(task_id, status="cancelled")
     await remove_scheduled_email(task_id)
     return {"message": "Task cancelled successfully"}
 
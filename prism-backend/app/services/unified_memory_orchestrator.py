@@ -35,6 +35,8 @@ from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 from enum import Enum
 
+from app.utils.tracing import traced
+
 logger = logging.getLogger(__name__)
 
 
@@ -112,12 +114,14 @@ class UnifiedMemoryOrchestrator:
         from app.db.redis_client import redis_client
         from app.db.mongo_client import MongoClient, memory_collection, users_collection, tasks_collection, users_global_collection
         from app.db.neo4j_client import Neo4jClient
+        from app.services.graph_snapshot import graph_snapshots
         from app.services.memory_manager import index as pinecone_index, get_embedding
         from app.services.user_resolution_service import get_user_resolution_service
         
         self.redis = redis_client
         self.mongo = MongoClient()
         self.neo4j = Neo4jClient()
+        self.graph_snapshots = graph_snapshots  # 🕸️ Redis-served knowledge graph
         self.pinecone = pinecone_index
         self.get_embedding = get_embedding
         self.memory_collection = memory_collection
@@ -183,6 +187,7 @@ class UnifiedMemoryOrchestrator:
     # HOLOGRAPHIC MEMORY RETRIEVAL (ULTRA-OPTIMIZED)
     # ==========================================
     
+    @traced("memory.holographic_context")
     async def get_holographic_context(
         self,
         user_id: str = None,              # Support positional for backwards compatibility
@@ -362,6 +367,7 @@ class UnifiedMemoryOrchestrator:
             reason="Skipped optimization"
         )
 
+    @traced("memory.fetch.global_stats")
     async def _fetch_global_stats(self, user_id: str) -> MemoryFetchResult:
         """Fetch global user statistics (conversation count, first interaction, etc.)"""
         start = datetime.now()
@@ -408,6 +414,7 @@ class UnifiedMemoryOrchestrator:
                 reason=f"Error: {str(e)}"
             )
 
+    @traced("memory.fetch.redis")
     async def _fetch_from_redis(self, user_id: str, query: str) -> MemoryFetchResult:
         """Fetch from Redis (session memory)"""
         start = datetime.now()
@@ -448,6 +455,7 @@ class UnifiedMemoryOrchestrator:
                 reason=f"Redis error: {str(e)}"
             )
     
+    @traced("memory.fetch.mongodb")
     async def _fetch_from_mongodb(
         self,
         user_id: str,
@@ -636,6 +644,7 @@ class UnifiedMemoryOrchestrator:
             )
 
             
+    @traced("memory.fetch.tasks")
     async def _fetch_from_tasks(self, user_id: str) -> MemoryFetchResult:
         """Fetch recent tasks from MongoDB"""
         start = datetime.now()
@@ -674,16 +683,22 @@ class UnifiedMemoryOrchestrator:
                 query_time_ms=query_time,
                 reason=f"Task fetch failed: {str(e)}"
             )
+    @traced("memory.fetch.neo4j")
     async def _fetch_from_neo4j(self, user_id: str, query: str) -> MemoryFetchResult:
         """
         Fetch from Neo4j (relationships + entities)
         🧠 STRONG FEATURE: Recursive Retrieval (Graph Reasoning)
+        
+        Served from the Redis graph snapshot (direct edges + 2-hop neighbours);
+        Neo4j is only queried when the snapshot is missing or expired.
         """
         start = datetime.now()
         
         try:
-            if not self.neo4j.is_available:
-                query_time = (datetime.now() - start).total_seconds() * 1000
+            snapshot = await self.graph_snapshots.get(user_id)
+            query_time = (datetime.now() - start).total_seconds() * 1000
+            
+            if snapshot is None:
                 return MemoryFetchResult(
                     found=False,
                     source=MemorySource.NEO4J,
@@ -692,69 +707,23 @@ class UnifiedMemoryOrchestrator:
                     reason="Neo4j not available"
                 )
             
-            # Query Neo4j for user's relationships AND related concepts (2-hop)
-            async with self.neo4j._driver.session() as session:
-                result = await session.run(
-                    """
-                    MATCH (u:User {id: $user_id})-[r1]->(n)
-                    OPTIONAL MATCH (n)-[r2]->(related)
-                    WHERE NOT (u)-->(related) AND related IS NOT NULL
-                    RETURN 
-                        type(r1) as direct_rel, 
-                        n.name as direct_target, 
-                        coalesce(n.value, "") as value,
-                        type(r2) as indirect_rel,
-                        related.name as indirect_target,
-                        labels(n) as direct_labels
-                    ORDER BY r1.created_at DESC
-                    LIMIT 15
-                    """,
-                    user_id=user_id
-                )
-                
-                records = await result.data()
-                query_time = (datetime.now() - start).total_seconds() * 1000
-                
-                if records:
-                    relationships = []
-                    seen_targets = set()
-                    
-                    for record in records:
-                        # Add direct relationship
-                        if record["direct_target"] not in seen_targets:
-                            relationships.append({
-                                "type": record["direct_rel"],
-                                "target": record["direct_target"],
-                                "value": record.get("value"),
-                                "depth": 1
-                            })
-                            seen_targets.add(record["direct_target"])
-                        
-                        # Add indirect relationship (Graph Reasoning)
-                        if record["indirect_target"] and record["indirect_target"] not in seen_targets:
-                            relationships.append({
-                                "type": "RELATED_VIA_" + record["direct_target"],
-                                "target": record["indirect_target"],
-                                "depth": 2,
-                                "reasoning": f"Because you like {record['direct_target']}"
-                            })
-                            seen_targets.add(record["indirect_target"])
-                    
-                    return MemoryFetchResult(
-                        found=True,
-                        source=MemorySource.NEO4J,
-                        data={"relationships": relationships},
-                        query_time_ms=query_time,
-                        reason=f"Found {len(relationships)} relationships (including inferred ones)"
-                    )
-                
+            relationships = snapshot.to_relationships(limit=15)
+            if relationships:
                 return MemoryFetchResult(
-                    found=False,
+                    found=True,
                     source=MemorySource.NEO4J,
-                    data=None,
+                    data={"relationships": relationships},
                     query_time_ms=query_time,
-                    reason="No relationships found in Neo4j"
+                    reason=f"Found {len(relationships)} relationships (including inferred ones)"
                 )
+            
+            return MemoryFetchResult(
+                found=False,
+                source=MemorySource.NEO4J,
+                data=None,
+                query_time_ms=query_time,
+                reason="No relationships found in Neo4j"
+            )
         except Exception as e:
             query_time = (datetime.now() - start).total_seconds() * 1000
             logger.warning(f"Neo4j fetch failed: {e}")
@@ -766,6 +735,7 @@ class UnifiedMemoryOrchestrator:
                 reason=f"Neo4j error: {str(e)}"
             )
     
+    @traced("memory.fetch.pinecone")
     async def _fetch_from_pinecone(self, user_id: str, query: str) -> MemoryFetchResult:
         """Fetch from Pinecone (semantic similarity)"""
         start = datetime.now()
@@ -842,29 +812,13 @@ class UnifiedMemoryOrchestrator:
     # MASTER PROMPT ENRICHMENT
     # ==========================================
     
-    def enrich_master_prompt(
-        self,
-        base_prompt: str,
-        context: Dict[str, Any],
-        debug_logs: List[str]
-    ) -> Tuple[str, List[str]]:
+    def _build_profile_head(self, context: Dict[str, Any]) -> str:
         """
-        🎯 ENRICH MASTER PROMPT WITH HOLOGRAPHIC CONTEXT
-        
-        Rules:
-        - Inject context from ALL sources
-        - Label clearly as [SYSTEM MEMORY CONTEXT]
-        - Prioritize: Profile > Location > Relationships > Memories > Session
-        - 🆕 NEVER ASK for data that's already available
+        Profile-derived part of the memory block (location, global stats,
+        profile, preferences). Depends only on context["profile"] and
+        context["global_stats"], so enrich_master_prompt memoizes it.
         """
-        debug_logs.append("[Master Prompt] Starting enrichment")
-        
-        if not any(context.values()):
-            debug_logs.append("[Master Prompt] No context to inject - using base prompt")
-            return base_prompt, debug_logs
-        
-        # Build memory context section
-        memory_block = "[SYSTEM MEMORY CONTEXT - USE THIS DATA, DON'T ASK FOR IT]\n"
+        memory_block = ""
         
         # 🌍 1. LOCATION FIRST (Most commonly needed, most commonly asked redundantly)
         if context.get("profile"):
@@ -943,6 +897,40 @@ class UnifiedMemoryOrchestrator:
             if profile.get("responseStyle"):
                 memory_block += f"  - Preferred Style: {profile['responseStyle']}\n"
             memory_block += "\n"
+        return memory_block
+    
+    def enrich_master_prompt(
+        self,
+        base_prompt: str,
+        context: Dict[str, Any],
+        debug_logs: List[str]
+    ) -> Tuple[str, List[str]]:
+        """
+        🎯 ENRICH MASTER PROMPT WITH HOLOGRAPHIC CONTEXT
+        
+        Rules:
+        - Inject context from ALL sources
+        - Label clearly as [SYSTEM MEMORY CONTEXT]
+        - Prioritize: Profile > Location > Relationships > Memories > Session
+        - 🆕 NEVER ASK for data that's already available
+        """
+        debug_logs.append("[Master Prompt] Starting enrichment")
+        from app.services.prompt_assembly import fingerprint, prompt_assembly
+        
+        if not any(context.values()):
+            debug_logs.append("[Master Prompt] No context to inject - using base prompt")
+            return base_prompt, debug_logs
+        
+        # Build memory context section
+        memory_block = "[SYSTEM MEMORY CONTEXT - USE THIS DATA, DON'T ASK FOR IT]\n"
+        
+        # 🌍 1-2. LOCATION / GLOBAL CONTEXT / PROFILE - memoized per profile version
+        if context.get("profile") or context.get("global_stats"):
+            head_key = "memhead:" + fingerprint({
+                "profile": context.get("profile"),
+                "global_stats": context.get("global_stats"),
+            })
+            memory_block += prompt_assembly.get_or_build(head_key, lambda: self._build_profile_head(context))
             
         # 3. Relationships (Neo4j)
         if context.get("relationships"):
@@ -1311,6 +1299,7 @@ class UnifiedMemoryOrchestrator:
                     timestamp=datetime.now().isoformat()
                 )
             
+            await self.graph_snapshots.record_edges(user_id, [(rel_type, str(target_value).lower(), "Entity")])
             debug_logs.append(f"[Neo4j Store] Created relationship: {rel_type} → {target_value}")
             
             return MemoryStorageResult(
@@ -1355,6 +1344,7 @@ class UnifiedMemoryOrchestrator:
                     target=target
                 )
             
+            await self.graph_snapshots.remove_edge(user_id, relationship_type, target)
             logger.info(f"🗑️ Deleted relationship: {relationship_type} -> {target}")
             return True
         except Exception as e:
@@ -1363,58 +1353,14 @@ class UnifiedMemoryOrchestrator:
 
     async def get_knowledge_graph(self, user_id: str) -> Dict[str, List[Any]]:
         """
-        Get the full knowledge graph for a user (formatted for frontend visualization)
+        Get the full knowledge graph for a user (formatted for frontend visualization).
+        Served from the Redis graph snapshot; Neo4j is only read to rebuild it.
         """
         try:
-            if not self.neo4j.is_available:
+            snapshot = await self.graph_snapshots.get(user_id)
+            if snapshot is None:
                 return {"nodes": [], "links": []}
-            
-            async with self.neo4j._driver.session() as session:
-                result = await session.run(
-                    """
-                    MATCH (u:User {id: $user_id})-[r]->(n)
-                    RETURN 
-                        u.id as source, 
-                        type(r) as label, 
-                        n.name as target, 
-                        labels(n) as target_labels,
-                        id(n) as target_id
-                    LIMIT 100
-                    """,
-                    user_id=user_id
-                )
-                
-                records = await result.data()
-                
-                nodes = []
-                links = []
-                seen_nodes = set()
-                
-                # Always add the user node
-                nodes.append({"id": user_id, "name": "Me", "group": "user", "val": 20})
-                seen_nodes.add(user_id)
-                
-                for record in records:
-                    target_name = record["target"]
-                    target_id = f"node_{target_name}" # Simple ID generation
-                    
-                    if target_id not in seen_nodes:
-                        nodes.append({
-                            "id": target_id,
-                            "name": target_name,
-                            "group": record["target_labels"][0] if record["target_labels"] else "Entity",
-                            "val": 10
-                        })
-                        seen_nodes.add(target_id)
-                    
-                    links.append({
-                        "source": user_id,
-                        "target": target_id,
-                        "label": record["label"]
-                    })
-                
-                return {"nodes": nodes, "links": links}
-                
+            return snapshot.to_visualization(limit=100)
         except Exception as e:
             logger.error(f"Failed to get knowledge graph: {e}")
             return {"nodes": [], "links": []}
@@ -0,0 +1,299 @@
+"""
+📊 USAGE COUNTERS - Atomic Redis Accounting with Periodic Mongo Flush
+=====================================================================
+
+Hot-path usage accounting (free requests and per-key requests) used to
+update MongoDB documents on every generation. Now:
+
+1. Each generation does ONE atomic HINCRBY on a per-user/day hash
+       usage:{user_id}:{YYYY-MM-DD}  ->  {"free": n, "key:<id>": n, ...}
+   plus one HINCRBY on a shared "pending deltas" hash.
+2. A background flusher atomically swaps the pending hash out (RENAME),
+   aggregates it, and writes everything to MongoDB with ONE bulk_write per
+   collection.
+3. /api-keys/usage and /dashboard read the day hash directly.
+
+If Redis loses a day hash (restart without persistence, eviction), it is
+re-seeded from MongoDB on the next access so limits stay correct: the
+"seeded" marker lives INSIDE the day hash, so it disappears with it.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+
+from bson import ObjectId
+
+from app.db.redis_client import redis_client
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+DAY_HASH_TEMPLATE = "usage:{user_id}:{day}"
+PENDING_KEY = "usage:pending"          # field "<user_id>|<day>|<field>" -> delta
+FLUSHING_KEY_PREFIX = "usage:flushing"
+DAY_TTL_SECONDS = 2 * 86400            # keep yesterday around for late flushes
+FLUSH_INTERVAL_SECONDS = 10
+SEED_RECHECK_SECONDS = 30             # how long a process trusts its "already seeded" memo
+FREE_FIELD = "free"
+SEED_FIELD = "_seeded"
+KEY_FIELD_PREFIX = "key:"
+
+
+def _today() -> str:
+    return date.today().isoformat()
+
+
+class UsageCounters:
+    """
+    Atomic per-user/day counters.
+
+    Usage:
+    ```python
+    from app.services.usage_counters import usage_counters
+    counted, total = await usage_counters.incr_free(user_id, limit=50)
+    free_used = await usage_counters.get_free_used(user_id)
+    ```
+    """
+
+    def __init__(self):
+        self._seeded: Dict[Tuple[str, str], float] = {}  # (user, day) -> monotonic time
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushes = 0
+        self.flushed_fields = 0
+
+    # ---------- seeding ----------
+
+    async def _ensure_seeded(self, user_id: str, day: str):
+        """
+        Make sure the day hash contains MongoDB's view of today's usage.
+
+        HSETNX on a marker field inside the day hash elects exactly one
+        seeder, and the marker vanishes whenever the hash does. Seeding uses
+        HINCRBY so increments that raced ahead are preserved. The local memo
+        only saves the HSETNX round-trip for SEED_RECHECK_SECONDS.
+        """
+        seeded_at = self._seeded.get((user_id, day))
+        if seeded_at is not None and time.monotonic() - seeded_at < SEED_RECHECK_SECONDS:
+            return
+
+        day_key = DAY_HASH_TEMPLATE.format(user_id=user_id, day=day)
+        if await redis_client.hsetnx(day_key, SEED_FIELD, "1"):
+            try:
+                await self._seed_from_mongo(user_id, day)
+            except Exception as e:
+                logger.warning(f"⚠️ Usage seed from Mongo failed for {user_id[:8]}...: {e}")
+                await redis_client.hdel(day_key, SEED_FIELD)
+                return
+
+        self._seeded[(user_id, day)] = time.monotonic()
+        if len(self._seeded) > 50_000:
+            # Bounded memory: forget other days' markers
+            self._seeded = {k: v for k, v in self._seeded.items() if k[1] == day}
+
+    async def _seed_from_mongo(self, user_id: str, day: str):
+        from app.db.mongo_client import db
+
+        day_key = DAY_HASH_TEMPLATE.format(user_id=user_id, day=day)
+        usage, keys = await asyncio.gather(
+            db.usage_tracking.find_one(
+                {"user_id": user_id}, {"free_requests_used": 1, "last_reset_date": 1}
+            ),
+            db.api_keys.find(
+                {"user_id": user_id, "last_request_date": day}, {"requests_today": 1}
+            ).to_list(100),
+        )
+
+        if usage and usage.get("last_reset_date") == day and usage.get("free_requests_used"):
+            await redis_client.hincrby(day_key, FREE_FIELD, int(usage["free_requests_used"]))
+        for key in keys:
+            if key.get("requests_today"):
+                await redis_client.hincrby(day_key, f"{KEY_FIELD_PREFIX}{key['_id']}", int(key["requests_today"]))
+        await redis_client.expire(day_key, DAY_TTL_SECONDS)
+
+    # ---------- writes (hot path) ----------
+
+    async def _incr(self, user_id: str, field: str, amount: int = 1, limit: Optional[int] = None) -> Tuple[bool, int]:
+        """
+        HINCRBY the day counter. With a limit, an increment that overshoots
+        is undone (HINCRBY -amount) and rejected, so concurrent callers can
+        never push the stored total past the cap.
+        """
+        day = _today()
+        await self._ensure_seeded(user_id, day)
+
+        day_key = DAY_HASH_TEMPLATE.format(user_id=user_id, day=day)
+        value = await redis_client.hincrby(day_key, field, amount)
+        if limit is not None and value > limit:
+            value = await redis_client.hincrby(day_key, field, -amount)
+            return False, value
+        if value == amount:
+            await redis_client.expire(day_key, DAY_TTL_SECONDS)
+        await redis_client.hincrby(PENDING_KEY, f"{user_id}|{day}|{field}", amount)
+        return True, value
+
+    async def incr_free(self, user_id: str, limit: Optional[int] = None) -> Tuple[bool, int]:
+        """
+        Count one platform-key (free) request.
+        Returns (counted, today's total); counted is False when at the limit.
+        """
+        return await self._incr(user_id, FREE_FIELD, limit=limit)
+
+    async def incr_key(self, user_id: str, key_id: str) -> int:
+        """Count one request on a user's own key; returns today's total for that key"""
+        return (await self._incr(user_id, f"{KEY_FIELD_PREFIX}{key_id}"))[1]
+
+    # ---------- reads ----------
+
+    async def get_day(self, user_id: str) -> Dict[str, int]:
+        """All of today's counters for user: {"free": n, "key:<id>": n}"""
+        day = _today()
+        await self._ensure_seeded(user_id, day)
+        raw = await redis_client.hgetall(DAY_HASH_TEMPLATE.format(user_id=user_id, day=day))
+        return {k: int(v) for k, v in (raw or {}).items() if k != SEED_FIELD}
+
+    async def get_free_used(self, user_id: str) -> int:
+        return (await self.get_day(user_id)).get(FREE_FIELD, 0)
+
+    @staticmethod
+    def key_requests(counters: Dict[str, int], key_id) -> int:
+        return counters.get(f"{KEY_FIELD_PREFIX}{key_id}", 0)
+
+    # ---------- flushing ----------
+
+    async def flush(self) -> int:
+        """
+        Move pending deltas to MongoDB in bulk. Returns number of fields flushed.
+
+        RENAME makes the hand-off atomic: increments arriving during the
+        flush land in a fresh pending hash.
+        """
+        if not await redis_client.exists(PENDING_KEY):
+            return 0
+
+        flushing_key = f"{FLUSHING_KEY_PREFIX}:{int(time.time() * 1000)}"
+        if not await redis_client.rename(PENDING_KEY, flushing_key):
+            return 0
+
+        pending = await redis_client.hgetall(flushing_key) or {}
+        try:
+            await self._write_bulk(pending)
+        except Exception as e:
+            # Put the deltas back so the next flush retries them
+            logger.error(f"❌ Usage flush failed, re-queueing {len(pending)} fields: {e}")
+            for field, delta in pending.items():
+                await redis_client.hincrby(PENDING_KEY, field, int(delta))
+            await redis_client.delete(flushing_key)
+            return 0
+
+        await redis_client.delete(flushing_key)
+        self.flushes += 1
+        self.flushed_fields += len(pending)
+        return len(pending)
+
+    async def _write_bulk(self, pending: Dict[str, str]):
+        from pymongo import UpdateOne
+        from pymongo.errors import BulkWriteError
+        from app.db.mongo_client import db
+
+        # Aggregate: (user, day) -> {field: delta}
+        grouped: Dict[Tuple[str, str], Dict[str, int]] = {}
+        for composite, delta in pending.items():
+            try:
+                user_id, day, field = composite.split("|", 2)
+            except ValueError:
+                continue
+            grouped.setdefault((user_id, day), {})[field] = int(delta)
+
+        now = datetime.utcnow()
+        usage_ops, key_ops = [], []
+        for (user_id, day), deltas in grouped.items():
+            # Absolute day values come from the day hash (idempotent on retry)
+            totals = await redis_client.hgetall(DAY_HASH_TEMPLATE.format(user_id=user_id, day=day)) or {}
+
+            if FREE_FIELD in deltas:
+                usage_ops.append(UpdateOne(
+                    # Never overwrite a newer day's counter with an older one
+                    {"user_id": user_id, "last_reset_date": {"$not": {"$gt": day}}},
+                    {
+                        "$set": {
+                            "free_requests_used": int(totals.get(FREE_FIELD, deltas[FREE_FIELD])),
+                            "last_reset_date": day,
+                            "last_used_at": now,
+                        },
+                        "$setOnInsert": {"created_at": now},
+                    },
+                    upsert=True,
+                ))
+
+            for field, delta in deltas.items():
+                if not field.startswith(KEY_FIELD_PREFIX):
+                    continue
+                try:
+                    key_oid = ObjectId(field[len(KEY_FIELD_PREFIX):])
+                except Exception:
+                    continue
+                key_ops.append(UpdateOne(
+                    {"_id": key_oid, "user_id": user_id, "last_request_date": {"$not": {"$gt": day}}},
+                    {
+                        "$set": {
+                            "requests_today": int(totals.get(field, delta)),
+                            "last_request_date": day,
+                            "last_used": now,
+                        },
+                        "$inc": {"total_requests": delta},
+                    },
+                ))
+
+        for collection, ops in ((db.usage_tracking, usage_ops), (db.api_keys, key_ops)):
+            if not ops:
+                continue
+            try:
+                await collection.bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # Duplicate-key upserts only happen for stale days - safe to drop
+                logger.warning(f"⚠️ Usage flush partial write on {collection.name}: {len(e.details.get('writeErrors', []))} errors")
+
+        logger.debug(f"📊 Usage flush: {len(usage_ops)} usage docs, {len(key_ops)} key docs")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL_SECONDS)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Usage flusher error: {e}")
+
+    def start(self):
+        """Start the background flusher (call from app lifespan)"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Stop the flusher and write out whatever is pending"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"⚠️ Final usage flush failed: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            "flushes": self.flushes,
+            "flushed_fields": self.flushed_fields,
+            "flusher_running": bool(self._flusher and not self._flusher.done()),
+        }
+
+
+# Global singleton
+usage_counters = UsageCounters()
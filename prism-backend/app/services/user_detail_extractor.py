@@ -13,6 +13,7 @@ Extracts:
 - And more...
 """
 
+import asyncio
 import json
 import logging
 from typing import Dict, Any, Optional, List
@@ -21,7 +22,7 @@ from bson import ObjectId
 
 from app.utils.llm_client import get_llm_response
 from app.db.mongo_client import users_collection, memory_collection
-from app.db.neo4j_client import graph_memory
+from app.db.neo4j_client import GraphUpsert, graph_write_batcher
 from app.services.vector_memory_service import get_vector_memory
 
 logger = logging.getLogger(__name__)
@@ -575,70 +576,66 @@ Remember: Your extraction enables personalized AI experiences. Be thorough and a
         data: Dict[str, Any],
         source_message: str
     ) -> bool:
-        """Save extracted details to Neo4j graph"""
+        """
+        Save extracted details to Neo4j graph.
+        
+        Everything is collected into one GraphUpsert (values sanitized on
+        the way in) and written as a single UNWIND statement in one managed
+        transaction. If that fails, items are retried one by one so a single
+        malformed detail only loses itself.
+        """
         try:
+            upsert = GraphUpsert()
+            
             # Personal info (comprehensive)
             if "personal_info" in data:
                 personal = data["personal_info"]
-                if personal.get("name"):
-                    await graph_memory.update_user_name(user_id, personal["name"])
-                if personal.get("location"):
-                    await graph_memory.add_user_property(user_id, "location", personal["location"])
-                if personal.get("occupation"):
-                    await graph_memory.add_user_property(user_id, "occupation", personal["occupation"])
-                if personal.get("age"):
-                    await graph_memory.add_user_property(user_id, "age", personal["age"])
-                if personal.get("education"):
-                    await graph_memory.add_user_property(user_id, "education", personal["education"])
+                for key in ("name", "location", "occupation", "age", "education"):
+                    if personal.get(key):
+                        upsert.set_property(key, personal[key])
             
-            # Interests
-            if "interests" in data:
-                for interest in data["interests"]:
-                    await graph_memory.add_interest_relationship(user_id, interest, "interest")
-            
-            # Hobbies
-            if "hobbies" in data:
-                for hobby in data["hobbies"]:
-                    await graph_memory.add_interest_relationship(user_id, hobby, "hobby")
-            
-            # Goals
-            if "goals" in data:
-                for goal in data["goals"]:
-                    await graph_memory.add_interest_relationship(user_id, goal, "goal")
-            
-            # Skills
-            if "skills" in data:
-                for skill in data["skills"]:
-                    await graph_memory.add_interest_relationship(user_id, skill, "skill")
+            # Interests, hobbies, goals, skills
+            for section, category in (("interests", "interest"), ("hobbies", "hobby"), ("goals", "goal"), ("skills", "skill")):
+                for item in data.get(section) or []:
+                    upsert.add_interest(item, category)
             
             # Preferences (likes)
             if "preferences" in data and data["preferences"].get("likes"):
                 for like in data["preferences"]["likes"]:
-                    await graph_memory.add_interest_relationship(user_id, like, "preference")
+                    upsert.add_interest(like, "preference")
             
             # Relationships
             if "relationships" in data:
                 rels = data["relationships"]
-                if rels.get("family"):
-                    for family_member in rels["family"]:
-                        await graph_memory.add_interest_relationship(user_id, family_member, "family")
-                if rels.get("pets"):
-                    for pet in rels["pets"]:
-                        await graph_memory.add_interest_relationship(user_id, pet, "pet")
+                for family_member in rels.get("family") or []:
+                    upsert.add_interest(family_member, "family")
+                for pet in rels.get("pets") or []:
+                    upsert.add_interest(pet, "pet")
             
             # Explicit Relationships (New Holographic Feature)
             if "explicit_relationships" in data:
                 for rel in data["explicit_relationships"]:
-                    try:
-                        rel_type = rel.get("type", "INTERESTED_IN")
-                        target = rel.get("target")
-                        if target:
-                            # Use the new dynamic relationship adder
-                            await graph_memory.add_dynamic_relationship(user_id, target, rel_type)
-                    except Exception as e:
-                        logger.warning(f"⚠️ Failed to save explicit relationship {rel}: {e}")
-            
-            logger.info(f"✅ Neo4j: Extracted details saved for user {user_id}")
+                    target = rel.get("target") if isinstance(rel, dict) else None
+                    if target:
+                        upsert.add_relationship(
+                            target, rel.get("type", "INTERESTED_IN"), source="holographic_extractor"
+                        )
+                    else:
+                        logger.warning(f"⚠️ Skipping explicit relationship without target: {rel}")
+            
+            if await graph_write_batcher.submit(user_id, upsert):
+                logger.info(f"✅ Neo4j: Extracted details saved for user {user_id} ({upsert.size()} items, 1 write)")
+                return True
+            
+            # Concurrent single-item submits coalesce again; the batcher then
+            # falls back to writing each submission on its own.
+            parts = upsert.split()
+            results = await asyncio.gather(*(graph_write_batcher.submit(user_id, part) for part in parts))
+            saved = sum(1 for ok in results if ok)
+            if not saved:
+                logger.warning(f"⚠️ Neo4j batch write failed for user {user_id}")
+                return False
+            logger.warning(f"⚠️ Neo4j: saved {saved}/{len(parts)} extracted details for user {user_id} (item-by-item retry)")
             return True
             
         except Exception as e:
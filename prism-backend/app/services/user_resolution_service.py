@@ -247,6 +247,8 @@ class UserResolutionService:
                 # Insert with duplicate protection
                 try:
                     result = await self.users_collection.insert_one(user_document)
+                    from app.services.analytics_rollups import analytics_rollups
+                    await analytics_rollups.record_signup()
                     logger.info(f"  ✅ User created successfully")
                     logger.info(f"  📝 MongoDB _id: {result.inserted_id}")
                     logger.info("=" * 80)
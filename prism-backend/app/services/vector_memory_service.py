@@ -9,6 +9,7 @@ For each user:
 🟢 Rule: Pinecone uses userId namespace, so no mixing between users
 """
 
+import asyncio
 import os
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
@@ -17,6 +18,7 @@ from fastembed import TextEmbedding
 from pinecone import Pinecone, ServerlessSpec
 from app.config import settings
 from app.models.perfect_models import PineconeMetadata
+from app.utils.resilience import get_backend
 import logging
 
 logger = logging.getLogger(__name__)
@@ -252,12 +254,17 @@ class VectorMemoryService:
                 filter_dict["type"] = {"$eq": memory_type}
             
             # Search in user's namespace only
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                namespace=user_id,  # 🟢 CRITICAL: Search only user's data
-                filter=filter_dict if filter_dict else None
+            # 🛡️ Off the event loop, behind the shared "pinecone" breaker, hedged
+            results = await get_backend("pinecone").call(
+                lambda: asyncio.to_thread(
+                    self.index.query,
+                    vector=query_embedding,
+                    top_k=top_k,
+                    include_metadata=True,
+                    namespace=user_id,  # 🟢 CRITICAL: Search only user's data
+                    filter=filter_dict if filter_dict else None
+                ),
+                hedge=True,
             )
             
             # Format results with score filtering
@@ -458,12 +465,16 @@ class VectorMemoryService:
                 filter_dict["type"] = {"$in": memory_types}
             
             # Search with higher top_k for better coverage
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True,
-                namespace=user_id,
-                filter=filter_dict if filter_dict else None
+            results = await get_backend("pinecone").call(
+                lambda: asyncio.to_thread(
+                    self.index.query,
+                    vector=query_embedding,
+                    top_k=top_k,
+                    include_metadata=True,
+                    namespace=user_id,
+                    filter=filter_dict if filter_dict else None
+                ),
+                hedge=True,
             )
             
             # 🚀 PRO: Process with flexible threshold
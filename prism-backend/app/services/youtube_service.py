@@ -8,23 +8,81 @@ Handles YouTube Data API v3 integration with:
 - Auto-switch to redirect mode if quota exceeded
 - Query normalization for better cache hits
 - User media library integration
+- Single-flight per normalized query: concurrent requests for the same
+  trending song share one waterfall instead of each burning quota
+- Negative caching (short TTL) so unfindable queries don't re-run the
+  API + scraper on every request
+- Local LRU tier in front of Redis for the hottest queries
+- Quota-aware admission: API calls are metered against a shared daily
+  budget in Redis and routed to the scraper while a reserve remains,
+  instead of waiting for the 403
 
-Performance: <5ms (MongoDB hit), <50ms (Redis hit), <500ms (API call)
+Performance: <1ms (local hit), <5ms (MongoDB hit), <50ms (Redis hit), <500ms (API call)
 Cost: 100 units per search (free tier = 10,000 units/day = 100 searches/day)
 """
 
 import os
+import asyncio
 import logging
 import hashlib
 import json
 import re
-from typing import Optional, Dict, Any
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timezone, timedelta
 from app.models.media_models import YouTubeCacheEntry
 from app.db.redis_client import redis_client
 
 logger = logging.getLogger(__name__)
 
+try:
+    from zoneinfo import ZoneInfo
+    _QUOTA_TZ = ZoneInfo("America/Los_Angeles")  # YouTube quota resets at midnight Pacific
+except Exception:
+    _QUOTA_TZ = timezone(timedelta(hours=-8))
+
+# ============ CONSTANTS ============
+LOCAL_CACHE_SIZE = 512
+LOCAL_CACHE_TTL_SECONDS = 600
+NEGATIVE_CACHE_TTL_SECONDS = 300
+SEARCH_COST_UNITS = 100
+QUOTA_KEY_TEMPLATE = "youtube:quota:{day}"
+QUOTA_KEY_TTL_SECONDS = 2 * 86400
+NEGATIVE_RESULT = ""  # cached "no video for this query"
+
+
+def _quota_day() -> str:
+    return datetime.now(_QUOTA_TZ).strftime("%Y-%m-%d")
+
+
+class _LocalLRU:
+    """Small per-process LRU with per-entry TTL (value None = negative entry)"""
+
+    def __init__(self, maxsize: int = LOCAL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Optional[str]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def put(self, key: str, value: Optional[str], ttl: float):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
 
 class YouTubeService:
     """
@@ -33,27 +91,48 @@ class YouTubeService:
     Cache Hierarchy:
     1. Redis (hot cache) - 48 hours TTL, fastest access
     2. MongoDB (persistent cache) - 30 days TTL, survives restarts
-    3. YouTube API - when cache misses
-    4. Scraper - fallback when API fails
+    3. YouTube API - when cache misses and the daily quota has headroom
+    4. Scraper - fallback when API fails or is rationed
+    
+    A process-local LRU sits in front of all of them, and concurrent
+    lookups for the same normalized query share one waterfall.
     """
     
     def __init__(self):
         self.api_key = os.getenv("YOUTUBE_API_KEY", "")
         self.redis_cache_ttl = int(os.getenv("MEDIA_CACHE_TTL", "172800"))  # 48 hours
         self.mongo_cache_ttl_days = 30  # 30 days in MongoDB
+        self.negative_cache_ttl = int(os.getenv("MEDIA_NEGATIVE_CACHE_TTL", str(NEGATIVE_CACHE_TTL_SECONDS)))
         self.use_scraper_fallback = os.getenv("MEDIA_USE_SCRAPER_FALLBACK", "true").lower() == "true"
+        self.daily_quota_units = int(os.getenv("YOUTUBE_DAILY_QUOTA_UNITS", "10000"))
+        self.quota_reserve_units = int(os.getenv("YOUTUBE_QUOTA_RESERVE_UNITS", "500"))
         self.quota_exceeded = False  # Flag to track if quota is exhausted
+        self._quota_exceeded_day: Optional[str] = None
+        self._local = _LocalLRU()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "local_hits": 0,
+            "negative_hits": 0,
+            "coalesced": 0,
+            "lookups": 0,
+            "api_admitted": 0,
+            "api_rationed": 0,
+        }
     
     async def get_video_id(self, search_query: str, user_id: Optional[str] = None) -> Optional[str]:
         """
         Get YouTube video ID for a search query.
         
         Strategy (Waterfall):
+        0. Local LRU (positive or negative entry)
         1. Check Redis cache (hot, fast)
         2. Check MongoDB cache (persistent, medium)
-        3. Try YouTube API (if not quota exceeded)
+        3. Try YouTube API (if admitted by the daily quota budget)
         4. Fall back to scraper
-        5. Return None (will use redirect mode)
+        5. Return None (will use redirect mode) and cache the miss briefly
+        
+        Steps 1-5 run at most once at a time per normalized query; other
+        callers await the same result.
         
         Args:
             search_query: Normalized search query
@@ -62,11 +141,39 @@ class YouTubeService:
         Returns:
             Video ID or None
         """
+        key = self.normalize_query(search_query)
+        hit, video_id = self._local.get(key)
+        if hit:
+            self.stats["local_hits"] += 1
+            return video_id
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._lookup(search_query, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, k=key: self._inflight.pop(k, None) if self._inflight.get(k) is done else None)
+        else:
+            self.stats["coalesced"] += 1
+        # shield: a cancelled caller must not cancel the lookup others are awaiting
+        return await asyncio.shield(task)
+    
+    def _remember(self, key: str, video_id: Optional[str]):
+        ttl = LOCAL_CACHE_TTL_SECONDS if video_id else min(LOCAL_CACHE_TTL_SECONDS, self.negative_cache_ttl)
+        self._local.put(key, video_id, ttl)
+    
+    async def _lookup(self, search_query: str, key: str) -> Optional[str]:
+        """The Redis -> Mongo -> API -> scraper waterfall (single-flight body)"""
+        self.stats["lookups"] += 1
         try:
             # Step 1: Check Redis cache (hot cache)
             cached_id = await self._fetch_from_redis_cache(search_query)
+            if cached_id == NEGATIVE_RESULT:
+                self.stats["negative_hits"] += 1
+                self._remember(key, None)
+                return None
             if cached_id:
                 logger.info(f"✅ Redis Cache HIT for query: '{search_query[:30]}...'")
+                self._remember(key, cached_id)
                 return cached_id
             
             # Step 2: Check MongoDB cache (persistent cache)
@@ -77,23 +184,22 @@ class YouTubeService:
                     logger.info(f"✅ MongoDB Cache HIT for query: '{search_query[:30]}...'")
                     # Warm up Redis cache for next time
                     await self._cache_to_redis(search_query, video_id)
+                    self._remember(key, video_id)
                     return video_id
             
             logger.info(f"❌ Cache MISS for query: '{search_query[:30]}...'")
             
-            # Step 3: Try API (if we have a key and quota not exceeded)
-            if self.api_key and not self.quota_exceeded:
+            # Step 3: Try API (if we have a key and the quota budget admits it)
+            if not self.api_key:
+                logger.warning("⚠️ YouTube API Key (YOUTUBE_API_KEY) is missing. Skipping API.")
+            elif await self._admit_api_call():
                 video_data = await self._fetch_from_api_with_metadata(search_query)
                 if video_data and video_data.get("video_id"):
                     video_id = video_data["video_id"]
                     # Cache the result in both Redis and MongoDB
                     await self._cache_video_data(search_query, video_data)
+                    self._remember(key, video_id)
                     return video_id
-            else:
-                if not self.api_key:
-                    logger.warning("⚠️ YouTube API Key (YOUTUBE_API_KEY) is missing. Skipping API.")
-                elif self.quota_exceeded:
-                    logger.warning("⚠️ YouTube API quota exceeded. Skipping API.")
             
             # Step 4: Try scraper fallback
             if self.use_scraper_fallback:
@@ -105,10 +211,13 @@ class YouTubeService:
                         "title": search_query.title(),
                         "source": "scraper"
                     })
+                    self._remember(key, video_id)
                     return video_id
             
-            # Step 5: No video ID found
+            # Step 5: No video ID found - remember the miss for a short while
             logger.warning(f"⚠️ Could not find video ID for: '{search_query}'")
+            await self._cache_negative(search_query)
+            self._remember(key, None)
             return None
             
         except Exception as e:
@@ -124,6 +233,8 @@ class YouTubeService:
                 try:
                     if data.startswith("{"):
                         entry = json.loads(data)
+                        if entry.get("negative"):
+                            return NEGATIVE_RESULT
                         return entry.get("video_id")
                     else:
                         return data  # Plain string
@@ -173,6 +284,67 @@ class YouTubeService:
         except Exception as e:
             logger.error(f"❌ Redis cache write error: {e}")
     
+    async def _cache_negative(self, query: str):
+        """Cache a failed lookup in Redis with a short TTL."""
+        try:
+            cache_entry = {
+                "negative": True,
+                "query": query,
+                "cached_at": datetime.now(timezone.utc).isoformat()
+            }
+            await redis_client.setex(self._get_cache_key(query), self.negative_cache_ttl, json.dumps(cache_entry))
+        except Exception as e:
+            logger.error(f"❌ Redis negative cache write error: {e}")
+    
+    async def _admit_api_call(self) -> bool:
+        """
+        Reserve SEARCH_COST_UNITS from today's shared quota budget.
+        
+        Refuses (-> scraper) once usage would cut into the reserve, so the
+        API is rationed before YouTube starts answering 403. The counter
+        lives in Redis so every instance draws from the same budget, and
+        its key is per Pacific day, matching YouTube's reset.
+        """
+        day = _quota_day()
+        if self.quota_exceeded:
+            if self._quota_exceeded_day == day:
+                self.stats["api_rationed"] += 1
+                return False
+            self.quota_exceeded = False  # New quota day
+        
+        limit = self.daily_quota_units - self.quota_reserve_units
+        key = QUOTA_KEY_TEMPLATE.format(day=day)
+        try:
+            used = await redis_client.hincrby(key, "units", SEARCH_COST_UNITS)
+            if used == SEARCH_COST_UNITS:
+                await redis_client.expire(key, QUOTA_KEY_TTL_SECONDS)
+            if used > limit:
+                await redis_client.hincrby(key, "units", -SEARCH_COST_UNITS)
+                logger.warning(f"⚠️ YouTube quota budget reached ({used - SEARCH_COST_UNITS}/{self.daily_quota_units} units). Skipping API.")
+                self.stats["api_rationed"] += 1
+                return False
+        except Exception as e:
+            logger.debug(f"YouTube quota counter unavailable, admitting API call: {e}")
+        self.stats["api_admitted"] += 1
+        return True
+    
+    async def _mark_quota_exhausted(self):
+        """YouTube said 403: stop API calls here and on other instances until the Pacific day ends."""
+        self.quota_exceeded = True
+        self._quota_exceeded_day = _quota_day()
+        try:
+            await redis_client.hset(QUOTA_KEY_TEMPLATE.format(day=self._quota_exceeded_day), mapping={"units": str(self.daily_quota_units)})
+        except Exception as e:
+            logger.debug(f"YouTube quota counter update skipped: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "local_entries": len(self._local),
+            "inflight": len(self._inflight),
+            "quota_exceeded": self.quota_exceeded,
+        }
+    
     async def _cache_video_data(self, query: str, video_data: Dict[str, Any]):
         """Cache video data to both Redis and MongoDB."""
         video_id = video_data.get("video_id")
@@ -242,7 +414,7 @@ class YouTubeService:
                 
                 if response.status_code == 403:
                     logger.error("🚫 YouTube API quota exceeded - switching to redirect mode")
-                    self.quota_exceeded = True
+                    await self._mark_quota_exhausted()
                     return None
                 
                 response.raise_for_status()
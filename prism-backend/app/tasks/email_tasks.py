@@ -7,13 +7,16 @@ Handles scheduled email sending with automatic retries and IST timezone support.
 - Production-ready error handling and retry logic
 - Timezone-aware scheduling (IST → UTC conversion)
 """
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
 import asyncio
+import time
+import uuid
 from typing import Dict, Any, List
 import logging
 
 from app.services.email_service import send_professional_email
+from app.services.mail_transport import MailMessageError, mail_transport
 from app.config import settings
 from bson import ObjectId
 
@@ -273,15 +276,7 @@ def _sync_send_otp_email(to_email: str, otp_code: str, subject: str = None) -> b
     """
     try:
         from app.services.email_service import send_otp_email_direct
-        # Run async function in sync context
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(send_otp_email_direct(to_email, otp_code, subject))
-            return result
-        finally:
-            loop.close()
+        return mail_transport.run_sync(send_otp_email_direct(to_email, otp_code, subject))
     except Exception as e:
         logger.error(f"Sync OTP email failed: {e}")
         return False
@@ -292,15 +287,7 @@ def _sync_send_email_notification(message: str) -> str:
     """
     try:
         from app.services.email_service import send_email_notification
-        # Run async function in sync context
-        import asyncio
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            result = loop.run_until_complete(send_email_notification(message))
-            return result
-        finally:
-            loop.close()
+        return mail_transport.run_sync(send_email_notification(message))
     except Exception as e:
         logger.error(f"Sync email notification failed: {e}")
         return f"❌ Failed to send email: {str(e)}"
@@ -308,15 +295,160 @@ def _sync_send_email_notification(message: str) -> str:
 def _sync_email_send(task_data: Dict[str, Any]) -> bool:
     """
     Synchronous wrapper for async email sending.
-    Celery tasks must be synchronous, so we use asyncio.run().
+    Celery tasks must be synchronous; the shared mail transport runs the send
+    on a fresh loop and closes its pooled clients afterwards.
     """
     try:
-        return asyncio.run(send_professional_email(task_data, retry_count=0, max_retries=3))
+        return mail_transport.run_sync(send_professional_email(task_data, retry_count=0, max_retries=3))
     except Exception as e:
         print(f"❌ Sync email wrapper error: {e}")
         raise
 
 
+# =============================================================================
+# 📦 BATCHED REMINDER DELIVERY
+# =============================================================================
+# One periodic task claims every due reminder in a time slice, renders them
+# from the cached template, sends them through the shared pooled mail
+# transport (one event loop for the whole batch) and writes
+# all statuses back with a single bulk_write - instead of one Celery message,
+# one Mongo round-trip pair and one fresh HTTPS connection per reminder.
+
+REMINDER_CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def _claimable_email_filter(now: datetime) -> Dict[str, Any]:
+    """Reminders nobody has sent or is currently sending (stale claims expire)"""
+    return {
+        "$or": [
+            {"email_status": {"$nin": ["sent", "sending", "permanently_failed", "cancelled"]}},
+            {"email_status": "sending", "email_claimed_at": {"$lt": now - REMINDER_CLAIM_TIMEOUT}},
+        ]
+    }
+
+
+def _is_config_error(error: Exception) -> bool:
+    """Missing SENDER_EMAIL / API key etc. - affects every message, not this one"""
+    return isinstance(error, ValueError) and not isinstance(error, MailMessageError)
+
+
+async def _deliver_reminders(claimed: List[dict]) -> List[Any]:
+    """
+    Render and send every claimed reminder through the shared mail transport
+    (pooled connections, MAIL_POOL_SIZE in flight). Returns None or the
+    exception for each reminder, in order.
+    """
+    from app.services.email_service import render_reminder_email
+
+    # Keep the batch inside the transport's backpressure limit
+    in_flight = asyncio.Semaphore(mail_transport.pool_size)
+
+    async def deliver(task: dict):
+        subject, html = render_reminder_email(task)
+        async with in_flight:
+            await mail_transport.send(task.get("user_email") or task.get("email"), subject, html)
+
+    return await asyncio.gather(*(deliver(task) for task in claimed), return_exceptions=True)
+
+
+def _send_reminder_batch(limit: int = None, max_retries: int = 3) -> Dict[str, Any]:
+    """
+    Claim, send and record every due reminder in one pass (synchronous).
+
+    Claiming is an update_many that flips email_status to "sending" under a
+    unique batch id, so concurrent workers (and the per-task path) never
+    pick up the same reminder twice.
+
+    Only errors about a specific message (MailMessageError, e.g. no
+    recipient) fail a reminder permanently. A configuration gap (missing
+    sender or API key, common mid-deploy) releases the claims without
+    spending a retry.
+    """
+    from pymongo import UpdateOne
+    from pymongo.errors import BulkWriteError
+
+    tasks_collection = _get_tasks_collection_safe()
+    if tasks_collection is None:
+        return {"status": "error", "reason": "mongodb_unavailable"}
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    batch_id = uuid.uuid4().hex
+    limit = limit or settings.REMINDER_BATCH_SIZE
+
+    due_filter = {"status": "pending", "due_date": {"$lte": now}, **_claimable_email_filter(now)}
+    due_ids = [doc["_id"] for doc in tasks_collection.find(due_filter, {"_id": 1}).sort("due_date", 1).limit(limit)]
+    if not due_ids:
+        return {"status": "success", "claimed": 0, "sent": 0, "failed": 0}
+
+    tasks_collection.update_many(
+        {"_id": {"$in": due_ids}, **_claimable_email_filter(now)},
+        {"$set": {"email_status": "sending", "email_claimed_at": now, "email_batch_id": batch_id}},
+    )
+    claimed = list(tasks_collection.find({"email_batch_id": batch_id, "email_status": "sending"}))
+
+    outcomes = mail_transport.run_sync(_deliver_reminders(claimed))
+
+    ops = []
+    sent = failed = released = 0
+    finished_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    for task, error in zip(claimed, outcomes):
+        match = {"_id": task["_id"], "email_batch_id": batch_id}
+        if error is None:
+            ops.append(UpdateOne(match, {
+                "$set": {"email_status": "sent", "email_sent_at": finished_at, "updated_at": finished_at},
+                "$unset": {"email_batch_id": "", "email_claimed_at": ""},
+            }))
+            sent += 1
+        elif _is_config_error(error):
+            # Not this reminder's fault - hand it back for the next batch
+            ops.append(UpdateOne(match, {
+                "$set": {"email_status": "failed", "email_last_error": str(error)[:500], "updated_at": finished_at},
+                "$unset": {"email_batch_id": "", "email_claimed_at": ""},
+            }))
+            released += 1
+        else:
+            attempts = int(task.get("email_retry_count") or 0) + 1
+            permanent = attempts > max_retries or isinstance(error, MailMessageError)
+            ops.append(UpdateOne(match, {
+                "$set": {
+                    "email_status": "permanently_failed" if permanent else "failed",
+                    "email_last_error": str(error)[:500],
+                    "email_last_attempt": finished_at,
+                    "updated_at": finished_at,
+                },
+                "$inc": {"email_retry_count": 1},
+                "$unset": {"email_batch_id": "", "email_claimed_at": ""},
+            }))
+            failed += 1
+            logger.warning(f"⚠️ Batched reminder {task['_id']} failed: {error}")
+
+    if released:
+        logger.error(f"❌ Reminder batch {batch_id[:8]}: mail transport misconfigured, released {released} reminders")
+
+    if ops:
+        try:
+            tasks_collection.bulk_write(ops, ordered=False)
+        except BulkWriteError as e:
+            logger.error(f"❌ Reminder status write partially failed: {len(e.details.get('writeErrors', []))} errors")
+
+    elapsed = time.perf_counter() - started
+    result = {
+        "status": "success",
+        "claimed": len(claimed),
+        "sent": sent,
+        "failed": failed,
+        "released": released,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "emails_per_second": round(len(claimed) / elapsed, 2) if elapsed > 0 else 0.0,
+    }
+    logger.info(
+        f"📦 Reminder batch {batch_id[:8]}: {sent} sent, {failed} failed, {released} released "
+        f"in {result['elapsed_ms']}ms ({result['emails_per_second']}/s)"
+    )
+    return result
+
+
 # ☁️ Only register task if Celery is available
 if CELERY_AVAILABLE and celery_app:
     
@@ -393,6 +525,15 @@ if CELERY_AVAILABLE and celery_app:
                 logger.info(f"ℹ️ {error_msg}")
                 return {"status": "skipped", "reason": "email_already_sent", "error": error_msg}
             
+            # 2.6. Claim it (a reminder batch may be sending the same task)
+            claim = tasks_collection.update_one(
+                {"_id": obj_id, **_claimable_email_filter(datetime.now(timezone.utc).replace(tzinfo=None))},
+                {"$set": {"email_status": "sending", "email_claimed_at": datetime.now(timezone.utc).replace(tzinfo=None)}},
+            )
+            if claim.modified_count == 0:
+                logger.info(f"ℹ️ Task {task_id} is being sent by another worker - skipping")
+                return {"status": "skipped", "reason": "claimed_elsewhere"}
+            
             # 3. Validate required fields
             user_email = task.get("user_email") or task.get("email")
             if not user_email:
@@ -441,7 +582,8 @@ if CELERY_AVAILABLE and celery_app:
                         "email_status": "sent",
                         "email_sent_at": now_utc,
                         "updated_at": now_utc,
-                    }
+                    },
+                    "$unset": {"email_claimed_at": ""},
                 }
             )
             
@@ -639,6 +781,13 @@ if CELERY_AVAILABLE and celery_app:
                 logger.error("❌ Cannot recover tasks: MongoDB client not available")
                 return {"status": "error", "reason": "mongodb_unavailable"}
             
+            # 📦 Batch mode: overdue reminders go out in one pass instead of
+            # one Celery message each
+            if settings.REMINDER_BATCH_MODE:
+                result = _send_reminder_batch()
+                logger.info(f"✅ Task recovery (batch mode): {result}")
+                return result
+            
             now_utc = datetime.now(timezone.utc)
             
             # Find all pending tasks that are due (or overdue)
@@ -722,6 +871,27 @@ if CELERY_AVAILABLE and celery_app:
             logger.error(f"Traceback: {traceback.format_exc()}")
             return {"status": "error", "error": str(e)}
     
+    @celery_app.task(
+        bind=True,
+        name="prism_tasks.send_due_reminders_batch",
+        queue="email",
+        ignore_result=True,
+        time_limit=300,
+        acks_late=True,
+    )
+    def send_due_reminders_batch_task(self):
+        """
+        📦 PERIODIC: Deliver every due reminder in one batch.
+        Scheduled by Celery beat when REMINDER_BATCH_MODE is enabled.
+        """
+        if not settings.REMINDER_BATCH_MODE:
+            return {"status": "skipped", "reason": "batch_mode_disabled"}
+        try:
+            return _send_reminder_batch()
+        except Exception as e:
+            logger.error(f"❌ Reminder batch failed: {e}")
+            return {"status": "error", "error": str(e)}
+    
 else:
     # Dummy function if Celery not available
     def send_reminder_email_task(task_id: str):
@@ -738,3 +908,7 @@ else:
     def recover_pending_tasks_task():
         """Dummy function when Celery is not available"""
         return {"status": "error", "reason": "celery_not_available"}
+    
+    def send_due_reminders_batch_task():
+        """Dummy function when Celery is not available"""
+        return {"status": "error", "reason": "celery_not_available"}
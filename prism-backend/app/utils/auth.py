@@ -12,6 +12,7 @@ from passlib.context import CryptContext
 from app.config import settings
 from app.db.mongo_client import users_collection, auth_sessions_collection
 from app.models.user_models import User
+from app.utils.tracing import traced
 import logging
 import hashlib
 
@@ -327,6 +328,8 @@ async def create_session_for_user(
     try:
         await auth_sessions_collection.insert_one(session_doc)
         logger.info(f"✅ Created login session for user {user.get('email')} | sessionId={session_id}")
+        from app.services.analytics_rollups import analytics_rollups
+        await analytics_rollups.record_login(str(user_id) if user_id else None)
     except Exception as e:
         logger.error(f"❌ Failed to create login session: {e}")
         raise HTTPException(
@@ -364,6 +367,7 @@ async def get_session(session_id: str) -> Optional[dict]:
         return None
 
 
+@traced("auth.session")
 async def get_current_user_from_session(
     request: Request,
     session_cookie_id: Optional[str] = Cookie(default=None, alias=SESSION_COOKIE_NAME),
@@ -7,6 +7,10 @@ Prevents duplicate operations from:
 - Network issues causing retries
 
 Uses Redis for fast idempotency key storage (5 min TTL).
+
+Chat finalize uses a dedicated ledger (FinalizeLedger): a Redis SETNX claim
+backed by db.finalized_generations (unique generation_id), so a retry is
+one key lookup instead of a scan of the session's messages array.
 """
 
 import hashlib
@@ -138,6 +142,152 @@ class IdempotencyManager:
             logger.warning(f"⚠️ Idempotency invalidation failed: {e}")
 
 
+# ========== FINALIZED GENERATIONS ==========
+
+class FinalizeLedger:
+    """
+    Exactly-once guard for persisting a generation's messages.
+    
+    claim() returns one of:
+    - "claimed": caller must persist, then call mark_done() (or release())
+    - "done": already persisted - answer the retry without writing
+    - "in_progress": another finalize holds the claim right now
+    
+    Redis SETNX answers almost every retry in one round-trip. The Mongo
+    record (unique generation_id) is the durable arbiter: it survives Redis
+    eviction, and two callers that both won SETNX on different Redis
+    fallbacks still can't both insert it. A pending claim older than
+    CLAIM_TIMEOUT is taken over, so a crash mid-finalize doesn't wedge retries:
+    the Redis pending marker only lives that long, and a retry that finds it
+    still asks Mongo whether the claim went stale.
+    """
+    
+    KEY_PREFIX = "finalized"
+    TTL = 86400  # 24 hours - longer than any client retry
+    CLAIM_TIMEOUT = timedelta(seconds=30)
+    PENDING_TTL = int(CLAIM_TIMEOUT.total_seconds())
+    
+    PENDING = "pending"
+    DONE = "done"
+    
+    @classmethod
+    def _key(cls, generation_id: str) -> str:
+        return f"{cls.KEY_PREFIX}:{generation_id}"
+    
+    @staticmethod
+    def _collection():
+        from app.db.mongo_client import db
+        return db.finalized_generations
+    
+    @classmethod
+    async def claim(cls, generation_id: str, chat_id: str, user_id: str) -> str:
+        key = cls._key(generation_id)
+        redis_claimed = False
+        try:
+            if not await redis_client.set(key, cls.PENDING, ex=cls.PENDING_TTL, nx=True):
+                if await redis_client.get(key) == cls.DONE:
+                    return "done"
+                try:
+                    if await cls._take_over_stale(generation_id, datetime.utcnow()):
+                        return "claimed"
+                except Exception as e:
+                    logger.warning(f"⚠️ Finalize claim: stale check failed: {e}")
+                return "in_progress"
+            redis_claimed = True
+        except Exception as e:
+            logger.warning(f"⚠️ Finalize claim: Redis unavailable, using Mongo only: {e}")
+        
+        from pymongo.errors import DuplicateKeyError
+        
+        now = datetime.utcnow()
+        collection = cls._collection()
+        try:
+            await collection.insert_one({
+                "generation_id": generation_id,
+                "chat_id": chat_id,
+                "user_id": user_id,
+                "status": cls.PENDING,
+                "claimed_at": now,
+                "created_at": now,
+            })
+            return "claimed"
+        except DuplicateKeyError:
+            pass
+        except Exception as e:
+            if not redis_claimed:
+                raise
+            logger.warning(f"⚠️ Finalize claim: Mongo ledger unavailable, relying on Redis: {e}")
+            return "claimed"
+        
+        # Someone recorded this generation before us (Redis lost the key)
+        if await cls._take_over_stale(generation_id, now):
+            return "claimed"
+        
+        record = await collection.find_one({"generation_id": generation_id}, {"status": 1})
+        if record and record.get("status") == cls.DONE:
+            try:
+                await redis_client.set(key, cls.DONE, ex=cls.TTL)
+            except Exception:
+                pass
+            return "done"
+        return "in_progress"
+    
+    @classmethod
+    async def _take_over_stale(cls, generation_id: str, now: datetime) -> bool:
+        """Atomically move a pending claim older than CLAIM_TIMEOUT to us."""
+        taken_over = await cls._collection().find_one_and_update(
+            {"generation_id": generation_id, "status": cls.PENDING, "claimed_at": {"$lt": now - cls.CLAIM_TIMEOUT}},
+            {"$set": {"claimed_at": now}},
+        )
+        if not taken_over:
+            return False
+        logger.info(f"🔄 Finalize claim for {generation_id} taken over from a stale owner")
+        try:
+            await redis_client.set(cls._key(generation_id), cls.PENDING, ex=cls.PENDING_TTL)
+        except Exception:
+            pass
+        return True
+    
+    @classmethod
+    async def mark_done(cls, generation_id: str):
+        """Never raises: the messages are already written at this point."""
+        try:
+            await cls._collection().update_one(
+                {"generation_id": generation_id},
+                {"$set": {"status": cls.DONE, "finalized_at": datetime.utcnow()}},
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Finalize ledger Mongo update failed: {e}")
+        try:
+            await redis_client.set(cls._key(generation_id), cls.DONE, ex=cls.TTL)
+        except Exception as e:
+            logger.warning(f"⚠️ Finalize ledger Redis update failed: {e}")
+    
+    @classmethod
+    async def release(cls, generation_id: str):
+        """Drop a claim that persisted nothing, so a later retry can try again."""
+        try:
+            await cls._collection().delete_one({"generation_id": generation_id, "status": cls.PENDING})
+        except Exception as e:
+            logger.warning(f"⚠️ Finalize ledger release failed (claim will time out): {e}")
+        try:
+            await redis_client.delete(cls._key(generation_id))
+        except Exception:
+            pass
+    
+    @classmethod
+    async def revoke(cls, generation_id: str):
+        """Forget a generation marked done whose queued write never landed, so a retry can persist it."""
+        try:
+            await cls._collection().delete_one({"generation_id": generation_id})
+        except Exception as e:
+            logger.warning(f"⚠️ Finalize ledger revoke failed: {e}")
+        try:
+            await redis_client.delete(cls._key(generation_id))
+        except Exception:
+            pass
+
+
 # ========== CONVENIENCE FUNCTIONS ==========
 
 async def is_duplicate_task(
@@ -8,6 +8,10 @@ import asyncio  # 🚀 Required for event loop flush
 
 logger = logging.getLogger(__name__)
 
+# Safety net only - history is token-budgeted upstream by context_packer
+MAX_HISTORY_MESSAGES = 12
+MAX_HISTORY_MESSAGE_CHARS = 4000
+
 # Initialize the default Async Client (platform key)
 client = AsyncGroq(
     api_key=settings.GROQ_API_KEY,
@@ -98,7 +102,8 @@ async def get_llm_response_stream(
     image_url: str | None = None,
     model: str = "llama-3.3-70b-versatile", # Default to high-intelligence
     conversation_history: list | None = None,  # 🆕 Multi-turn conversation support
-    api_key: str | None = None  # 🔑 User's API key (None = use platform key)
+    api_key: str | None = None,  # 🔑 User's API key (None = use platform key)
+    intent: str = "general"  # 📏 Keys the output-length estimator
 ):
     """
     Streams response from Groq in real-time chunks.
@@ -111,7 +116,12 @@ async def get_llm_response_stream(
         model: Model to use
         conversation_history: Optional list of previous messages in format:
             [{"role": "user"|"assistant", "content": "..."}]
+        intent: Detected intent, used for output-length prediction and token budgeting
     """
+    from app.services.load_aware_router import record_model_outcome
+    model_name = model
+    first_token_ms = None
+    failure_recorded = False  # router feedback: one failure per request, however it fails
     try:
         if image_url:
             model_name = "llama-3.2-11b-vision-preview"
@@ -131,12 +141,11 @@ async def get_llm_response_stream(
             messages = [{"role": "system", "content": system_prompt}]
             
             # Add conversation history if provided (recent turns for context continuity)
-            # 🚀 ULTRA-FAST: Simplified history handling
+            # History is token-budgeted upstream (context_packer); this is only a safety net
             if conversation_history and len(conversation_history) > 0:
-                # Quick limit: max 4 messages, 500 chars each
-                for msg in conversation_history[-4:]:
+                for msg in conversation_history[-MAX_HISTORY_MESSAGES:]:
                     role = msg.get("role", "user").lower()
-                    content = msg.get("content", "")[:500]  # Hard truncate
+                    content = msg.get("content", "")[:MAX_HISTORY_MESSAGE_CHARS]
                     if role in ["user", "assistant"] and content:
                         messages.append({"role": role, "content": content})
             
@@ -208,21 +217,41 @@ async def get_llm_response_stream(
             token_count = 0
             async for chunk in stream:
                 if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    if first_token_ms is None:
+                        first_token_ms = (time.time() - gen_start_time) * 1000
                     yield chunk.choices[0].delta.content
                     token_count += 1
                     await asyncio.sleep(0)  # Yield to event loop
+            record_model_outcome(model_name, first_token_ms, success=True)
             
             # Record metrics for adaptive quality
             if ADAPTIVE_QUALITY_ENABLED:
                 latency_ms = (time.time() - gen_start_time) * 1000
-                record_generation_metrics(latency_ms, success=True)
+                record_generation_metrics(latency_ms, success=True, model=model_name, intent=intent, output_tokens=token_count)
         else:
             # 🚀 PLATFORM KEY - Use Groq Pool for load balancing across 5 keys
             from app.services.groq_pool import get_groq_pool
+            from app.services.model_router import SmartModelRouter
+            from app.services.output_estimator import estimate_tokens, output_estimator
             pool = await get_groq_pool()
             
+            # 📏 TOKEN BUDGET: prompt + predicted output must fit a key's TPM headroom;
+            # step down to a smaller model before a long answer would trip a 429
+            prompt_tokens = sum(
+                estimate_tokens(m["content"]) for m in messages if isinstance(m["content"], str)
+            ) + (estimate_tokens(prompt) if image_url else 0)  # vision turns carry the prompt in a parts list
+            if image_url:
+                predicted_tokens = output_estimator.predict(model_name, intent, dynamic_max_tokens)["tokens"]
+            else:
+                fitted = SmartModelRouter.fit_to_token_budget(
+                    model_name, intent, prompt_tokens, await pool.token_headroom(), dynamic_max_tokens
+                )
+                model_name, dynamic_max_tokens = fitted["name"], fitted["max_tokens"]
+                predicted_tokens = fitted["predicted_output_tokens"]
+            reserved_tokens = prompt_tokens + predicted_tokens
+            
             # Get best available key from pool
-            key_config, pool_client = await pool.get_best_key()
+            key_config, pool_client = await pool.get_best_key(estimated_tokens=reserved_tokens)
             
             if not key_config or not pool_client:
                 logger.error("❌ All Groq pool keys exhausted!")
@@ -233,9 +262,12 @@ async def get_llm_response_stream(
             
             logger.debug(f"[LLM] POOL Key #{key_config.index + 1} | Model: {model_name} | Quality: {quality_tier} | MaxTokens: {dynamic_max_tokens}")
             
+            token_count = 0
+            stream = None
             try:
                 # Increment usage BEFORE request (optimistic)
                 await pool.increment_usage(key_config.index)
+                token_minute = await pool.reserve_tokens(key_config.index, reserved_tokens)
                 
                 stream = await pool_client.chat.completions.create(
                     messages=messages,
@@ -247,17 +279,21 @@ async def get_llm_response_stream(
                     stream=True,
                 )
                 
-                token_count = 0
                 async for chunk in stream:
                     if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                        if first_token_ms is None:
+                            first_token_ms = (time.time() - gen_start_time) * 1000
                         yield chunk.choices[0].delta.content
                         token_count += 1
                         await asyncio.sleep(0)
                 
+                record_model_outcome(model_name, first_token_ms, success=True)
+                await pool.settle_tokens(key_config.index, token_minute, reserved_tokens, prompt_tokens + token_count)
+                
                 # Record successful generation
                 if ADAPTIVE_QUALITY_ENABLED:
                     latency_ms = (time.time() - gen_start_time) * 1000
-                    record_generation_metrics(latency_ms, success=True)
+                    record_generation_metrics(latency_ms, success=True, model=model_name, intent=intent, output_tokens=token_count)
                         
             except Exception as pool_error:
                 error_str = str(pool_error).lower()
@@ -266,30 +302,49 @@ async def get_llm_response_stream(
                 if "429" in error_str or "rate" in error_str or "limit" in error_str:
                     logger.warning(f"⚠️ Pool Key #{key_config.index + 1} rate limited, trying fallback...")
                     await pool.mark_unhealthy(key_config.index, duration_seconds=60)
+                    record_model_outcome(model_name, success=False)
+                    failure_recorded = True
+                    # A rejected request consumed nothing; one cut off mid-stream used its prompt + what streamed
+                    used_tokens = prompt_tokens + token_count if stream is not None else 0
+                    await pool.settle_tokens(key_config.index, token_minute, reserved_tokens, used_tokens)
                     
                     # Try next key
-                    next_key, next_client = await pool.get_best_key()
+                    next_key, next_client = await pool.get_best_key(estimated_tokens=reserved_tokens)
                     if next_key and next_client:
                         logger.info(f"[LLM] Failover to Pool Key #{next_key.index + 1}")
                         await pool.increment_usage(next_key.index)
+                        token_minute = await pool.reserve_tokens(next_key.index, reserved_tokens)
+                        failover_start = time.time()
+                        failover_tokens = 0
+                        stream = None
                         
-                        stream = await next_client.chat.completions.create(
-                            messages=messages,
-                            model=model_name,
-                            temperature=adaptive_temp,  # 🎚️ Adaptive
-                            max_tokens=dynamic_max_tokens,
-                            top_p=adaptive_top_p,  # 🎚️ Adaptive
-                            stop=None,
-                            stream=True,
-                        )
-                        
-                        async for chunk in stream:
-                            # Safe null checks for chunk.choices
-                            if chunk.choices and len(chunk.choices) > 0:
-                                delta = chunk.choices[0].delta
-                                if delta and delta.content:
-                                    yield delta.content
-                                    await asyncio.sleep(0)
+                        try:
+                            stream = await next_client.chat.completions.create(
+                                messages=messages,
+                                model=model_name,
+                                temperature=adaptive_temp,  # 🎚️ Adaptive
+                                max_tokens=dynamic_max_tokens,
+                                top_p=adaptive_top_p,  # 🎚️ Adaptive
+                                stop=None,
+                                stream=True,
+                            )
+                            
+                            async for chunk in stream:
+                                # Safe null checks for chunk.choices
+                                if chunk.choices and len(chunk.choices) > 0:
+                                    delta = chunk.choices[0].delta
+                                    if delta and delta.content:
+                                        if not failover_tokens:
+                                            first_token_ms = (time.time() - failover_start) * 1000
+                                        yield delta.content
+                                        failover_tokens += 1
+                                        await asyncio.sleep(0)
+                        except Exception:
+                            used_tokens = prompt_tokens + failover_tokens if stream is not None else 0
+                            await pool.settle_tokens(next_key.index, token_minute, reserved_tokens, used_tokens)
+                            raise
+                        record_model_outcome(model_name, first_token_ms, success=True)
+                        await pool.settle_tokens(next_key.index, token_minute, reserved_tokens, prompt_tokens + failover_tokens)
                     else:
                         yield "I'm currently experiencing high traffic. Please try again in a moment."
                 else:
@@ -297,6 +352,8 @@ async def get_llm_response_stream(
                 
     except Exception as e:
         logger.error(f"LLM Streaming Error: {e}")
+        if not failure_recorded:
+            record_model_outcome(model_name, success=False)
         yield "I'm having trouble processing right now."
 
 async def llm_health_check():
@@ -0,0 +1,347 @@
+"""
+🩺 Runtime Profiling Hooks (admin-only surface)
+
+psutil tells us the box is busy, not WHY. These hooks let an admin look
+inside a running process without redeploying:
+
+- CpuProfiler: on-demand sampling profiler. A worker thread snapshots the
+  event-loop thread's stack every few ms via sys._current_frames() and
+  aggregates collapsed stacks ("a;b;c 42"), ready for flamegraph.pl /
+  speedscope. Nothing is installed in the interpreter, so the loop pays
+  only the GIL hand-offs while a profile is running.
+- LoopMonitor: always-on lag probe (sleep drift of a tiny task) plus a
+  watchdog thread that logs the loop thread's stack when a callback blocks
+  the loop longer than LOOP_STALL_WARN_MS. asyncio's own slow-callback
+  logging (debug mode) can be toggled on demand as well.
+- task_counts(): live asyncio tasks grouped by coroutine name (leak hunting).
+- AllocationTracker: tracemalloc baseline + snapshot diffs, top N by size.
+
+Usage:
+```python
+from app.utils.profiling import cpu_profiler, loop_monitor, allocation_tracker, task_counts
+
+report = await cpu_profiler.profile(seconds=10)   # {"collapsed": "...", ...}
+loop_monitor.get_stats()
+```
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from typing import Deque, List, Optional
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# ============ CONSTANTS ============
+MAX_PROFILE_SECONDS = 60
+MIN_SAMPLE_INTERVAL_MS = 1
+MAX_STACK_DEPTH = 128
+LOOP_PROBE_INTERVAL_SECONDS = 0.1
+LOOP_LAG_WINDOW = 600            # ~1 minute of probes
+MAX_RECENT_STALLS = 20
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile or allocation capture is already in progress"""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, prefix: Optional[str] = None) -> str:
+    """Root-first `a;b;c` stack (flamegraph collapsed format)"""
+    labels: List[str] = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    if prefix:
+        labels.insert(0, prefix)
+    return ";".join(labels)
+
+
+# ==================================================
+# CPU: sampling profiler
+# ==================================================
+
+class CpuProfiler:
+    """One on-demand sampling session at a time per process"""
+
+    def __init__(self):
+        self._running = False
+        self.profiles_taken = 0
+
+    async def profile(self, seconds: float = 10.0, interval_ms: float = 5.0, all_threads: bool = False) -> dict:
+        """
+        Sample stacks for `seconds`. Must be awaited on the event loop: the
+        calling thread is the one profiled unless all_threads is set.
+        """
+        if self._running:
+            raise ProfilerBusy("A CPU profile is already running")
+        seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+        interval = max(float(interval_ms), MIN_SAMPLE_INTERVAL_MS) / 1000
+
+        self._running = True
+        try:
+            stacks, sweeps = await asyncio.to_thread(
+                self._sample, threading.get_ident(), seconds, interval, all_threads
+            )
+        finally:
+            self._running = False
+        self.profiles_taken += 1
+
+        ordered = stacks.most_common()
+        return {
+            "seconds": seconds,
+            "interval_ms": interval * 1000,
+            "sweeps": sweeps,
+            "samples": sum(stacks.values()),
+            "unique_stacks": len(stacks),
+            "collapsed": "\n".join(f"{stack} {count}" for stack, count in ordered),
+        }
+
+    @staticmethod
+    def _sample(target_thread: int, seconds: float, interval: float, all_threads: bool):
+        """Runs in a worker thread (never samples itself)"""
+        own_thread = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks: Counter = Counter()
+        sweeps = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread or (not all_threads and thread_id != target_thread):
+                    continue
+                prefix = names.get(thread_id, str(thread_id)) if all_threads else None
+                stacks[_collapse(frame, prefix)] += 1
+            sweeps += 1
+            time.sleep(interval)
+        return stacks, sweeps
+
+    def get_stats(self) -> dict:
+        return {"running": self._running, "profiles_taken": self.profiles_taken}
+
+
+# ==================================================
+# EVENT LOOP: lag probe + stall watchdog
+# ==================================================
+
+class LoopMonitor:
+    """
+    Lag = how late a 100ms sleep wakes up. The watchdog thread notices when
+    the probe stops ticking and captures what the loop thread is doing.
+    """
+
+    def __init__(self, stall_ms: Optional[float] = None):
+        self.stall_ms = stall_ms or settings.LOOP_STALL_WARN_MS
+        self._lags: Deque[float] = deque(maxlen=LOOP_LAG_WINDOW)
+        self._recent_stalls: Deque[dict] = deque(maxlen=MAX_RECENT_STALLS)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._probe: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_tick = time.monotonic()
+        self._stall_reported = False
+        self.max_lag_ms = 0.0
+        self.stalls = 0
+
+    def start(self):
+        """Start probe + watchdog (call from app lifespan)"""
+        if self._probe is not None and not self._probe.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._probe = self._loop.create_task(self._probe_loop())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stop.set()
+        if self._probe:
+            self._probe.cancel()
+            try:
+                await self._probe
+            except asyncio.CancelledError:
+                pass
+            self._probe = None
+
+    async def _probe_loop(self):
+        while True:
+            expected = time.monotonic() + LOOP_PROBE_INTERVAL_SECONDS
+            await asyncio.sleep(LOOP_PROBE_INTERVAL_SECONDS)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - expected) * 1000)
+            self._lags.append(lag_ms)
+            if lag_ms > self.max_lag_ms:
+                self.max_lag_ms = lag_ms
+            self._last_tick = now
+            self._stall_reported = False
+
+    def _watch(self):
+        """Watchdog thread: report each stall once, with the blocking stack"""
+        while not self._stop.wait(LOOP_PROBE_INTERVAL_SECONDS):
+            blocked_ms = (time.monotonic() - self._last_tick - LOOP_PROBE_INTERVAL_SECONDS) * 1000
+            if blocked_ms < self.stall_ms or self._stall_reported:
+                continue
+            self._stall_reported = True
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = _collapse(frame) if frame is not None else "<unavailable>"
+            self.stalls += 1
+            self._recent_stalls.append({
+                "at": time.time(),
+                "blocked_ms": round(blocked_ms, 1),
+                "stack": stack,
+            })
+            logger.warning(f"🐢 Event loop blocked for {blocked_ms:.0f}ms+ in: {stack.rsplit(';', 3)[-3:]}")
+
+    # ---------- asyncio debug-mode slow callback logging ----------
+
+    def set_slow_callback_logging(self, enabled: bool, threshold_ms: Optional[float] = None) -> dict:
+        """
+        Toggle asyncio debug mode, which logs every callback slower than
+        slow_callback_duration via the "asyncio" logger. Debug mode adds
+        per-task overhead - leave it on only while investigating.
+        """
+        loop = self._loop or asyncio.get_running_loop()
+        if threshold_ms is not None:
+            loop.slow_callback_duration = max(threshold_ms, 1) / 1000
+        loop.set_debug(enabled)
+        return {"debug": loop.get_debug(), "slow_callback_ms": loop.slow_callback_duration * 1000}
+
+    def get_stats(self) -> dict:
+        lags = sorted(self._lags)
+        count = len(lags)
+        loop = self._loop
+        return {
+            "running": bool(self._probe and not self._probe.done()),
+            "samples": count,
+            "lag_ms": {
+                "last": round(self._lags[-1], 2) if count else 0.0,
+                "avg": round(sum(lags) / count, 2) if count else 0.0,
+                "p50": round(lags[count // 2], 2) if count else 0.0,
+                "p99": round(lags[min(count - 1, int(count * 0.99))], 2) if count else 0.0,
+                "max_window": round(lags[-1], 2) if count else 0.0,
+                "max_ever": round(self.max_lag_ms, 2),
+            },
+            "stall_threshold_ms": self.stall_ms,
+            "stalls": self.stalls,
+            "recent_stalls": list(self._recent_stalls),
+            "asyncio_debug": loop.get_debug() if loop else False,
+        }
+
+
+# ==================================================
+# TASKS
+# ==================================================
+
+def task_counts(limit: int = 50) -> dict:
+    """Live asyncio tasks grouped by coroutine qualname (call on the loop)"""
+    counts: Counter = Counter()
+    for task in asyncio.all_tasks():
+        coro = task.get_coro()
+        counts[getattr(coro, "__qualname__", None) or type(coro).__name__] += 1
+    return {
+        "total": sum(counts.values()),
+        "by_coroutine": [{"name": name, "count": count} for name, count in counts.most_common(limit)],
+    }
+
+
+# ==================================================
+# MEMORY: tracemalloc diffs
+# ==================================================
+
+class AllocationTracker:
+    """tracemalloc baseline/diff; tracing costs memory + CPU, so it's opt-in"""
+
+    _FILTERS = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._busy = False
+        self.started_at: Optional[float] = None
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(self._FILTERS)
+
+    async def start(self, frames: int = TRACEMALLOC_FRAMES) -> dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        self._baseline = await asyncio.to_thread(self._snapshot)
+        self.started_at = time.time()
+        return self.get_stats()
+
+    async def diff(self, limit: int = 25, key_type: str = "lineno", rebase: bool = False) -> dict:
+        """Top allocation growth since the baseline (started on first call)"""
+        if self._busy:
+            raise ProfilerBusy("An allocation snapshot is already being taken")
+        if not tracemalloc.is_tracing() or self._baseline is None:
+            await self.start()
+
+        self._busy = True
+        try:
+            snapshot = await asyncio.to_thread(self._snapshot)
+            stats = await asyncio.to_thread(snapshot.compare_to, self._baseline, key_type)
+        finally:
+            self._busy = False
+        if rebase:
+            self._baseline = snapshot
+
+        top = []
+        for stat in stats[:limit]:
+            top.append({
+                "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+                "size_kb": round(stat.size / 1024, 1),
+                "size_diff_kb": round(stat.size_diff / 1024, 1),
+                "count": stat.count,
+                "count_diff": stat.count_diff,
+            })
+        return {**self.get_stats(), "key_type": key_type, "top": top}
+
+    def stop(self) -> dict:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self._baseline = None
+        self.started_at = None
+        return self.get_stats()
+
+    def get_stats(self) -> dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": tracing,
+            "started_at": self.started_at,
+            "traced_current_mb": round(current / 1048576, 2),
+            "traced_peak_mb": round(peak / 1048576, 2),
+        }
+
+
+# Global singletons
+cpu_profiler = CpuProfiler()
+loop_monitor = LoopMonitor()
+allocation_tracker = AllocationTracker()
+
+
+__all__ = [
+    "ProfilerBusy",
+    "CpuProfiler", "cpu_profiler",
+    "LoopMonitor", "loop_monitor",
+    "AllocationTracker", "allocation_tracker",
+    "task_counts",
+]
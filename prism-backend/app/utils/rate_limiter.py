@@ -0,0 +1,412 @@
+"""
+🛡️ Unified Rate Limiting (Sliding-Window Counter)
+
+One rate-limiting subsystem for the whole backend:
+- Redis Lua script (atomic, shared across workers/instances)
+- In-process fallback with bounded memory when Redis is unavailable
+- ASGI middleware applying per-route limits
+
+Algorithm: sliding-window counter. Each key keeps TWO integers (current and
+previous fixed window). The effective count is
+
+    previous * (1 - elapsed_fraction) + current
+
+which approximates a true sliding log with O(1) memory per key instead of a
+list of every request timestamp.
+"""
+
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple, List
+
+from fastapi import HTTPException
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from app.config import settings
+from app.db.redis_client import redis_client
+from app.utils.security import get_trusted_client_ip
+
+logger = logging.getLogger(__name__)
+
+
+# =============================================================================
+# 🚀 LUA SCRIPT: Atomic sliding-window check-and-increment
+# =============================================================================
+# KEYS[1] = counter for the current window
+# KEYS[2] = counter for the previous window
+# ARGV[1] = limit
+# ARGV[2] = weight of previous window (1 - elapsed_fraction), 0..1
+# ARGV[3] = TTL for current window counter (ms) - two windows
+# ARGV[4] = cost (usually 1)
+# Returns {allowed (0/1), remaining}
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local weight = tonumber(ARGV[2])
+local ttl_ms = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local estimated = math.floor(previous * weight) + current
+
+if estimated + cost > limit then
+    return {0, math.max(0, limit - estimated)}
+end
+
+current = redis.call('INCRBY', KEYS[1], cost)
+if current == cost then
+    redis.call('PEXPIRE', KEYS[1], ttl_ms)
+end
+return {1, math.max(0, limit - estimated - cost)}
+"""
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    """Outcome of a single rate limit check"""
+    allowed: bool
+    limit: int
+    remaining: int
+    retry_after: int  # seconds until the caller should retry (0 if allowed)
+
+
+def _window_position(now: float, window: int) -> Tuple[int, float]:
+    """Return (window_index, weight_of_previous_window) for a timestamp"""
+    index = int(now // window)
+    elapsed_fraction = (now - index * window) / window
+    return index, 1.0 - elapsed_fraction
+
+
+def _retry_after(now: float, window: int) -> int:
+    """Seconds until the current window rolls over (upper bound for a retry)"""
+    return max(1, int(window - (now % window)) + 1)
+
+
+# =============================================================================
+# 🧠 IN-PROCESS FALLBACK (bounded memory, idle-key eviction)
+# =============================================================================
+class _WindowCounter:
+    """Two-integer state per key (replaces the per-request timestamp list)"""
+    __slots__ = ("window_index", "current", "previous")
+
+    def __init__(self, window_index: int):
+        self.window_index = window_index
+        self.current = 0
+        self.previous = 0
+
+    def roll(self, window_index: int):
+        """Advance to window_index, shifting or clearing counters"""
+        if window_index == self.window_index:
+            return
+        if window_index == self.window_index + 1:
+            self.previous = self.current
+        else:
+            self.previous = 0
+        self.current = 0
+        self.window_index = window_index
+
+
+class LocalSlidingWindowLimiter:
+    """
+    In-memory sliding-window counter.
+
+    Memory is bounded by max_keys (LRU eviction) and keys idle for more
+    than two windows are swept, so the store never grows with the number
+    of clients that ever connected.
+    """
+
+    def __init__(self, max_keys: int = 50_000, sweep_interval: float = 60.0):
+        self.max_keys = max_keys
+        self.sweep_interval = sweep_interval
+        self._counters: "OrderedDict[Tuple[str, int], _WindowCounter]" = OrderedDict()
+        self._last_sweep = time.monotonic()
+
+    def hit(self, key: str, limit: int, window: int, cost: int = 1, now: Optional[float] = None) -> RateLimitResult:
+        """Check and (if allowed) record a request for key"""
+        now = time.time() if now is None else now
+        index, weight = _window_position(now, window)
+
+        slot = (key, window)
+        counter = self._counters.get(slot)
+        if counter is None:
+            counter = _WindowCounter(index)
+            self._counters[slot] = counter
+            if len(self._counters) > self.max_keys:
+                self._counters.popitem(last=False)
+        else:
+            self._counters.move_to_end(slot)
+            counter.roll(index)
+
+        estimated = int(counter.previous * weight) + counter.current
+        if estimated + cost > limit:
+            self._maybe_sweep(now)
+            return RateLimitResult(False, limit, max(0, limit - estimated), _retry_after(now, window))
+
+        counter.current += cost
+        self._maybe_sweep(now)
+        return RateLimitResult(True, limit, max(0, limit - estimated - cost), 0)
+
+    def _maybe_sweep(self, now: float):
+        """Drop keys whose both windows have expired (amortized O(1))"""
+        mono = time.monotonic()
+        if mono - self._last_sweep < self.sweep_interval:
+            return
+        self._last_sweep = mono
+        stale = [
+            slot for slot, counter in self._counters.items()
+            if int(now // slot[1]) - counter.window_index > 1
+        ]
+        for slot in stale:
+            del self._counters[slot]
+        if stale:
+            logger.debug(f"🧹 Rate limiter evicted {len(stale)} idle keys")
+
+    def reset(self, key: str):
+        """Forget all windows for key"""
+        for slot in [s for s in self._counters if s[0] == key]:
+            del self._counters[slot]
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+
+# =============================================================================
+# 🔌 RATE LIMITER (Redis first, local fallback)
+# =============================================================================
+class RateLimiter:
+    """
+    🛡️ Sliding-window rate limiter shared by middleware and services.
+
+    Usage:
+    ```python
+    from app.utils.rate_limiter import rate_limiter
+    result = await rate_limiter.hit(f"user:{user_id}:chat", limit=60, window=60)
+    if not result.allowed:
+        raise HTTPException(429, ...)
+    ```
+    """
+
+    KEY_PREFIX = "ratelimit"
+
+    def __init__(self):
+        self._script = None
+        self.local = LocalSlidingWindowLimiter()
+
+    def _get_script(self):
+        if self._script is None:
+            self._script = redis_client.register_script(SLIDING_WINDOW_LUA)
+        return self._script
+
+    async def hit(self, key: str, limit: int, window: int = 60, cost: int = 1) -> RateLimitResult:
+        """Count one request against key; never raises"""
+        if redis_client.is_using_fallback():
+            return self.local.hit(key, limit, window, cost)
+
+        now = time.time()
+        index, weight = _window_position(now, window)
+        base = f"{self.KEY_PREFIX}:{key}:{window}"
+        try:
+            result = await self._get_script()(
+                keys=[f"{base}:{index}", f"{base}:{index - 1}"],
+                args=[limit, f"{weight:.6f}", window * 2000, cost],
+            )
+            allowed, remaining = int(result[0]), int(result[1])
+        except Exception as e:
+            # Script unavailable or returned a non-limiter payload - degrade locally
+            logger.warning(f"⚠️ Redis rate limit check failed, using local limiter: {e}")
+            return self.local.hit(key, limit, window, cost, now=now)
+
+        if allowed:
+            return RateLimitResult(True, limit, remaining, 0)
+        return RateLimitResult(False, limit, remaining, _retry_after(now, window))
+
+    async def is_allowed(self, key: str, limit: int, window: int = 60) -> bool:
+        """Boolean convenience wrapper around hit()"""
+        return (await self.hit(key, limit, window)).allowed
+
+
+rate_limiter = RateLimiter()
+
+
+# =============================================================================
+# 🚦 PER-ROUTE MIDDLEWARE
+# =============================================================================
+# Per-account generation limits become this many x per IP in the middleware (NAT / offices)
+SHARED_IP_FACTOR = 4
+
+
+@dataclass(frozen=True)
+class RouteLimit:
+    """Limit applied to requests whose method and path match"""
+    name: str
+    pattern: str
+    limit: int
+    window: int = 60
+    methods: Tuple[str, ...] = ("POST",)
+    scope: str = "ip"   # "ip" | "email" | "user" - see RateLimitMiddleware
+
+    @property
+    def ip_limit(self) -> int:
+        """Per-IP limit the middleware applies (user rules are per account, so many users may share an IP)"""
+        return self.limit * SHARED_IP_FACTOR if self.scope == "user" else self.limit
+
+    def compiled(self) -> "re.Pattern":
+        return re.compile(self.pattern)
+
+
+# First match wins - keep the most specific rules at the top
+ROUTE_LIMITS: List[RouteLimit] = [
+    # 🔐 Auth (brute force / OTP abuse) - per IP, and per target email via email_rate_limit()
+    RouteLimit("auth_login", r"^/auth/login$", limit=10, window=60, scope="email"),
+    RouteLimit("auth_signup", r"^/auth/signup$", limit=5, window=60, scope="email"),
+    RouteLimit("auth_otp", r"^/auth/(verify-otp|verify-reset-otp)$", limit=10, window=60, scope="email"),
+    RouteLimit("auth_reset", r"^/auth/(forgot-password|reset-password)$", limit=5, window=300, scope="email"),
+    # 🤖 LLM generation (expensive) - per account via user_rate_limit() where the route is authenticated
+    RouteLimit("generate", r"^/api/streaming/chat/[^/]+/(generate|stream-now)$", limit=30, window=60, scope="user"),
+    RouteLimit("chat_send", r"^/chat/(message|message/stream|send|send-message|memory-chat)$", limit=30, window=60, scope="user"),
+    RouteLimit("mini_agent", r"^/api/mini-agents/[^/]+/messages$", limit=30, window=60),
+    # 📨 Public forms
+    RouteLimit("contact_form", r"^/api/form$", limit=5, window=300),
+]
+
+
+class RateLimitMiddleware(BaseHTTPMiddleware):
+    """
+    🚦 Applies ROUTE_LIMITS before the request reaches a router.
+
+    Identity: client IP only (forwarded headers are believed only from
+    TRUSTED_PROXIES). The middleware runs before authentication, so
+    a cookie here is unvalidated and a random one per request would get a
+    fresh bucket. Per-email and per-account limits are applied by the
+    email_rate_limit() / user_rate_limit() route dependencies instead.
+    Responds 429 with Retry-After; successful responses carry
+    X-RateLimit-Limit / X-RateLimit-Remaining headers.
+    """
+
+    def __init__(self, app, limits: Optional[List[RouteLimit]] = None, limiter: Optional[RateLimiter] = None):
+        super().__init__(app)
+        self.limiter = limiter or rate_limiter
+        self.rules = [(rule, rule.compiled()) for rule in (limits if limits is not None else ROUTE_LIMITS)]
+
+    def _match(self, method: str, path: str) -> Optional[RouteLimit]:
+        for rule, pattern in self.rules:
+            if method in rule.methods and pattern.match(path):
+                return rule
+        return None
+
+    async def dispatch(self, request: Request, call_next):
+        rule = self._match(request.method, request.url.path)
+        if rule is None:
+            return await call_next(request)
+
+        key = f"{rule.name}:ip:{get_trusted_client_ip(request)}"
+        result = await self.limiter.hit(key, rule.ip_limit, rule.window)
+        if not result.allowed:
+            logger.warning(f"🚦 Rate limit exceeded: {rule.name} {request.url.path}")
+            return JSONResponse(status_code=429, content=_limited_body(result), headers=_limited_headers(result))
+
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(result.limit)
+        response.headers["X-RateLimit-Remaining"] = str(result.remaining)
+        return response
+
+
+def _limited_body(result: RateLimitResult) -> dict:
+    return {
+        "error": "RATE_LIMITED",
+        "message": "Too many requests. Please slow down.",
+        "retry_after": result.retry_after,
+    }
+
+
+def _limited_headers(result: RateLimitResult) -> dict:
+    return {
+        "Retry-After": str(result.retry_after),
+        "X-RateLimit-Limit": str(result.limit),
+        "X-RateLimit-Remaining": "0",
+    }
+
+
+def _rule(name: str) -> RouteLimit:
+    return next(rule for rule in ROUTE_LIMITS if rule.name == name)
+
+
+def _digest(value: str) -> str:
+    # Never put raw emails or ids into Redis key names
+    return hashlib.blake2b(value.encode(), digest_size=8).hexdigest()
+
+
+# =============================================================================
+# 🔑 ROUTE DEPENDENCIES (identity known only after the body / session is read)
+# =============================================================================
+def email_rate_limit(rule_name: str, limiter: Optional[RateLimiter] = None):
+    """
+    Dependency limiting an auth route per target email, whatever the client IP.
+
+    Usage:
+    ```python
+    @router.post("/login", dependencies=[Depends(email_rate_limit("auth_login"))])
+    ```
+    """
+    rule = _rule(rule_name)
+
+    async def dependency(request: Request):
+        try:
+            body = await request.json()
+        except Exception:
+            return  # malformed body - the route's own validation answers it
+        email = str(body.get("email") or "").strip().lower() if isinstance(body, dict) else ""
+        if not email:
+            return
+        result = await (limiter or rate_limiter).hit(f"{rule.name}:e:{_digest(email)}", rule.limit, rule.window)
+        if not result.allowed:
+            logger.warning(f"🚦 Rate limit exceeded: {rule.name} (per email)")
+            raise HTTPException(status_code=429, detail=_limited_body(result), headers=_limited_headers(result))
+
+    return dependency
+
+
+def user_rate_limit(rule_name: str, limiter: Optional[RateLimiter] = None):
+    """
+    Dependency limiting an authenticated route per account. The session is
+    validated first, so forged cookies fail with 401 instead of getting a
+    bucket of their own.
+
+    Usage:
+    ```python
+    @router.post("/message", dependencies=[Depends(user_rate_limit("chat_send"))])
+    ```
+    """
+    rule = _rule(rule_name)
+
+    async def dependency(request: Request):
+        from app.utils.auth import get_current_user_from_session
+
+        user = await get_current_user_from_session(
+            request=request, session_cookie_id=request.cookies.get(settings.SESSION_COOKIE_NAME)
+        )
+        result = await (limiter or rate_limiter).hit(f"{rule.name}:u:{_digest(user.user_id)}", rule.limit, rule.window)
+        if not result.allowed:
+            logger.warning(f"🚦 Rate limit exceeded: {rule.name} (per user)")
+            raise HTTPException(status_code=429, detail=_limited_body(result), headers=_limited_headers(result))
+
+    return dependency
+
+
+__all__ = [
+    "RateLimiter",
+    "RateLimitResult",
+    "LocalSlidingWindowLimiter",
+    "RateLimitMiddleware",
+    "RouteLimit",
+    "ROUTE_LIMITS",
+    "email_rate_limit",
+    "user_rate_limit",
+    "rate_limiter",
+]
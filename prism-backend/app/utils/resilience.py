@@ -0,0 +1,368 @@
+"""
+🛡️ Shared Resilience Layer - Circuit Breakers, Retry Budgets, Hedged Reads
+
+Retries used to live in four places (smart_retry, mongo_retry,
+Neo4jClient.query, media_library's private breaker), each with plain
+exponential backoff and no global limit - so during an incident every
+caller multiplied its load on the dependency that was already struggling.
+
+One Backend per dependency ("mongo", "redis", "neo4j", "pinecone",
+"http:<host>") now owns:
+
+- a circuit breaker: N consecutive failures open it for a cooldown; then
+  one half-open probe decides whether to close it again
+- a retry budget: retries (and hedges) spend tokens that refill at
+  ~20% of successful traffic plus a small floor, so retries can never
+  exceed a fraction of normal load
+- full-jitter backoff: sleep uniform(0, base * 2**attempt), capped
+- hedged reads (opt-in, idempotent reads only): if the first attempt is
+  still running after the backend's recent p95 latency, fire a second one
+  and take whichever finishes first
+
+Only TRANSIENT_ERRORS (connection failures and driver/socket timeouts) are
+retried or counted against a breaker by default. Caller bugs and query
+errors propagate untouched, and a LatencyGuardTimeout - our own per-call
+deadline expiring - is retried but never trips a breaker: it says the call
+was slower than this caller could wait, not that the backend is down.
+
+Usage:
+```python
+from app.utils.resilience import CircuitOpenError, get_backend
+
+doc = await get_backend("mongo").call(
+    lambda: users_collection.find_one({"_id": user_id}),
+    retries=2, hedge=True, timeout=0.3,
+)
+```
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def _driver_errors() -> Tuple[Type[BaseException], ...]:
+    """Connection/timeout errors of the installed drivers (each one optional)"""
+    errors: list = []
+    try:
+        from pymongo.errors import AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError
+        errors += [AutoReconnect, NetworkTimeout, ServerSelectionTimeoutError]
+    except ImportError:
+        pass
+    try:
+        from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+        errors += [RedisConnectionError, RedisTimeoutError]
+    except ImportError:
+        pass
+    try:
+        from neo4j.exceptions import ServiceUnavailable, SessionExpired
+        errors += [ServiceUnavailable, SessionExpired]
+    except ImportError:
+        pass
+    try:
+        # Pinecone's sync client talks HTTP through urllib3
+        from urllib3.exceptions import MaxRetryError, ProtocolError, TimeoutError as Urllib3TimeoutError
+        errors += [MaxRetryError, ProtocolError, Urllib3TimeoutError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+# ============ CONSTANTS ============
+FAILURE_THRESHOLD = 5
+COOLDOWN_SECONDS = 30.0
+RETRY_BUDGET_RATIO = 0.2           # retry tokens earned per request
+RETRY_BUDGET_MIN_PER_SECOND = 5.0  # floor so low-traffic backends can still retry
+RETRY_BUDGET_WINDOW_SECONDS = 10.0
+BASE_DELAY_SECONDS = 0.05
+MAX_DELAY_SECONDS = 2.0
+LATENCY_SAMPLES = 256
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_DELAY_SECONDS = 0.005
+# Builtin ConnectionError / TimeoutError are OSError subclasses (sockets, asyncio timeouts)
+TRANSIENT_ERRORS: Tuple[Type[BaseException], ...] = (OSError,) + _driver_errors()
+
+
+class LatencyGuardTimeout(asyncio.TimeoutError):
+    """Our own per-call deadline expired (the backend may be fine, just slower than we can wait)"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+
+    def __init__(self, backend: str, retry_in: float):
+        super().__init__(f"{backend} circuit open (retry in {retry_in:.1f}s)")
+        self.backend = backend
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half-open probe -> closed"""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """May a call go through right now? (claims the half-open probe slot)"""
+        if self.state == "closed":
+            return True
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.cooldown:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            logger.info(f"🔌 {self.name} circuit breaker: half-open (probing)")
+        if self._probing:
+            self.rejected += 1
+            return False
+        self._probing = True
+        return True
+
+    def is_open(self) -> bool:
+        """Non-claiming check for callers that record outcomes themselves"""
+        return self.state == "open" and time.monotonic() - self.opened_at < self.cooldown
+
+    def retry_in(self) -> float:
+        return max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"✅ {self.name} circuit breaker: closed (backend recovered)")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"🔌 {self.name} circuit breaker: OPEN for {self.cooldown:.0f}s after {self.failures} failure(s)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """Give back a probe slot without a verdict (e.g. caller cancelled)"""
+        self._probing = False
+
+
+class RetryBudget:
+    """Token bucket: each request deposits `ratio`, each retry/hedge spends 1"""
+
+    def __init__(
+        self,
+        ratio: float = RETRY_BUDGET_RATIO,
+        min_per_second: float = RETRY_BUDGET_MIN_PER_SECOND,
+        window_seconds: float = RETRY_BUDGET_WINDOW_SECONDS,
+    ):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = max(1.0, min_per_second * window_seconds)
+        self.balance = self.capacity
+        self._refilled_at = time.monotonic()
+        self.exhausted = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.balance = min(self.capacity, self.balance + (now - self._refilled_at) * self.min_per_second)
+        self._refilled_at = now
+
+    def deposit(self):
+        self._refill()
+        self.balance = min(self.capacity, self.balance + self.ratio)
+
+    def try_spend(self) -> bool:
+        self._refill()
+        if self.balance >= 1.0:
+            self.balance -= 1.0
+            return True
+        self.exhausted += 1
+        return False
+
+
+class Backend:
+    """Breaker + retry budget + latency window for one dependency"""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD, cooldown: float = COOLDOWN_SECONDS):
+        self.name = name
+        self.breaker = CircuitBreaker(name, failure_threshold, cooldown)
+        self.budget = RetryBudget()
+        self._latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._p95: Optional[float] = None
+        self._since_p95 = 0
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    # ---------- latency ----------
+
+    def _observe(self, seconds: float):
+        self._latencies.append(seconds)
+        self._since_p95 += 1
+        if self._p95 is None or self._since_p95 >= 16:
+            self._since_p95 = 0
+            if len(self._latencies) >= HEDGE_MIN_SAMPLES:
+                ordered = sorted(self._latencies)
+                self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self._p95
+
+    # ---------- calls ----------
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], timeout: Optional[float]) -> T:
+        started = time.perf_counter()
+        if timeout is None:
+            result = await operation()
+        else:
+            deadline = asyncio.timeout(timeout)
+            try:
+                async with deadline:
+                    result = await operation()
+            except TimeoutError:
+                if deadline.expired():
+                    raise LatencyGuardTimeout(f"{self.name} call exceeded {timeout * 1000:.0f}ms") from None
+                raise  # the driver's own timeout - a real backend failure
+        self._observe(time.perf_counter() - started)
+        return result
+
+    async def _hedged(self, operation: Callable[[], Awaitable[T]], timeout: Optional[float]) -> T:
+        """First attempt, plus a second one if the first outlives p95"""
+        first = asyncio.ensure_future(self._attempt(operation, timeout))
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=max(self._p95, HEDGE_MIN_DELAY_SECONDS))
+            if done or not self.budget.try_spend():
+                return await first
+
+            self.hedges += 1
+            tasks.append(asyncio.ensure_future(self._attempt(operation, timeout)))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        *,
+        retries: int = 0,
+        hedge: bool = False,
+        timeout: Optional[float] = None,
+        retry_on: Tuple[Type[BaseException], ...] = TRANSIENT_ERRORS,
+        base_delay: float = BASE_DELAY_SECONDS,
+    ) -> T:
+        """
+        Run operation (a zero-arg coroutine factory) under this backend's
+        breaker and retry budget. Only exceptions matching retry_on are
+        retried, and only those (minus LatencyGuardTimeout) count as backend
+        failures; anything else propagates at once. Raises CircuitOpenError
+        without calling when the circuit is open. hedge=True is for
+        idempotent reads only.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+        self.calls += 1
+        self.budget.deposit()
+
+        attempt = 0
+        while True:
+            try:
+                if hedge and self._p95 is not None and self.breaker.state == "closed":
+                    result = await self._hedged(operation, timeout)
+                else:
+                    result = await self._attempt(operation, timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except retry_on as e:
+                if isinstance(e, CircuitOpenError):
+                    self.breaker.release()
+                    raise
+                if isinstance(e, LatencyGuardTimeout):
+                    self.breaker.release()
+                else:
+                    self.breaker.record_failure()
+                if attempt >= retries or self.breaker.state == "open" or not self.budget.try_spend():
+                    raise
+                delay = random.uniform(0, min(MAX_DELAY_SECONDS, base_delay * (2 ** attempt)))
+                attempt += 1
+                self.retries += 1
+                logger.debug(f"🔁 {self.name} retry {attempt}/{retries} in {delay * 1000:.0f}ms after {type(e).__name__}")
+                await asyncio.sleep(delay)
+                if not self.breaker.allow():
+                    raise CircuitOpenError(self.name, self.breaker.retry_in())
+                continue
+            except BaseException:
+                # The backend answered; the error is the caller's problem
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def get_stats(self) -> dict:
+        return {
+            "state": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "rejected": self.breaker.rejected,
+            "calls": self.calls,
+            "retries": self.retries,
+            "retry_budget": round(self.budget.balance, 1),
+            "retry_budget_exhausted": self.budget.exhausted,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": round(self._p95 * 1000, 1) if self._p95 is not None else None,
+        }
+
+
+# Global registry (one Backend per dependency name)
+_backends: Dict[str, Backend] = {}
+
+
+def get_backend(name: str) -> Backend:
+    backend = _backends.get(name)
+    if backend is None:
+        backend = _backends[name] = Backend(name)
+    return backend
+
+
+def resilience_stats() -> Dict[str, dict]:
+    return {name: backend.get_stats() for name, backend in sorted(_backends.items())}
+
+
+__all__ = [
+    "Backend",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "LatencyGuardTimeout",
+    "RetryBudget",
+    "TRANSIENT_ERRORS",
+    "get_backend",
+    "resilience_stats",
+]
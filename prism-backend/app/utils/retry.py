@@ -3,14 +3,20 @@
 
 Retry strategy for DB and memory operations:
 - Max 1-2 retries only
-- Exponential backoff (50ms, 200ms)
+- Full-jitter exponential backoff, capped
+- Retries spend the backend's shared retry budget and stop when its
+  circuit breaker opens (see app.utils.resilience)
 - Fail silently after max retries
 - NO infinite retries
 
+Only transient errors (TRANSIENT_ERRORS: connection failures, driver
+timeouts) are retried; anything else fails on the first attempt.
+
 Usage:
     result = await smart_retry(
         operation=lambda: db.find_one({"_id": id}),
         operation_name="MongoDB find_one",
+        backend="mongo",
         max_retries=2
     )
 """
@@ -19,6 +25,8 @@ import asyncio
 import logging
 from typing import Callable, Any, Optional, TypeVar
 
+from app.utils.resilience import get_backend
+
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
@@ -27,10 +35,11 @@ T = TypeVar('T')
 async def smart_retry(
     operation: Callable[[], Any],
     operation_name: str,
+    backend: str,
     max_retries: int = 3,
     base_delay_ms: int = 100,
     fail_silently: bool = True,
-    fallback: Optional[T] = None
+    fallback: Optional[T] = None,
 ) -> Optional[T]:
     """
     🚀 Part 18: Smart retry with exponential backoff.
@@ -38,6 +47,9 @@ async def smart_retry(
     Args:
         operation: Async function to retry
         operation_name: Name for logging (e.g., "MongoDB query")
+        backend: Resilience backend whose breaker/retry budget applies
+            ("mongo", "redis", "neo4j", "pinecone", ...) - never shared
+            between unrelated dependencies
         max_retries: Maximum retry attempts (default: 3)
         base_delay_ms: Base delay in milliseconds (default: 100ms)
         fail_silently: If True, return fallback on failure; if False, raise
@@ -51,6 +63,7 @@ async def smart_retry(
         user = await smart_retry(
             operation=lambda: users_collection.find_one({"_id": user_id}),
             operation_name="MongoDB find user",
+            backend="mongo",
             max_retries=3
         )
         
@@ -58,59 +71,50 @@ async def smart_retry(
         cached = await smart_retry(
             operation=lambda: redis_client.get(key),
             operation_name="Redis GET",
+            backend="redis",
             fallback={},
             max_retries=1
         )
     """
-    last_error = None
-    
-    for attempt in range(max_retries + 1):
-        try:
-            result = await operation()
-            
-            # Log recovery if this was a retry
-            if attempt > 0:
-                logger.info(f"✅ {operation_name} succeeded on attempt {attempt + 1}")
-            
-            return result
-            
-        except Exception as e:
-            last_error = e
-            
-            # Last attempt - don't retry
-            if attempt >= max_retries:
-                if fail_silently:
-                    logger.warning(
-                        f"⚠️ {operation_name} failed after {max_retries} retries. "
-                        f"Failing silently. Error: {str(e)[:100]}"
-                    )
-                    return fallback
-                else:
-                    logger.error(f"❌ {operation_name} failed after {max_retries} retries: {e}")
-                    raise
-            
-            # Calculate exponential backoff delay
-            delay_ms = base_delay_ms * (2 ** attempt)
-            delay_sec = delay_ms / 1000
-            
+    return await _retry_on_backend(
+        operation, operation_name, backend, max_retries, base_delay_ms, fail_silently, fallback
+    )
+
+
+async def _retry_on_backend(
+    operation: Callable[[], Any],
+    operation_name: str,
+    backend: str,
+    max_retries: int,
+    base_delay_ms: int,
+    fail_silently: bool,
+    fallback: Optional[T],
+) -> Optional[T]:
+    try:
+        return await get_backend(backend).call(
+            operation, retries=max_retries, base_delay=base_delay_ms / 1000
+        )
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        if fail_silently:
             logger.warning(
-                f"⚠️ {operation_name} failed (attempt {attempt + 1}/{max_retries + 1}). "
-                f"Retrying in {delay_ms}ms... Error: {str(e)[:100]}"
+                f"⚠️ {operation_name} failed (up to {max_retries} retries). "
+                f"Failing silently. Error: {str(e)[:100]}"
             )
-            
-            await asyncio.sleep(delay_sec)
-    
-    # Should never reach here, but for type safety
-    return fallback
+            return fallback
+        logger.error(f"❌ {operation_name} failed (up to {max_retries} retries): {e}")
+        raise
 
 
 async def smart_retry_sync(
     operation: Callable[[], Any],
     operation_name: str,
+    backend: str,
     max_retries: int = 2,
     base_delay_ms: int = 50,
     fail_silently: bool = True,
-    fallback: Optional[T] = None
+    fallback: Optional[T] = None,
 ) -> Optional[T]:
     """
     🚀 Part 18: Smart retry for SYNCHRONOUS operations.
@@ -123,46 +127,14 @@ async def smart_retry_sync(
         result = await smart_retry_sync(
             operation=lambda: neo4j_session.run(query).single(),
             operation_name="Neo4j query",
+            backend="neo4j",
             max_retries=2
         )
     """
-    last_error = None
-    
-    for attempt in range(max_retries + 1):
-        try:
-            # Run sync operation in thread pool to avoid blocking
-            result = await asyncio.to_thread(operation)
-            
-            if attempt > 0:
-                logger.info(f"✅ {operation_name} succeeded on attempt {attempt + 1}")
-            
-            return result
-            
-        except Exception as e:
-            last_error = e
-            
-            if attempt >= max_retries:
-                if fail_silently:
-                    logger.warning(
-                        f"⚠️ {operation_name} failed after {max_retries} retries. "
-                        f"Failing silently. Error: {str(e)[:100]}"
-                    )
-                    return fallback
-                else:
-                    logger.error(f"❌ {operation_name} failed after {max_retries} retries: {e}")
-                    raise
-            
-            delay_ms = base_delay_ms * (2 ** attempt)
-            delay_sec = delay_ms / 1000
-            
-            logger.warning(
-                f"⚠️ {operation_name} failed (attempt {attempt + 1}/{max_retries + 1}). "
-                f"Retrying in {delay_ms}ms... Error: {str(e)[:100]}"
-            )
-            
-            await asyncio.sleep(delay_sec)
-    
-    return fallback
+    return await _retry_on_backend(
+        lambda: asyncio.to_thread(operation),  # Thread pool: never block the loop
+        operation_name, backend, max_retries, base_delay_ms, fail_silently, fallback
+    )
 
 
 # ========== CONVENIENCE WRAPPERS FOR COMMON OPERATIONS ==========
@@ -175,7 +147,8 @@ async def retry_mongodb(operation: Callable[[], Any], operation_name: str = "Mon
         max_retries=2,
         base_delay_ms=50,
         fail_silently=True,
-        fallback=None
+        fallback=None,
+        backend="mongo"
     )
 
 
@@ -187,7 +160,8 @@ async def retry_redis(operation: Callable[[], Any], operation_name: str = "Redis
         max_retries=1,
         base_delay_ms=50,
         fail_silently=True,
-        fallback=None
+        fallback=None,
+        backend="redis"
     )
 
 
@@ -199,7 +173,8 @@ async def retry_neo4j(operation: Callable[[], Any], operation_name: str = "Neo4j
         max_retries=2,
         base_delay_ms=100,
         fail_silently=True,
-        fallback=None
+        fallback=None,
+        backend="neo4j"
     )
 
 
@@ -211,7 +186,8 @@ async def retry_pinecone(operation: Callable[[], Any], operation_name: str = "Pi
         max_retries=1,
         base_delay_ms=100,
         fail_silently=True,
-        fallback=None
+        fallback=None,
+        backend="pinecone"
     )
 
 
@@ -226,6 +202,7 @@ Example 1: MongoDB query with retry
         user = await smart_retry(
             operation=lambda: users_collection.find_one({"_id": ObjectId(user_id)}),
             operation_name=f"MongoDB find user {user_id}",
+            backend="mongo",
             max_retries=2
         )
         return user if user else None
@@ -239,6 +216,7 @@ Example 2: Redis cache with fallback
         cached = await smart_retry(
             operation=lambda: redis_client.get(f"tasks:{user_id}"),
             operation_name="Redis GET tasks",
+            backend="redis",
             fallback=[],
             max_retries=1
         )
@@ -261,6 +239,7 @@ Example 3: Neo4j graph query
         relationships = await smart_retry_sync(
             operation=neo4j_query,
             operation_name="Neo4j get relationships",
+            backend="neo4j",
             max_retries=2
         )
         return relationships if relationships else []
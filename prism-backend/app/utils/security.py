@@ -8,13 +8,38 @@ from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 import time
 import logging
-from typing import Dict, Set
+from typing import Dict, Optional, Set, Tuple
 import re
 import ipaddress
 from datetime import datetime, timedelta
+from functools import lru_cache
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+@lru_cache(maxsize=8)
+def _proxy_networks(spec: Tuple[str, ...]) -> tuple:
+    networks = []
+    for entry in spec:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            logger.warning(f"⚠️ Ignoring invalid TRUSTED_PROXIES entry: {entry}")
+    return tuple(networks)
+
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    """True when host is one of settings.TRUSTED_PROXIES (our own reverse proxies)"""
+    if not host:
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _proxy_networks(tuple(settings.trusted_proxies_list)))
+
+
 def get_client_ip(request: Request) -> str:
     """Get client IP address from request"""
     # Try X-Forwarded-For first (if behind proxy)
@@ -33,6 +58,22 @@ def get_client_ip(request: Request) -> str:
     
     return "unknown"
 
+def get_trusted_client_ip(request: Request) -> str:
+    """
+    Client IP that callers cannot spoof: forwarded headers are only read when
+    the peer is a trusted proxy, and X-Forwarded-For is walked from the right
+    (entries appended by our proxies) to the first address we did not add.
+    """
+    peer = request.client.host if getattr(request, "client", None) else None
+    if not is_trusted_proxy(peer):
+        return peer or "unknown"
+    forwarded = [hop.strip() for hop in (request.headers.get("X-Forwarded-For") or "").split(",") if hop.strip()]
+    for hop in reversed(forwarded):
+        if not is_trusted_proxy(hop):
+            return hop
+    return request.headers.get("X-Real-IP") or (forwarded[0] if forwarded else peer)
+
+
 class SecurityMiddleware(BaseHTTPMiddleware):
     """
     Comprehensive security middleware for request validation and protection
@@ -358,32 +399,6 @@ security_middleware = SecurityMiddleware
 form_input_validator = FormInputValidator()
 auth_security = AuthenticationSecurity()
 
-# Simple rate limiting (can be enhanced later with Redis)
-class SimpleRateLimiter:
-    def __init__(self):
-        self.requests = {}
-        
-    def is_allowed(self, key: str, limit: int, window: int = 60) -> bool:
-        """Simple in-memory rate limiting"""
-        now = time.time()
-        
-        if key not in self.requests:
-            self.requests[key] = []
-            
-        # Clean old requests
-        self.requests[key] = [req_time for req_time in self.requests[key] 
-                            if now - req_time < window]
-        
-        # Check if limit exceeded
-        if len(self.requests[key]) >= limit:
-            return False
-            
-        # Add current request
-        self.requests[key].append(now)
-        return True
-
-simple_rate_limiter = SimpleRateLimiter()
-
 # Export main components
 __all__ = [
     'SecurityMiddleware',
@@ -392,6 +407,5 @@ __all__ = [
     'security_middleware',
     'form_input_validator',
     'auth_security',
-    'simple_rate_limiter',
     'get_client_ip'
 ]
\ No newline at end of file
@@ -22,6 +22,8 @@ from typing import Optional, Dict, Any
 from datetime import datetime
 from contextlib import contextmanager
 
+from app.utils.tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 
@@ -74,6 +76,11 @@ class StructuredLogger:
         if metadata:
             log_data["metadata"] = metadata
         
+        # Correlate with the request trace when this request is sampled
+        span = tracer.current()
+        if span.sampled:
+            log_data["trace_id"] = span.trace_id
+        
         # Log as JSON for easy parsing
         log_json = json.dumps(log_data)
         
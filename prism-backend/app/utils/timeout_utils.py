@@ -16,6 +16,8 @@ import logging
 from typing import Optional, Callable, Any, TypeVar
 from functools import wraps
 
+from app.utils.resilience import TRANSIENT_ERRORS, get_backend
+
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T')
@@ -25,6 +27,17 @@ class ServiceTimeoutError(Exception):
     pass
 
 
+# service_name prefix -> shared resilience backend (breaker state is shared
+# with retries and direct backend calls)
+_BACKEND_ALIASES = {"redis": "redis", "mongodb": "mongo", "mongo": "mongo", "neo4j": "neo4j", "pinecone": "pinecone"}
+
+
+def _breaker_for(service_name: str):
+    words = (service_name or "").lower().split()
+    backend = _BACKEND_ALIASES.get(words[0]) if words else None
+    return get_backend(backend).breaker if backend else None
+
+
 async def with_timeout(
     coro,
     timeout_ms: int,
@@ -54,22 +67,41 @@ async def with_timeout(
         )
     """
     timeout_seconds = timeout_ms / 1000.0
+    breaker = _breaker_for(service_name)
     
-    try:
-        result = await asyncio.wait_for(coro, timeout=timeout_seconds)
-        return result
-    except asyncio.TimeoutError:
-        logger.warning(
-            f"⏱️ {service_name} timeout after {timeout_ms}ms - using fallback"
-        )
+    # 🔌 Known backend with an open circuit: don't even start the call
+    if breaker is not None and breaker.is_open():
+        if asyncio.iscoroutine(coro):
+            coro.close()
+        logger.debug(f"🔌 {service_name} circuit open - using fallback")
         if raise_on_timeout:
-            raise ServiceTimeoutError(f"{service_name} timeout after {timeout_ms}ms")
+            raise ServiceTimeoutError(f"{service_name} circuit open")
         return fallback
+    
+    deadline = asyncio.timeout(timeout_seconds)
+    try:
+        async with deadline:
+            result = await coro
     except Exception as e:
+        if isinstance(e, TimeoutError) and deadline.expired():
+            # Our latency guard fired - the backend isn't necessarily down, so
+            # this never feeds the breaker
+            logger.warning(
+                f"⏱️ {service_name} timeout after {timeout_ms}ms - using fallback"
+            )
+            if raise_on_timeout:
+                raise ServiceTimeoutError(f"{service_name} timeout after {timeout_ms}ms")
+            return fallback
         logger.error(f"❌ {service_name} error: {e}")
+        # Only connection/driver-timeout errors say the backend is unhealthy
+        if breaker is not None and isinstance(e, TRANSIENT_ERRORS):
+            breaker.record_failure()
         if raise_on_timeout:
             raise
         return fallback
+    if breaker is not None:
+        breaker.record_success()
+    return result
 
 
 def timeout_decorator(timeout_ms: int, service_name: str, fallback: Any = None):
@@ -1,5 +1,7 @@
 import asyncio
 import json
+import os
+import socket
 from datetime import datetime, timezone
 from typing import Any
 
@@ -10,8 +12,11 @@ from app.db.redis_client import (
     EMAIL_HIGH_PRIORITY_QUEUE,
     EMAIL_SCHEDULED_QUEUE,
     EMAIL_DLQ,
-    EMAIL_LOCK_KEY_TEMPLATE,
+    EMAIL_SCHEDULED_STREAM,
+    EMAIL_CONSUMER_GROUP,
+    EMAIL_SCHEDULED_WAKE,
 )
+from redis.exceptions import ResponseError
 from app.db.mongo_client import tasks_collection
 from app.services.email_service import send_otp_email_direct
 from app.config import settings
@@ -20,20 +25,16 @@ from app.config import settings
 QUEUE_HIGH = EMAIL_HIGH_PRIORITY_QUEUE
 QUEUE_SCHEDULED = EMAIL_SCHEDULED_QUEUE
 QUEUE_DLQ = EMAIL_DLQ
-LOCK_PREFIX = EMAIL_LOCK_KEY_TEMPLATE.replace("{task_id}", "")
 
-
-async def acquire_lock(lock_id: str, ttl: int = 300) -> bool:
-    """
-    Ensure we don't process the same task twice concurrently.
-    Sets a key that expires in 5 minutes.
-    """
-    key = f"{LOCK_PREFIX}{lock_id}"
-    return await redis_client.set(key, "LOCKED", ex=ttl, nx=True)
-
-
-async def release_lock(lock_id: str):
-    await redis_client.delete(f"{LOCK_PREFIX}{lock_id}")
+# Blocking waits are capped below the Redis socket timeout; loops just re-block
+BLOCK_SECONDS = 4
+BATCH_SIZE = 20
+MAX_CONCURRENCY = 10
+STREAM_MAXLEN = 10_000
+# Entries a crashed consumer never acknowledged are taken over after this
+CLAIM_IDLE_MS = 5 * 60 * 1000
+CLAIM_INTERVAL_SECONDS = 60
+CONSUMER_NAME = f"{socket.gethostname()}-{os.getpid()}"
 
 
 async def handle_retry(task_id: str, current_retries: int, error_msg: str):
@@ -85,32 +86,30 @@ async def process_otp(payload: dict):
 async def process_task(task_id: str):
     """
     🐢 LANE 2 PROCESSOR
-    """
-    if not await acquire_lock(task_id):
-        return
 
+    Called for stream entries this consumer owns, so no per-task lock is
+    needed: the consumer group delivers each entry to exactly one consumer.
+    """
     try:
         oid = ObjectId(task_id)
     except Exception:
         oid = task_id
 
+    task = None
     try:
         task = await tasks_collection.find_one({"_id": oid})
 
         if not task:
-            print(f"⚠️ Task {task_id} not found in DB. Removing from queue.")
-            await redis_client.zrem(QUEUE_SCHEDULED, task_id)
+            print(f"⚠️ Task {task_id} not found in DB. Skipping.")
             return
 
         # 🚀 Part 15: Prevent duplicate execution - check status BEFORE sending email
         if task.get("status") != "pending":
             print(f"⚠️ Task {task_id} is not pending (status: {task.get('status')}). Skipping.")
-            await redis_client.zrem(QUEUE_SCHEDULED, task_id)
             return
 
         if task.get("email_status") == "sent":
             print(f"⚠️ Task {task_id} already sent. Skipping.")
-            await redis_client.zrem(QUEUE_SCHEDULED, task_id)
             return
 
         print(f"📧 Scheduling email via Celery for: {task.get('description')}")
@@ -130,7 +129,7 @@ async def process_task(task_id: str):
                 print(f"✅ Email task queued for {task_id}")
                 
                 # Mark as email_queued (Celery will update to sent when complete)
-                await tasks_collection.update_one(
+                result = await tasks_collection.update_one(
                     {"_id": task["_id"], "status": "pending"},
                     {
                         "$set": {
@@ -147,7 +146,7 @@ async def process_task(task_id: str):
                 await send_professional_email(task)
                 
                 # Mark as completed immediately for direct sending
-                await tasks_collection.update_one(
+                result = await tasks_collection.update_one(
                     {"_id": task["_id"], "status": "pending"},
                     {
                         "$set": {
@@ -171,47 +170,150 @@ async def process_task(task_id: str):
                     }
                 },
             )
+            result = None
 
-        if result.modified_count > 0:
+        if result is not None and result.modified_count > 0:
             print(f"✅ Task {task_id} marked as sent")
-        else:
+        elif result is not None:
             print(f"⚠️ Task {task_id} was already modified (prevented duplicate send)")
 
-        await redis_client.zrem(QUEUE_SCHEDULED, task_id)
-
     except Exception as e:
         print(f"❌ Error processing task {task_id}: {e}")
         await handle_retry(task_id, task.get("email_retry_count", 0) if task else 0, str(e))
 
-    finally:
-        await release_lock(task_id)
+
+async def _run_bounded(semaphore: asyncio.Semaphore, coro):
+    async with semaphore:
+        try:
+            await coro
+        except Exception as e:
+            print(f"💥 Email job error: {e}")
 
 
-async def start_worker():
-    print("👷 Email Worker Started...")
+async def otp_loop(semaphore: asyncio.Semaphore):
+    """
+    🚀 LANE 1: block on the OTP list instead of polling it.
+    Each OTP is sent concurrently (bounded by the shared semaphore).
+    """
+    pending = set()
     while True:
         try:
-            otp_raw = await redis_client.rpop(QUEUE_HIGH)
-            if otp_raw:
-                await process_otp(json.loads(otp_raw))
+            item = await redis_client.brpop(QUEUE_HIGH, timeout=BLOCK_SECONDS)
+            if not item:
                 continue
+            job = asyncio.create_task(_run_bounded(semaphore, process_otp(json.loads(item[1]))))
+            pending.add(job)
+            job.add_done_callback(pending.discard)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"💥 OTP Loop Error: {e}")
+            await asyncio.sleep(5)
+
+
+async def promote_due_reminders():
+    """
+    ⏰ Move due reminders from the delay ZSET into the stream.
 
+    The move is one Lua script (XADD + ZREM together), so a crash or Redis
+    error can't leave a reminder in neither structure, and concurrent
+    promoters can't publish the same one twice. Between moves we sleep on
+    the wake list until the next reminder is due (or schedule_task_reminder
+    pushes an earlier one).
+    """
+    while True:
+        try:
             now_ts = datetime.now(timezone.utc).timestamp()
-            due_tasks = await redis_client.zrangebyscore(
-                QUEUE_SCHEDULED, "0", str(now_ts), start=0, num=1
+            moved, next_ts = await redis_client.zmove_due_to_stream(
+                QUEUE_SCHEDULED, EMAIL_SCHEDULED_STREAM, now_ts, BATCH_SIZE, maxlen=STREAM_MAXLEN,
             )
+            if moved:
+                continue  # more may be due - drain before sleeping
+
+            wait = BLOCK_SECONDS if next_ts is None else min(max(next_ts - now_ts, 0.05), BLOCK_SECONDS)
+            await redis_client.brpop(EMAIL_SCHEDULED_WAKE, timeout=wait)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"💥 Promoter Loop Error: {e}")
+            await asyncio.sleep(5)
 
-            if due_tasks:
-                task_id = due_tasks[0]
+
+async def _process_entry(semaphore: asyncio.Semaphore, entry_id: str, fields: dict):
+    """
+    Process one stream entry, then acknowledge it.
+
+    process_task either finishes the reminder or re-schedules it via
+    handle_retry. If it raises anyway (e.g. Mongo/Redis down mid-retry) the
+    entry stays pending and XAUTOCLAIM re-delivers it later.
+    """
+    async with semaphore:
+        task_id = fields.get("task_id")
+        try:
+            if task_id:
                 await process_task(task_id)
-            else:
-                await asyncio.sleep(1)
+        except Exception as e:
+            print(f"💥 Reminder entry {entry_id} failed, leaving it pending: {e}")
+            return
+        await redis_client.xack(EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP, entry_id)
+
+
+async def consume_reminders(semaphore: asyncio.Semaphore):
+    """
+    🐢 LANE 2: XREADGROUP consumer.
+
+    Ownership comes from the consumer group's pending list - an entry is
+    delivered to one consumer and stays pending until acknowledged, and
+    XAUTOCLAIM hands entries of a crashed consumer to a live one.
+    """
+    await redis_client.xgroup_create(EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP)
+    last_claim = 0.0
+    loop = asyncio.get_running_loop()
 
+    while True:
+        try:
+            entries = []
+            if loop.time() - last_claim >= CLAIM_INTERVAL_SECONDS:
+                last_claim = loop.time()
+                entries = await redis_client.xautoclaim(
+                    EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP, CONSUMER_NAME,
+                    CLAIM_IDLE_MS, count=BATCH_SIZE,
+                )
+                if entries:
+                    print(f"♻️ Reclaimed {len(entries)} stale reminder entries")
+
+            if not entries:
+                entries = await redis_client.xreadgroup(
+                    EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP, CONSUMER_NAME,
+                    count=BATCH_SIZE, block_ms=BLOCK_SECONDS * 1000,
+                )
+            if entries:
+                await asyncio.gather(*(
+                    _process_entry(semaphore, entry_id, fields) for entry_id, fields in entries
+                ))
+        except asyncio.CancelledError:
+            raise
+        except ResponseError as e:
+            if "NOGROUP" in str(e):
+                # Stream was deleted/flushed - recreate and carry on
+                await redis_client.xgroup_create(EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP)
+                continue
+            print(f"💥 Consumer Loop Error: {e}")
+            await asyncio.sleep(5)
         except Exception as e:
-            print(f"💥 Worker Loop Error: {e}")
+            print(f"💥 Consumer Loop Error: {e}")
             await asyncio.sleep(5)
 
 
+async def start_worker():
+    print(f"👷 Email Worker Started ({CONSUMER_NAME})...")
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    await asyncio.gather(
+        otp_loop(semaphore),
+        promote_due_reminders(),
+        consume_reminders(semaphore),
+    )
+
+
 if __name__ == "__main__":
     asyncio.run(start_worker())
-
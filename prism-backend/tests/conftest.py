@@ -0,0 +1,474 @@
+"""
+Shared fixtures for the backend test suite.
+
+Tests run against the InMemoryStore Redis fallback and an in-memory MongoDB
+double, so no Redis, MongoDB or Neo4j server is needed. Run from
+prism-backend/:
+
+    python -m pytest -q
+"""
+
+import asyncio
+import copy
+import re
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.redis_client import InMemoryStore, redis_client
+
+# mongo_client module attribute -> collection name
+MONGO_COLLECTIONS = {
+    "users_collection": "users",
+    "sessions_collection": "sessions",
+    "auth_sessions_collection": "auth_sessions",
+    "tasks_collection": "user_tasks",
+    "memory_collection": "memory",
+    "mini_agents_collection": "mini_agents",
+    "users_global_collection": "users_global",
+    "media_cache_collection": "media_cache",
+    "user_media_library_collection": "user_media_library",
+}
+
+_MISSING = object()
+
+
+# ============ IN-MEMORY MONGO ============
+
+def _resolve(value, path):
+    """Values at a dotted path, fanning out over arrays like MongoDB does"""
+    values = [value]
+    for part in path.split("."):
+        found = []
+        for item in values:
+            if isinstance(item, list):
+                found.extend(sub[part] for sub in item if isinstance(sub, dict) and part in sub)
+            elif isinstance(item, dict) and part in item:
+                found.append(item[part])
+        values = found
+    # A terminal array matches on itself and on each element
+    return values + [sub for item in values if isinstance(item, list) for sub in item]
+
+
+def _compare(values, op, operand):
+    checks = {
+        "$lt": lambda v: v < operand,
+        "$lte": lambda v: v <= operand,
+        "$gt": lambda v: v > operand,
+        "$gte": lambda v: v >= operand,
+    }
+    return any(v is not None and type(v) is type(operand) and checks[op](v) for v in values)
+
+
+def _matches_condition(values, cond):
+    if not (isinstance(cond, dict) and cond and all(key.startswith("$") for key in cond)):
+        return cond in values if cond is not None else (not values or None in values)
+    for op, operand in cond.items():
+        if op == "$exists":
+            ok = bool(values) == bool(operand)
+        elif op == "$eq":
+            ok = operand in values
+        elif op == "$ne":
+            ok = operand not in values
+        elif op == "$in":
+            ok = any(v in operand for v in values) or (None in operand and not values)
+        elif op == "$nin":
+            ok = not any(v in operand for v in values)
+        elif op in ("$lt", "$lte", "$gt", "$gte"):
+            ok = _compare(values, op, operand)
+        elif op == "$regex":
+            ok = any(isinstance(v, str) and re.search(operand, v) for v in values)
+        else:
+            raise NotImplementedError(op)
+        if not ok:
+            return False
+    return True
+
+
+def mongo_matches(doc, query):
+    """Just enough of the MongoDB query language for the services under test"""
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            ok = any(mongo_matches(doc, sub) for sub in cond)
+        elif key == "$and":
+            ok = all(mongo_matches(doc, sub) for sub in cond)
+        elif key == "$nor":
+            ok = not any(mongo_matches(doc, sub) for sub in cond)
+        else:
+            ok = _matches_condition(_resolve(doc, key), cond)
+        if not ok:
+            return False
+    return True
+
+
+def _set_path(doc, path, value):
+    *parents, leaf = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[leaf] = value
+
+
+def _apply_update(doc, update, inserting=False):
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            if op in ("$set", "$setOnInsert"):
+                _set_path(doc, path, copy.deepcopy(value))
+            elif op == "$inc":
+                current = (_resolve(doc, path) or [0])[0]
+                _set_path(doc, path, current + value)
+            elif op == "$unset":
+                *parents, leaf = path.split(".")
+                target = doc
+                for part in parents:
+                    target = target.get(part, {})
+                target.pop(leaf, None)
+            elif op == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                array = (_resolve(doc, path) or [None])[0]
+                if array is None:
+                    array = []
+                    _set_path(doc, path, array)
+                array.extend(copy.deepcopy(items))
+            else:
+                raise NotImplementedError(op)
+
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+
+def _evaluate(expr, doc, variables):
+    """Just enough of the aggregation expression language for the pipelines under test"""
+    if isinstance(expr, str) and expr.startswith("$$"):
+        name, _, path = expr[2:].partition(".")
+        value = variables.get(name, _MISSING)
+        if path and value is not _MISSING:
+            for part in path.split("."):
+                value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+        return value
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = doc
+        for part in expr[1:].split("."):
+            value = value.get(part, _MISSING) if isinstance(value, dict) else _MISSING
+        return value
+    if isinstance(expr, dict) and len(expr) == 1 and next(iter(expr)).startswith("$"):
+        op, args = next(iter(expr.items()))
+        if op == "$map":
+            items = _evaluate(args["input"], doc, variables)
+            return [_evaluate(args["in"], doc, {**variables, args["as"]: item}) for item in items]
+        values = [_evaluate(arg, doc, variables) for arg in args] if isinstance(args, list) else _evaluate(args, doc, variables)
+        if op == "$ifNull":
+            return next((v for v in values if v not in (None, _MISSING)), None)
+        if op == "$size":
+            return len(values)
+        if op == "$min":
+            return min(values)
+        if op == "$max":
+            return max(values)
+        if op == "$subtract":
+            return values[0] - values[1]
+        if op == "$slice":
+            array, skip, count = values
+            return array[skip:skip + count]
+        raise NotImplementedError(op)
+    if isinstance(expr, dict):
+        out = {}
+        for key, sub in expr.items():
+            value = _evaluate(sub, doc, variables)
+            if value is not _MISSING:
+                out[key] = value
+        return out
+    return expr
+
+
+def _group(docs, spec):
+    groups = {}
+    for doc in docs:
+        key = _evaluate(spec["_id"], doc, {})
+        group = groups.setdefault(repr(key), {"_id": key})
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (op, arg), = accumulator.items()
+            value = _evaluate(arg, doc, {})
+            if op == "$sum":
+                group[field] = group.get(field, 0) + value
+            elif op == "$push":
+                group.setdefault(field, []).append(value)
+            elif op == "$first":
+                group.setdefault(field, value)
+            else:
+                raise NotImplementedError(op)
+    return list(groups.values())
+
+
+class MemoryCursor:
+    """find()/aggregate() result: chainable sort/skip/limit, to_list and async iteration"""
+
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else list(key.items()) if isinstance(key, dict) else [(key, direction)]
+        for field, order in reversed(keys):
+            present = [d for d in self.docs if _resolve(d, field)]
+            missing = [d for d in self.docs if not _resolve(d, field)]
+            present.sort(key=lambda d: _resolve(d, field)[0], reverse=order < 0)
+            self.docs = missing + present if order > 0 else present + missing
+        return self
+
+    def skip(self, n):
+        self.docs = self.docs[n:]
+        return self
+
+    def limit(self, n):
+        if n:
+            self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs[:length] if length else self.docs
+
+    def __aiter__(self):
+        self._iter = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class MemoryCollection:
+    """
+    Async collection double: documents live in self.docs (by _id), calls are
+    counted in self.calls and find() filters kept in self.queries. Indexes
+    created with unique=True are enforced. Set write_error to a callable
+    (op filter -> errmsg or None) to fail bulk_write ops with BulkWriteError.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.docs = {}
+        self.indexes = []
+        self.calls = Counter()
+        self.queries = []
+        self.write_error = None
+        self._next_id = 0
+
+    # ---------- helpers ----------
+
+    def seed(self, *docs):
+        """Synchronously load documents (assigning _id where missing)"""
+        for doc in docs:
+            self._store(copy.deepcopy(doc))
+        return self
+
+    def _store(self, doc):
+        from pymongo.errors import DuplicateKeyError
+
+        if "_id" not in doc:
+            self._next_id += 1
+            doc["_id"] = f"{self.name}-{self._next_id}"
+        for keys, options in self.indexes:
+            if not options.get("unique"):
+                continue
+            fields = [keys] if isinstance(keys, str) else [field for field, _ in keys]
+            value = [(_resolve(doc, f) or [None])[0] for f in fields]
+            if any([(_resolve(d, f) or [None])[0] for f in fields] == value for d in self.docs.values()):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name}")
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_")
+        self.docs[doc["_id"]] = doc
+        return doc
+
+    def _find(self, query):
+        return [doc for doc in self.docs.values() if mongo_matches(doc, query)]
+
+    def _update(self, query, update, upsert=False, many=False):
+        matched = self._find(query)[: None if many else 1]
+        for doc in matched:
+            _apply_update(doc, update)
+        upserted_id = None
+        if not matched and upsert:
+            doc = {k: copy.deepcopy(v) for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            _apply_update(doc, update, inserting=True)
+            upserted_id = self._store(doc)["_id"]
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched), upserted_id=upserted_id)
+
+    # ---------- reads ----------
+
+    def find(self, query=None, projection=None):
+        self.calls["find"] += 1
+        self.queries.append(query)
+        return MemoryCursor([_project(copy.deepcopy(doc), projection) for doc in self._find(query)])
+
+    async def find_one(self, query=None, projection=None):
+        self.calls["find_one"] += 1
+        docs = self._find(query)
+        return _project(copy.deepcopy(docs[0]), projection) if docs else None
+
+    async def count_documents(self, query):
+        self.calls["count_documents"] += 1
+        return len(self._find(query))
+
+    async def estimated_document_count(self):
+        self.calls["estimated_document_count"] += 1
+        return len(self.docs)
+
+    def aggregate(self, pipeline, **kwargs):
+        self.calls["aggregate"] += 1
+        docs = [copy.deepcopy(doc) for doc in self.docs.values()]
+        cursor = MemoryCursor(docs)
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == "$match":
+                cursor.docs = [doc for doc in cursor.docs if mongo_matches(doc, spec)]
+            elif op == "$sort":
+                cursor.sort(list(spec.items()))
+            elif op == "$limit":
+                cursor.limit(spec)
+            elif op == "$skip":
+                cursor.skip(spec)
+            elif op == "$group":
+                cursor.docs = _group(cursor.docs, spec)
+            elif op == "$project":
+                projected = []
+                for doc in cursor.docs:
+                    out = {"_id": doc.get("_id")} if spec.get("_id", 1) else {}
+                    for key, value in spec.items():
+                        if key == "_id" or value == 0:
+                            continue
+                        result = doc.get(key, _MISSING) if value == 1 else _evaluate(value, doc, {})
+                        if result is not _MISSING:
+                            out[key] = result
+                    projected.append(out)
+                cursor.docs = projected
+            else:
+                raise NotImplementedError(op)
+        return cursor
+
+    # ---------- writes ----------
+
+    async def insert_one(self, doc):
+        self.calls["insert_one"] += 1
+        await asyncio.sleep(0)  # let concurrent writers interleave
+        return SimpleNamespace(inserted_id=self._store(copy.deepcopy(doc))["_id"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.calls["update_one"] += 1
+        return self._update(query, update, upsert)
+
+    async def update_many(self, query, update, upsert=False):
+        self.calls["update_many"] += 1
+        return self._update(query, update, upsert, many=True)
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=False, **kwargs):
+        self.calls["find_one_and_update"] += 1
+        docs = self._find(query)
+        if not docs:
+            if upsert:
+                self._update(query, update, upsert=True)
+            return None
+        before = copy.deepcopy(docs[0])
+        _apply_update(docs[0], update)
+        return copy.deepcopy(docs[0]) if return_document else before
+
+    async def delete_one(self, query):
+        self.calls["delete_one"] += 1
+        docs = self._find(query)[:1]
+        for doc in docs:
+            del self.docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=len(docs))
+
+    async def delete_many(self, query):
+        self.calls["delete_many"] += 1
+        docs = self._find(query)
+        for doc in docs:
+            del self.docs[doc["_id"]]
+        return SimpleNamespace(deleted_count=len(docs))
+
+    async def bulk_write(self, ops, ordered=True):
+        from pymongo.errors import BulkWriteError
+
+        self.calls["bulk_write"] += 1
+        matched = modified = upserted = 0
+        errors = []
+        for index, op in enumerate(ops):
+            errmsg = self.write_error(op._filter) if self.write_error else None
+            if errmsg:
+                errors.append({"index": index, "errmsg": errmsg})
+                if ordered:
+                    break
+                continue
+            result = self._update(op._filter, op._doc, getattr(op, "_upsert", False))
+            matched += result.matched_count
+            modified += result.modified_count
+            upserted += result.upserted_id is not None
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nMatched": matched, "nModified": modified, "nUpserted": upserted})
+        return SimpleNamespace(matched_count=matched, modified_count=modified, upserted_count=upserted)
+
+    async def create_index(self, keys, **options):
+        self.indexes.append((keys, options))
+        return options.get("name", str(keys))
+
+
+class MemoryMongo:
+    """Database double: collections are created on first attribute or item access"""
+
+    def __init__(self):
+        self._collections = {}
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+
+# ============ FIXTURES ============
+
+@pytest.fixture
+def memory_redis(monkeypatch):
+    """Route the redis_client singleton to a fresh in-memory store"""
+    store = InMemoryStore()
+    monkeypatch.setattr(redis_client, "_fallback", store)
+    monkeypatch.setattr(redis_client, "_use_fallback", True)
+    return store
+
+
+@pytest.fixture
+def memory_mongo(monkeypatch):
+    """Route mongo_client.db and its *_collection globals to a fresh in-memory database"""
+    from app.db import mongo_client
+
+    database = MemoryMongo()
+    monkeypatch.setattr(mongo_client, "db", database)
+    for attribute, name in MONGO_COLLECTIONS.items():
+        monkeypatch.setattr(mongo_client, attribute, database[name])
+    return database
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    def _run(coro):
+        return asyncio.run(coro)
+    return _run
@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from app.services.analytics_rollups import AnalyticsRollups
+
+
+def _seed(memory_mongo, users=100, sessions=40):
+    for name, count in (("users", users), ("sessions", sessions), ("user_tasks", 7), ("memory", 3)):
+        memory_mongo[name].seed(*({} for _ in range(count)))
+
+
+def test_totals_are_seeded_once_then_maintained_by_hooks(memory_redis, memory_mongo, run):
+    _seed(memory_mongo)
+    rollups = AnalyticsRollups()
+
+    async def scenario():
+        await rollups.record_signup()   # raced ahead of the seed - must be kept
+        first = await rollups.get_totals()
+        await rollups.record_session()
+        await rollups.record_login("u1")
+        return first, await AnalyticsRollups().get_totals()
+
+    first, second = run(scenario())
+
+    assert first["users"] == 101
+    assert second == {"users": 101, "sessions": 41, "logins": 1, "tasks": 7, "memories": 3}
+    assert memory_mongo.users.calls["count_documents"] == 1
+
+
+def test_overview_reads_rollups_without_counting_collections(memory_redis, memory_mongo, run):
+    _seed(memory_mongo, users=90, sessions=0)
+    rollups = AnalyticsRollups()
+    now = datetime.utcnow()
+
+    async def scenario():
+        for user_id in ("u1", "u2", "u1"):
+            await rollups.record_login(user_id)
+        for _ in range(10):
+            await rollups.record_signup()
+        written = await rollups.write_rollups(now=now)
+        calls_before = memory_mongo.users.calls["count_documents"]
+        overview = await rollups.get_overview()
+        return written, calls_before, overview
+
+    written, calls_before, overview = run(scenario())
+
+    assert written == (4 if now.hour == 0 else 3)  # two hours + today (+ yesterday after midnight)
+    assert overview["total_users"] == 100
+    assert overview["active_users_24h"] == 2
+    assert overview["signups_7d"] == 10
+    assert overview["growth_rate"] == round(100 * 10 / 90, 1)
+    assert memory_mongo.users.calls["count_documents"] == calls_before
+    assert memory_mongo.analytics_rollups.docs[f"hour:{now:%Y-%m-%dT%H}"]["logins"] == 3
@@ -0,0 +1,120 @@
+from app.services.context_packer import (
+    BLOCK_OVERHEAD_TOKENS,
+    DEFAULT_CONTEXT_BUDGET,
+    MAX_TURNS_SHARE,
+    MIN_TURNS_SHARE,
+    ContextPacker,
+    budget_for_model,
+)
+from app.services.output_estimator import estimate_tokens
+
+
+def _turns(count, chars=200):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f"turn {i} " + "x" * chars}
+        for i in range(count)
+    ]
+
+
+def _context(**overrides):
+    context = {
+        "profile": {"name": "Asha", "location": "Pune"},
+        "memories": [],
+        "relationships": [],
+        "tasks": [],
+        "session": {},
+    }
+    context.update(overrides)
+    return context
+
+
+def test_budget_is_per_model_with_a_default():
+    assert budget_for_model("llama-3.1-8b-instant") < budget_for_model("llama-3.3-70b-versatile")
+    assert budget_for_model("unknown-model") == budget_for_model(None) == DEFAULT_CONTEXT_BUDGET
+
+
+def test_turns_keep_the_newest_contiguous_tail_and_truncate_the_oldest_kept():
+    history = _turns(40, chars=250)
+
+    packed = ContextPacker().pack(_context(), history, budget=1000)
+
+    kept = packed.history
+    assert kept[-1] == history[-1] and len(kept) < len(history)
+    assert [t["content"] for t in kept[1:]] == [t["content"] for t in history[-(len(kept) - 1):]]
+    assert kept[0]["content"].endswith("…") and kept[0]["role"] == history[-len(kept)]["role"]
+    assert packed.dropped["turns"] == len(history) - len(kept)
+    assert sum(estimate_tokens(t["content"]) + 4 for t in kept) <= 1000 * MAX_TURNS_SHARE
+
+
+def test_profile_first_then_memories_graph_and_tasks_within_budget():
+    context = _context(
+        memories=[{"text": f"memory number {i} about hiking trips"} for i in range(60)],
+        relationships=[{"type": "LIKES", "target": f"thing {i}"} for i in range(60)],
+        tasks=[{"title": f"task {i}", "status": "pending"} for i in range(60)],
+        session={"mood": "happy", "timestamp": "now"},
+    )
+
+    packed = ContextPacker().pack(context, _turns(4, chars=40), budget=800)
+
+    assert packed.context["profile"] == context["profile"]
+    assert packed.used_tokens <= 800
+    assert 0 < len(packed.context["memories"]) < 60
+    assert len(packed.context["memories"]) > len(packed.context["relationships"]) > len(packed.context["tasks"])
+    assert packed.context["session"] == {"timestamp": "now"}
+    assert packed.dropped["session"] == 1
+    assert packed.summary()["context_dropped"] == sum(packed.dropped.values())
+
+
+def test_duplicates_are_removed_across_memories_and_turns():
+    history = [{"role": "user", "content": "I moved to Berlin last month for work"}]
+    context = _context(memories=[
+        {"text": "Moved to Berlin last month"},
+        {"text": "likes green tea"},
+        {"text": "Likes green tea!"},
+        {"text": "plays the violin on weekends"},
+    ])
+
+    packed = ContextPacker().pack(context, history, budget=2000)
+
+    assert [m["text"] for m in packed.context["memories"]] == ["likes green tea", "plays the violin on weekends"]
+    assert packed.duplicates == 2
+
+
+def test_small_items_still_fill_the_room_a_large_one_left():
+    context = _context(profile={}, memories=[
+        {"text": "short one"},
+        {"text": "y" * 2000},
+        {"text": "short two"},
+    ])
+
+    packed = ContextPacker().pack(context, [], budget=BLOCK_OVERHEAD_TOKENS + 40)
+
+    assert [m["text"] for m in packed.context["memories"]] == ["short one", "short two"]
+    assert packed.dropped == {"memories": 1}
+
+
+def test_context_shape_is_preserved_and_inputs_untouched():
+    context = _context(memories=[{"text": "likes green tea", "score": 0.9}], global_stats={"total_memories": 3})
+    original = {key: (list(value) if isinstance(value, list) else value) for key, value in context.items()}
+
+    packed = ContextPacker().pack(context, None, model="llama-3.3-70b-versatile")
+
+    assert set(packed.context) == set(context) and packed.history == []
+    assert packed.context["memories"] == [{"text": "likes green tea", "score": 0.9}]
+    assert context == original and packed.budget == budget_for_model("llama-3.3-70b-versatile")
+
+
+def test_oversized_profile_leaves_turns_their_reserve(caplog):
+    context = _context(
+        profile={f"fact_{i}": "x" * 40 for i in range(60)},
+        global_stats={"total_memories": 1200, "topics": ["y" * 40] * 20},
+    )
+    history = _turns(10, chars=80)
+
+    packed = ContextPacker().pack(context, history, budget=1000)
+
+    assert packed.context["profile"] == context["profile"]
+    assert packed.context["global_stats"] == {} and packed.dropped["global_stats"] == 1
+    assert packed.history and packed.history[-1] == history[-1]
+    assert sum(estimate_tokens(t["content"]) + 4 for t in packed.history) <= 1000 * MIN_TURNS_SHARE
+    assert "budget overrun" in caplog.text
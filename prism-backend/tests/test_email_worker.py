@@ -0,0 +1,53 @@
+import asyncio
+import time
+
+from app.db.redis_client import EMAIL_CONSUMER_GROUP, EMAIL_SCHEDULED_QUEUE, EMAIL_SCHEDULED_STREAM, redis_client
+from app.workers import email_worker
+
+
+def test_due_reminders_move_to_stream_atomically(memory_redis, run):
+    now = time.time()
+
+    async def scenario():
+        await redis_client.zadd(EMAIL_SCHEDULED_QUEUE, {"due-1": now - 5, "due-2": now - 1, "later": now + 60})
+        moved, next_ts = await redis_client.zmove_due_to_stream(
+            EMAIL_SCHEDULED_QUEUE, EMAIL_SCHEDULED_STREAM, now, count=10
+        )
+        remaining = await redis_client.zrangebyscore(EMAIL_SCHEDULED_QUEUE, "-inf", "+inf")
+        return moved, next_ts, remaining
+
+    moved, next_ts, remaining = run(scenario())
+    assert moved == ["due-1", "due-2"]
+    assert next_ts == now + 60
+    assert remaining == ["later"]
+    assert [f["task_id"] for f in memory_redis._streams[EMAIL_SCHEDULED_STREAM].values()] == ["due-1", "due-2"]
+
+
+def _deliver_one(monkeypatch, run, process_task):
+    monkeypatch.setattr(email_worker, "process_task", process_task)
+
+    async def scenario():
+        await redis_client.xgroup_create(EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP)
+        await redis_client.xadd(EMAIL_SCHEDULED_STREAM, {"task_id": "t1", "due_ts": "0"})
+        [(entry_id, fields)] = await redis_client.xreadgroup(
+            EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP, "c1", count=1
+        )
+        await email_worker._process_entry(asyncio.Semaphore(1), entry_id, fields)
+
+    run(scenario())
+
+
+def test_entry_is_acked_after_successful_processing(memory_redis, monkeypatch, run):
+    async def process_task(task_id):
+        return None
+
+    _deliver_one(monkeypatch, run, process_task)
+    assert memory_redis._groups[(EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP)]["pending"] == {}
+
+
+def test_entry_stays_pending_when_processing_fails(memory_redis, monkeypatch, run):
+    async def process_task(task_id):
+        raise RuntimeError("mongo down")
+
+    _deliver_one(monkeypatch, run, process_task)
+    assert len(memory_redis._groups[(EMAIL_SCHEDULED_STREAM, EMAIL_CONSUMER_GROUP)]["pending"]) == 1
@@ -0,0 +1,75 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.utils.idempotency import FinalizeLedger
+
+
+@pytest.fixture
+def ledger(memory_mongo, run):
+    """finalized_generations with its unique generation_id index"""
+    collection = memory_mongo.finalized_generations
+    run(collection.create_index("generation_id", unique=True))
+    return collection
+
+
+def _record(ledger, generation_id):
+    return next(doc for doc in ledger.docs.values() if doc["generation_id"] == generation_id)
+
+
+def test_concurrent_finalize_retries_yield_one_claim(ledger, memory_redis, run):
+
+    async def scenario():
+        outcomes = await asyncio.gather(*(FinalizeLedger.claim("gen-1", "chat", "user") for _ in range(10)))
+        await FinalizeLedger.mark_done("gen-1")
+        return outcomes, await FinalizeLedger.claim("gen-1", "chat", "user")
+
+    outcomes, retry = run(scenario())
+
+    assert outcomes.count("claimed") == 1
+    assert outcomes.count("in_progress") == 9
+    assert retry == "done"
+    assert _record(ledger, "gen-1")["status"] == FinalizeLedger.DONE
+
+
+def test_mongo_record_answers_when_redis_lost_the_key(ledger, memory_redis, run):
+    run(FinalizeLedger.claim("gen-2", "chat", "user"))
+    run(FinalizeLedger.mark_done("gen-2"))
+    memory_redis._store.clear()
+
+    assert run(FinalizeLedger.claim("gen-2", "chat", "user")) == "done"
+    assert run(memory_redis.get("finalized:gen-2")) == FinalizeLedger.DONE
+
+
+def test_release_lets_the_next_retry_claim(ledger, memory_redis, run):
+    assert run(FinalizeLedger.claim("gen-3", "chat", "user")) == "claimed"
+    run(FinalizeLedger.release("gen-3"))
+
+    assert ledger.docs == {}
+    assert run(FinalizeLedger.claim("gen-3", "chat", "user")) == "claimed"
+
+
+def test_stale_pending_claim_is_taken_over(ledger, memory_redis, run):
+    run(FinalizeLedger.claim("gen-4", "chat", "user"))
+
+    assert run(FinalizeLedger.claim("gen-4", "chat", "user")) == "in_progress"
+    assert memory_redis._expiry["finalized:gen-4"] - time.time() <= FinalizeLedger.PENDING_TTL
+
+    # The owner crashed: its Redis marker is still there, but the Mongo claim went stale
+    _record(ledger, "gen-4")["claimed_at"] = datetime.utcnow() - FinalizeLedger.CLAIM_TIMEOUT - timedelta(seconds=1)
+    assert run(memory_redis.get("finalized:gen-4")) == FinalizeLedger.PENDING
+    assert run(FinalizeLedger.claim("gen-4", "chat", "user")) == "claimed"
+    assert run(FinalizeLedger.claim("gen-4", "chat", "user")) == "in_progress"
+
+
+def test_redis_claim_stands_when_mongo_is_down(ledger, memory_redis, monkeypatch, run):
+
+    async def broken_insert(doc):
+        raise ConnectionError("mongo down")
+
+    monkeypatch.setattr(ledger, "insert_one", broken_insert)
+
+    assert run(FinalizeLedger.claim("gen-5", "chat", "user")) == "claimed"
+    assert run(FinalizeLedger.claim("gen-5", "chat", "user")) == "in_progress"
@@ -0,0 +1,133 @@
+import json
+
+import pytest
+from bson import ObjectId
+
+from app.db.session_schema import session_schema
+from app.services import finalize_queue as queue_module
+from app.services.finalize_queue import FINALIZE_DLQ, FINALIZE_GROUP, FINALIZE_STREAM, MAX_ATTEMPTS, FinalizeQueue
+from app.utils.idempotency import FinalizeLedger
+
+USER = "64b7f0c2a1b2c3d4e5f60718"
+
+
+@pytest.fixture
+def queue(monkeypatch, memory_redis, memory_mongo):
+    monkeypatch.setattr(session_schema, "canonical", True)
+    monkeypatch.setattr(queue_module.redis_client, "is_using_fallback", lambda: False)
+    sessions = memory_mongo.sessions.seed(
+        *({"_id": chat_id, "chat_id": chat_id, "user_id": ObjectId(USER), "messages": []} for chat_id in ("chat-a", "chat-b"))
+    )
+    q = FinalizeQueue()
+    q.sessions = sessions
+    q.jobs_run = []
+
+    async def record_jobs(payload):
+        q.jobs_run.append(payload["generation_id"])
+
+    monkeypatch.setattr(q, "_run_jobs", record_jobs)
+    return q
+
+
+def _messages(generation_id, text):
+    return [
+        {"role": "user", "content": f"q {text}", "generation_id": generation_id},
+        {"role": "assistant", "content": f"a {text}", "generation_id": generation_id},
+    ]
+
+
+async def _enqueue_and_read(q, items):
+    for chat_id, generation_id in items:
+        await q.enqueue(chat_id, USER, generation_id, _messages(generation_id, generation_id))
+    await queue_module.redis_client.xgroup_create(FINALIZE_STREAM, FINALIZE_GROUP)
+    return await queue_module.redis_client.xreadgroup(FINALIZE_STREAM, FINALIZE_GROUP, "c1", count=50)
+
+
+def test_batch_is_written_in_order_with_one_bulk_write(queue, run):
+    async def scenario():
+        entries = await _enqueue_and_read(queue, [("chat-a", "g1"), ("chat-b", "g2"), ("chat-a", "g3")])
+        acked = await queue.process_batch(entries)
+        leftovers = await queue_module.redis_client.xautoclaim(FINALIZE_STREAM, FINALIZE_GROUP, "c2", 0)
+        return acked, leftovers
+
+    acked, leftovers = run(scenario())
+
+    assert acked == 3
+    assert leftovers == []
+    assert queue.sessions.calls["bulk_write"] == 1
+    assert [m["generation_id"] for m in queue.sessions.docs["chat-a"]["messages"]] == ["g1", "g1", "g3", "g3"]
+    assert queue.jobs_run == ["g1", "g2", "g3"]
+
+
+def test_redelivered_entries_do_not_duplicate_messages(queue, run):
+    async def scenario():
+        entries = await _enqueue_and_read(queue, [("chat-a", "g1")])
+        await queue.process_batch(entries)
+        await queue.process_batch(entries)  # e.g. crash between write and XACK
+
+    run(scenario())
+
+    assert len(queue.sessions.docs["chat-a"]["messages"]) == 2
+
+
+def test_failed_entry_is_retried_then_dead_lettered(queue, run):
+    queue.sessions.write_error = lambda query: "boom" if query["messages.generation_id"]["$ne"] == "bad" else None
+
+    async def scenario():
+        entries = await _enqueue_and_read(queue, [("chat-a", "g1"), ("chat-a", "bad"), ("chat-b", "g2")])
+        acked = await queue.process_batch(entries)
+        bad = [e for e in entries if json.loads(e[1]["payload"])["generation_id"] == "bad"]
+        pending = await queue_module.redis_client.xautoclaim(FINALIZE_STREAM, FINALIZE_GROUP, "c2", 0)
+        for _ in range(MAX_ATTEMPTS - 1):
+            await queue.process_batch(bad)
+        still_pending = await queue_module.redis_client.xautoclaim(FINALIZE_STREAM, FINALIZE_GROUP, "c3", 0)
+        dlq = await queue_module.redis_client.lrange(FINALIZE_DLQ, 0, -1)
+        return acked, pending, still_pending, dlq
+
+    acked, pending, still_pending, dlq = run(scenario())
+
+    assert acked == 2
+    assert [json.loads(f["payload"])["generation_id"] for _, f in pending] == ["bad"]
+    assert [m["generation_id"] for m in queue.sessions.docs["chat-b"]["messages"]] == ["g2", "g2"]
+    assert still_pending == []
+    assert len(dlq) == 1 and json.loads(dlq[0])["error"] == "boom"
+    assert queue.dead_lettered == 1
+    assert "bad" not in queue.jobs_run
+
+
+def test_update_that_matched_no_session_is_dead_lettered_and_revoked(queue, run):
+    async def scenario():
+        await FinalizeLedger.claim("lost", "chat-gone", USER)
+        await FinalizeLedger.mark_done("lost")
+        entries = await _enqueue_and_read(queue, [("chat-gone", "lost"), ("chat-a", "g1")])
+        await queue.process_batch(entries[1:])
+        acked = await queue.process_batch(entries)  # g1 redelivered: matches nothing, but it landed
+        pending = await queue_module.redis_client.xautoclaim(FINALIZE_STREAM, FINALIZE_GROUP, "c2", 0)
+        dlq = await queue_module.redis_client.lrange(FINALIZE_DLQ, 0, -1)
+        return acked, pending, dlq, await FinalizeLedger.claim("lost", "chat-gone", USER)
+
+    acked, pending, dlq, retry = run(scenario())
+
+    assert acked == 1 and pending == []
+    assert [json.loads(d)["error"] for d in dlq] == ["session not found"]
+    assert retry == "claimed"
+    assert queue.jobs_run == ["g1", "g1"]
+
+
+def test_without_redis_enqueue_writes_through(queue, monkeypatch, run):
+    monkeypatch.setattr(queue_module.redis_client, "is_using_fallback", lambda: True)
+
+    async def scenario():
+        entry_id = await queue.enqueue("chat-a", USER, "g1", _messages("g1", "g1"))
+        landed = [m["generation_id"] for m in queue.sessions.docs["chat-a"]["messages"]]
+        await queue.stop()
+        with pytest.raises(RuntimeError):
+            await queue.enqueue("chat-gone", USER, "g2", _messages("g2", "g2"))
+        return entry_id, landed
+
+    entry_id, landed = run(scenario())
+
+    assert entry_id == queue_module.WRITE_THROUGH_ID
+    assert landed == ["g1", "g1"]
+    assert queue.jobs_run == ["g1"]
+    assert queue.enqueued == 0
@@ -0,0 +1,87 @@
+import asyncio
+
+from app.db import neo4j_client as neo4j_module
+from app.services.graph_snapshot import COMPLETE_FIELD, GraphSnapshotCache
+
+
+class FakeNeo4j:
+    """Serves SNAPSHOT_QUERY rows; an optional hook runs mid-read"""
+
+    is_available = True
+
+    def __init__(self, records, during_read=None):
+        self.records = records
+        self.during_read = during_read
+        self.reads = 0
+
+    async def read(self, query, params, strict=False):
+        self.reads += 1
+        await asyncio.sleep(0.01)
+        if self.during_read:
+            await self.during_read()
+        return self.records
+
+
+RECORDS = [
+    {"rel": "LIKES", "target": "chess", "labels": ["Interest"], "ts": "2024-01-02", "related": [["PART_OF", "board games"]]},
+    {"rel": "WORKS_AT", "target": "Acme", "labels": ["Organization"], "ts": "2024-01-01", "related": []},
+]
+
+
+def test_rebuild_once_then_serve_incremental_updates_from_redis(memory_redis, monkeypatch, run):
+    fake = FakeNeo4j(RECORDS)
+    monkeypatch.setattr(neo4j_module, "neo4j_client", fake)
+    cache = GraphSnapshotCache()
+
+    async def scenario():
+        first, second = await asyncio.gather(cache.get("u1"), cache.get("u1"))
+        await cache.record_edges("u1", [("LIKES", "go", "Interest")])
+        await cache.remove_edge("u1", "WORKS_AT", "Acme")
+        return first, second, await cache.get("u1")
+
+    first, second, updated = run(scenario())
+
+    assert fake.reads == 1
+    assert [e.target for e in first.edges] == ["chess", "Acme"]
+    assert second.edges == first.edges
+    assert {(e.rel_type, e.target) for e in updated.edges} == {("LIKES", "chess"), ("LIKES", "go")}
+    assert {"type": "RELATED_VIA_chess", "target": "board games", "depth": 2,
+            "reasoning": "Because you like chess"} in updated.to_relationships()
+
+
+def test_write_racing_a_rebuild_leaves_snapshot_incomplete(memory_redis, monkeypatch, run):
+    cache = GraphSnapshotCache()
+
+    async def concurrent_write():
+        await cache.record_edges("u1", [("LIKES", "go", "Interest")])
+
+    fake = FakeNeo4j(RECORDS, during_read=concurrent_write)
+    monkeypatch.setattr(neo4j_module, "neo4j_client", fake)
+
+    async def scenario():
+        await cache.get("u1")
+        stored = await memory_redis.hgetall(cache._key("u1"))
+        fake.during_read = None
+        await cache.get("u1")
+        return stored
+
+    stored = run(scenario())
+
+    assert COMPLETE_FIELD not in stored
+    assert fake.reads == 2
+
+
+def test_unavailable_graph_returns_none(memory_redis, monkeypatch, run):
+    fake = FakeNeo4j(RECORDS)
+    fake.is_available = False
+    monkeypatch.setattr(neo4j_module, "neo4j_client", fake)
+
+    assert run(GraphSnapshotCache().get("u1")) is None
+
+
+def test_removing_from_a_missing_snapshot_leaves_an_expiring_hash(memory_redis, run):
+    cache = GraphSnapshotCache()
+
+    run(cache.remove_edge("u1", "LIKES", "chess"))
+
+    assert cache._key("u1") in memory_redis._expiry
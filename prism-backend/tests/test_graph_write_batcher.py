@@ -0,0 +1,77 @@
+import asyncio
+
+from app.db.neo4j_client import GraphUpsert, GraphWriteBatcher
+
+
+class FakeGraphClient:
+    """Records statements; any statement whose params mention `poison` fails"""
+
+    is_available = True
+
+    def __init__(self):
+        self.statements = []
+
+    async def write(self, query, params):
+        self.statements.append(params)
+        if "poison" in repr(params):
+            raise RuntimeError("malformed property")
+        return [{"user_id": params["user_id"]}]
+
+
+def _batcher():
+    return GraphWriteBatcher(FakeGraphClient(), window_seconds=0.01)
+
+
+def test_concurrent_submits_coalesce_into_one_statement(run):
+    batcher = _batcher()
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.submit("u1", GraphUpsert().add_interest("chess")),
+            batcher.submit("u1", GraphUpsert().set_property("city", "Pune")),
+        )
+
+    assert run(scenario()) == [True, True]
+    assert len(batcher.client.statements) == 1
+
+
+def test_one_bad_submission_does_not_sink_the_others(run):
+    batcher = _batcher()
+
+    async def scenario():
+        return await asyncio.gather(
+            batcher.submit("u1", GraphUpsert().add_interest("chess")),
+            batcher.submit("u1", GraphUpsert().set_property("bio", "poison")),
+        )
+
+    assert run(scenario()) == [True, False]
+
+
+def test_compile_failure_still_resolves_waiters(run, monkeypatch):
+    batcher = _batcher()
+
+    def broken(self, user_id):
+        raise ValueError("cannot compile")
+
+    monkeypatch.setattr(GraphUpsert, "to_cypher", broken)
+
+    async def scenario():
+        return await asyncio.wait_for(batcher.submit("u1", GraphUpsert().add_interest("chess")), timeout=1)
+
+    assert run(scenario()) is False
+
+
+def test_relationship_without_strength_leaves_strength_untouched():
+    query, params = GraphUpsert().add_relationship("Alice", "knows", "Person").to_cypher("u1")
+    assert params["rels_0"][0]["strength_inc"] is None
+    assert "WHEN item.strength_inc IS NULL THEN r.strength" in query
+
+
+def test_split_yields_one_upsert_per_item():
+    upsert = (
+        GraphUpsert()
+        .set_property("city", "Pune")
+        .add_interest("chess")
+        .add_relationship("Alice", "KNOWS", "Person")
+    )
+    assert [part.size() for part in upsert.split()] == [1, 1, 1]
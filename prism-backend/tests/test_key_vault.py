@@ -0,0 +1,67 @@
+import asyncio
+import time
+from datetime import date
+
+from app.services.key_vault import UserKeyVault, VaultKey, _VaultEntry
+
+
+def _entry(label: str) -> _VaultEntry:
+    key = VaultKey(
+        id=label, label=label, model="llama-3.1-8b-instant", priority=1,
+        is_active=True, is_exhausted_today=False, last_request_date=None, api_key=f"sk-{label}",
+    )
+    return _VaultEntry(keys=[key], loaded_at=time.monotonic(), day=date.today().isoformat())
+
+
+def _vault(monkeypatch, loads):
+    vault = UserKeyVault()
+
+    async def no_broadcast(user_id):
+        return None
+
+    monkeypatch.setattr(vault, "_broadcast", no_broadcast)
+    monkeypatch.setattr(vault, "_load", loads)
+    return vault
+
+
+def test_load_racing_an_invalidation_is_not_cached(monkeypatch, run):
+    release = None
+    versions = iter(["old", "new"])
+
+    async def slow_load(user_id):
+        await release.wait()
+        return _entry(next(versions))
+
+    vault = _vault(monkeypatch, slow_load)
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        first = asyncio.create_task(vault.get_keys("u1"))
+        await asyncio.sleep(0)
+        await vault.invalidate("u1")  # key deleted while the old list is loading
+        release.set()
+        stale = await first
+        fresh = await vault.get_keys("u1")
+        return stale, fresh
+
+    stale, fresh = run(scenario())
+    assert stale[0].label == "old"
+    assert fresh[0].label == "new"
+
+
+def test_hits_are_served_from_memory(monkeypatch, run):
+    calls = []
+
+    async def load(user_id):
+        calls.append(user_id)
+        return _entry("k1")
+
+    vault = _vault(monkeypatch, load)
+
+    async def scenario():
+        await vault.get_keys("u1")
+        return await vault.next_available("u1")
+
+    assert run(scenario())["api_key"] == "sk-k1"
+    assert calls == ["u1"]
@@ -0,0 +1,118 @@
+import json
+import random
+
+from app.services.load_aware_router import (
+    MIN_HEALTH_SAMPLES,
+    PROBE_INTERVAL,
+    LoadAwareRouter,
+    percentile,
+)
+from app.services.model_router import SmartModelRouter
+from app.services.output_estimator import OutputEstimator
+from app.services.routing_simulator import (
+    ComplexityPolicy,
+    LoadAwarePolicy,
+    TraceRequest,
+    compare_policies,
+    default_models,
+    load_trace,
+)
+
+INSTANT = SmartModelRouter.MODELS["instant"].name
+BALANCED = SmartModelRouter.MODELS["balanced"].name
+POWERFUL = SmartModelRouter.MODELS["powerful"].name
+
+
+def _router():
+    return LoadAwareRouter(estimator=OutputEstimator())
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 50), percentile(values, 95), percentile([7], 95)) == (50, 95, 7)
+    assert percentile([], 50) is None
+
+
+def test_complexity_tier_is_a_ceiling():
+    router = _router()
+
+    assert router.decide("powerful", "research")["name"] == POWERFUL
+    assert router.decide("instant", "general") == {
+        "name": INSTANT, "type": "instant", "complexity": "instant", "downgraded": False, "reasons": [],
+    }
+
+
+def test_slow_or_failing_models_are_stepped_over():
+    router = _router()
+    for _ in range(MIN_HEALTH_SAMPLES):
+        router.record(POWERFUL, ttft_ms=4500)
+        router.record(BALANCED, success=False)
+
+    decision = router.decide("powerful", "research")
+
+    assert decision["name"] == INSTANT and decision["downgraded"]
+    assert decision["reasons"] == ["powerful:p95_ttft", "balanced:error_rate"]
+    assert router.health(POWERFUL)["p95_ttft_ms"] == 4500
+
+
+def test_unhealthy_model_is_probed_periodically():
+    router = _router()
+    for _ in range(MIN_HEALTH_SAMPLES):
+        router.record(POWERFUL, success=False)
+
+    picks = [router.decide("powerful")["type"] for _ in range(PROBE_INTERVAL)]
+
+    assert picks.count("powerful") == 1 and picks[-1] == "powerful"
+
+
+def test_overload_and_token_headroom_downgrade():
+    router = _router()
+    for _ in range(5):
+        router.estimator.record(BALANCED, "general", 600)
+        router.estimator.record(INSTANT, "general", 200)
+
+    assert router.decide("powerful", load_score=1.2)["type"] == "balanced"
+    assert router.decide("balanced", prompt_tokens=500, headroom=800)["reasons"] == ["balanced:token_headroom"]
+    assert router.decide("balanced", prompt_tokens=5000, headroom=800)["reasons"][-1] == "fallback"
+
+
+def test_load_trace_reads_exported_llm_spans(tmp_path):
+    spans = [
+        {"name": "brain.turn", "start_unix_ns": 1, "attributes": {}},
+        {"name": "llm.stream", "start_unix_ns": 3_000_000_000, "attributes": {
+            "model": INSTANT, "intent": "coding", "complexity": "balanced", "prompt_tokens": 900, "chunks": 420}},
+        {"name": "llm.stream", "start_unix_ns": 1_000_000_000, "attributes": {
+            "model": INSTANT, "intent": "general", "prompt_chars": 400, "chunks": 60}},
+    ]
+    path = tmp_path / "traces.jsonl"
+    path.write_text("\n".join(json.dumps(span) for span in spans))
+
+    assert load_trace(str(path)) == [
+        TraceRequest(arrival_s=0.0, intent="general", complexity="instant", prompt_tokens=100, output_tokens=60),
+        TraceRequest(arrival_s=2.0, intent="coding", complexity="balanced", prompt_tokens=900, output_tokens=420),
+    ]
+
+
+def test_simulation_load_aware_beats_complexity_when_the_big_model_degrades():
+    rng = random.Random(3)
+    trace = [
+        TraceRequest(
+            arrival_s=i * 3.0,
+            intent="research" if i % 3 else "general",
+            complexity="powerful" if i % 3 else "instant",
+            prompt_tokens=rng.randint(300, 900),
+            output_tokens=rng.randint(150, 700),
+        )
+        for i in range(300)
+    ]
+    models = default_models()
+    models[POWERFUL].error_rate = 0.4
+
+    reports = compare_policies(
+        trace, {"complexity": ComplexityPolicy(), "load_aware": LoadAwarePolicy()}, models=models
+    )
+
+    assert reports["complexity"]["failure_rate"] > 0.2
+    assert reports["load_aware"]["failure_rate"] < reports["complexity"]["failure_rate"] / 2
+    assert reports["load_aware"]["downgraded"] > 0
+    assert reports["load_aware"]["requests"] == reports["complexity"]["requests"] == 300
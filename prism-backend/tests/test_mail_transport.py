@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.config import settings
+from app.services import mail_transport as transport_module
+from app.services.mail_transport import MailMessageError, MailTransport
+
+
+class FakeSMTP:
+    """Thread-safe counting stand-in for smtplib.SMTP"""
+
+    opened = 0
+    sent = 0
+    closed = 0
+    failures = []   # exceptions raised by the next send_message calls
+    lock = threading.Lock()
+
+    def __init__(self, host, port, timeout=None):
+        with FakeSMTP.lock:
+            FakeSMTP.opened += 1
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        pass
+
+    def noop(self):
+        return (250, b"ok")
+
+    def send_message(self, message):
+        if FakeSMTP.failures:
+            raise FakeSMTP.failures.pop(0)
+        time.sleep(0.005)  # hold the connection long enough for threads to overlap
+        with FakeSMTP.lock:
+            FakeSMTP.sent += 1
+
+    def quit(self):
+        raise transport_module.smtplib.SMTPServerDisconnected("gone")
+
+    def close(self):
+        with FakeSMTP.lock:
+            FakeSMTP.closed += 1
+
+
+@pytest.fixture
+def smtp_relay(monkeypatch):
+    FakeSMTP.opened = FakeSMTP.sent = FakeSMTP.closed = 0
+    FakeSMTP.failures = []
+    monkeypatch.setattr(transport_module.smtplib, "SMTP", FakeSMTP)
+    monkeypatch.setattr(settings, "SMTP_HOST", "relay.test")
+    monkeypatch.setattr(settings, "SMTP_USERNAME", "")
+    monkeypatch.setattr(settings, "SENDER_EMAIL", "noreply@prism.test")
+    return FakeSMTP
+
+
+def test_concurrent_smtp_sends_share_a_bounded_pool(smtp_relay):
+    transport = MailTransport(pool_size=4, max_pending=100)
+
+    async def scenario():
+        await asyncio.gather(*(
+            transport.send(f"user{i}@example.com", "Reminder", "<p>hi</p>") for i in range(40)
+        ))
+        stats = transport.get_stats()
+        await transport.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert smtp_relay.sent == 40
+    assert stats["failed"] == 0
+    assert smtp_relay.opened <= 4
+
+
+def test_invalid_recipient_is_a_message_error(smtp_relay):
+    transport = MailTransport(pool_size=1, max_pending=10)
+    with pytest.raises(MailMessageError):
+        asyncio.run(transport.send("not-an-address", "Reminder", "<p>hi</p>"))
+    assert smtp_relay.sent == 0
+
+
+def test_run_sync_closes_pooled_connections(smtp_relay):
+    transport = MailTransport(pool_size=2, max_pending=10)
+    transport.run_sync(transport.send("user@example.com", "Reminder", "<p>hi</p>"))
+    assert transport.get_stats()["smtp_idle_connections"] == 0
+    assert smtp_relay.sent == 1
+
+
+def test_failed_reconnect_closes_both_connections(smtp_relay):
+    transport = MailTransport(pool_size=1, max_pending=10)
+    smtp_relay.failures = [
+        transport_module.smtplib.SMTPServerDisconnected("dropped"),
+        transport_module.smtplib.SMTPDataError(554, b"rejected"),
+    ]
+
+    with pytest.raises(transport_module.smtplib.SMTPDataError):
+        transport.run_sync(transport.send("user@example.com", "Reminder", "<p>hi</p>"))
+
+    assert smtp_relay.opened == 2
+    assert smtp_relay.closed == 2
+    assert transport.get_stats()["smtp_idle_connections"] == 0
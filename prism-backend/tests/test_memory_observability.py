@@ -0,0 +1,85 @@
+import math
+import random
+
+from app.services.memory_observability import (
+    SKETCH_GROWTH,
+    LatencySketch,
+    MemoryObserver,
+    OperationType,
+    RingBuffer,
+    WindowedLatencySketch,
+)
+
+# Bucket midpoints are within a factor of sqrt(growth) of any value in the bucket
+MAX_RELATIVE_ERROR = math.sqrt(SKETCH_GROWTH) - 1
+
+
+def _exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+
+def test_quantiles_stay_within_the_bucket_error_bound():
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1.2) for _ in range(20_000)]
+    sketch = LatencySketch()
+    for value in values:
+        sketch.record(value)
+
+    for q in (0.5, 0.9, 0.95, 0.99, 0.999):
+        exact = _exact_quantile(values, q)
+        assert abs(sketch.quantile(q) - exact) / exact <= MAX_RELATIVE_ERROR + 1e-9, q
+
+    assert sketch.count == len(values)
+    assert math.isclose(sketch.mean, sum(values) / len(values))
+
+
+def test_quantiles_are_clamped_to_observed_extremes():
+    single = LatencySketch()
+    single.record(123.4)
+    overflow = LatencySketch()
+    for value in (5.0, 10 ** 9):
+        overflow.record(value)
+
+    assert single.quantile(0.5) == 123.4
+    assert overflow.quantile(1.0) == 10 ** 9
+    assert LatencySketch().quantile(0.5) == 0.0
+
+
+def test_ring_buffer_keeps_only_the_newest_items():
+    ring = RingBuffer(3)
+    for item in range(5):
+        ring.append(item)
+
+    assert len(ring) == 3
+    assert list(ring.newest_first()) == [4, 3, 2]
+
+
+def test_windowed_quantiles_forget_old_samples():
+    window = WindowedLatencySketch(window=100)
+    for _ in range(100):
+        window.record(900.0)
+    for _ in range(100):
+        window.record(20.0)
+
+    assert window.count <= 100
+    assert window.quantile(0.99) == 20.0
+
+
+def test_latency_alert_clears_after_recovery():
+    observer = MemoryObserver(max_latency_samples=200)
+    alerts = []
+    observer.register_alert_callback(alerts.append)
+
+    for _ in range(200):
+        observer.log_operation(OperationType.FETCH, "u1", True, 900.0)
+    assert alerts
+    for _ in range(200):
+        observer.log_operation(OperationType.FETCH, "u1", True, 20.0)
+    alerts.clear()
+    for _ in range(100):
+        observer.log_operation(OperationType.FETCH, "u1", True, 20.0)
+
+    assert alerts == []
+    assert observer.get_metrics()["operations"]["fetch"]["p99_latency_ms"] == 20.0
+    assert observer.get_metrics()["operations"]["fetch"]["total_count"] == 500
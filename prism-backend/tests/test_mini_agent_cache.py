@@ -0,0 +1,76 @@
+import pytest
+
+from app.services.mini_agent_cache import (
+    BUCKET_SIZE,
+    MiniAgentCache,
+    canonicalize,
+    snippet_fingerprint,
+)
+
+SNIPPET = "Memoization stores the results of expensive function calls and returns the cached result."
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("What does memoization mean?", ("definition", "define memoization")),
+    ("define memoization", ("definition", "define memoization")),
+    ("What's the meaning of memoization", ("definition", "define memoization")),
+    ("Can you explain this part?", ("clarification", "explain this")),
+    ("what does this mean", ("clarification", "explain this")),
+    ("Could you please give me an example", ("example", "example this")),
+    ("Why is it faster?", ("clarification", "why is it faster")),
+])
+def test_paraphrases_share_a_canonical_form(question, expected):
+    assert canonicalize(question) == expected
+
+
+def test_snippet_fingerprint_ignores_case_and_spacing():
+    assert snippet_fingerprint(SNIPPET) == snippet_fingerprint("  " + SNIPPET.upper().replace(" ", "\n"))
+    assert snippet_fingerprint(SNIPPET) != snippet_fingerprint("Something else entirely")
+
+
+def test_canonical_paraphrase_hits_exact_tier_across_users(memory_redis, run):
+    producer, consumer = MiniAgentCache(), MiniAgentCache()
+
+    run(producer.put(SNIPPET, "What does memoization mean?", "Caching results of calls."))
+
+    assert run(consumer.get(SNIPPET, "define memoization")) == "Caching results of calls."
+    assert consumer.get_stats()["definition"]["exact"] == 1
+    assert run(consumer.get("A different paragraph", "define memoization")) is None
+
+
+def test_near_question_hits_neighbour_tier_and_warms_exact_key(memory_redis, run):
+    cache = MiniAgentCache()
+    run(cache.put(SNIPPET, "why does memoization speed up recursive fibonacci", "It avoids recomputation."))
+
+    assert run(cache.get(SNIPPET, "why does memoization speed up the recursive fibonacci?")) == "It avoids recomputation."
+    assert run(cache.get(SNIPPET, "why does memoization slow down recursive parsers")) is None
+    run(cache.get(SNIPPET, "why does memoization speed up the recursive fibonacci?"))
+
+    stats = cache.get_stats()["clarification"]
+    assert (stats["neighbour"], stats["exact"], stats["miss"]) == (1, 1, 1)
+    assert run(cache.hit_rates())["clarification"]["hit_rate_percent"] == pytest.approx(66.67)
+
+
+def test_follow_up_questions_skip_the_neighbour_tier(memory_redis, run):
+    cache = MiniAgentCache()
+    run(cache.put(SNIPPET, "why does memoization speed up recursive fibonacci", "It avoids recomputation."))
+
+    assert run(cache.get(SNIPPET, "why does memoization speed up the recursive fibonacci", follow_up=True)) is None
+
+
+def test_follow_up_answers_are_not_stored(memory_redis, run):
+    cache = MiniAgentCache()
+
+    assert run(cache.put(SNIPPET, "define memoization", "As discussed above, caching.", follow_up=True)) is None
+
+    assert run(cache.get(SNIPPET, "define memoization")) is None
+    assert run(memory_redis.hgetall(f"mini_cache:nn:{snippet_fingerprint(SNIPPET)}")) == {}
+
+
+def test_neighbour_bucket_is_capped(memory_redis, run):
+    cache = MiniAgentCache()
+    for i in range(BUCKET_SIZE + 5):
+        run(cache.put(SNIPPET, f"question number {i}", "answer"))
+
+    bucket = run(memory_redis.hgetall(f"mini_cache:nn:{snippet_fingerprint(SNIPPET)}"))
+    assert len(bucket) == BUCKET_SIZE
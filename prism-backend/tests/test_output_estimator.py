@@ -0,0 +1,127 @@
+import pytest
+
+from app.services import output_estimator as estimator_module
+from app.services.groq_pool import GroqKeyConfig, GroqKeyPool
+from app.services.model_router import MIN_OUTPUT_TOKENS, SmartModelRouter
+from app.services.output_estimator import (
+    DEFAULT_OUTPUT_TOKENS,
+    MIN_SAMPLES,
+    OutputEstimator,
+    estimate_tokens,
+)
+
+INSTANT = SmartModelRouter.MODELS["instant"].name
+BALANCED = SmartModelRouter.MODELS["balanced"].name
+POWERFUL = SmartModelRouter.MODELS["powerful"].name
+
+
+@pytest.fixture
+def estimator(monkeypatch):
+    fresh = OutputEstimator()
+    monkeypatch.setattr(estimator_module, "output_estimator", fresh)
+    return fresh
+
+
+def _pool(*token_limits):
+    pool = GroqKeyPool()
+    pool.keys = [
+        GroqKeyConfig(key=f"gsk_{i}", index=i, label=f"Key #{i + 1}", token_limit=limit)
+        for i, limit in enumerate(token_limits)
+    ]
+    pool.clients = {i: object() for i in range(len(token_limits))}
+    pool._initialized = True
+    return pool
+
+
+def test_predictions_use_priors_until_enough_samples(estimator):
+    for _ in range(MIN_SAMPLES - 1):
+        estimator.record(INSTANT, "coding", 900, duration_s=1.5)
+
+    prediction = estimator.predict(INSTANT, "coding")
+
+    assert prediction["tokens"] == DEFAULT_OUTPUT_TOKENS and prediction["samples"] == 0
+    assert prediction["tokens_per_second"] == SmartModelRouter.MODELS["instant"].tokens_per_second
+
+
+def test_predictions_learn_per_intent_with_model_fallback(estimator):
+    for tokens in (400, 420, 380, 410, 390, 400):
+        estimator.record(INSTANT, "coding", tokens, duration_s=tokens / 500)
+        estimator.record(INSTANT, "greeting", 20, duration_s=0.1)
+
+    coding = estimator.predict(INSTANT, "coding")
+    research = estimator.predict(INSTANT, "research")   # unseen intent -> model-wide stats
+
+    assert 400 <= coding["tokens"] <= 440                # p90 sits a little above the mean
+    assert coding["tokens_per_second"] == pytest.approx(500, rel=0.01)
+    assert estimator.predict(INSTANT, "greeting")["tokens"] == 20
+    assert research["samples"] == 12 and research["mean_tokens"] > 20
+    assert estimator.predict(INSTANT, "coding", max_tokens=250)["tokens"] == 250
+
+
+def test_record_generation_metrics_feeds_the_estimator(estimator, memory_redis, run):
+    from app.services.adaptive_quality import record_generation_metrics
+
+    async def _record():
+        for _ in range(MIN_SAMPLES):
+            record_generation_metrics(1000, success=True, model=INSTANT, intent="task", output_tokens=120)
+        record_generation_metrics(1000, success=False, model=INSTANT, intent="task", output_tokens=5000)
+
+    run(_record())
+
+    assert estimator.predict(INSTANT, "task")["tokens"] == 120
+
+
+def test_pool_skips_keys_that_cannot_absorb_the_estimate(memory_redis, run):
+    pool = _pool(1000, 1000)
+
+    async def _scenario():
+        minute = await pool.reserve_tokens(0, 100)
+        first, _ = await pool.get_best_key(estimated_tokens=800)    # both fit: least requests wins
+        await pool.increment_usage(first.index)
+        await pool.reserve_tokens(1, 700)
+        skipped, _ = await pool.get_best_key(estimated_tokens=800)  # key 1 would exceed its budget
+        await pool.settle_tokens(0, minute, 100, 40)
+        return first, skipped, await pool.token_headroom(), await pool.get_pool_status()
+
+    first, skipped, headroom, status = run(_scenario())
+
+    assert first.index == 0 and skipped.index == 0
+    assert headroom == 960
+    assert [k["tokens_used"] for k in status["keys"]] == [40, 700]
+
+
+def test_estimate_above_a_whole_minute_waits_for_an_idle_key(memory_redis, run):
+    pool = _pool(1000, 1000)
+
+    async def _scenario():
+        await pool.reserve_tokens(0, 100)
+        idle, _ = await pool.get_best_key(estimated_tokens=1000 + MIN_OUTPUT_TOKENS)
+        await pool.reserve_tokens(1, 1)
+        busy, _ = await pool.get_best_key(estimated_tokens=1000 + MIN_OUTPUT_TOKENS)
+        return idle, busy
+
+    idle, busy = run(_scenario())
+
+    assert idle.index == 1
+    assert busy is not None  # no idle key left: round-robin fallback still answers
+
+
+def test_router_steps_down_until_prediction_fits(estimator):
+    for _ in range(MIN_SAMPLES):
+        estimator.record(POWERFUL, "research", 1500, duration_s=7.5)
+        estimator.record(BALANCED, "research", 900, duration_s=1.8)
+        estimator.record(INSTANT, "research", 500, duration_s=0.6)
+
+    roomy = SmartModelRouter.fit_to_token_budget(POWERFUL, "research", 500, 6000, 2000)
+    tight = SmartModelRouter.fit_to_token_budget(POWERFUL, "research", 500, 1200, 2000)
+    full = SmartModelRouter.fit_to_token_budget(POWERFUL, "research", 500, 550, 2000)
+
+    assert (roomy["name"], roomy["downgraded"]) == (POWERFUL, False)
+    assert (tight["name"], tight["downgraded"], tight["max_tokens"]) == (INSTANT, True, 2000)
+    assert (full["name"], full["max_tokens"]) == (INSTANT, MIN_OUTPUT_TOKENS)
+    assert SmartModelRouter.get_model_config("hi")["predicted_output_tokens"] == 500
+
+
+def test_estimate_tokens_is_about_four_chars_each():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("x" * 401) == 101
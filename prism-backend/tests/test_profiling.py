@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+from app.utils.profiling import AllocationTracker, CpuProfiler, LoopMonitor, ProfilerBusy
+
+
+def _busy_wait(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        pass
+
+
+def test_slow_callback_logging_toggles_loop_debug_mode(run):
+    monitor = LoopMonitor(stall_ms=10_000)
+
+    async def scenario():
+        monitor.start()
+        on = monitor.set_slow_callback_logging(True, threshold_ms=50)
+        debug_on = asyncio.get_running_loop().get_debug()
+        off = monitor.set_slow_callback_logging(False)
+        stats = monitor.get_stats()
+        await monitor.stop()
+        return on, debug_on, off, stats
+
+    on, debug_on, off, stats = run(scenario())
+
+    assert on == {"debug": True, "slow_callback_ms": 50.0} and debug_on
+    assert off["debug"] is False and off["slow_callback_ms"] == 50.0
+    assert stats["running"] and stats["asyncio_debug"] is False
+
+
+def test_loop_monitor_start_stop_and_stall_capture(run):
+    monitor = LoopMonitor(stall_ms=50)
+
+    async def scenario():
+        monitor.start()
+        monitor.start()  # idempotent while running
+        await asyncio.sleep(0.25)
+        _busy_wait(0.4)  # block the loop so the watchdog reports a stall
+        await asyncio.sleep(0.15)
+        await monitor.stop()
+        return monitor.get_stats()
+
+    stats = run(scenario())
+
+    assert stats["running"] is False
+    assert stats["samples"] >= 1
+    assert stats["stalls"] == 1
+    assert "_busy_wait" in stats["recent_stalls"][0]["stack"]
+    assert monitor._stop.is_set()
+
+
+def test_cpu_profiler_samples_the_loop_thread_and_rejects_overlap(run):
+    profiler = CpuProfiler()
+
+    async def scenario():
+        async def hog():
+            await asyncio.sleep(0.02)
+            _busy_wait(0.2)
+
+        report, _ = await asyncio.gather(profiler.profile(seconds=0.3, interval_ms=2), hog())
+        profiler._running = True
+        with pytest.raises(ProfilerBusy):
+            await profiler.profile(seconds=0.1)
+        profiler._running = False
+        return report
+
+    report = run(scenario())
+
+    assert report["samples"] > 0 and report["sweeps"] > 0
+    assert "_busy_wait" in report["collapsed"]
+    assert profiler.get_stats() == {"running": False, "profiles_taken": 1}
+
+
+def test_allocation_tracker_start_diff_stop(run):
+    tracker = AllocationTracker()
+
+    async def scenario():
+        started = await tracker.start()
+        hoard = [bytearray(1024) for _ in range(2000)]
+        diff = await tracker.diff(limit=5)
+        del hoard
+        return started, diff, tracker.stop()
+
+    started, diff, stopped = run(scenario())
+
+    assert started["tracing"] and started["started_at"] is not None
+    assert diff["top"] and diff["top"][0]["size_diff_kb"] > 0
+    assert stopped == {"tracing": False, "started_at": None, "traced_current_mb": 0.0, "traced_peak_mb": 0.0}
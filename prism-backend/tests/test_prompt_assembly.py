@@ -0,0 +1,88 @@
+import pytest
+
+from app.services import prompt_assembly as assembly_module
+from app.services.behavior_engine import BehaviorEngine, BehaviorProfile
+from app.services.prompt_assembly import PromptAssemblyCache, fingerprint
+
+CORE = "\nYou are Prism.\nUse the ➤ format for suggestions.\n"
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    fresh = PromptAssemblyCache()
+    monkeypatch.setattr(assembly_module, "prompt_assembly", fresh)
+    return fresh
+
+
+def _profile(**overrides):
+    values = dict(
+        formality_level=0.5, emotional_depth=0.5, tone="calm",
+        vocabulary_style="standard", response_length="normal", warmth=0.5,
+    )
+    values.update(overrides)
+    return BehaviorProfile(**values)
+
+
+def _engine(monkeypatch, anchor=None):
+    engine = BehaviorEngine()
+
+    async def _anchor(user_id):
+        return anchor
+
+    monkeypatch.setattr(engine, "get_interaction_anchor", _anchor)
+    return engine
+
+
+def test_prefix_is_memoized_and_byte_identical_across_turns(cache, monkeypatch, run):
+    engine = _engine(monkeypatch)
+
+    first = run(engine.build_dynamic_prompt_async(CORE, _profile(), "👤 Name: Asha", user_id="u1"))
+    second = run(engine.build_dynamic_prompt_async(CORE, _profile(), "🧠 Memory: likes tea", user_id="u1"))
+
+    prefix = engine._construct_prompt_prefix(CORE, _profile(), "", "")
+    assert first.startswith(prefix + "\n\n") and second.startswith(prefix + "\n\n")
+    assert first.endswith("👤 Name: Asha") and second.endswith("🧠 Memory: likes tea")
+    assert "Asha" not in prefix and "ACTIVE STYLE: balanced | Tone: calm" in prefix
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_prompt_text_matches_the_uncached_builder(cache, monkeypatch, run):
+    engine = _engine(monkeypatch)
+    profile = {"username": "Asha", "email": "asha@example.com"}
+
+    cached = run(engine.build_dynamic_prompt_async(CORE, _profile(), "", user_id="u1", user_profile=profile))
+
+    assert cached == engine._construct_prompt_text(
+        CORE, _profile(), "", "", None, engine._bio_instruction(profile)
+    )
+    assert cached.endswith("No prior context available.")
+
+
+def test_anchor_style_and_profile_changes_get_new_prefixes(cache, monkeypatch, run):
+    anchor = {"relationship_style": "playful", "assistant_nickname": "Nova", "emotional_mode": "playful"}
+    plain, anchored = _engine(monkeypatch), _engine(monkeypatch, anchor=anchor)
+
+    run(plain.build_dynamic_prompt_async(CORE, _profile(), "", user_id="u1"))
+    with_anchor = run(anchored.build_dynamic_prompt_async(CORE, _profile(), "", user_id="u1"))
+    run(plain.build_dynamic_prompt_async(CORE, _profile(response_length="concise"), "", user_id="u1"))
+    run(plain.build_dynamic_prompt_async(CORE, _profile(), "", user_id="u1", user_profile={"username": "Asha"}))
+
+    assert cache.misses == 4 and cache.hits == 0
+    assert "Stay in character as 'Nova'" in with_anchor and "- **User Nickname**: User" in with_anchor
+    assert "Tone: playful" in with_anchor
+
+
+def test_size_accounting_splits_prefix_and_tail():
+    cache = PromptAssemblyCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.get_or_build(key, lambda: "x" * 400)
+    cache.record_sizes("x" * 400, "y" * 100)
+
+    stats = cache.get_stats()
+    assert stats["entries"] == 2
+    assert (stats["avg_prefix_tokens"], stats["avg_tail_tokens"], stats["prefix_share_percent"]) == (100, 25, 80)
+
+
+def test_fingerprint_ignores_key_order():
+    assert fingerprint({"a": 1, "b": [2]}) == fingerprint({"b": [2], "a": 1})
+    assert fingerprint(None) == fingerprint({}) == "-"
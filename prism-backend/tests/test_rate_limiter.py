@@ -0,0 +1,142 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.utils.rate_limiter import (
+    LocalSlidingWindowLimiter,
+    RateLimiter,
+    RateLimitMiddleware,
+    RouteLimit,
+    email_rate_limit,
+)
+from app.utils.security import get_trusted_client_ip
+
+
+def test_local_limiter_rejects_the_call_after_the_limit():
+    limiter = LocalSlidingWindowLimiter()
+    now = 1_000_040.0  # 20s into a 60s window
+
+    results = [limiter.hit("user:1", limit=5, window=60, now=now) for _ in range(6)]
+
+    assert [r.allowed for r in results] == [True] * 5 + [False]
+    assert results[4].remaining == 0
+    assert results[5].retry_after > 0
+    # Other keys have their own budget
+    assert limiter.hit("user:2", limit=5, window=60, now=now).allowed
+
+
+def test_previous_window_is_weighted_by_overlap():
+    limiter = LocalSlidingWindowLimiter()
+    start = 1_000_020.0  # start of 60s window 16667
+    for _ in range(10):
+        assert limiter.hit("k", limit=10, window=60, now=start).allowed
+
+    # 45s into the next window the previous one still weighs 25% -> 2 slots used
+    later = start + 60 + 45
+    allowed = [limiter.hit("k", limit=10, window=60, now=later).allowed for _ in range(10)]
+
+    assert allowed.count(True) == 8
+
+
+def test_idle_keys_are_swept():
+    limiter = LocalSlidingWindowLimiter(sweep_interval=0.0)
+    limiter.hit("idle", limit=5, window=60, now=1_000_000.0)
+
+    limiter.hit("active", limit=5, window=60, now=1_000_000.0 + 600)
+
+    assert len(limiter) == 1
+
+
+def test_shared_limiter_falls_back_locally_without_redis(memory_redis, run):
+    limiter = RateLimiter()
+
+    async def scenario():
+        return [(await limiter.hit("auth_login:ip:1.2.3.4", limit=3, window=60)).allowed for _ in range(4)]
+
+    assert run(scenario()) == [True, True, True, False]
+
+
+def _request(path, method="POST", cookies=None, ip="10.0.0.7", body=None, forwarded_for=None):
+    async def json():
+        return body
+
+    return SimpleNamespace(
+        method=method,
+        url=SimpleNamespace(path=path),
+        cookies=cookies or {},
+        headers={"X-Forwarded-For": forwarded_for} if forwarded_for else {},
+        client=SimpleNamespace(host=ip),
+        json=json,
+    )
+
+
+def test_middleware_returns_429_after_the_route_limit(memory_redis, run):
+    middleware = RateLimitMiddleware(
+        app=None,
+        limits=[RouteLimit("login", r"^/auth/login$", limit=2, window=60)],
+        limiter=RateLimiter(),
+    )
+
+    async def call_next(request):
+        return SimpleNamespace(status_code=200, headers={})
+
+    async def scenario():
+        responses = [await middleware.dispatch(_request("/auth/login"), call_next) for _ in range(3)]
+        unmatched = await middleware.dispatch(_request("/auth/login", method="GET"), call_next)
+        return responses, unmatched
+
+    responses, unmatched = run(scenario())
+
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert responses[1].headers["X-RateLimit-Remaining"] == "0"
+    assert "Retry-After" in responses[2].headers
+    assert unmatched.status_code == 200
+
+
+def test_random_session_cookies_do_not_get_fresh_buckets(memory_redis, run):
+    middleware = RateLimitMiddleware(
+        app=None,
+        limits=[RouteLimit("login", r"^/auth/login$", limit=2, window=60, scope="email")],
+        limiter=RateLimiter(),
+    )
+
+    async def call_next(request):
+        return SimpleNamespace(status_code=200, headers={})
+
+    async def scenario():
+        return [
+            (await middleware.dispatch(_request("/auth/login", cookies={"session_id": f"forged-{i}"}), call_next)).status_code
+            for i in range(3)
+        ]
+
+    assert run(scenario()) == [200, 200, 429]
+
+
+def test_user_scoped_rules_allow_a_shared_ip_more_than_one_account():
+    rule = RouteLimit("generate", r"^/generate$", limit=30, scope="user")
+
+    assert rule.ip_limit > rule.limit
+    assert RouteLimit("login", r"^/auth/login$", limit=10, scope="email").ip_limit == 10
+
+
+def test_email_limit_applies_across_client_ips(memory_redis, run):
+    check = email_rate_limit("auth_login", limiter=RateLimiter())
+
+    async def scenario():
+        for i in range(10):
+            await check(_request("/auth/login", ip=f"10.0.0.{i}", body={"email": "Asha@Example.com"}))
+        await check(_request("/auth/login", ip="10.9.9.9", body={"email": "other@example.com"}))
+        await check(_request("/auth/login", ip="10.9.9.9", body={"email": "asha@example.com "}))
+
+    with pytest.raises(HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 429
+
+
+def test_forwarded_for_is_trusted_only_from_our_proxies():
+    direct = _request("/auth/login", ip="203.0.113.9", forwarded_for="198.51.100.1")
+    proxied = _request("/auth/login", ip="10.0.0.2", forwarded_for="6.6.6.6, 198.51.100.1, 10.0.0.3")
+
+    assert get_trusted_client_ip(direct) == "203.0.113.9"
+    assert get_trusted_client_ip(proxied) == "198.51.100.1"
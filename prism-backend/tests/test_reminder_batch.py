@@ -0,0 +1,63 @@
+from app.services.mail_transport import mail_transport
+from app.tasks import email_tasks
+
+
+class FakeCursor(list):
+    def sort(self, *args):
+        return self
+
+    def limit(self, n):
+        return FakeCursor(self[:n])
+
+
+class FakeTasks:
+    """Just enough of a pymongo collection for _send_reminder_batch"""
+
+    def __init__(self, docs):
+        self.docs = {doc["_id"]: dict(doc) for doc in docs}
+        self.writes = []
+
+    def find(self, query, projection=None):
+        if "email_batch_id" in query:
+            return FakeCursor(d for d in self.docs.values() if d.get("email_batch_id") == query["email_batch_id"])
+        return FakeCursor(self.docs.values())
+
+    def update_many(self, query, update):
+        for _id in query["_id"]["$in"]:
+            self.docs[_id].update(update["$set"])
+
+    def bulk_write(self, ops, ordered=False):
+        self.writes.extend(ops)
+
+
+def _status_updates(collection):
+    return {op._filter["_id"]: op._doc for op in collection.writes}
+
+
+def _batch(monkeypatch, send):
+    collection = FakeTasks([
+        {"_id": "t1", "status": "pending", "user_email": "a@example.com", "description": "one"},
+        {"_id": "t2", "status": "pending", "user_email": "", "description": "two"},
+    ])
+    monkeypatch.setattr(email_tasks, "_get_tasks_collection_safe", lambda: collection)
+    monkeypatch.setattr(mail_transport, "send", send)
+    email_tasks._send_reminder_batch(limit=10)
+    return _status_updates(collection)
+
+
+def test_missing_recipient_fails_only_that_reminder_permanently(monkeypatch):
+    async def send(to_email, subject, html, text=None, from_name=None):
+        return None
+
+    updates = _batch(monkeypatch, send)
+    assert updates["t1"]["$set"]["email_status"] == "sent"
+    assert updates["t2"]["$set"]["email_status"] == "permanently_failed"
+
+
+def test_config_gap_releases_reminders_without_spending_a_retry(monkeypatch):
+    async def send(to_email, subject, html, text=None, from_name=None):
+        raise ValueError("SENDER_EMAIL not configured in environment")
+
+    updates = _batch(monkeypatch, send)
+    assert updates["t1"]["$set"]["email_status"] == "failed"
+    assert "$inc" not in updates["t1"]
@@ -0,0 +1,84 @@
+import hashlib
+
+import pytest
+
+from app.services.finalize_queue import FinalizeQueue
+from app.services.rendered_text_index import (
+    CLEAN_RULES,
+    KEY_TEMPLATE,
+    MARKDOWN_RULES,
+    RenderedTextIndex,
+    RenderedTextIndexCache,
+    apply_rules,
+    build_rendered_index,
+    content_hash,
+)
+
+SAMPLES = [
+    "",
+    "plain text only",
+    "  <!-- THINKING_DATA: {\"steps\": 3} -->\n## Title\nSome **bold** and *italic* and _under_ text.  ",
+    "Use `pip install` or see [the docs](https://example.com) ~~not this~~.\n# H1\n### H3 **mixed _nest_**",
+    "<!-- ACTION: {\"type\": \"task\"} -->Done. **Saved** your task.",
+    "Snake_case_names and a*b*c math ** unmatched",
+]
+
+
+def _rendered(content):
+    """The plain (untracked) pipeline get_rendered_text uses"""
+    if not content:
+        return ""
+    return apply_rules(apply_rules(content, CLEAN_RULES).strip(), MARKDOWN_RULES)
+
+
+@pytest.mark.parametrize("content", SAMPLES)
+def test_index_matches_the_rendered_text_and_maps_every_char(content):
+    index = build_rendered_index(content)
+
+    assert index.text == _rendered(content)
+    assert index.message_hash == hashlib.sha256(index.text.encode("utf-8")).hexdigest()
+    for offset, char in enumerate(index.text):
+        assert content[index.to_raw(offset)] == char
+        assert index.to_rendered(index.to_raw(offset)) == offset
+
+
+def test_raw_span_covers_the_markdown_behind_a_selection():
+    content = "Intro. Some **bold words** here."
+    index = build_rendered_index(content)
+    start = index.text.index("bold words")
+
+    raw_start, raw_end = index.raw_span(start, start + len("bold words"))
+
+    assert content[raw_start:raw_end] == "bold words"
+    assert index.to_rendered(content.index("**")) == start  # markup snaps to the next visible char
+    assert len(index.rendered_starts) == 3                   # "Intro. Some ", "bold words", " here."
+
+
+def test_index_round_trips_through_redis_cache(memory_redis, run):
+    content = "## Heading\nBody with `code`."
+    writer, reader = RenderedTextIndexCache(), RenderedTextIndexCache()
+
+    run(writer.precompute(content))
+    index = run(reader.get(content))
+
+    assert isinstance(index, RenderedTextIndex) and index.text == "Heading\nBody with code."
+    assert reader.get_stats()["hits"] == 1
+    assert run(memory_redis.get(KEY_TEMPLATE.format(content_hash=content_hash(content))))
+
+
+def test_finalize_jobs_precompute_assistant_messages(memory_redis, run):
+    payload = {
+        "chat_id": "chat-1",
+        "user_id": "user-1",
+        "generation_id": "gen-1",
+        "jobs": {},
+        "messages": [
+            {"role": "user", "content": "what is **this**"},
+            {"role": "assistant", "content": "It is **markdown**."},
+        ],
+    }
+
+    run(FinalizeQueue()._run_jobs(payload))
+
+    assert run(memory_redis.get(KEY_TEMPLATE.format(content_hash=content_hash("It is **markdown**."))))
+    assert not run(memory_redis.get(KEY_TEMPLATE.format(content_hash=content_hash("what is **this**"))))
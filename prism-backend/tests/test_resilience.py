@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from app.utils.resilience import Backend, CircuitOpenError, LatencyGuardTimeout, get_backend
+from app.utils.timeout_utils import with_timeout
+
+
+class Flaky:
+    """Fails the first `failures` calls, then returns "ok" after `delay`"""
+
+    def __init__(self, failures=0, delay=0.0):
+        self.failures = failures
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError("backend down")
+        await asyncio.sleep(self.delay)
+        return "ok"
+
+
+def test_retries_with_backoff_then_succeeds(run):
+    backend = Backend("test", failure_threshold=5)
+    op = Flaky(failures=2)
+
+    assert run(backend.call(op, retries=2, base_delay=0.001)) == "ok"
+    assert op.calls == 3
+    assert backend.breaker.state == "closed"
+    assert backend.retries == 2
+
+
+def test_breaker_opens_and_fails_fast(run):
+    backend = Backend("test", failure_threshold=3, cooldown=60)
+    op = Flaky(failures=100)
+
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            run(backend.call(op))
+    with pytest.raises(CircuitOpenError):
+        run(backend.call(op))
+
+    assert op.calls == 3
+    assert backend.breaker.state == "open"
+
+
+def test_half_open_probe_closes_the_breaker(run):
+    backend = Backend("test", failure_threshold=1, cooldown=0.0)
+    with pytest.raises(ConnectionError):
+        run(backend.call(Flaky(failures=1)))
+    assert backend.breaker.state == "open"
+
+    assert run(backend.call(Flaky())) == "ok"
+    assert backend.breaker.state == "closed"
+
+
+def test_non_matching_errors_do_not_trip_or_retry(run):
+    backend = Backend("test", failure_threshold=1)
+    calls = []
+
+    async def op():
+        calls.append(1)
+        raise KeyError("duplicate")
+
+    with pytest.raises(KeyError):
+        run(backend.call(op, retries=3, retry_on=(ConnectionError,)))
+
+    assert len(calls) == 1
+    assert backend.breaker.state == "closed"
+
+
+def test_retry_budget_caps_retries(run):
+    backend = Backend("test", failure_threshold=1000)
+    backend.budget.balance = 0.0
+    backend.budget.min_per_second = 0.0
+    op = Flaky(failures=100)
+
+    with pytest.raises(ConnectionError):
+        run(backend.call(op, retries=5, base_delay=0.001))
+
+    # One request deposits 0.2 tokens - not enough for a single retry
+    assert op.calls == 1
+    assert backend.budget.exhausted == 1
+
+
+def test_hedged_read_returns_the_faster_attempt(run):
+    backend = Backend("test")
+    backend._p95 = 0.01
+    delays = iter([0.5, 0.0])
+
+    async def op():
+        await asyncio.sleep(next(delays))
+        return "ok"
+
+    async def scenario():
+        started = asyncio.get_running_loop().time()
+        result = await backend.call(op, hedge=True)
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = run(scenario())
+
+    assert result == "ok"
+    assert elapsed < 0.4
+    assert backend.hedges == 1 and backend.hedge_wins == 1
+
+
+def test_latency_guard_timeouts_retry_but_never_trip_the_breaker(run):
+    backend = Backend("test", failure_threshold=1)
+    op = Flaky(delay=0.2)
+
+    with pytest.raises(LatencyGuardTimeout):
+        run(backend.call(op, retries=1, timeout=0.01, base_delay=0.001))
+
+    assert op.calls == 2
+    assert backend.breaker.state == "closed"
+
+
+def test_application_errors_are_not_retried_by_default(run):
+    backend = Backend("test", failure_threshold=1)
+    calls = []
+
+    async def op():
+        calls.append(1)
+        raise ValueError("bad document")
+
+    with pytest.raises(ValueError):
+        run(backend.call(op, retries=3))
+
+    assert len(calls) == 1
+    assert backend.breaker.state == "closed"
+
+
+def test_with_timeout_only_counts_backend_failures(run):
+    breaker = get_backend("redis").breaker
+    breaker.failures = 0
+
+    async def slow():
+        await asyncio.sleep(0.2)
+
+    async def broken():
+        raise KeyError("missing")
+
+    async def down():
+        raise ConnectionError("refused")
+
+    assert run(with_timeout(slow(), 10, "Redis GET", fallback="cached")) == "cached"
+    assert run(with_timeout(broken(), 100, "Redis GET", fallback="cached")) == "cached"
+    assert breaker.failures == 0
+
+    run(with_timeout(down(), 100, "Redis GET"))
+    assert breaker.failures == 1
+    breaker.record_success()
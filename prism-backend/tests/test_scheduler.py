@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app.services import scheduler_service
+from app.services.scheduler_service import ReminderScheduler
+
+
+class _TasksCollection:
+    """Just enough of find_one_and_update to evaluate the claim filter"""
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    async def find_one_and_update(self, query, update, return_document=None):
+        doc = self.doc
+        if doc["_id"] != query["_id"] or doc["status"] != query["status"]:
+            return None
+        if doc["due_date"] > query["due_date"]["$lte"]:
+            return None
+        doc.update(update["$set"])
+        return dict(doc)
+
+
+def _task(due_date):
+    return {"_id": scheduler_service.ObjectId("65f0c0ffee0000000000abcd"), "status": "pending", "due_date": due_date}
+
+
+def test_claim_matches_mongo_millisecond_due_date(monkeypatch, run):
+    armed = datetime.utcnow() + timedelta(minutes=1, microseconds=123)
+    stored = armed.replace(microsecond=armed.microsecond // 1000 * 1000)
+    tasks = _TasksCollection(_task(stored))
+    monkeypatch.setattr(scheduler_service, "tasks_collection", tasks)
+
+    claimed = run(ReminderScheduler()._claim(str(tasks.doc["_id"])))
+
+    assert claimed is not None
+    assert claimed["status"] == "sending"
+
+
+def test_claim_skips_task_rescheduled_later(monkeypatch, run):
+    tasks = _TasksCollection(_task(datetime.utcnow() + timedelta(hours=2)))
+    monkeypatch.setattr(scheduler_service, "tasks_collection", tasks)
+
+    assert run(ReminderScheduler()._claim(str(tasks.doc["_id"]))) is None
+    assert tasks.doc["status"] == "pending"
+
+
+def test_claim_is_lost_once_another_instance_took_it(monkeypatch, run):
+    tasks = _TasksCollection(_task(datetime.utcnow()))
+    monkeypatch.setattr(scheduler_service, "tasks_collection", tasks)
+    task_id = str(tasks.doc["_id"])
+
+    assert run(ReminderScheduler()._claim(task_id)) is not None
+    assert run(ReminderScheduler()._claim(task_id)) is None
+
+
+def test_fire_tasks_are_held_until_done_and_crashes_are_logged(monkeypatch, run, capsys):
+    scheduler = ReminderScheduler()
+
+    async def crashing_fire(task_id, due_date):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(scheduler, "_fire", crashing_fire)
+
+    async def scenario():
+        scheduler._spawn_fire("t1", datetime.utcnow())
+        held = len(scheduler._fire_tasks)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return held
+
+    assert run(scenario()) == 1
+    assert scheduler._fire_tasks == set()
+    assert "boom" in capsys.readouterr().out
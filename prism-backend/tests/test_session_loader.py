@@ -0,0 +1,96 @@
+import pytest
+from bson import ObjectId
+
+from app.db.redis_client import redis_client
+from app.db.session_schema import session_schema
+from app.services.session_loader import (
+    SessionLoader,
+    bump_session_version,
+    etag_matches,
+    make_etag,
+    session_version,
+)
+
+USER = "64b7f0c2a1b2c3d4e5f60718"
+
+
+@pytest.fixture
+def fakes(monkeypatch, memory_mongo):
+    monkeypatch.setattr(session_schema, "canonical", True)
+    messages = [
+        {
+            "id": f"m{i}",
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": f"message {i}",
+            "generation_id": f"g{i // 2}",
+            "chunks_sent": 40,
+            "metadata": {"source": "web_client", "action_payload": {"type": "task"}} if i == 9 else {"source": "web_client"},
+        }
+        for i in range(10)
+    ]
+    memory_mongo.sessions.seed({"chat_id": "chat-1", "user_id": ObjectId(USER), "title": "Long chat", "messages": messages})
+    memory_mongo.message_highlights.seed(
+        {"sessionId": "chat-1", "messageId": "m1", "highlightId": "h-old", "startIndex": 0, "endIndex": 3},
+        {"sessionId": "chat-1", "messageId": "m8", "highlightId": "h-new", "startIndex": 2, "endIndex": 5},
+    )
+    memory_mongo.mini_agent_threads.seed(
+        {"sessionId": "chat-1", "messageId": "m0", "id": "t-old"},
+        {"sessionId": "chat-1", "messageId": "m9", "id": "t-new"},
+    )
+    memory_mongo.mini_agent_messages.seed(
+        {"threadId": "t-new", "id": "tm1", "role": "user", "content": "why?", "createdAt": 1},
+        {"threadId": "t-old", "id": "tm2", "role": "user", "content": "old", "createdAt": 2},
+    )
+    return memory_mongo
+
+
+def test_pages_walk_back_from_the_latest_messages(fakes, run):
+    loader = SessionLoader()
+
+    first = run(loader.load_page("chat-1", USER, before=None, limit=4))
+    second = run(loader.load_page("chat-1", USER, before=first["page"]["before"], limit=4))
+    last = run(loader.load_page("chat-1", USER, before=second["page"]["before"], limit=4))
+
+    assert [m["id"] for m in first["messages"]] == ["m6", "m7", "m8", "m9"]
+    assert [m["id"] for m in second["messages"]] == ["m2", "m3", "m4", "m5"]
+    assert [m["id"] for m in last["messages"]] == ["m0", "m1"]
+    assert first["page"] == {"start": 6, "end": 10, "total": 10, "limit": 4, "hasMore": True, "before": 6}
+    assert last["page"]["hasMore"] is False and last["page"]["before"] is None
+    assert run(loader.load_page("chat-1", USER, before=0, limit=4))["messages"] == []
+    assert run(loader.load_page("missing", USER, before=None, limit=4)) is None
+
+
+def test_page_is_projected_and_scoped_to_its_messages(fakes, run):
+    db = fakes
+
+    page = run(SessionLoader().load_page("chat-1", USER, before=None, limit=4))
+
+    latest = page["messages"][-1]
+    assert set(latest) == {"id", "role", "content", "metadata", "highlights"}
+    assert latest["metadata"] == {"action_payload": {"type": "task"}}
+    assert "metadata" not in page["messages"][0]
+    assert [h["highlightId"] for h in page["highlights"]] == ["h-new"]
+    assert page["messages"][2]["highlights"][0]["startOffset"] == 2
+    assert [a["agentId"] for a in page["miniAgents"]] == ["t-new"]
+    assert page["miniAgents"][0]["messages"][0]["content"] == "why?"
+    assert db.mini_agent_messages.queries == [{"threadId": {"$in": ["t-new"]}}]
+
+
+def test_etag_changes_only_when_the_session_is_bumped(monkeypatch, memory_redis, run):
+    monkeypatch.setattr(redis_client, "is_using_fallback", lambda: False)
+
+    version = run(session_version("chat-1"))
+    etag = make_etag(version, USER, "chat-1", None, 50)
+
+    assert run(session_version("chat-1")) == version
+    assert etag_matches(etag, etag) and etag_matches(f'"other", {etag}', etag)
+    assert make_etag(version, USER, "chat-1", 50, 50) != etag
+
+    run(bump_session_version("chat-1"))
+    assert not etag_matches(etag, make_etag(run(session_version("chat-1")), USER, "chat-1", None, 50))
+
+
+def test_no_etag_while_redis_is_process_local(memory_redis, run):
+    assert run(session_version("chat-1")) is None
+    assert make_etag(None, USER, "chat-1") is None
+    assert not etag_matches("*", None)
@@ -0,0 +1,100 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.db import session_schema as schema_module
+from app.db.session_schema import SESSION_INDEXES, SessionSchema
+
+USER = "64b7f0c2a1b2c3d4e5f60718"
+
+
+def test_filters_switch_from_legacy_or_to_equality():
+    schema = SessionSchema()
+    legacy = schema.session_filter("c1", USER)
+    assert legacy == {"$and": [
+        {"$or": [{"chat_id": "c1"}, {"sessionId": "c1"}]},
+        {"$or": [{"user_id": {"$in": [ObjectId(USER), USER]}}, {"userId": {"$in": [ObjectId(USER), USER]}}]},
+    ]}
+
+    schema.canonical = True
+    assert schema.session_filter("c1", USER) == {"chat_id": "c1", "user_id": ObjectId(USER)}
+    assert schema.session_filter("c1") == {"chat_id": "c1"}
+    assert schema.user_sessions_filter(ObjectId(USER)) == {"user_id": ObjectId(USER)}
+
+
+def test_migration_backfills_dedupes_indexes_and_marks(memory_mongo, memory_redis, run):
+    oid = ObjectId(USER)
+    now = datetime.utcnow()
+    sessions = memory_mongo.sessions.seed(
+        {"_id": 1, "sessionId": "legacy", "userId": oid},
+        {"_id": 2, "chat_id": "modern", "user_id": oid, "sessionId": "modern", "userId": oid},
+        {"_id": 3, "chat_id": "stringly", "user_id": USER},
+        {"_id": 4, "chat_id": "dup", "user_id": oid, "updated_at": now},
+        {"_id": 5, "sessionId": "dup", "userId": oid, "updated_at": now - timedelta(days=1)},
+    )
+
+    schema = SessionSchema()
+    assert run(schema.migrate()) is True
+
+    docs = sessions.docs
+    assert docs[1]["chat_id"] == "legacy" and docs[1]["user_id"] == oid
+    assert docs[3]["user_id"] == oid
+    assert docs[4]["chat_id"] == "dup"
+    assert docs[5]["chat_id"] == f"dup{schema_module.DUPLICATE_SUFFIX}5"
+    assert schema.duplicates_renamed == 1
+    assert sessions.indexes == [(keys, options) for keys, options in SESSION_INDEXES]
+    assert memory_mongo.migrations.docs[schema_module.MIGRATION_ID]["completed_at"]
+    assert schema.canonical
+
+    # Another instance only needs the marker
+    other = SessionSchema()
+    assert run(other.migrate()) is True
+    assert other.canonical and other.backfilled == 0
+
+
+def test_migration_waits_while_another_instance_holds_the_lock(memory_mongo, memory_redis, run):
+    run(memory_redis.set(schema_module.MIGRATION_LOCK_KEY, "1"))
+
+    schema = SessionSchema()
+    assert run(schema.migrate()) is False
+    assert not schema.canonical
+    assert schema.session_filter("c1", USER)["$and"]
+
+
+@pytest.mark.skipif(not os.getenv("PRISM_TEST_MONGO_URL"), reason="set PRISM_TEST_MONGO_URL to a local mongod")
+def test_canonical_lookup_is_a_single_index_scan():
+    from pymongo import MongoClient
+
+    client = MongoClient(os.environ["PRISM_TEST_MONGO_URL"])
+    sessions = client["prism_explain_test"]["sessions"]
+    sessions.drop()
+    try:
+        users = [ObjectId() for _ in range(20)]
+        sessions.insert_many([
+            {"chat_id": f"c{i}", "sessionId": f"c{i}", "user_id": users[i % 20], "userId": users[i % 20],
+             "updated_at": datetime.utcnow()}
+            for i in range(2000)
+        ])
+        sessions.create_index("sessionId", unique=True)
+        sessions.create_index([("userId", 1), ("updated_at", -1)])
+        for keys, options in SESSION_INDEXES:
+            sessions.create_index(keys, **options)
+
+        schema = SessionSchema()
+        schema.canonical = True
+
+        plan = sessions.find(schema.session_filter("c7", users[7])).explain()
+        winning = str(plan["queryPlanner"]["winningPlan"])
+        assert schema_module.UNIQUE_INDEX_NAME in winning
+        assert "OR" not in winning and "COLLSCAN" not in winning
+        assert plan["executionStats"]["totalKeysExamined"] <= 1 if "executionStats" in plan else True
+
+        listing = sessions.find(schema.user_sessions_filter(users[3])).sort("updated_at", -1).limit(20).explain()
+        winning = str(listing["queryPlanner"]["winningPlan"])
+        assert "user_id_1_updated_at_-1" in winning
+        assert "SORT'" not in winning and "COLLSCAN" not in winning
+    finally:
+        sessions.drop()
+        client.close()
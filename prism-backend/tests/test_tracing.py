@@ -0,0 +1,88 @@
+import asyncio
+
+from app.utils.tracing import NOOP_SPAN, Tracer
+
+
+def _tracer():
+    tracer = Tracer(sample_rate=1.0)
+    tracer.enabled = True
+    return tracer
+
+
+def test_unsampled_requests_get_the_shared_noop_span():
+    tracer = Tracer(sample_rate=0.0)
+    tracer.enabled = True
+
+    root = tracer.start_trace("http.request")
+
+    assert root is NOOP_SPAN
+    assert root.child("sse.stream") is NOOP_SPAN
+    assert tracer.span("memory.fetch") is NOOP_SPAN
+
+
+def test_generator_children_attach_to_the_stream_span_not_the_root(run):
+    tracer = _tracer()
+
+    async def stream(sse_span):
+        setup = sse_span.child("sse.setup")
+        await asyncio.sleep(0)
+        setup.end()
+        for i in range(3):
+            yield i
+        turn = sse_span.child("brain.turn")
+        turn.end()
+
+    async def scenario():
+        with tracer.start_trace("http.request") as root:
+            sse_span = tracer.span("sse.stream")
+        # The body is streamed after the handler's span has closed
+        async for _ in stream(sse_span):
+            pass
+        sse_span.end()
+        return root
+
+    root = run(scenario())
+    spans = {span.name: span for span in tracer._queue}
+
+    assert spans["sse.stream"].parent_id == root.span_id
+    assert spans["sse.setup"].parent_id == spans["sse.stream"].span_id
+    assert spans["brain.turn"].parent_id == spans["sse.stream"].span_id
+    assert {span.trace_id for span in tracer._queue} == {root.trace_id}
+
+
+def test_cancelled_stream_is_not_recorded_as_an_error(run):
+    tracer = _tracer()
+
+    async def scenario():
+        root = tracer.start_trace("http.request")
+        try:
+            with root:
+                raise asyncio.CancelledError()
+        except asyncio.CancelledError:
+            pass
+        return root
+
+    root = run(scenario())
+
+    assert root.end_ns is not None
+    assert root.error is None
+
+
+def test_upstream_sampling_is_honored_only_from_trusted_proxies():
+    tracer = Tracer(sample_rate=0.0)
+    tracer.enabled = True
+    header = "00-" + "a" * 32 + "-" + "b" * 16 + "-01"
+
+    public = tracer.start_trace("http.request", traceparent=header)
+    proxied = tracer.start_trace("http.request", traceparent=header, trusted=True)
+
+    assert public is NOOP_SPAN
+    assert proxied.trace_id == "a" * 32 and proxied.parent_id == "b" * 16
+
+
+def test_trusted_proxy_matching():
+    from app.utils.security import is_trusted_proxy
+
+    assert is_trusted_proxy("10.1.2.3") and is_trusted_proxy("::1")
+    assert not is_trusted_proxy("203.0.113.9")
+    assert not is_trusted_proxy("not-an-ip") and not is_trusted_proxy(None)
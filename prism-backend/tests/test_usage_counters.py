@@ -0,0 +1,42 @@
+import asyncio
+
+from app.services.usage_counters import DAY_HASH_TEMPLATE, UsageCounters, _today
+from app.db.redis_client import redis_client
+
+
+def _counters(monkeypatch, seeded_free: int = 0) -> UsageCounters:
+    counters = UsageCounters()
+    seeds = []
+
+    async def fake_seed(user_id, day):
+        seeds.append(day)
+        if seeded_free:
+            await redis_client.hincrby(DAY_HASH_TEMPLATE.format(user_id=user_id, day=day), "free", seeded_free)
+
+    monkeypatch.setattr(counters, "_seed_from_mongo", fake_seed)
+    counters.seeds = seeds
+    return counters
+
+
+def test_free_limit_is_never_overshot_by_concurrent_increments(memory_redis, monkeypatch, run):
+    counters = _counters(monkeypatch, seeded_free=48)
+
+    async def scenario():
+        return await asyncio.gather(*(counters.incr_free("u1", limit=50) for _ in range(10)))
+
+    results = run(scenario())
+    assert sum(1 for counted, _ in results if counted) == 2
+    assert run(counters.get_free_used("u1")) == 50
+
+
+def test_day_hash_lost_from_redis_is_reseeded(memory_redis, monkeypatch, run):
+    counters = _counters(monkeypatch, seeded_free=5)
+    assert run(counters.get_free_used("u1")) == 5
+
+    # Simulate a Redis restart: the day hash (and its seed marker) vanish,
+    # but this process still has a fresh memo entry.
+    run(redis_client.delete(DAY_HASH_TEMPLATE.format(user_id="u1", day=_today())))
+    counters._seeded = {key: 0.0 for key in counters._seeded}  # memo older than the recheck window
+
+    assert run(counters.get_free_used("u1")) == 5
+    assert len(counters.seeds) == 2
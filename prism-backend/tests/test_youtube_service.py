@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from app.services import youtube_service as yt_module
+from app.services.youtube_service import SEARCH_COST_UNITS, YouTubeService
+
+
+@pytest.fixture
+def service(monkeypatch, memory_redis):
+    monkeypatch.setenv("YOUTUBE_API_KEY", "test-key")
+    svc = YouTubeService()
+    svc.api_calls = []
+    svc.scraper_calls = []
+    svc.api_result = {"video_id": "apiVideo001", "title": "Song", "source": "api"}
+    svc.scraper_result = "scraperVid1"
+
+    async def no_mongo(query):
+        return None
+
+    async def no_mongo_write(query, video_data):
+        await svc._cache_to_redis(query, video_data["video_id"])
+
+    async def fake_api(query):
+        svc.api_calls.append(query)
+        await asyncio.sleep(0.01)
+        return svc.api_result
+
+    async def fake_scraper(query):
+        svc.scraper_calls.append(query)
+        await asyncio.sleep(0.01)
+        return svc.scraper_result
+
+    monkeypatch.setattr(svc, "_fetch_from_mongo_cache", no_mongo)
+    monkeypatch.setattr(svc, "_cache_video_data", no_mongo_write)
+    monkeypatch.setattr(svc, "_fetch_from_api_with_metadata", fake_api)
+    monkeypatch.setattr(svc, "_fetch_from_scraper", fake_scraper)
+    return svc
+
+
+def test_concurrent_lookups_share_one_api_call(service, run):
+    async def scenario():
+        return await asyncio.gather(*(service.get_video_id("Blinding Lights!") for _ in range(20)),
+                                    service.get_video_id("blinding lights"))
+
+    results = run(scenario())
+
+    assert set(results) == {"apiVideo001"}
+    assert len(service.api_calls) == 1
+    assert service.stats["coalesced"] == 20
+    assert service._inflight == {}
+
+
+def test_local_tier_answers_without_redis(service, run, memory_redis):
+    run(service.get_video_id("lofi beats"))
+    memory_redis._store.clear()
+
+    assert run(service.get_video_id("lofi beats")) == "apiVideo001"
+    assert service.stats["local_hits"] == 1
+    assert len(service.api_calls) == 1
+
+
+def test_misses_are_negatively_cached(service, run):
+    service.api_result = None
+    service.scraper_result = None
+
+    assert run(service.get_video_id("no such song xyz")) is None
+    assert run(service.get_video_id("no such song xyz")) is None
+    assert len(service.api_calls) == 1
+    assert len(service.scraper_calls) == 1
+
+    # Another instance (empty local tier) sees the Redis marker
+    service._local = yt_module._LocalLRU()
+    assert run(service.get_video_id("no such song xyz")) is None
+    assert service.stats["negative_hits"] == 1
+    assert len(service.api_calls) == 1
+
+
+def test_quota_budget_routes_to_scraper_before_exhaustion(service, run):
+    service.daily_quota_units = 10 * SEARCH_COST_UNITS
+    service.quota_reserve_units = 2 * SEARCH_COST_UNITS
+
+    for i in range(12):
+        run(service.get_video_id(f"song {i}"))
+
+    assert len(service.api_calls) == 8
+    assert len(service.scraper_calls) == 4
+    assert service.stats["api_rationed"] == 4
+    assert not service.quota_exceeded
+
+
+def test_quota_403_stops_api_until_next_day(service, run, monkeypatch):
+    run(service._mark_quota_exhausted())
+    run(service.get_video_id("after quota"))
+    assert service.api_calls == []
+    assert service.scraper_calls == ["after quota"]
+
+    monkeypatch.setattr(yt_module, "_quota_day", lambda: "2999-01-01")
+    run(service.get_video_id("next day"))
+    assert service.api_calls == ["next day"]
+    assert not service.quota_exceeded